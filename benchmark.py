@@ -0,0 +1,94 @@
+"""
+Benchmark suite for the Fingerstyle Tab pipeline.
+
+Usage:
+    python benchmark.py backends path/to/audio.mp3 [--backends tflite onnx] [--threads 2]
+    python benchmark.py profiles path/to/audio.mp3 [--profiles preview balanced] [--duration 60]
+    python benchmark.py warmup path/to/audio.mp3 [--duration 30] [--repeats 2]
+"""
+import argparse
+import sys
+
+from src.analysis_profiles import PROFILES, benchmark_profiles
+from src.inference_backend import available_backends, benchmark_backends
+from src.warmup import benchmark_first_request
+
+
+def run_backends(args):
+    """Compare inference backends on the same audio file."""
+    results = benchmark_backends(
+        args.audio_path,
+        backends=args.backends,
+        include_quantized=not args.no_quantized,
+        intra_op_threads=args.threads,
+        inter_op_threads=args.inter_threads,
+        repeats=args.repeats,
+    )
+    print(f"{'backend':<12} {'quant':<6} {'load(s)':>8} {'infer(s)':>9} {'notes':>6} "
+          f"{'prec':>6} {'recall':>6} {'f1':>6}")
+    for r in results:
+        print(f"{r.backend:<12} {'yes' if r.quantized else 'no':<6} {r.load_seconds:>8.2f} "
+              f"{r.inference_seconds:>9.2f} {r.num_notes:>6} {r.precision:>6.3f} "
+              f"{r.recall:>6.3f} {r.f1:>6.3f}")
+
+
+def run_profiles(args):
+    """Compare analysis profiles (latency and note agreement with 'accurate')."""
+    results = benchmark_profiles(args.audio_path, profiles=args.profiles, duration=args.duration,
+                                 repeats=args.repeats)
+    print(f"{'profile':<10} {'time(s)':>8} {'notes':>6} {'prec':>6} {'recall':>6} {'f1':>6}")
+    for r in results:
+        print(f"{r.profile:<10} {r.seconds:>8.2f} {r.num_notes:>6} {r.precision:>6.3f} "
+              f"{r.recall:>6.3f} {r.f1:>6.3f}")
+
+
+def run_warmup(args):
+    """Compare first-request latency of a fresh process, cold and after the startup warm-up."""
+    results = benchmark_first_request(args.audio_path, duration=args.duration, repeats=args.repeats)
+    print(f"{'mode':<20} {'import(s)':>9} {'warm-up(s)':>10} {'first(s)':>9}")
+    for r in results:
+        warmup = "-" if r.warmup_seconds is None else f"{r.warmup_seconds:.2f}"
+        print(f"{r.mode:<20} {r.import_seconds:>9.2f} {warmup:>10} {r.first_request_seconds:>9.2f}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fingerstyle Tab benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backends = sub.add_parser("backends", help="Compare inference backends (speed and note agreement)")
+    backends.add_argument("audio_path")
+    backends.add_argument("--backends", nargs="+", choices=available_backends(),
+                          help="Backends to compare (default: all available)")
+    backends.add_argument("--no-quantized", action="store_true",
+                          help="Skip the dynamic-range quantized variants")
+    backends.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = default)")
+    backends.add_argument("--inter-threads", type=int, default=0, help="Inter-op threads (0 = default)")
+    backends.add_argument("--repeats", type=int, default=1, help="Inference runs per configuration")
+    backends.set_defaults(func=run_backends)
+
+    profiles = sub.add_parser("profiles", help="Compare analysis profiles (latency and agreement with 'accurate')")
+    profiles.add_argument("audio_path")
+    profiles.add_argument("--profiles", nargs="+", choices=list(PROFILES),
+                          help="Profiles to compare (default: all)")
+    profiles.add_argument("--duration", type=float, default=None,
+                          help="Seconds to analyze from the start (default: whole file)")
+    profiles.add_argument("--repeats", type=int, default=1, help="Runs per profile")
+    profiles.set_defaults(func=run_profiles)
+
+    warmup = sub.add_parser("warmup", help="First-request latency of a fresh process, cold vs. warmed up")
+    warmup.add_argument("audio_path")
+    warmup.add_argument("--duration", type=float, default=None,
+                        help="Seconds to analyze from the start (default: whole file)")
+    warmup.add_argument("--repeats", type=int, default=1, help="Processes per mode")
+    warmup.set_defaults(func=run_warmup)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
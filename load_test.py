@@ -0,0 +1,372 @@
+"""
+Concurrent-client load test for the MCP server.
+
+Starts mcp_server.py over stdio (or in this process with --transport memory)
+and drives it with simulated clients issuing a weighted mix of requests:
+
+    hit         analyze_audio_to_tab on a file analyzed during warm-up (tab cache hit)
+    miss_short  analyze_audio_to_tab on a new recording as long as the short fixture
+                (another arrangement, so neither caches nor fingerprints match)
+    miss_long   the same with the long fixture's length (transcribed in parallel chunks)
+    list        list_available_audio_files
+    resource    read of the guitar://tuning/standard resource
+
+Audio fixtures are synthesized into a temporary directory, so the test runs
+offline. Each client tags its calls with its own client_id, so admission
+control treats them as separate clients; "Server busy" replies are counted
+apart from errors. The report gives throughput, p50/p95/p99 latency and error
+rate per request type, and the server's RSS (including worker processes)
+sampled over time.
+
+Usage:
+    python load_test.py --clients 8 --duration 60
+    python load_test.py --clients 4 --mix hit=5,miss_short=1,list=2 --json report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, redirect_stderr, redirect_stdout
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RATE = 22050
+
+DEFAULT_MIX = "hit=4,miss_short=2,miss_long=1,list=2,resource=1"
+OPERATIONS = ("hit", "miss_short", "miss_long", "list", "resource")
+
+# Replies the server returns as text instead of raising
+BUSY_PREFIX = "Server busy"
+ERROR_PREFIXES = ("Error occurred", "CRITICAL ERROR")
+
+
+def synthesize(path: str, seconds: float, seed: int = 0, bpm: float = 100.0) -> None:
+    """Write a plucked arpeggio (decaying harmonic tones) over C, G, Am and F."""
+    rng = np.random.default_rng(seed)
+    chords = [(48, 52, 55, 60, 64), (43, 47, 50, 55, 59), (45, 48, 52, 57, 60), (41, 45, 48, 53, 57)]
+    step = 60.0 / bpm / 2  # eighth notes
+    audio = np.zeros(int(seconds * SAMPLE_RATE) + SAMPLE_RATE, dtype=np.float32)
+    t = np.arange(int(1.5 * SAMPLE_RATE)) / SAMPLE_RATE
+    for i in range(int(seconds / step)):
+        chord = chords[(i // 8) % len(chords)]
+        pitch = chord[rng.integers(len(chord))] if i % 8 else chord[0]
+        f0 = 440.0 * 2 ** ((pitch - 69) / 12)
+        tone = sum(0.2 / k * np.sin(2 * np.pi * f0 * k * t) for k in range(1, 6)) * np.exp(-3 * t)
+        start = int(i * step * SAMPLE_RATE)
+        audio[start:start + len(t)] += tone[:len(audio) - start]
+    audio = audio[:int(seconds * SAMPLE_RATE)]
+    sf.write(path, audio / max(1.0, float(np.abs(audio).max())), SAMPLE_RATE)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, ___, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# -- server RSS ---------------------------------------------------------------
+
+def _rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _descendants(pid: int) -> List[int]:
+    """pid and all its descendant processes (Linux /proc)."""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, []))
+    return found
+
+
+def server_rss(server_pid: Optional[int]) -> Optional[int]:
+    """Resident memory of the server and its worker processes, or None if unknown."""
+    if server_pid is None:
+        return None
+    total = 0
+    try:
+        for pid in _descendants(server_pid):
+            try:
+                total += _rss_bytes(pid)
+            except OSError:
+                pass
+    except OSError:
+        return None
+    return total
+
+
+def find_server_pid() -> Optional[int]:
+    """The mcp_server.py process started by this process over stdio."""
+    for pid in _descendants(os.getpid())[1:]:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"mcp_server.py" in f.read():
+                    return pid
+        except OSError:
+            continue
+    return None
+
+
+# -- transports ---------------------------------------------------------------
+
+@asynccontextmanager
+async def stdio_sessions(server_log):
+    """One stdio server process; clients share its session and differ by client_id."""
+    from mcp import ClientSession
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[os.path.join(REPO_DIR, "mcp_server.py")],
+                                   cwd=REPO_DIR, env=dict(os.environ))
+    async with stdio_client(params, errlog=server_log) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            @asynccontextmanager
+            async def connect():
+                yield session
+            yield connect, find_server_pid()
+
+
+@asynccontextmanager
+async def memory_sessions(server_log):
+    """The server in this process; every client gets its own session."""
+    sys.path.insert(0, REPO_DIR)
+    from mcp.shared.memory import create_connected_server_and_client_session
+    # The server logs to stderr and its libraries may print; keep both out of the report
+    with redirect_stdout(server_log), redirect_stderr(server_log):
+        import mcp_server
+
+        @asynccontextmanager
+        async def connect():
+            async with create_connected_server_and_client_session(mcp_server.mcp) as session:
+                yield session
+        yield connect, os.getpid()
+
+
+TRANSPORTS = {"stdio": stdio_sessions, "memory": memory_sessions}
+
+
+# -- load generation ----------------------------------------------------------
+
+class Fixtures:
+    """Synthesized audio files: warmed-up files for cache hits and new recordings for misses"""
+
+    def __init__(self, directory: str, short_seconds: float, long_seconds: float):
+        self.directory = directory
+        self.short = os.path.join(directory, "fixture_short.wav")
+        self.long = os.path.join(directory, "fixture_long.wav")
+        self.seconds = {self.short: short_seconds, self.long: long_seconds}
+        synthesize(self.short, short_seconds, seed=1)
+        synthesize(self.long, long_seconds, seed=2)
+        self.hits = [self.short, self.long]
+        self._copies = 0
+
+    def fresh_copy(self, template: str) -> str:
+        """
+        A new recording as long as the template, unknown to every server cache.
+
+        A byte copy would be recognized by acoustic fingerprint and served from
+        the template's analysis; another arrangement (seed) is not.
+        """
+        self._copies += 1
+        path = os.path.join(self.directory, f"miss_{self._copies:05d}_{os.path.basename(template)}")
+        synthesize(path, self.seconds[template], seed=100 + self._copies)
+        return path
+
+
+async def prepare(operation: str, fixtures: Fixtures, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    """Tool name and arguments of one request (a miss synthesizes its recording here, untimed)."""
+    if operation == "list":
+        return "list_available_audio_files", {}
+    if operation == "hit":
+        return "analyze_audio_to_tab", {"file_path": rng.choice(fixtures.hits)}
+    if operation in ("miss_short", "miss_long"):
+        template = fixtures.short if operation == "miss_short" else fixtures.long
+        return "analyze_audio_to_tab", {"file_path": await asyncio.to_thread(fixtures.fresh_copy, template)}
+    return "", {}
+
+
+async def call(session, client_id: str, operation: str, name: str, arguments: Dict[str, Any]) -> str:
+    """Issue one request; return 'ok', 'busy' or 'error'."""
+    meta = {"client_id": client_id}
+    if operation == "resource":
+        from pydantic import AnyUrl
+        result = await session.read_resource(AnyUrl("guitar://tuning/standard"))
+        return "ok" if result.contents else "error"
+
+    result = await session.call_tool(name, arguments, meta=meta)
+    text = "".join(getattr(c, "text", "") for c in result.content)
+    if text.startswith(BUSY_PREFIX):
+        return "busy"
+    if result.isError or text.startswith(ERROR_PREFIXES):
+        return "error"
+    return "ok"
+
+
+async def client_loop(connect, index: int, mix: Dict[str, float], fixtures: Fixtures, deadline: float,
+                      think_seconds: float, seed: int, records: List[Tuple[str, float, float, str]]) -> None:
+    rng = random.Random(seed + index)
+    operations, weights = list(mix), list(mix.values())
+    client_id = f"load-client-{index}"
+    async with connect() as session:
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            name, arguments = await prepare(operation, fixtures, rng)
+            started = time.monotonic()
+            try:
+                outcome = await call(session, client_id, operation, name, arguments)
+            except Exception:
+                outcome = "error"
+            records.append((operation, started, time.monotonic() - started, outcome))
+            if think_seconds > 0:
+                await asyncio.sleep(rng.expovariate(1.0 / think_seconds))
+
+
+async def sample_rss(server_pid: Optional[int], interval: float, started: float,
+                     samples: List[Tuple[float, Optional[int]]], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        samples.append((time.monotonic() - started, server_rss(server_pid)))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="tab-load-")
+    fixtures = Fixtures(workdir, args.short_seconds, args.long_seconds)
+    server_log_path = args.server_log or os.path.join(workdir, "server.log")
+    records: List[Tuple[str, float, float, str]] = []
+    samples: List[Tuple[float, Optional[int]]] = []
+    try:
+        with open(server_log_path, "w") as server_log:
+            async with TRANSPORTS[args.transport](server_log) as (connect, server_pid):
+                # Warm-up: analyze the cache-hit files once, outside the measurement
+                if "hit" in args.mix:
+                    async with connect() as session:
+                        for path in fixtures.hits:
+                            await session.call_tool("analyze_audio_to_tab", {"file_path": path})
+
+                stop = asyncio.Event()
+                started = time.monotonic()
+                sampler = asyncio.create_task(sample_rss(server_pid, args.sample_interval, started, samples, stop))
+                deadline = started + args.duration
+                await asyncio.gather(*(
+                    client_loop(connect, i, args.mix, fixtures, deadline, args.think_ms / 1000.0,
+                                args.seed, records)
+                    for i in range(args.clients)
+                ))
+                elapsed = time.monotonic() - started
+                stop.set()
+                await sampler
+                samples.append((elapsed, server_rss(server_pid)))
+    finally:
+        if not args.keep_fixtures:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return summarize(records, samples, elapsed, args, server_log_path)
+
+
+def summarize(records, samples, elapsed: float, args, server_log_path: str) -> Dict[str, Any]:
+    def stats(rows) -> Dict[str, Any]:
+        latencies = np.array([r[2] for r in rows]) if rows else np.zeros(0)
+        outcomes = [r[3] for r in rows]
+        return {
+            "requests": len(rows),
+            "throughput_per_s": round(len(rows) / elapsed, 3) if elapsed > 0 else 0.0,
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if len(rows) else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if len(rows) else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1) if len(rows) else None,
+            "error_rate": round(outcomes.count("error") / len(rows), 4) if rows else 0.0,
+            "busy_rate": round(outcomes.count("busy") / len(rows), 4) if rows else 0.0,
+        }
+
+    by_operation = defaultdict(list)
+    for record in records:
+        by_operation[record[0]].append(record)
+    return {
+        "transport": args.transport,
+        "clients": args.clients,
+        "duration_s": round(elapsed, 2),
+        "mix": args.mix,
+        "total": stats(records),
+        "operations": {op: stats(rows) for op, rows in sorted(by_operation.items())},
+        "rss_mb": [(round(t, 1), None if rss is None else round(rss / (1024 * 1024), 1)) for t, rss in samples],
+        "server_log": server_log_path if args.server_log or args.keep_fixtures else None,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['clients']} clients over {report['transport']}, {report['duration_s']} s")
+    print(f"{'operation':<12} {'reqs':>6} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'busy':>6}")
+    rows = list(report["operations"].items()) + [("TOTAL", report["total"])]
+    for name, s in rows:
+        def ms(value):
+            return "-" if value is None else f"{value:.1f}"
+        print(f"{name:<12} {s['requests']:>6} {s['throughput_per_s']:>7.2f} {ms(s['p50_ms']):>9} "
+              f"{ms(s['p95_ms']):>9} {ms(s['p99_ms']):>9} {s['error_rate']:>7.1%} {s['busy_rate']:>6.1%}")
+
+    rss = [mb for ___, mb in report["rss_mb"] if mb is not None]
+    if rss:
+        print(f"\nServer RSS (MB): start {rss[0]:.1f}, peak {max(rss):.1f}, end {rss[-1]:.1f}")
+        print("  " + "  ".join(f"{t:.0f}s:{mb:.0f}" for t, mb in report["rss_mb"] if mb is not None))
+    else:
+        print("\nServer RSS: not available on this platform")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Concurrent-client load test for the MCP server")
+    parser.add_argument("--clients", type=int, default=4, help="Simulated clients")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weighted request mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="stdio",
+                        help="stdio: spawn mcp_server.py; memory: run the server in this process")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a client's requests")
+    parser.add_argument("--short-seconds", type=float, default=15.0, help="Length of the short fixture")
+    parser.add_argument("--long-seconds", type=float, default=90.0, help="Length of the long fixture")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-log", help="File for the server's log output")
+    parser.add_argument("--keep-fixtures", action="store_true", help="Keep the generated audio and log")
+    parser.add_argument("--json", help="Also write the report as JSON to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,15 +1,37 @@
 # 1. Suppress library logs via environment variables
 import os
 import sys
+import asyncio
 import logging
-import contextlib
+import threading
+from io import TextIOWrapper
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 os.environ['PYTHONWARNINGS'] = 'ignore'
 os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
 
+# 2. Keep STDOUT for MCP messages only
+def _reserve_stdout():
+    """
+    Give the MCP transport its own copy of stdout and send everything else to stderr.
+
+    print() on any thread and native libraries writing to file descriptor 1 all end
+    up on stderr, so nothing but protocol messages can reach the client.
+    """
+    sys.stdout.flush()
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    return protocol
+
+# Only when run as the server (not when imported, e.g. by load_test.py)
+_PROTOCOL_STDOUT = _reserve_stdout() if __name__ == "__main__" else None
+
+import anyio
 import gettext
-from mcp.server.fastmcp import FastMCP
+from mcp import types
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.stdio import stdio_server
 
 # Setup logging to STDERR
 logging.basicConfig(
@@ -19,10 +41,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Import core logic
+# Import core logic (the analysis service itself is imported on first local use)
 try:
-    from src.transcriber import transcribe_audio
-    from src.tab_generator import create_tab
+    from src.config import get_config
+    from src.daemon import DaemonClient, DaemonUnavailable
 except ImportError as e:
     logger.error(f"Import failed: {e}")
     sys.exit(1)
@@ -39,11 +61,83 @@ print("------------------------------------------------", file=sys.stderr, flush
 print("🚀 FINGERSTYLE MCP SERVER IS NOW ONLINE AND READY", file=sys.stderr, flush=True)
 print("------------------------------------------------", file=sys.stderr, flush=True)
 
-# Result cache to avoid re-processing identical files
-_TAB_CACHE = {}
+# Default destination of export_tab
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+
+# The analysis service, when this process runs it itself (no daemon answered)
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+def _local_service():
+    """Return the in-process analysis service, starting it on first use."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            logger.info(_("No analysis daemon available; analyzing in this process"))
+            # Before librosa is imported, so its compiled kernels persist across runs
+            from src.warmup import configure_numba_cache
+            configure_numba_cache()
+            from src import service
+            service.start()
+            _SERVICE = service
+    return _SERVICE
+
+def _daemon_client():
+    """Client of the shared analysis daemon, or None if daemon.enabled is off."""
+    if not get_config().daemon.enabled:
+        return None
+    return DaemonClient()
+
+def _call(method: str, **params):
+    """Run a service function in the shared daemon, or in this process if none answers."""
+    client = _daemon_client()
+    if client is not None:
+        try:
+            return client.call(method, **params)
+        except DaemonUnavailable as e:
+            logger.debug(f"Analysis daemon unavailable ({e})")
+    return getattr(_local_service(), method)(**params)
+
+# Without a daemon, start the service now so the model preload and config
+# watching begin at startup as they always did
+_client = _daemon_client()
+try:
+    if _client is None:
+        raise DaemonUnavailable()
+    logger.info(_("Using the analysis daemon on {} (pid {})").format(_client.path, _client.ping()['pid']))
+except DaemonUnavailable:
+    _local_service()
+
+async def _on_initialized(notification: types.InitializedNotification) -> None:
+    """After the MCP handshake, warm up the analysis pipeline (daemon or local) in the background."""
+    try:
+        logger.info(await asyncio.to_thread(_call, 'warm_up'))
+    except Exception as e:
+        logger.warning(_("Could not start the warm-up: {}").format(str(e)))
+
+mcp._mcp_server.notification_handlers[types.InitializedNotification] = _on_initialized
+
+def _client_id(ctx: Context = None):
+    """Identify the caller for admission control: MCP client id, else the session (None: local)."""
+    if ctx is None:
+        return None
+    try:
+        return ctx.client_id or f"session-{id(ctx.session):x}"
+    except ValueError:
+        # No active request (e.g. called directly rather than through MCP)
+        return None
+
+def _audio_path(file_path: str) -> str:
+    """Make an existing local path absolute, so the daemon (another cwd) finds the same file."""
+    expanded = os.path.expanduser(file_path)
+    if os.path.exists(expanded):
+        return os.path.abspath(expanded)
+    # A bare or fuzzy name, resolved against resource/ by the service
+    return file_path
 
 @mcp.tool()
-def analyze_audio_to_tab(file_path: str, duration_seconds: float = None, start_seconds: float = 0.0) -> str:
+async def analyze_audio_to_tab(file_path: str, duration_seconds: float = None, start_seconds: float = 0.0,
+                               profile: str = None, progressive: bool = False, ctx: Context = None) -> str:
     """
     Analyzes an audio file and converts it to guitar tablature.
     
@@ -51,117 +145,178 @@ def analyze_audio_to_tab(file_path: str, duration_seconds: float = None, start_s
         file_path: The absolute path to the file OR just the filename (it will search in the local 'resource/' folder).
         duration_seconds: (Optional) Limit analysis to N seconds (default: None - process all).
         start_seconds: (Optional) Start analysis from N seconds (default: 0.0).
+        profile: (Optional) Speed/quality profile: 'preview' (fastest), 'balanced' or 'accurate'
+            (chroma chords, whole-passage fingering, tempo map). Default: from the server configuration.
+        progressive: (Optional) Return a quick 'preview' tab now and compute the requested profile in
+            the background; calling again with the same arguments returns the refined tab once ready.
     
     Returns:
         Generated ASCII guitar tablature or a CRITICAL error message.
     """
-    cache_key = f"{file_path}_{start_seconds}_{duration_seconds}"
-    if cache_key in _TAB_CACHE:
-        logger.info(f"Returning cached result for: {file_path}")
-        return _TAB_CACHE[cache_key]
+    return await asyncio.to_thread(_call, 'analyze_audio_to_tab', client_id=_client_id(ctx),
+                                   file_path=_audio_path(file_path), duration_seconds=duration_seconds,
+                                   start_seconds=start_seconds, profile=profile, progressive=progressive)
 
-    print(f"DEBUG: Tool called for: {file_path} (Start: {start_seconds}s, Duration: {duration_seconds}s)", file=sys.stderr, flush=True)
+@mcp.tool()
+async def list_available_audio_files(page: int = 1, page_size: int = 50) -> str:
+    """
+    Lists audio files available in the local 'resource' directory.
+    Use this to see which songs are ready for analysis.
 
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    resource_dir = os.path.join(project_root, 'resource')
-    
-    full_path = os.path.abspath(os.path.expanduser(file_path))
-    
-    # 1. Improved Fuzzy Matching
-    if not os.path.exists(full_path):
-        print(f"DEBUG: Path {full_path} not found. Fuzzy matching in {resource_dir}", file=sys.stderr, flush=True)
-        filename = os.path.basename(full_path)
-        
-        if os.path.exists(resource_dir):
-            import re
-            def normalize(s):
-                # Remove extension and keep only alphanumeric
-                name_only = os.path.splitext(s)[0]
-                return re.sub(r'[^a-zA-Z0-9]', '', name_only).lower()
-            
-            target_norm = normalize(filename)
-            available_files = os.listdir(resource_dir)
-            
-            for f in available_files:
-                if f.startswith('.'): continue
-                f_norm = normalize(f)
-                if f_norm == target_norm or target_norm in f_norm or f_norm in target_norm:
-                    found_path = os.path.join(resource_dir, f)
-                    if os.path.isfile(found_path):
-                        print(f"DEBUG: SUCCESSful fuzzy match: {f}", file=sys.stderr, flush=True)
-                        full_path = found_path
-                        break
-
-    # 2. Final check with explicit failure message
-    if not os.path.exists(full_path):
-        files = os.listdir(resource_dir) if os.path.exists(resource_dir) else []
-        err_msg = (
-            "CRITICAL ERROR: TAB GENERATION FAILED. NO FILE FOUND.\n"
-            f"Expected: {full_path}\n"
-            f"Available in resource/: {', '.join(files)}\n"
-            "INSTRUCTION TO AI: Do NOT hallucinate a tab. Tell the user the file is missing in the 로컬 'resource' folder."
-        )
-        return err_msg
-    
+    Args:
+        page: (Optional) 1-based page number (default: 1).
+        page_size: (Optional) Files per page (default: 50).
+    """
+    return await asyncio.to_thread(_call, 'list_available_audio_files', page=page, page_size=page_size)
+
+@mcp.tool()
+async def render_tab_measures(file_path: str, start_measure: int = 1, end_measure: int = None, ctx: Context = None) -> str:
+    """
+    Renders only the given bars of a song's tablature (e.g. bars 120-135).
+    The song is analyzed once; later calls reuse the stored analysis.
+
+    Args:
+        file_path: The absolute path to the file OR just the filename (searched in 'resource/').
+        start_measure: First bar to show (1-based, default: 1).
+        end_measure: Last bar to show, inclusive (default: last bar of the song).
+
+    Returns:
+        ASCII tablature for the requested bars or an error message.
+    """
+    return await asyncio.to_thread(_call, 'render_tab_measures', client_id=_client_id(ctx),
+                                   file_path=_audio_path(file_path), start_measure=start_measure,
+                                   end_measure=end_measure)
+
+@mcp.tool()
+async def render_tab_time_range(file_path: str, start_seconds: float, end_seconds: float, ctx: Context = None) -> str:
+    """
+    Renders the bars covering a time range of a song without re-running transcription
+    (the song is analyzed once and the analysis is reused).
+
+    Args:
+        file_path: The absolute path to the file OR just the filename (searched in 'resource/').
+        start_seconds: Start of the range in seconds.
+        end_seconds: End of the range in seconds.
+
+    Returns:
+        ASCII tablature for the bars overlapping the range or an error message.
+    """
+    return await asyncio.to_thread(_call, 'render_tab_time_range', client_id=_client_id(ctx),
+                                   file_path=_audio_path(file_path), start_seconds=start_seconds,
+                                   end_seconds=end_seconds)
+
+def _export_tab(client_id: str, file_path: str, format: str, output_dir: str) -> str:
+    """Blocking body of export_tab, run on a worker thread."""
+    exported = _call('export_tab', client_id=client_id, file_path=_audio_path(file_path), format=format)
+    if 'error' in exported:
+        return exported['error']
     try:
-        print(f"DEBUG: Processing {full_path}...", file=sys.stderr, flush=True)
-        # Wrap everything in redirect_stdout to keep MCP-STDOUT clean
-        with contextlib.redirect_stdout(sys.stderr):
-            # Step 1: Transcribe audio to note data
-            notes, detected_bpm = transcribe_audio(full_path, duration=duration_seconds, start_offset=start_seconds)
-            
-            # Step 2: Convert notes to tablature
-            tab = create_tab(notes, bpm=detected_bpm)
-        
-        print(f"DEBUG: Processing complete!", file=sys.stderr, flush=True)
-        result = _("Analysis Successful (Start: {}s, Duration: {}s) - Path: {}:\n\n{}").format(start_seconds, duration_seconds, full_path, tab)
-        _TAB_CACHE[cache_key] = result
-        return result
+        # Written here rather than by the daemon, with this user's permissions
+        target_dir = output_dir or EXPORT_DIR
+        name = exported['name']
+        # A plain file name only: the answer must not choose where outside target_dir to write
+        if not name or name != os.path.basename(name) or name in (os.curdir, os.pardir):
+            raise ValueError(_("Invalid export file name: {!r}").format(name))
+        os.makedirs(target_dir, exist_ok=True)
+        out_path = os.path.join(target_dir, name)
+        with open(out_path, 'wb') as f:
+            f.write(exported['data'])
+        return _("Exported {} ({} bytes): {}").format(format.lower(), len(exported['data']), out_path)
     except Exception as e:
-        logger.error(_("Error during analysis: {}").format(str(e)))
+        logger.error(_("Error during export: {}").format(str(e)))
         return _("Error occurred during processing (Check server logs for details): {}").format(str(e))
 
 @mcp.tool()
-def list_available_audio_files() -> str:
+async def export_tab(file_path: str, format: str = "musicxml", output_dir: str = None, ctx: Context = None) -> str:
     """
-    Lists all audio files available in the local 'resource' directory.
-    Use this to see which songs are ready for analysis.
+    Exports the analyzed song as MIDI, MusicXML (with a TAB staff) or compact JSON.
+    Uses the stored analysis, so no transcription is re-run once the song has been analyzed.
+
+    Args:
+        file_path: The absolute path to the file OR just the filename (searched in 'resource/').
+        format: One of 'midi', 'musicxml', 'json'.
+        output_dir: Directory to write the file to (default: 'exports/').
+
+    Returns:
+        Path and size of the written file or an error message.
     """
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    resource_dir = os.path.join(project_root, 'resource')
-    
-    if os.path.exists(resource_dir):
-        files = [f for f in os.listdir(resource_dir) if not f.startswith('.')]
-        if files:
-            return _("Available files in 'resource/':\n- {}").format("\n- ".join(files))
-        return _("The 'resource/' folder is empty.")
-    return _("The 'resource/' folder does not exist.")
+    return await asyncio.to_thread(_export_tab, _client_id(ctx), file_path, format, output_dir)
 
 @mcp.tool()
-def tweak_tab_fingering(note_pitch: int, preferred_string: int) -> str:
+async def tweak_tab_fingering(file_path: str, note_pitch: int, preferred_string: int,
+                              start_measure: int = None, end_measure: int = None, ctx: Context = None) -> str:
     """
-    Suggests a preferred string for a specific note pitch.
-    
+    Plays a note pitch on a preferred string from now on, in the whole song or in a range of bars.
+    The override is saved for the file; only the bars containing that pitch are re-fingered
+    and re-rendered, and cached tabs of the song are updated. Overrides are shared by all of
+    this user's sessions.
+
     Args:
+        file_path: The absolute path to the file OR just the filename (searched in 'resource/').
         note_pitch: MIDI pitch of the note (0-127).
-        preferred_string: Target guitar string number (1: High E to 6: Low E).
-    
+        preferred_string: Target guitar string number (1: High E to 6: Low E), or 0 to remove the override.
+        start_measure: First bar the override applies to (1-based, default: from the start).
+        end_measure: Last bar the override applies to (inclusive, default: to the end).
+
     Returns:
-        Feedback on the adjustment request.
+        Summary of the change and the re-rendered bars, or an error message.
     """
-    string_names = ["Low E", "A", "D", "G", "B", "High E"]
-    if 1 <= preferred_string <= 6:
-        msg = _("Updated configuration to play pitch {} on string {} ({}) (Logic integration pending).").format(
-            note_pitch, preferred_string, string_names[6-preferred_string]
-        )
-        return msg
-    else:
-        return _("Invalid string number. Please enter a value between 1 and 6.")
+    return await asyncio.to_thread(_call, 'tweak_tab_fingering', client_id=_client_id(ctx),
+                                   file_path=_audio_path(file_path), note_pitch=note_pitch,
+                                   preferred_string=preferred_string, start_measure=start_measure,
+                                   end_measure=end_measure)
+
+@mcp.tool()
+async def get_model_status() -> str:
+    """
+    Reports the state of the transcription model: whether it is loaded, how long
+    loading took, how much memory it added, and the result of a health check.
+    """
+    return await asyncio.to_thread(_call, 'model_status')
+
+@mcp.tool()
+async def get_queue_status() -> str:
+    """
+    Reports the analysis queue: worker count, audio seconds waiting to be transcribed,
+    measured throughput, and per-client running jobs. Use it to decide when to retry
+    after a "Server busy" response.
+    """
+    return await asyncio.to_thread(_call, 'queue_status')
+
+@mcp.tool()
+async def profile_next_requests(count: int = 1) -> str:
+    """
+    Profiles the next N analyze_audio_to_tab calls that do work (answers served from
+    the result cache are not counted). Each profile covers the request and its worker
+    tasks (cProfile) plus time and peak memory per stage; read it with get_profile.
+
+    Args:
+        count: Number of requests to profile (0 cancels).
+    """
+    return await asyncio.to_thread(_call, 'profile_next_requests', count=count)
+
+@mcp.tool()
+async def get_profile(name: str = "") -> str:
+    """
+    Lists stored request profiles (newest first), or returns one profile's summary:
+    time and peak memory per stage and the hottest functions.
+
+    Args:
+        name: Profile name from the list, or 'latest' (default: list profiles).
+    """
+    return await asyncio.to_thread(_call, 'get_profile', name=name)
 
 @mcp.resource("guitar://tuning/standard")
 def get_standard_tuning() -> str:
     """Returns standard guitar tuning information."""
     return _("Standard Tuning: E2, A2, D3, G3, B3, E4 (82.41Hz - 329.63Hz)")
 
+async def _run_stdio():
+    """Serve MCP over stdio, writing messages to the stdout reserved at startup."""
+    stdout = anyio.wrap_file(TextIOWrapper(_PROTOCOL_STDOUT, encoding='utf-8'))
+    async with stdio_server(stdout=stdout) as (read_stream, write_stream):
+        await mcp._mcp_server.run(read_stream, write_stream,
+                                  mcp._mcp_server.create_initialization_options())
+
 if __name__ == "__main__":
-    mcp.run()
+    anyio.run(_run_stdio)
@@ -0,0 +1,664 @@
+"""
+Analyzed piece: the reusable result of transcription plus tab analysis.
+
+An AnalyzedPiece holds the notes of a whole song as arrays sorted by onset,
+together with the tempo map, per-measure chord labels, the chosen fingering
+and an index from measure number to note range. Any measure or time range can
+then be rendered in time proportional to the range rather than the song.
+
+Fingering overrides (a pitch played on a chosen string, optionally only in
+some measures) are applied to a piece in place: only the measures holding
+notes the changed overrides apply to are fingered and rendered again.
+"""
+import gettext
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, field, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src import serialization
+from src.analysis_profiles import AnalysisProfile, get_analysis_profile
+from src.config import get_config
+from src.profiling import stage
+from src.tab_generator import FingeringOverride, TabGenerator, bass_mask
+
+if TYPE_CHECKING:
+    from src.fingerprint import FingerprintIndex
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+STANDARD_TUNING = ('E2', 'A2', 'D3', 'G3', 'B3', 'E4')
+DEFAULT_PIECE_DIR = Path.home() / '.cache' / 'fingerstyle-tab' / 'pieces'
+DEFAULT_OVERRIDE_DIR = Path.home() / '.cache' / 'fingerstyle-tab' / 'overrides'
+PIECE_SUFFIX = '.ftnb'
+
+# Array fields written to and read from a piece bundle
+_ARRAY_FIELDS = ('starts', 'ends', 'pitches', 'velocities', 'measure_idx', 'slot_idx',
+                 'strings', 'frets', 'measure_offsets')
+
+# Array fields present only for some pieces
+_OPTIONAL_ARRAY_FIELDS = ('is_bass',)
+
+
+@dataclass
+class AnalyzedPiece:
+    """Notes, tempo, chords and fingering of a whole piece, indexed by measure"""
+    bpm: float
+    starts: np.ndarray
+    ends: np.ndarray
+    pitches: np.ndarray
+    velocities: np.ndarray
+    measure_idx: np.ndarray
+    slot_idx: np.ndarray
+    strings: np.ndarray
+    frets: np.ndarray
+    measure_chords: List[str]
+    measure_offsets: np.ndarray  # notes of measure m are [offsets[m], offsets[m + 1])
+    tempo_map: List[Tuple[float, float]]  # (time in seconds, bpm) from that time on
+    tuning: Tuple[str, ...] = STANDARD_TUNING
+    capo: int = 0
+    slots_per_measure: int = 16
+    source_path: Optional[str] = None
+    model_version: Optional[str] = None
+    is_bass: Optional[np.ndarray] = None  # bass stem of source separation, if used
+    fingering: str = 'greedy'  # method strings and frets were chosen with
+    overrides: Tuple[FingeringOverride, ...] = ()  # fingering overrides applied
+    _generator: Optional[TabGenerator] = field(default=None, repr=False, compare=False)
+    _exports: Dict[str, bytes] = field(default_factory=dict, repr=False, compare=False)
+    # Rendered lines of measures by (first, end) measure, for the layout they were rendered with
+    _rows: Dict[Tuple[int, int], str] = field(default_factory=dict, repr=False, compare=False)
+    _rows_layout: Optional[Tuple[int, int]] = field(default=None, repr=False, compare=False)
+    # Bumped whenever apply_overrides replaces strings and frets; renders and
+    # exports of an older fingering are not cached
+    _generation: int = field(default=0, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @classmethod
+    def from_notes(cls, notes: List[Dict[str, Any]], bpm: float,
+                   tuning: Optional[List[str]] = None, capo: int = 0,
+                   source_path: Optional[str] = None,
+                   chroma: Optional[np.ndarray] = None, fingering: str = 'greedy',
+                   tempo_map: Optional[List[Tuple[float, float]]] = None) -> 'AnalyzedPiece':
+        """
+        Analyze a whole piece once: chords per measure and fingering per note.
+
+        Args:
+            notes: Note dictionaries with 'start', 'end', 'pitch', 'velocity'
+            bpm: Tempo of the piece
+            tuning: String tunings (default: standard tuning)
+            capo: Capo fret
+            source_path: Audio file the notes were transcribed from
+            chroma: Chromagram of the whole file to detect chords from
+                (default: detect chords from the notes)
+            fingering: Fingering method, 'greedy' or 'dp' (see TabGenerator.assign_fingering)
+            tempo_map: (time, bpm) tempo changes that place notes in measures and
+                slots (default: bpm throughout)
+
+        Returns:
+            AnalyzedPiece covering every measure that contains a note
+        """
+        generator = TabGenerator(tuning=list(tuning or STANDARD_TUNING), bpm=bpm, capo=capo)
+        slots_per_measure = generator.slots_per_measure
+        tempo_map = list(tempo_map) if tempo_map else [(0.0, generator.bpm)]
+        grid_map = _grid_map(tempo_map, generator.bpm)
+
+        starts = np.fromiter((n['start'] for n in notes), dtype=np.float64, count=len(notes))
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        ends = np.fromiter((n['end'] for n in notes), dtype=np.float64, count=len(notes))[order]
+        pitches = np.fromiter((n['pitch'] for n in notes), dtype=np.int64, count=len(notes))[order]
+        velocities = np.fromiter((n.get('velocity', 0.0) for n in notes),
+                                 dtype=np.float32, count=len(notes))[order]
+        is_bass = bass_mask(notes)
+        if is_bass is not None:
+            is_bass = is_bass[order]
+
+        num_measures = int(generator.grid_positions(ends.max(), grid_map)[0]) + 1 if len(notes) else 0
+        measure_idx, slot_idx = generator.grid_positions(starts, grid_map)
+        measure_chords = generator.measure_chords(measure_idx, pitches, 0, num_measures, chroma,
+                                                  tempo_map=grid_map)
+        strings, frets = generator.assign_fingering(pitches, measure_idx, measure_chords, is_bass,
+                                                    fingering, slot_idx)
+        measure_offsets = np.searchsorted(measure_idx, np.arange(num_measures + 1), side='left')
+
+        return cls(
+            bpm=generator.bpm,
+            starts=starts, ends=ends, pitches=pitches, velocities=velocities,
+            measure_idx=measure_idx, slot_idx=slot_idx, strings=strings, frets=frets,
+            measure_chords=measure_chords, measure_offsets=measure_offsets,
+            tempo_map=tempo_map,
+            tuning=tuple(tuning or STANDARD_TUNING), capo=capo,
+            slots_per_measure=slots_per_measure, source_path=source_path,
+            model_version=serialization.model_version(),
+            is_bass=is_bass,
+            fingering=fingering,
+            _generator=generator,
+        )
+
+    @classmethod
+    def from_audio(cls, audio_path: str, profile: Optional[AnalysisProfile] = None,
+                   job=None, duration: Optional[float] = None) -> 'AnalyzedPiece':
+        """
+        Transcribe and analyze an audio file with a speed/quality profile.
+
+        Stages are measured when the request is profiled (see src.profiling).
+
+        Args:
+            audio_path: Audio file
+            profile: Analysis profile (default: analysis.default_profile)
+            job: Admitted scheduler job to transcribe under (default: a local job)
+            duration: Seconds to analyze from the start (default: whole file)
+
+        Returns:
+            AnalyzedPiece of the file
+        """
+        from src.chord_engine import chroma_for_chords
+        from src.features import get_feature_store
+        from src.transcriber import transcribe_audio
+        profile = profile or get_analysis_profile()
+        with stage('transcribe'):
+            notes, detected_bpm = transcribe_audio(audio_path, duration=duration, job=job, profile=profile)
+        with stage('chroma'):
+            chroma = chroma_for_chords(audio_path, 0.0, duration, engine=profile.chord_engine)
+            tempo_map = None
+            if profile.tempo == 'map':
+                tempo_map = get_feature_store().segment(audio_path, 0.0, duration).tempo_map
+        with stage('analyze'):
+            return cls.from_notes(notes, detected_bpm, source_path=audio_path, chroma=chroma,
+                                  fingering=profile.fingering, tempo_map=tempo_map)
+
+    def realigned(self, audio_path: str, offset: float,
+                  profile: Optional[AnalysisProfile] = None) -> 'AnalyzedPiece':
+        """
+        Return this piece as the analysis of another recording of the same audio.
+
+        The transcribed notes are reused with their times moved by the offset
+        between the recordings; notes outside the other recording are dropped.
+        Chords and fingering are recomputed on the new measure grid, from the
+        other recording's chromagram when the profile uses the chroma engine.
+
+        Args:
+            audio_path: The other recording
+            offset: Seconds to add to a time in this piece to get the same point in audio_path
+            profile: Analysis profile (default: analysis.default_profile)
+
+        Returns:
+            AnalyzedPiece of audio_path
+        """
+        from src.audio_probe import get_audio_duration
+        from src.chord_engine import chroma_for_chords
+        from src.separation import BASS, MELODY
+        profile = profile or get_analysis_profile()
+        duration = get_audio_duration(audio_path)
+        starts = self.starts + offset
+        keep = np.flatnonzero((starts >= 0) & (starts < duration))
+        notes = [
+            {'start': float(starts[i]), 'end': float(min(self.ends[i] + offset, duration)),
+             'pitch': int(self.pitches[i]), 'velocity': float(self.velocities[i])}
+            for i in keep
+        ]
+        if self.is_bass is not None:
+            for i, note in zip(keep, notes):
+                note['source'] = BASS if self.is_bass[i] else MELODY
+
+        # The tempo in effect where the other recording starts applies from its start
+        tempo_map = [(round(time + offset, 3), bpm) for time, bpm in self.tempo_map]
+        first = max([i for i, (time, ___) in enumerate(tempo_map) if time <= 0.0] or [0])
+        tempo_map = [(0.0, tempo_map[first][1])] + tempo_map[first + 1:]
+
+        chroma = chroma_for_chords(audio_path, 0.0, None, engine=profile.chord_engine)
+        return AnalyzedPiece.from_notes(notes, self.bpm, list(self.tuning), self.capo, audio_path,
+                                        chroma, profile.fingering, tempo_map)
+
+    @property
+    def num_measures(self) -> int:
+        return len(self.measure_chords)
+
+    @property
+    def sec_per_measure(self) -> float:
+        return (60 / self.bpm) * 4
+
+    @property
+    def grid_tempo_map(self) -> Optional[List[Tuple[float, float]]]:
+        """Tempo map the measure grid follows, or None for a fixed tempo."""
+        return _grid_map(self.tempo_map, self.bpm)
+
+    @property
+    def generator(self) -> TabGenerator:
+        if self._generator is None:
+            self._generator = TabGenerator(tuning=list(self.tuning), bpm=self.bpm, capo=self.capo)
+        return self._generator
+
+    def note_range(self, start_measure: int, end_measure: int) -> Tuple[int, int]:
+        """Return the [first, last) note indices of a measure range (0-based, end exclusive)."""
+        start_measure = min(max(0, start_measure), self.num_measures)
+        end_measure = min(max(start_measure, end_measure), self.num_measures)
+        return int(self.measure_offsets[start_measure]), int(self.measure_offsets[end_measure])
+
+    def measure_at(self, seconds: float) -> int:
+        """Return the 0-based measure containing a time in seconds."""
+        return int(self.generator.grid_positions(max(0.0, seconds), self.grid_tempo_map)[0])
+
+    def render_measures(self, start_measure: int = 0, end_measure: Optional[int] = None) -> str:
+        """
+        Render a range of measures as ASCII tablature.
+
+        Args:
+            start_measure: First measure (0-based)
+            end_measure: Measure after the last one (default: end of piece)
+
+        Returns:
+            ASCII tablature for the range
+        """
+        if self.num_measures == 0:
+            return _("No notes detected.")
+        end_measure = self.num_measures if end_measure is None else min(end_measure, self.num_measures)
+        start_measure = max(0, start_measure)
+        if start_measure >= end_measure:
+            return _("No measures in the requested range.")
+
+        generator = self.generator
+        with self._lock:
+            fingering = (self.strings, self.frets)
+            generation = self._generation
+        if start_measure % generator.measures_per_line:
+            return self._render_rows(start_measure, end_measure, fingering, header=True)
+
+        # Whole lines of the piece's layout are rendered once and kept until
+        # overrides change their fingering (see apply_overrides)
+        layout = (generator.measures_per_line, self.slots_per_measure)
+        output = [generator.render_header()]
+        for first in range(start_measure, end_measure, generator.measures_per_line):
+            end = min(first + generator.measures_per_line, end_measure)
+            if end < min(first + generator.measures_per_line, self.num_measures):
+                output.append(self._render_rows(first, end, fingering))
+                continue
+            with self._lock:
+                if self._rows_layout != layout:
+                    self._rows.clear()
+                    self._rows_layout = layout
+                row = self._rows.get((first, end)) if self._generation == generation else None
+            if row is None:
+                row = self._render_rows(first, end, fingering)
+                with self._lock:
+                    if self._rows_layout == layout and self._generation == generation:
+                        self._rows[(first, end)] = row
+            output.append(row)
+        return "\n".join(output)
+
+    def _render_rows(self, start_measure: int, end_measure: int,
+                     fingering: Tuple[np.ndarray, np.ndarray], header: bool = False) -> str:
+        lo, hi = self.note_range(start_measure, end_measure)
+        strings, frets = fingering
+        return self.generator.render_tab(
+            self.measure_idx[lo:hi] - start_measure,
+            self.slot_idx[lo:hi],
+            strings[lo:hi],
+            frets[lo:hi],
+            self.measure_chords[start_measure:end_measure],
+            self.slots_per_measure,
+            header,
+        )
+
+    def apply_overrides(self, overrides: Sequence[FingeringOverride]) -> List[int]:
+        """
+        Replace the piece's fingering overrides, refingering only what they change.
+
+        Notes that an added or removed override applies to are fingered again,
+        measure run by measure run (with 'dp', positions in neighbouring
+        measures stay as they are); rendered lines holding them are dropped from
+        the render cache and exports are regenerated on next request.
+
+        Args:
+            overrides: The piece's complete list of overrides, later ones winning
+
+        Returns:
+            0-based measures whose notes were fingered again
+        """
+        overrides = tuple(overrides)
+        with self._lock:
+            changed = set(self.overrides) ^ set(overrides)
+            affected = np.zeros(len(self.pitches), dtype=bool)
+            for override in changed:
+                affected |= override.applies(self.pitches, self.measure_idx)
+            measures = np.unique(self.measure_idx[affected])
+
+            # Copies: the arrays of a loaded piece are read-only views of its file
+            strings, frets = np.array(self.strings), np.array(self.frets)
+            generator = self.generator
+            runs = np.split(measures, np.flatnonzero(np.diff(measures) > 1) + 1) if len(measures) else []
+            for run in runs:
+                first, end = int(run[0]), int(run[-1]) + 1
+                lo, hi = self.note_range(first, end)
+                pitches, measure_idx = self.pitches[lo:hi], self.measure_idx[lo:hi]
+                strings[lo:hi], frets[lo:hi] = generator.assign_fingering(
+                    pitches, measure_idx - first, self.measure_chords[first:end],
+                    None if self.is_bass is None else self.is_bass[lo:hi],
+                    self.fingering, self.slot_idx[lo:hi],
+                    generator.override_strings(pitches, measure_idx, overrides),
+                )
+
+            self.strings, self.frets, self.overrides = strings, frets, overrides
+            self._generation += 1
+            self._rows = {(first, end): row for (first, end), row in self._rows.items()
+                          if not np.any((measures >= first) & (measures < end))}
+            self._exports.clear()
+        return measures.tolist()
+
+    def render_time_range(self, start_seconds: float, end_seconds: float) -> str:
+        """Render every measure overlapping [start_seconds, end_seconds)."""
+        end_measure = self.measure_at(max(start_seconds, end_seconds - 1e-9)) + 1
+        return self.render_measures(self.measure_at(start_seconds), end_measure)
+
+    def notes(self, start_measure: int = 0, end_measure: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the notes of a measure range as note dictionaries."""
+        lo, hi = self.note_range(start_measure, self.num_measures if end_measure is None else end_measure)
+        return [
+            {'start': float(s), 'end': float(e), 'pitch': int(p), 'velocity': float(v)}
+            for s, e, p, v in zip(self.starts[lo:hi], self.ends[lo:hi],
+                                  self.pitches[lo:hi], self.velocities[lo:hi])
+        ]
+
+    def export(self, fmt: str) -> bytes:
+        """
+        Return the piece in an export format, generating it on first request.
+
+        Args:
+            fmt: One of 'midi', 'musicxml', 'json'
+
+        Returns:
+            File contents in that format
+
+        Raises:
+            ValueError: If the format is not supported
+        """
+        from src.exporters import EXPORTERS
+        if fmt not in EXPORTERS:
+            raise ValueError(_("Unsupported export format: {}. Supported formats: {}").format(
+                fmt, ', '.join(EXPORTERS)
+            ))
+        with self._lock:
+            data = self._exports.get(fmt)
+            generation = self._generation
+            # A copy whose fingering apply_overrides can't change while it is exported
+            snapshot = None if data is not None else replace(self, _exports={}, _rows={})
+        if data is None:
+            data = EXPORTERS[fmt](snapshot)
+            with self._lock:
+                if self._generation == generation:
+                    self._exports[fmt] = data
+        return data
+
+    def save(self, path: str) -> None:
+        """Write the piece as a binary bundle (written atomically)."""
+        with self._lock:
+            piece = replace(self, _exports={}, _rows={})
+        piece._write(path)
+
+    def _write(self, path: str) -> None:
+        meta = {
+            'kind': 'piece',
+            'bpm': self.bpm,
+            'measure_chords': self.measure_chords,
+            'tempo_map': self.tempo_map,
+            'tuning': list(self.tuning),
+            'capo': self.capo,
+            'slots_per_measure': self.slots_per_measure,
+            'source_path': self.source_path,
+            'model_version': self.model_version,
+            'fingering': self.fingering,
+            'overrides': [list(astuple(o)) for o in self.overrides],
+        }
+        arrays = {name: getattr(self, name) for name in _ARRAY_FIELDS}
+        arrays.update({name: getattr(self, name) for name in _OPTIONAL_ARRAY_FIELDS
+                       if getattr(self, name) is not None})
+        serialization.write(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> 'AnalyzedPiece':
+        """
+        Read a piece written by save().
+
+        With use_mmap the note arrays are read-only views of the mapped file.
+        """
+        meta, arrays = serialization.read(path, use_mmap=use_mmap)
+        if meta.get('kind') != 'piece':
+            raise ValueError(_("Not an analyzed piece: {}").format(path))
+        return cls(
+            bpm=meta['bpm'],
+            measure_chords=meta['measure_chords'],
+            tempo_map=[tuple(t) for t in meta['tempo_map']],
+            tuning=tuple(meta['tuning']),
+            capo=meta['capo'],
+            slots_per_measure=meta['slots_per_measure'],
+            source_path=meta['source_path'],
+            model_version=meta.get('model_version'),
+            fingering=meta.get('fingering', 'greedy'),
+            overrides=tuple(FingeringOverride(*o) for o in meta.get('overrides', ())),
+            **{name: arrays[name] for name in _ARRAY_FIELDS},
+            **{name: arrays[name] for name in _OPTIONAL_ARRAY_FIELDS if name in arrays},
+        )
+
+
+def result_settings(profile: Optional[AnalysisProfile] = None) -> str:
+    """
+    Return the settings an analysis result depends on, as text for cache keys.
+
+    Tablature, chord detection, note extraction and separation settings, the
+    inference backend and quantization, and the analysis profile.
+    """
+    config = get_config()
+    inference = config.inference
+    return repr((config.tablature, config.chord_detection, config.note_extraction, config.separation,
+                 (inference.backend, inference.quantize, inference.quantized_model_dir),
+                 profile or get_analysis_profile()))
+
+
+class PieceStore:
+    """Memory + disk store of AnalyzedPiece objects keyed by audio file identity."""
+
+    def __init__(self, directory: Optional[str] = None, max_in_memory: int = 32,
+                 fingerprints: Optional['FingerprintIndex'] = None):
+        """
+        Initialize the PieceStore.
+
+        Args:
+            directory: Directory for persisted pieces (default: DEFAULT_PIECE_DIR)
+            max_in_memory: Most recently used pieces kept in memory
+            fingerprints: Index of stored recordings, to find pieces of other
+                recordings of the same audio (see find_recording)
+        """
+        self.directory = Path(directory).expanduser() if directory else DEFAULT_PIECE_DIR
+        self.max_in_memory = max_in_memory
+        self.fingerprints = fingerprints
+        self._lock = threading.Lock()
+        self._pieces: "OrderedDict[str, AnalyzedPiece]" = OrderedDict()
+
+    def _remember(self, key: str, piece: AnalyzedPiece) -> None:
+        with self._lock:
+            self._pieces[key] = piece
+            self._pieces.move_to_end(key)
+            while len(self._pieces) > max(0, self.max_in_memory):
+                self._pieces.popitem(last=False)
+
+    @staticmethod
+    def key_for(audio_path: str, tuning: Optional[List[str]] = None, capo: int = 0,
+                profile: Optional[AnalysisProfile] = None, identity: Optional[str] = None) -> str:
+        """
+        Key an audio file by path, size and mtime plus tuning/capo and result_settings().
+
+        A file version's 'path|size|mtime_ns' identity (see src.fingerprint.identity_of)
+        may be given instead of the file, which then need not exist any more.
+        """
+        if identity is None:
+            abs_path = os.path.abspath(audio_path)
+            st = os.stat(abs_path)
+            identity = f"{abs_path}|{st.st_size}|{st.st_mtime_ns}"
+        settings = result_settings(profile)
+        ident = f"{identity}|{','.join(tuning or STANDARD_TUNING)}|{capo}|{settings}"
+        return hashlib.blake2b(ident.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _file_for(self, key: str) -> Path:
+        return self.directory / f"{key}{PIECE_SUFFIX}"
+
+    def get(self, key: str) -> Optional[AnalyzedPiece]:
+        """Return a stored piece from memory or disk, or None."""
+        with self._lock:
+            piece = self._pieces.get(key)
+            if piece is not None:
+                self._pieces.move_to_end(key)
+                return piece
+
+        path = self._file_for(key)
+        if not path.exists():
+            return None
+        try:
+            piece = AnalyzedPiece.load(str(path))
+        except Exception as e:
+            logger.warning(_("Discarding unreadable analysis {}: {}").format(path, str(e)))
+            return None
+        if piece.model_version != serialization.model_version():
+            logger.info(_("Discarding analysis from {}: {}").format(piece.model_version, path))
+            return None
+        self._remember(key, piece)
+        return piece
+
+    def put(self, key: str, piece: AnalyzedPiece) -> None:
+        """Store a piece in memory and persist it to disk, fingerprinting its recording."""
+        self._remember(key, piece)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            piece.save(str(self._file_for(key)))
+        except OSError as e:
+            logger.warning(_("Could not persist analysis: {}").format(str(e)))
+        if self._fingerprinting and piece.source_path:
+            try:
+                self.fingerprints.add(piece.source_path)
+            except Exception as e:
+                logger.warning(_("Could not fingerprint {}: {}").format(piece.source_path, str(e)))
+
+    @property
+    def _fingerprinting(self) -> bool:
+        return self.fingerprints is not None and get_config().performance.fingerprint_matching
+
+    def find_recording(self, audio_path: str, tuning: Optional[List[str]] = None, capo: int = 0,
+                       profile: Optional[AnalysisProfile] = None) -> Optional[AnalyzedPiece]:
+        """
+        Return a stored piece of another recording of the same audio, realigned to this file.
+
+        Re-encoded copies (other formats, bit rates, sample rates, or a little
+        more or less silence at the start) are found by acoustic fingerprint,
+        so their transcription is reused instead of run again.
+
+        Returns:
+            AnalyzedPiece of audio_path, or None if no matching recording was analyzed
+            with the same settings
+        """
+        if not self._fingerprinting:
+            return None
+        try:
+            matches = self.fingerprints.matches(audio_path)
+        except Exception as e:
+            logger.warning(_("Could not fingerprint {}: {}").format(audio_path, str(e)))
+            return None
+        for match in matches:
+            piece = self.get(self.key_for(audio_path, tuning, capo, profile, identity=match.identity))
+            if piece is not None:
+                logger.info(_("Reusing the analysis of {} for {} (offset {:+.3f}s, score {:.2f})").format(
+                    match.source_path, audio_path, match.offset, match.score
+                ))
+                return piece.realigned(audio_path, match.offset, profile)
+        return None
+
+
+def _grid_map(tempo_map: Sequence[Tuple[float, float]], bpm: float) -> Optional[List[Tuple[float, float]]]:
+    """A tempo map to place notes by, or None when it is just bpm throughout."""
+    tempo_map = [tuple(entry) for entry in tempo_map]
+    return None if tempo_map == [(0.0, bpm)] else tempo_map
+
+
+class OverrideStore:
+    """
+    Fingering overrides of audio files, persisted as one JSON file per file path.
+
+    The store belongs to a user (its directory is under the user's cache), so overrides are
+    shared by all of that user's sessions; the daemon serving them refuses other users.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize the OverrideStore.
+
+        Args:
+            directory: Directory of override files (default: DEFAULT_OVERRIDE_DIR)
+        """
+        self.directory = Path(directory).expanduser() if directory else DEFAULT_OVERRIDE_DIR
+        self._lock = threading.Lock()
+
+    def _file_for(self, audio_path: str) -> Path:
+        name = hashlib.blake2b(os.path.abspath(audio_path).encode('utf-8'), digest_size=16).hexdigest()
+        return self.directory / f"{name}.json"
+
+    def get(self, audio_path: str) -> Tuple[FingeringOverride, ...]:
+        """Return the overrides of a file, in the order they were set."""
+        path = self._file_for(audio_path)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)['overrides']
+            return tuple(FingeringOverride(*entry) for entry in entries)
+        except FileNotFoundError:
+            return ()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(_("Discarding unreadable fingering overrides {}: {}").format(path, str(e)))
+            return ()
+
+    def set(self, audio_path: str, pitch: int, string: Optional[int],
+            start_measure: Optional[int] = None, end_measure: Optional[int] = None) -> Tuple[FingeringOverride, ...]:
+        """
+        Set or remove the override of a pitch in a measure range and persist the result.
+
+        An override for the same pitch and range is replaced. With string None
+        the pitch's override for the range is removed, or all of the pitch's
+        overrides when no range is given.
+
+        Args:
+            audio_path: Audio file
+            pitch: MIDI pitch
+            string: String index (0 = lowest string), or None to remove
+            start_measure: First measure (0-based; default: from the start)
+            end_measure: Measure after the last one (default: to the end)
+
+        Returns:
+            The file's overrides after the change
+        """
+        with self._lock:
+            scope = (start_measure, end_measure)
+            unscoped_removal = string is None and scope == (None, None)
+            overrides = [o for o in self.get(audio_path)
+                         if o.pitch != pitch or (not unscoped_removal
+                                                 and (o.start_measure, o.end_measure) != scope)]
+            if string is not None:
+                overrides.append(FingeringOverride(pitch, string, start_measure, end_measure))
+            path = self._file_for(audio_path)
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'source_path': os.path.abspath(audio_path),
+                               'overrides': [list(astuple(o)) for o in overrides]}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(_("Could not persist fingering overrides: {}").format(str(e)))
+            return tuple(overrides)
@@ -0,0 +1,142 @@
+"""
+Speed/quality profiles of an analysis request.
+
+A profile selects how much of the pipeline a request pays for:
+
+- preview: mono mix (no source separation), silent model windows skipped,
+  no chunk overlap, the configured default tempo instead of a tempo search,
+  chords from the notes and greedy fingering. Meant to answer in seconds.
+- balanced: the pipeline as configured (the default).
+- accurate: chroma chords with beat-synchronous smoothing, dynamic-programming
+  fingering and a tempo map: measures and slots follow the detected tempo
+  changes instead of one tempo for the whole analysis.
+
+Fields left as None keep the configured behaviour, so 'balanced' is exactly
+what a request without a profile used to do.
+"""
+import gettext
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from src.config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    """Pipeline settings of one speed/quality tier"""
+    name: str
+    separation: Optional[bool] = None  # None = separation.enabled
+    silence_db: Optional[float] = None  # skip model windows peaking below this (dBFS)
+    chunk_overlap: bool = True  # transcribe performance.chunk_overlap_seconds past each chunk
+    chord_engine: Optional[str] = None  # None = chord_detection.engine
+    fingering: str = 'greedy'  # greedy (per note), dp (whole passage)
+    tempo: str = 'estimate'  # fixed (audio.default_bpm), estimate, map (tempo changes too)
+
+
+PREVIEW = AnalysisProfile('preview', separation=False, silence_db=-40.0, chunk_overlap=False,
+                          chord_engine='notes', fingering='greedy', tempo='fixed')
+BALANCED = AnalysisProfile('balanced')
+ACCURATE = AnalysisProfile('accurate', chord_engine='chroma', fingering='dp', tempo='map')
+
+PROFILES: Dict[str, AnalysisProfile] = {p.name: p for p in (PREVIEW, BALANCED, ACCURATE)}
+
+
+def get_analysis_profile(name: Optional[str] = None) -> AnalysisProfile:
+    """
+    Return a profile by name.
+
+    Args:
+        name: Profile name (default: analysis.default_profile)
+
+    Returns:
+        The named AnalysisProfile
+
+    Raises:
+        ValueError: If no profile has that name
+    """
+    name = name or get_config().analysis.default_profile
+    profile = PROFILES.get(name.lower())
+    if profile is None:
+        raise ValueError(_("Unknown analysis profile: {}. Available profiles: {}").format(
+            name, ", ".join(PROFILES)
+        ))
+    return profile
+
+
+# Audio analyzed, untimed, before a profile benchmark
+WARMUP_SECONDS = 10.0
+
+
+@dataclass
+class ProfileBenchmark:
+    """Latency of one profile on one audio file and its note agreement with 'accurate'"""
+    profile: str
+    seconds: float
+    num_notes: int
+    precision: float = 1.0
+    recall: float = 1.0
+    f1: float = 1.0
+
+
+def benchmark_profiles(audio_path: str, profiles: Optional[Sequence[str]] = None,
+                       duration: Optional[float] = None, repeats: int = 1) -> List[ProfileBenchmark]:
+    """
+    Analyze the same audio with each profile and compare the notes with 'accurate'.
+
+    Each run transcribes, analyzes and renders the file from cold chunk and
+    feature caches. An untimed 'accurate' run over the first seconds loads the
+    model and compiles what the pipeline compiles on first use; 'accurate' is
+    then run first as the reference.
+
+    Args:
+        audio_path: Audio file to analyze
+        profiles: Profile names to compare (default: all)
+        duration: Seconds to analyze from the start (default: whole file)
+        repeats: Runs per profile; the fastest is reported
+
+    Returns:
+        One ProfileBenchmark per profile, 'accurate' first
+    """
+    from src.analysis import AnalyzedPiece
+    from src.features import get_feature_store
+    from src.inference_backend import note_agreement
+    from src.window_planner import get_window_planner
+
+    names = [ACCURATE.name] + [p.name for p in map(get_analysis_profile, profiles or PROFILES)
+                               if p != ACCURATE]
+    AnalyzedPiece.from_audio(audio_path, ACCURATE, duration=WARMUP_SECONDS)
+
+    results = []
+    reference_notes = None
+    for name in names:
+        profile = get_analysis_profile(name)
+        best = float('inf')
+        notes = []
+        for ___ in range(max(1, repeats)):
+            get_window_planner().clear()
+            get_feature_store().clear()
+            start = time.perf_counter()
+            piece = AnalyzedPiece.from_audio(audio_path, profile, duration=duration)
+            piece.render_measures()
+            best = min(best, time.perf_counter() - start)
+            notes = piece.notes()
+
+        result = ProfileBenchmark(name, best, len(notes))
+        if reference_notes is None:
+            reference_notes = notes
+        else:
+            result.precision, result.recall, result.f1 = note_agreement(reference_notes, notes)
+        results.append(result)
+        logger.info(_("Benchmark profile {}: {:.2f}s, {} notes").format(name, best, len(notes)))
+
+    return results
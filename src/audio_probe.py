@@ -0,0 +1,176 @@
+"""
+Audio metadata probing with a cache keyed by path, mtime and size.
+
+Duration, sample rate, channel count and codec are read from the file header
+where possible (libsndfile for WAV/FLAC/OGG/MP3, audioread's container probe
+for M4A/AAC) and only fall back to decoding the whole file once. Results are
+cached so repeated requests never pay for a decode just to learn a length.
+"""
+import gettext
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from src.config import Config, add_reload_listener, get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Maximum number of files whose metadata is kept in memory
+DEFAULT_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class AudioMetadata:
+    """Basic properties of an audio file"""
+    duration: float
+    sample_rate: int
+    channels: int
+    codec: str
+    source: str  # 'header' or 'decode'
+
+
+def _probe_soundfile(path: str) -> Optional[AudioMetadata]:
+    import soundfile as sf
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        # LibsndfileError subclasses RuntimeError: format not readable from the header
+        return None
+    if info.samplerate <= 0 or info.frames <= 0:
+        return None
+    return AudioMetadata(
+        duration=info.frames / info.samplerate,
+        sample_rate=int(info.samplerate),
+        channels=int(info.channels),
+        codec=f"{info.format}/{info.subtype}".lower(),
+        source='header',
+    )
+
+
+def _probe_audioread(path: str) -> Optional[AudioMetadata]:
+    try:
+        import audioread
+        with audioread.audio_open(path) as f:
+            if not f.duration:
+                return None
+            return AudioMetadata(
+                duration=float(f.duration),
+                sample_rate=int(f.samplerate),
+                channels=int(f.channels),
+                codec=os.path.splitext(path)[1].lstrip('.').lower(),
+                source='header',
+            )
+    except Exception:
+        return None
+
+
+def _probe_decode(path: str) -> AudioMetadata:
+    import librosa
+    y, sr = librosa.load(path, sr=None, mono=False)
+    channels = 1 if y.ndim == 1 else int(y.shape[0])
+    return AudioMetadata(
+        duration=float(y.shape[-1]) / sr,
+        sample_rate=int(sr),
+        channels=channels,
+        codec=os.path.splitext(path)[1].lstrip('.').lower(),
+        source='decode',
+    )
+
+
+def file_identity(path: str) -> Tuple[str, int, int]:
+    """Identify a file version by absolute path, mtime and size."""
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    return abs_path, st.st_mtime_ns, st.st_size
+
+
+class AudioProbeCache:
+    """Thread-safe LRU cache of AudioMetadata keyed by (path, mtime, size)."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, int], AudioMetadata]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, path: str) -> AudioMetadata:
+        """
+        Return metadata for an audio file, reading it only if not cached.
+
+        Args:
+            path: Path to the audio file
+
+        Returns:
+            AudioMetadata for the file
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+            RuntimeError: If the file cannot be read as audio
+        """
+        key = file_identity(path)
+        abs_path = key[0]
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        metadata = _probe_soundfile(abs_path) or _probe_audioread(abs_path)
+        if metadata is None:
+            logger.info(_("No readable header for {}; decoding once for metadata").format(abs_path))
+            try:
+                metadata = _probe_decode(abs_path)
+            except Exception as e:
+                raise RuntimeError(_("Could not read audio metadata: {}").format(str(e))) from e
+
+        with self._lock:
+            self._entries[key] = metadata
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return metadata
+
+    def resize(self, max_entries: int) -> None:
+        """Change the capacity, evicting least recently used entries if needed."""
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_PROBE_CACHE = AudioProbeCache(get_config().performance.audio_probe_cache_size)
+
+
+def _apply_config(config: Config) -> None:
+    _PROBE_CACHE.resize(config.performance.audio_probe_cache_size)
+
+
+add_reload_listener(_apply_config)
+
+
+def probe_audio(path: str) -> AudioMetadata:
+    """Return (cached) metadata for an audio file."""
+    return _PROBE_CACHE.probe(path)
+
+
+def get_audio_duration(path: str) -> float:
+    """Return the (cached) duration of an audio file in seconds."""
+    return _PROBE_CACHE.probe(path).duration
@@ -0,0 +1,258 @@
+"""
+Chord recognition from the audio's chroma.
+
+Note-based chord detection only sees the notes the transcription found, so
+a missed note can change the chord. The ChordEngine instead matches the
+chromagram of the decoded audio against the chord shapes of the current
+tuning. Frames are averaged per beat on the tab's tempo grid (a fixed tempo
+or the beats of a tempo map, see beats_at), every beat is
+scored against every template in one matrix product, and a Viterbi pass
+over the whole song smooths the sequence: changing chord costs more than
+staying, so single noisy beats don't flip the result. Measures take the
+chord held on most of their beats.
+"""
+import gettext
+import logging
+import os
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import get_config
+from src.features import HOP_LENGTH, SAMPLE_RATE, get_feature_store
+
+if TYPE_CHECKING:
+    from src.tab_generator import TuningTables
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+NO_CHORD = "N.C."
+
+# chord_detection.engine values
+NOTES_ENGINE = 'notes'
+CHROMA_ENGINE = 'chroma'
+ENGINES = (NOTES_ENGINE, CHROMA_ENGINE)
+
+# Chroma frames per second of the shared feature store
+FRAME_RATE = SAMPLE_RATE / HOP_LENGTH
+
+BEATS_PER_MEASURE = 4
+
+# Extra template weight on the chord's root (as the root bonus of note scoring)
+ROOT_WEIGHT = 0.5
+
+# Score deducted per template note beyond a triad: spectral leakage gives
+# every pitch class some energy, which otherwise favors four-note chords
+EXTENSION_PENALTY = 0.05
+
+# Correlation a chord must beat to be preferred over no chord; silence and
+# flat (noise) chroma score 0
+NO_CHORD_SCORE = 0.3
+
+# Scale from cosine similarity to log-likelihood
+EMISSION_SHARPNESS = 20.0
+
+
+def chroma_for_chords(audio_path: str, start: float = 0.0,
+                      duration: Optional[float] = None,
+                      engine: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Return the chromagram to detect chords from, if the chroma engine is configured.
+
+    Args:
+        audio_path: Audio file
+        start: Segment start in seconds
+        duration: Segment length in seconds (default: to the end of the file)
+        engine: Chord engine to use (default: chord_detection.engine)
+
+    Returns:
+        (12, frames) chromagram from the shared feature store, or None when
+        chords are detected from the transcribed notes
+
+    Raises:
+        ValueError: If the engine is unknown
+    """
+    engine = engine or get_config().chord_detection.engine
+    if engine not in ENGINES:
+        raise ValueError(_("Unknown chord engine: {}. Supported engines: {}").format(
+            engine, ", ".join(ENGINES)
+        ))
+    if engine != CHROMA_ENGINE:
+        return None
+    return get_feature_store().segment(audio_path, start, duration).chroma
+
+
+def beats_at(times, tempo_map: Sequence[Tuple[float, float]]) -> np.ndarray:
+    """
+    Return the beats elapsed since time 0 at each time under a tempo map.
+
+    Each (time, bpm) entry holds from its time until the next; the first
+    tempo also applies before its entry, so the grid starts at time 0 like a
+    fixed-tempo grid.
+
+    Args:
+        times: Times in seconds
+        tempo_map: (time in seconds, bpm) entries in time order
+
+    Returns:
+        Fractional beat position of each time
+    """
+    times = np.asarray(times, dtype=np.float64)
+    change_times = np.array([time for time, ___ in tempo_map], dtype=np.float64)
+    bpms = np.array([bpm for ___, bpm in tempo_map], dtype=np.float64)
+    change_times[0] = 0.0
+    change_beats = np.concatenate([[0.0], np.cumsum(np.diff(change_times) * bpms[:-1] / 60.0)])
+    entry = np.clip(np.searchsorted(change_times, times, side='right') - 1, 0, len(bpms) - 1)
+    return change_beats[entry] + (times - change_times[entry]) * bpms[entry] / 60.0
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """Center each row and scale it to unit length, so dot products are correlations."""
+    centered = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    return (centered / np.maximum(norms, 1e-9)).astype(np.float32)
+
+
+def viterbi_self_loop(log_emission: np.ndarray, log_stay: float, log_switch: float) -> np.ndarray:
+    """
+    Most likely state sequence when every change of state costs the same.
+
+    With a transition matrix of log_stay on the diagonal and log_switch
+    elsewhere, the best predecessor of a state is either itself or the best
+    state of the previous step, so each step is O(states) instead of
+    O(states^2).
+
+    Args:
+        log_emission: (steps, states) log-likelihoods
+        log_stay: Log probability of keeping the state
+        log_switch: Log probability of moving to one particular other state
+
+    Returns:
+        (steps,) state indices
+    """
+    steps, states = log_emission.shape
+    if steps == 0:
+        return np.zeros(0, dtype=np.int64)
+    own = np.arange(states)
+    backpointers = np.empty((steps, states), dtype=np.int64)
+    delta = log_emission[0].astype(np.float64)
+    for t in range(1, steps):
+        best = int(np.argmax(delta))
+        stay = delta + log_stay
+        switch = delta[best] + log_switch
+        from_best = switch > stay
+        backpointers[t] = np.where(from_best, best, own)
+        delta = np.where(from_best, switch, stay) + log_emission[t]
+
+    path = np.empty(steps, dtype=np.int64)
+    path[-1] = int(np.argmax(delta))
+    for t in range(steps - 1, 0, -1):
+        path[t - 1] = backpointers[t, path[t]]
+    return path
+
+
+class ChordEngine:
+    """Beat-synchronous chroma chord recognition for one tuning's chord shapes"""
+
+    def __init__(self, tables: 'TuningTables', smoothing: float = 0.9):
+        """
+        Initialize the ChordEngine.
+
+        Args:
+            tables: Tuning tables with the chord shapes to recognize
+            smoothing: Probability of keeping the chord from one beat to the next
+        """
+        self.chord_names = list(tables.chord_names) + [NO_CHORD]
+        masks = np.asarray(tables.chord_masks, dtype=np.float32).reshape(-1, 12)
+        templates = masks.copy()
+        templates[np.arange(len(templates)), tables.chord_roots] += ROOT_WEIGHT
+        self.templates = _unit_rows(templates)  # (chords, 12)
+        self.prior = np.append(-EXTENSION_PENALTY * np.maximum(0, masks.sum(axis=1) - 3),
+                               NO_CHORD_SCORE).astype(np.float32)[:, np.newaxis]
+
+        states = len(self.chord_names)
+        smoothing = min(max(smoothing, 1e-6), 1 - 1e-6)
+        self.log_stay = float(np.log(smoothing))
+        self.log_switch = float(np.log((1 - smoothing) / max(1, states - 1)))
+
+    def beat_chroma(self, chroma: np.ndarray, bpm: float, first_beat: int, num_beats: int,
+                    offset_seconds: float = 0.0, frame_rate: float = FRAME_RATE,
+                    tempo_map: Optional[Sequence[Tuple[float, float]]] = None) -> np.ndarray:
+        """
+        Average chroma frames per beat of a tempo grid starting at time 0.
+
+        Args:
+            chroma: (12, frames) chromagram
+            bpm: Tempo of the grid
+            first_beat: First beat to return
+            num_beats: Number of beats to return
+            offset_seconds: File time of the first chroma frame
+            frame_rate: Chroma frames per second
+            tempo_map: (time, bpm) entries the grid follows instead of bpm
+
+        Returns:
+            (12, num_beats) mean chroma per beat; zeros where no frame falls
+        """
+        times = offset_seconds + np.arange(chroma.shape[1]) / frame_rate
+        beats = times * bpm / 60.0 if tempo_map is None else beats_at(times, tempo_map)
+        beats = np.floor(beats).astype(np.int64) - first_beat
+        inside = (beats >= 0) & (beats < num_beats)
+        beats = beats[inside]
+        frames = chroma[:, inside]
+        counts = np.bincount(beats, minlength=num_beats)
+        sums = np.stack([np.bincount(beats, weights=row, minlength=num_beats) for row in frames])
+        return (sums / np.maximum(counts, 1)).astype(np.float32)
+
+    def decode(self, beat_chroma: np.ndarray) -> np.ndarray:
+        """Return the smoothed chord index (into chord_names) of every beat."""
+        # Correlation of every beat with every template; N.C. scores its prior alone
+        correlation = self.templates @ _unit_rows(beat_chroma.T).T  # (chords, beats)
+        scores = np.concatenate([correlation, np.zeros((1, correlation.shape[1]), np.float32)])
+        log_emission = EMISSION_SHARPNESS * (scores + self.prior).T
+        return viterbi_self_loop(log_emission, self.log_stay, self.log_switch)
+
+    def beat_chords(self, chroma: np.ndarray, bpm: float, num_beats: Optional[int] = None,
+                    offset_seconds: float = 0.0, frame_rate: float = FRAME_RATE) -> List[str]:
+        """Return the chord of every beat from time 0 (default: to the end of the chroma)."""
+        if num_beats is None:
+            end_time = offset_seconds + chroma.shape[1] / frame_rate
+            num_beats = int(np.ceil(end_time * bpm / 60.0))
+        states = self.decode(self.beat_chroma(chroma, bpm, 0, num_beats, offset_seconds, frame_rate))
+        return [self.chord_names[i] for i in states.tolist()]
+
+    def measure_chords(self, chroma: np.ndarray, bpm: float, start_measure: int, num_measures: int,
+                       offset_seconds: float = 0.0, frame_rate: float = FRAME_RATE,
+                       tempo_map: Optional[Sequence[Tuple[float, float]]] = None) -> List[str]:
+        """
+        Return the chord of each 4/4 measure of a range.
+
+        Each measure takes the chord held on most of its beats; on a tie the
+        chord on the downbeat wins.
+
+        Args:
+            chroma: (12, frames) chromagram
+            bpm: Tempo of the tab grid
+            start_measure: First measure (0-based, measured from time 0)
+            num_measures: Number of measures
+            offset_seconds: File time of the first chroma frame
+            frame_rate: Chroma frames per second
+            tempo_map: (time, bpm) entries the grid follows instead of bpm
+
+        Returns:
+            Chord name per measure ("N.C." where no chord is heard)
+        """
+        if num_measures <= 0:
+            return []
+        num_beats = num_measures * BEATS_PER_MEASURE
+        states = self.decode(self.beat_chroma(chroma, bpm, start_measure * BEATS_PER_MEASURE,
+                                              num_beats, offset_seconds, frame_rate, tempo_map))
+        votes = np.zeros((num_measures, len(self.chord_names)), dtype=np.float32)
+        measures = np.arange(num_beats) // BEATS_PER_MEASURE
+        np.add.at(votes, (measures, states), 1.0)
+        votes[np.arange(num_measures), states[::BEATS_PER_MEASURE]] += 0.5
+        return [self.chord_names[i] for i in np.argmax(votes, axis=1).tolist()]
@@ -2,10 +2,11 @@
 Configuration management for Fingerstyle Tab MCP Server
 """
 import os
+import threading
 import yaml
 import logging
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
@@ -35,7 +36,9 @@ class TablatureConfig:
 @dataclass
 class ChordDetectionConfig:
     """Chord detection configuration"""
+    engine: str = "notes"  # notes (transcribed notes), chroma (audio chromagram)
     min_score: int = 5
+    smoothing: float = 0.9  # chroma engine: probability of keeping the chord per beat
     enabled_chord_types: Dict[str, bool] = field(default_factory=lambda: {
         'major': True,
         'minor': True,
@@ -47,6 +50,98 @@ class ChordDetectionConfig:
     })
 
 
+@dataclass
+class InferenceConfig:
+    """Basic Pitch inference backend configuration"""
+    backend: str = "tensorflow"  # auto, tensorflow, tflite, onnx
+    intra_op_threads: int = 0  # 0 = from the thread budget (runtime default if disabled)
+    inter_op_threads: int = 0
+    quantize: bool = False  # dynamic-range quantized model (tflite/onnx)
+    quantized_model_dir: Optional[str] = None
+    preload: bool = False  # load the model at server startup
+    idle_unload_seconds: float = 0.0  # 0 = keep loaded forever
+    load_retries: int = 3
+    retry_backoff_seconds: float = 1.0
+
+
+@dataclass
+class NoteExtractionConfig:
+    """Note extraction from the model's activations (basic_pitch.inference.predict defaults)"""
+    onset_threshold: float = 0.5  # minimum onset activation of a note start
+    frame_threshold: float = 0.3  # minimum frame activation while a note sounds
+    min_note_length_ms: float = 127.7
+    infer_onsets: bool = True  # also start notes where the frame activation jumps
+    melodia_trick: bool = True  # also keep strong activity without an onset
+
+
+@dataclass
+class SeparationConfig:
+    """Optional source separation before transcription"""
+    enabled: bool = False
+    split_bands: bool = True  # transcribe bass and melody stems separately
+    crossover_hz: float = 150.0  # bass/melody boundary (about D3)
+    hpss_margin: float = 1.0  # >1 keeps only clearly harmonic energy
+
+
+@dataclass
+class AnalysisConfig:
+    """Speed/quality profile of requests that don't choose one (see src.analysis_profiles)"""
+    default_profile: str = "balanced"  # preview, balanced, accurate
+
+
+@dataclass
+class PerformanceConfig:
+    """Concurrency, chunking and cache limits (reloadable on a live server)"""
+    workers: int = 4  # shared worker threads running chunk transcriptions
+    worker_processes: int = 0  # >0: run inference in up to this many preloaded processes
+    worker_process_idle_seconds: float = 300.0  # idle worker processes exit after this
+    parallel_threshold_seconds: float = 45.0  # shorter audio is transcribed in one piece
+    chunk_seconds: float = 30.0
+    chunk_overlap_seconds: float = 2.0
+    batch_size: int = 1  # model windows stacked into each inference call
+    audio_probe_cache_size: int = 1024
+    tab_cache_size: int = 128  # rendered analyze_audio_to_tab results
+    piece_cache_size: int = 32  # analyzed pieces kept in memory
+    chunk_cache_size: int = 128  # transcribed chunks reused by overlapping requests
+    feature_cache_mb: float = 256.0  # decoded audio, STFTs and derived features
+    fingerprint_matching: bool = True  # reuse analyses of re-encoded copies of a song
+    config_poll_seconds: float = 2.0  # 0 = don't watch the config file
+
+
+@dataclass
+class ThreadsConfig:
+    """CPU thread budget of workers, inference runtime and BLAS (see src.thread_budget)"""
+    enabled: bool = True  # False = leave thread counts at runtime/library defaults
+    cpus: int = 0  # CPUs to budget for; 0 = detect (affinity mask and cgroup CPU quota)
+    blas_threads: int = 0  # OpenMP/BLAS threads per process; 0 = CPUs per worker process
+
+
+@dataclass
+class WarmupConfig:
+    """Startup warm-up and persistent JIT cache (see src.warmup)"""
+    enabled: bool = True  # analyze a synthetic clip in the background after the MCP handshake
+    clip_seconds: float = 3.0
+    numba_cache_dir: Optional[str] = None  # None = NUMBA_CACHE_DIR or ~/.cache/fingerstyle-tab/numba
+
+
+@dataclass
+class AdmissionConfig:
+    """Per-client limits for the shared server (0 = unlimited); costs are audio seconds"""
+    max_jobs_per_client: int = 2
+    max_client_pending_seconds: float = 1800.0
+    max_pending_seconds: float = 7200.0
+    client_audio_seconds_per_minute: float = 0.0
+    short_job_seconds: float = 60.0  # jobs this short are scheduled ahead of longer ones
+
+
+@dataclass
+class DaemonConfig:
+    """Shared local analysis daemon (python -m src.daemon)"""
+    enabled: bool = True  # forward MCP tool calls to a running daemon
+    socket_path: Optional[str] = None  # None = fingerstyle-tab/daemon.sock in $XDG_RUNTIME_DIR or ~/.cache
+    connect_timeout_seconds: float = 1.0
+
+
 @dataclass
 class LoggingConfig:
     """Logging configuration"""
@@ -75,6 +170,15 @@ class Config:
     audio: AudioConfig = field(default_factory=AudioConfig)
     tablature: TablatureConfig = field(default_factory=TablatureConfig)
     chord_detection: ChordDetectionConfig = field(default_factory=ChordDetectionConfig)
+    inference: InferenceConfig = field(default_factory=InferenceConfig)
+    note_extraction: NoteExtractionConfig = field(default_factory=NoteExtractionConfig)
+    separation: SeparationConfig = field(default_factory=SeparationConfig)
+    analysis: AnalysisConfig = field(default_factory=AnalysisConfig)
+    performance: PerformanceConfig = field(default_factory=PerformanceConfig)
+    threads: ThreadsConfig = field(default_factory=ThreadsConfig)
+    warmup: WarmupConfig = field(default_factory=WarmupConfig)
+    admission: AdmissionConfig = field(default_factory=AdmissionConfig)
+    daemon: DaemonConfig = field(default_factory=DaemonConfig)
     logging: LoggingConfig = field(default_factory=LoggingConfig)
     i18n: I18nConfig = field(default_factory=I18nConfig)
     mcp: MCPConfig = field(default_factory=MCPConfig)
@@ -106,10 +210,19 @@ class Config:
                 logger.warning(f"Empty configuration file: {config_path}, using defaults")
                 return cls()
 
-            return cls(
+            config = cls(
                 audio=AudioConfig(**data.get('audio', {})),
                 tablature=TablatureConfig(**data.get('tablature', {})),
                 chord_detection=ChordDetectionConfig(**data.get('chord_detection', {})),
+                inference=InferenceConfig(**data.get('inference', {})),
+                note_extraction=NoteExtractionConfig(**data.get('note_extraction', {})),
+                separation=SeparationConfig(**data.get('separation', {})),
+                analysis=AnalysisConfig(**data.get('analysis', {})),
+                performance=PerformanceConfig(**data.get('performance', {})),
+                threads=ThreadsConfig(**data.get('threads', {})),
+                warmup=WarmupConfig(**data.get('warmup', {})),
+                admission=AdmissionConfig(**data.get('admission', {})),
+                daemon=DaemonConfig(**data.get('daemon', {})),
                 logging=LoggingConfig(**data.get('logging', {})),
                 i18n=I18nConfig(**data.get('i18n', {})),
                 mcp=MCPConfig(**data.get('mcp', {})),
@@ -119,6 +232,37 @@ class Config:
         except TypeError as e:
             raise ValueError(f"Invalid configuration format: {str(e)}") from e
 
+        # Forked workers share one preloaded model only with tflite; with any other
+        # backend each would load its own copy, which worker processes exist to avoid
+        if config.performance.worker_processes > 0 and config.inference.backend != 'tflite':
+            raise ValueError(f"Invalid configuration: performance.worker_processes needs "
+                             f"inference.backend: tflite (got {config.inference.backend})")
+        return config
+
+    @staticmethod
+    def find(config_path: Optional[str] = None) -> Optional[Path]:
+        """
+        Return the configuration file that load() would read.
+
+        Args:
+            config_path: Optional explicit path to config file
+
+        Returns:
+            Path of the file, or None if no config.yaml exists
+        """
+        if config_path:
+            return Path(config_path)
+
+        # Search for config.yaml in current and parent directories
+        search_paths = [
+            Path.cwd() / "config.yaml",
+            Path(__file__).parent.parent / "config.yaml",
+        ]
+        for path in search_paths:
+            if path.exists():
+                return path
+        return None
+
     @classmethod
     def load(cls, config_path: Optional[str] = None) -> 'Config':
         """
@@ -135,16 +279,10 @@ class Config:
         if config_path:
             return cls.from_yaml(config_path)
 
-        # Search for config.yaml in current and parent directories
-        search_paths = [
-            Path.cwd() / "config.yaml",
-            Path(__file__).parent.parent / "config.yaml",
-        ]
-
-        for path in search_paths:
-            if path.exists():
-                logger.info(f"Loading configuration from: {path}")
-                return cls.from_yaml(str(path))
+        path = cls.find()
+        if path is not None:
+            logger.info(f"Loading configuration from: {path}")
+            return cls.from_yaml(str(path))
 
         logger.info("No configuration file found, using defaults")
         return cls()
@@ -155,6 +293,15 @@ class Config:
             'audio': self.audio.__dict__,
             'tablature': self.tablature.__dict__,
             'chord_detection': self.chord_detection.__dict__,
+            'inference': self.inference.__dict__,
+            'note_extraction': self.note_extraction.__dict__,
+            'separation': self.separation.__dict__,
+            'analysis': self.analysis.__dict__,
+            'performance': self.performance.__dict__,
+            'threads': self.threads.__dict__,
+            'warmup': self.warmup.__dict__,
+            'admission': self.admission.__dict__,
+            'daemon': self.daemon.__dict__,
             'logging': self.logging.__dict__,
             'i18n': self.i18n.__dict__,
             'mcp': self.mcp.__dict__,
@@ -163,6 +310,10 @@ class Config:
 
 # Global configuration instance
 _config: Optional[Config] = None
+_config_path: Optional[str] = None
+
+# Callables notified with the new Config after every reload
+_reload_listeners: List[Callable[[Config], None]] = []
 
 
 def get_config(config_path: Optional[str] = None) -> Config:
@@ -175,22 +326,115 @@ def get_config(config_path: Optional[str] = None) -> Config:
     Returns:
         Config instance
     """
-    global _config
+    global _config, _config_path
     if _config is None:
+        _config_path = config_path
         _config = Config.load(config_path)
     return _config
 
 
+def add_reload_listener(listener: Callable[[Config], None]) -> None:
+    """
+    Register a callable to be notified after the configuration is reloaded.
+
+    Components that size resources at startup (caches, pools) use this to
+    apply new limits; everything else simply reads get_config() per request.
+    """
+    _reload_listeners.append(listener)
+
+
 def reload_config(config_path: Optional[str] = None) -> Config:
     """
     Reload the global configuration.
 
+    The global instance is replaced, never mutated: requests already running
+    keep the Config they read when they started.
+
     Args:
         config_path: Optional path to configuration file
 
     Returns:
         New Config instance
     """
-    global _config
+    global _config, _config_path
+    _config_path = config_path
     _config = Config.load(config_path)
+    for listener in list(_reload_listeners):
+        try:
+            listener(_config)
+        except Exception as e:
+            logger.error(f"Configuration reload listener failed: {e}")
     return _config
+
+
+class ConfigWatcher:
+    """Polls the configuration file and reloads the global config when it changes."""
+
+    def __init__(self, poll_interval: float = 2.0, config_path: Optional[str] = None):
+        """
+        Initialize the ConfigWatcher.
+
+        Args:
+            poll_interval: Seconds between checks of the file's mtime and size
+            config_path: File to watch (default: the file get_config() would load)
+        """
+        self.poll_interval = poll_interval
+        self.config_path = config_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signature = self._current_signature()
+
+    def _current_signature(self) -> Optional[Tuple[str, int, int]]:
+        path = Config.find(self.config_path or _config_path)
+        if path is None:
+            return None
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return str(path), st.st_mtime_ns, st.st_size
+
+    def check(self) -> bool:
+        """
+        Reload the configuration if the file changed since the last check.
+
+        An invalid or deleted file is logged and the current configuration
+        is kept.
+
+        Returns:
+            True if the configuration was reloaded
+        """
+        signature = self._current_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        if signature is None:
+            logger.warning("Configuration file removed; keeping current configuration")
+            return False
+        try:
+            reload_config(self.config_path or _config_path)
+        except (ValueError, FileNotFoundError) as e:
+            logger.error(f"Configuration reload failed, keeping current configuration: {e}")
+            return False
+        logger.info(f"Configuration reloaded from: {signature[0]}")
+        return True
+
+    def start(self) -> 'ConfigWatcher':
+        """Start polling in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Configuration watcher error: {e}")
@@ -0,0 +1,337 @@
+"""
+Shared local analysis daemon.
+
+Every MCP client starts its own mcp_server.py process, and each one would
+otherwise load the model, start its own workers and fill its own caches.
+The daemon runs the analysis service (src.service) once per user behind a
+Unix domain socket: that user's MCP servers forward their tool calls to it,
+so the model is loaded once, their requests share one scheduler and a result
+computed for one of their sessions is a cache hit for the others.
+
+Sharing stops at the user: the daemon opens audio files and caches results
+with its own permissions, so serving other users would let them read
+through it. Each user who wants a shared model runs their own daemon.
+
+Start it with ``python -m src.daemon [--socket PATH]``. The daemon serves
+only its own user: the socket lives in a per-user 0700 directory with mode
+0600, the daemon refuses peers of other users (SO_PEERCRED, where the
+platform has it) and derives client ids from the peer's credentials, and
+clients only talk to a socket owned by, and a daemon running as, their own
+user. Requests are JSON lines rather than pickles, so a client can't make the
+daemon run code.
+
+Without a running daemon, DaemonClient.call raises DaemonUnavailable and
+mcp_server.py runs the service in its own process instead.
+"""
+import argparse
+import base64
+import gettext
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from typing import Any, Optional, Tuple
+
+from src.config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Sent with every request; a daemon of another version is treated as absent
+PROTOCOL_VERSION = 1
+
+SOCKET_NAME = 'daemon.sock'
+
+# Service functions a client may call
+METHODS = ('analyze_audio_to_tab', 'list_available_audio_files', 'render_tab_measures',
+           'render_tab_time_range', 'export_tab', 'tweak_tab_fingering', 'model_status',
+           'queue_status', 'profile_next_requests', 'get_profile', 'warm_up')
+
+
+class DaemonUnavailable(ConnectionError):
+    """No compatible daemon answers on the socket"""
+
+
+class DaemonError(RuntimeError):
+    """The daemon rejected a request"""
+
+
+def default_socket_path() -> str:
+    """Per-user socket: in $XDG_RUNTIME_DIR, else in ~/.cache."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    base = runtime_dir if runtime_dir and os.path.isdir(runtime_dir) \
+        else os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'fingerstyle-tab', SOCKET_NAME)
+
+
+def socket_path(config=None) -> str:
+    """Return the configured daemon socket (daemon.socket_path or the default)."""
+    config = config or get_config()
+    return os.path.expanduser(config.daemon.socket_path or default_socket_path())
+
+
+def peer_credentials(sock: socket.socket) -> Optional[Tuple[int, int]]:
+    """Return (pid, uid) of the process at the other end of a Unix socket, or None if unsupported."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    except OSError:
+        return None
+    pid, uid, ___ = struct.unpack('3i', creds)
+    return pid, uid
+
+
+def _own_uid() -> Optional[int]:
+    return os.getuid() if hasattr(os, 'getuid') else None
+
+
+def _encode(value: Any) -> Any:
+    """Make a service value JSON-serializable (bytes become {'$bytes': base64})."""
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    """Inverse of _encode."""
+    if isinstance(value, dict):
+        if set(value) == {'$bytes'}:
+            return base64.b64decode(value['$bytes'])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class DaemonClient:
+    """Calls service functions in the daemon, one connection per call"""
+
+    def __init__(self, path: Optional[str] = None, connect_timeout: Optional[float] = None):
+        """
+        Args:
+            path: Daemon socket (default: from the configuration)
+            connect_timeout: Seconds to wait for the connection (default: daemon.connect_timeout_seconds)
+        """
+        self.path = path or socket_path()
+        self.connect_timeout = (get_config().daemon.connect_timeout_seconds
+                                if connect_timeout is None else connect_timeout)
+
+    def _check_owner(self, sock: socket.socket) -> None:
+        """Refuse a socket or daemon of another user, who could serve forged results."""
+        uid = _own_uid()
+        if uid is None:
+            return
+        try:
+            owner = os.stat(self.path).st_uid
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+        if owner != uid:
+            raise DaemonUnavailable(_("The daemon socket {} belongs to another user").format(self.path))
+        peer = peer_credentials(sock)
+        if peer is not None and peer[1] != uid:
+            raise DaemonUnavailable(_("The daemon on {} runs as another user").format(self.path))
+
+    def _request(self, method: str, params: dict) -> Any:
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        except (AttributeError, OSError) as e:
+            raise DaemonUnavailable(str(e)) from e
+        try:
+            sock.settimeout(self.connect_timeout)
+            sock.connect(self.path)
+            self._check_owner(sock)
+            # Analyses take as long as they take
+            sock.settimeout(None)
+            request = {'version': PROTOCOL_VERSION, 'method': method, 'params': _encode(params),
+                       'pid': os.getpid()}
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as reader:
+                line = reader.readline()
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+        finally:
+            sock.close()
+
+        if not line:
+            raise DaemonUnavailable(_("The daemon closed the connection without answering"))
+        response = json.loads(line)
+        if response.get('version') != PROTOCOL_VERSION:
+            raise DaemonUnavailable(_("The daemon speaks protocol {}, expected {}").format(
+                response.get('version'), PROTOCOL_VERSION
+            ))
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return _decode(response.get('result'))
+
+    def call(self, method: str, **params) -> Any:
+        """
+        Run a service function in the daemon.
+
+        Args:
+            method: Name from METHODS
+            **params: Keyword arguments of the function
+
+        Returns:
+            The function's result
+
+        Raises:
+            DaemonUnavailable: If no compatible daemon answers
+            DaemonError: If the daemon rejects the request
+        """
+        return self._request(method, params)
+
+    def ping(self) -> dict:
+        """Return the daemon's pid and protocol version, or raise DaemonUnavailable."""
+        return self._request('ping', {})
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers JSON-line requests until the client hangs up"""
+
+    def handle(self):
+        peer = peer_credentials(self.connection)
+        if peer is not None and peer[1] != _own_uid():
+            logger.warning(_("Refused a daemon connection from uid {}").format(peer[1]))
+            response = {'version': PROTOCOL_VERSION, 'error': _("The daemon only serves its own user")}
+            try:
+                self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            except OSError:
+                # The client checked our credentials first and already hung up
+                pass
+            return
+        for line in self.rfile:
+            response = self.server.dispatch(line, peer[0] if peer else None)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class AnalysisDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves an analysis service to local MCP servers over a Unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, path: Optional[str] = None, service: Any = None):
+        """
+        Args:
+            path: Socket to listen on (default: from the configuration)
+            service: Object providing the METHODS functions (default: src.service, started)
+
+        Raises:
+            RuntimeError: If another daemon already answers on the socket
+        """
+        self.path = path or socket_path()
+        if service is None:
+            from src import service
+            service.start()
+        self.service = service
+
+        if os.path.exists(self.path):
+            try:
+                DaemonClient(self.path).ping()
+            except DaemonUnavailable:
+                # Left behind by a daemon that didn't shut down cleanly
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(_("An analysis daemon is already listening on {}").format(self.path))
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if self.path == default_socket_path():
+            os.chmod(directory, 0o700)
+        # Created 0600 from the start, not chmod-ed after other users could connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self.path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        logger.info(_("Analysis daemon listening on {}").format(self.path))
+
+    def dispatch(self, line: bytes, peer_pid: Optional[int] = None) -> dict:
+        """
+        Run one encoded request and return the response to encode.
+
+        Args:
+            line: JSON request
+            peer_pid: Pid of the calling process from the socket's credentials
+                (default: the pid the request reports, where the platform has none)
+        """
+        response = {'version': PROTOCOL_VERSION}
+        try:
+            request = json.loads(line)
+            if request.get('version') != PROTOCOL_VERSION:
+                response['error'] = _("Protocol version {} is not supported").format(request.get('version'))
+                return response
+            method = request.get('method')
+            if method == 'ping':
+                response['result'] = {'pid': os.getpid()}
+            elif method in METHODS:
+                params = _decode(request.get('params') or {})
+                if 'client_id' in params:
+                    params['client_id'] = self._client_id(params['client_id'], peer_pid or request.get('pid'))
+                result = getattr(self.service, method)(**params)
+                response['result'] = _encode(result)
+            else:
+                response['error'] = _("Unknown method: {}").format(method)
+        except Exception as e:
+            logger.error(_("Daemon request failed: {}").format(str(e)))
+            response['error'] = str(e)
+        return response
+
+    @staticmethod
+    def _client_id(client_id: Optional[str], pid: Any) -> str:
+        """Scope a client id to the calling MCP server process (ids are only unique within one)."""
+        prefix = f"pid-{pid}"
+        return prefix if client_id is None else f"{prefix}/{client_id}"
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared Fingerstyle Tab analysis daemon")
+    parser.add_argument("--socket", default=None, help="Unix socket to listen on (default: from config.yaml)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Before the service imports librosa, whose kernels then use the persistent cache
+    from src.warmup import configure_numba_cache
+    configure_numba_cache()
+    try:
+        server = AnalysisDaemon(args.socket)
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, so it can't run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    with server:
+        server.serve_forever()
+    logger.info(_("Analysis daemon stopped"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Export formats generated from an AnalyzedPiece.
+
+Every format is derived from the stored analysis (notes, fingering, chords),
+so producing MIDI, MusicXML or JSON never re-runs transcription. Results are
+cached on the piece by AnalyzedPiece.export().
+"""
+import gettext
+import io
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.analysis import AnalyzedPiece
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Format name -> file extension
+EXPORT_FORMATS = {
+    'midi': '.mid',
+    'musicxml': '.musicxml',
+    'json': '.json',
+}
+
+JSON_FORMAT_VERSION = 1
+
+# General MIDI program 25 (0-based): Acoustic Guitar (steel)
+GUITAR_PROGRAM = 25
+
+PITCH_SPELLING = [('C', 0), ('C', 1), ('D', 0), ('D', 1), ('E', 0), ('F', 0),
+                  ('F', 1), ('G', 0), ('G', 1), ('A', 0), ('A', 1), ('B', 0)]
+
+# Durations in 64th notes that have a single MusicXML note type
+NOTE_TYPES = [(64, 'whole', False), (48, 'half', True), (32, 'half', False),
+              (24, 'quarter', True), (16, 'quarter', False), (12, 'eighth', True),
+              (8, 'eighth', False), (6, '16th', True), (4, '16th', False),
+              (2, '32nd', False), (1, '64th', False)]
+
+# MusicXML divisions per quarter note: durations are written in 64ths
+DIVISIONS = 16
+
+# Chord-name suffix -> (MusicXML kind, display text)
+CHORD_KINDS = {
+    '': ('major', ''),
+    'm': ('minor', 'm'),
+    '7': ('dominant', '7'),
+    'M7': ('major-seventh', 'M7'),
+    'm7': ('minor-seventh', 'm7'),
+    'sus4': ('suspended-fourth', 'sus4'),
+    'add9': ('major', 'add9'),
+}
+
+
+def to_midi(piece: 'AnalyzedPiece') -> bytes:
+    """
+    Render a piece as a Standard MIDI File.
+
+    Args:
+        piece: Analyzed piece
+
+    Returns:
+        MIDI file contents
+    """
+    import pretty_midi
+
+    midi = pretty_midi.PrettyMIDI(initial_tempo=piece.bpm)
+    guitar = pretty_midi.Instrument(program=GUITAR_PROGRAM, name='Guitar')
+    for start, end, midi_pitch, velocity in zip(piece.starts.tolist(), piece.ends.tolist(),
+                                                piece.pitches.tolist(), piece.velocities.tolist()):
+        guitar.notes.append(pretty_midi.Note(
+            velocity=int(np.clip(round(velocity * 127), 1, 127)),
+            pitch=int(midi_pitch),
+            start=start,
+            end=max(end, start + 1e-3),
+        ))
+    midi.instruments.append(guitar)
+
+    buffer = io.BytesIO()
+    midi.write(buffer)
+    return buffer.getvalue()
+
+
+def to_json(piece: 'AnalyzedPiece') -> bytes:
+    """
+    Render a piece as compact, column-oriented JSON.
+
+    Strings are numbered 1 (high e) to 6 (low E) as in Guitar Pro; notes
+    without a playable position have string and fret 0.
+
+    Args:
+        piece: Analyzed piece
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    placed = piece.strings >= 0
+    document = {
+        'version': JSON_FORMAT_VERSION,
+        'bpm': round(piece.bpm, 3),
+        'tempo_map': [[round(t, 3), round(b, 3)] for t, b in piece.tempo_map],
+        'tuning': list(piece.tuning),
+        'capo': piece.capo,
+        'time_signature': [4, 4],
+        'measures': piece.measure_chords,
+        'notes': {
+            'start': np.round(piece.starts, 3).tolist(),
+            'end': np.round(piece.ends, 3).tolist(),
+            'pitch': piece.pitches.tolist(),
+            'velocity': np.round(piece.velocities, 3).tolist(),
+            'measure': piece.measure_idx.tolist(),
+            'string': np.where(placed, len(piece.tuning) - piece.strings.astype(np.int64), 0).tolist(),
+            'fret': np.where(placed, piece.frets, 0).tolist(),
+        },
+    }
+    return json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _split_chord_name(name: str) -> Optional[Tuple[str, int, str]]:
+    if not name or name == "N.C.":
+        return None
+    step, rest = name[0], name[1:]
+    alter = 0
+    if rest[:1] in ('#', 'b'):
+        alter = 1 if rest[0] == '#' else -1
+        rest = rest[1:]
+    return step, alter, rest
+
+
+def _fill(duration: int) -> List[Tuple[int, str, bool]]:
+    """Split a length in 64ths into note values, longest first."""
+    parts = []
+    for value, note_type, dotted in NOTE_TYPES:
+        while duration >= value:
+            parts.append((value, note_type, dotted))
+            duration -= value
+    return parts
+
+
+def _add_duration(element: ET.Element, value: int, note_type: str, dotted: bool) -> None:
+    ET.SubElement(element, 'duration').text = str(value)
+    ET.SubElement(element, 'voice').text = '1'
+    ET.SubElement(element, 'type').text = note_type
+    if dotted:
+        ET.SubElement(element, 'dot')
+
+
+def _add_rests(measure: ET.Element, duration: int) -> None:
+    for value, note_type, dotted in _fill(duration):
+        rest = ET.SubElement(measure, 'note')
+        ET.SubElement(rest, 'rest')
+        _add_duration(rest, value, note_type, dotted)
+
+
+def _add_harmony(measure: ET.Element, chord_name: str) -> None:
+    parts = _split_chord_name(chord_name)
+    if parts is None:
+        return
+    step, alter, suffix = parts
+    kind, text = CHORD_KINDS.get(suffix, ('major', suffix))
+    harmony = ET.SubElement(measure, 'harmony')
+    root = ET.SubElement(harmony, 'root')
+    ET.SubElement(root, 'root-step').text = step
+    if alter:
+        ET.SubElement(root, 'root-alter').text = str(alter)
+    ET.SubElement(harmony, 'kind', text=text).text = kind
+
+
+def to_musicxml(piece: 'AnalyzedPiece') -> bytes:
+    """
+    Render a piece as MusicXML with a six-line TAB staff.
+
+    Onsets are quantized to the tab grid (slots_per_measure per 4/4 bar).
+    Each onset lasts until the next onset in its measure, rounded down to a
+    single note value, with rests filling the remainder. Fingering is written
+    as <string>/<fret> technical notations and chords as <harmony>.
+
+    Args:
+        piece: Analyzed piece
+
+    Returns:
+        UTF-8 encoded MusicXML (score-partwise)
+
+    Raises:
+        ValueError: If a grid slot is not a whole number of 64th notes
+    """
+    if 64 % piece.slots_per_measure:
+        raise ValueError(_("MusicXML export needs slots_per_measure to divide 64, got {}").format(
+            piece.slots_per_measure
+        ))
+    slot_length = 64 // piece.slots_per_measure
+    slots = 64
+    num_strings = len(piece.tuning)
+    generator = piece.generator
+
+    score = ET.Element('score-partwise', version='3.1')
+    part_list = ET.SubElement(score, 'part-list')
+    score_part = ET.SubElement(part_list, 'score-part', id='P1')
+    ET.SubElement(score_part, 'part-name').text = 'Guitar'
+    part = ET.SubElement(score, 'part', id='P1')
+
+    for m_idx in range(piece.num_measures):
+        measure = ET.SubElement(part, 'measure', number=str(m_idx + 1))
+        if m_idx == 0:
+            attributes = ET.SubElement(measure, 'attributes')
+            ET.SubElement(attributes, 'divisions').text = str(DIVISIONS)
+            time = ET.SubElement(attributes, 'time')
+            ET.SubElement(time, 'beats').text = '4'
+            ET.SubElement(time, 'beat-type').text = '4'
+            clef = ET.SubElement(attributes, 'clef')
+            ET.SubElement(clef, 'sign').text = 'TAB'
+            ET.SubElement(clef, 'line').text = '5'
+            details = ET.SubElement(attributes, 'staff-details')
+            ET.SubElement(details, 'staff-lines').text = str(num_strings)
+            for line, open_midi in enumerate(generator.tuning, start=1):
+                tuning = ET.SubElement(details, 'staff-tuning', line=str(line))
+                step, alter = PITCH_SPELLING[(open_midi - piece.capo) % 12]
+                ET.SubElement(tuning, 'tuning-step').text = step
+                if alter:
+                    ET.SubElement(tuning, 'tuning-alter').text = str(alter)
+                ET.SubElement(tuning, 'tuning-octave').text = str((open_midi - piece.capo) // 12 - 1)
+            if piece.capo:
+                ET.SubElement(details, 'capo').text = str(piece.capo)
+            direction = ET.SubElement(measure, 'direction', placement='above')
+            direction_type = ET.SubElement(direction, 'direction-type')
+            metronome = ET.SubElement(direction_type, 'metronome')
+            ET.SubElement(metronome, 'beat-unit').text = 'quarter'
+            ET.SubElement(metronome, 'per-minute').text = f"{piece.bpm:.1f}"
+            ET.SubElement(direction, 'sound', tempo=f"{piece.bpm:.2f}")
+
+        _add_harmony(measure, piece.measure_chords[m_idx])
+
+        lo, hi = piece.note_range(m_idx, m_idx + 1)
+        onsets: Dict[int, List[int]] = {}
+        for i in range(lo, hi):
+            if piece.strings[i] >= 0:
+                onsets.setdefault(int(piece.slot_idx[i]) * slot_length, []).append(i)
+
+        cursor = 0
+        slot_list = sorted(onsets)
+        for k, slot in enumerate(slot_list):
+            if slot > cursor:
+                _add_rests(measure, slot - cursor)
+            next_slot = slot_list[k + 1] if k + 1 < len(slot_list) else slots
+            value, note_type, dotted = _fill(next_slot - slot)[0]
+
+            # One note per string; a later note on the same string replaces an earlier one
+            by_string = {int(piece.strings[i]): i for i in onsets[slot]}
+            for n, s_idx in enumerate(sorted(by_string, reverse=True)):
+                i = by_string[s_idx]
+                note = ET.SubElement(measure, 'note')
+                if n > 0:
+                    ET.SubElement(note, 'chord')
+                # Written pitch follows the fingering, which may be an octave-shifted placement
+                sounding = generator.tuning[s_idx] + int(piece.frets[i])
+                step, alter = PITCH_SPELLING[sounding % 12]
+                pitch_el = ET.SubElement(note, 'pitch')
+                ET.SubElement(pitch_el, 'step').text = step
+                if alter:
+                    ET.SubElement(pitch_el, 'alter').text = str(alter)
+                ET.SubElement(pitch_el, 'octave').text = str(sounding // 12 - 1)
+                _add_duration(note, value, note_type, dotted)
+                technical = ET.SubElement(ET.SubElement(note, 'notations'), 'technical')
+                ET.SubElement(technical, 'string').text = str(num_strings - s_idx)
+                ET.SubElement(technical, 'fret').text = str(int(piece.frets[i]))
+            cursor = slot + value
+
+        if cursor < slots:
+            _add_rests(measure, slots - cursor)
+
+    body = ET.tostring(score, encoding='unicode')
+    header = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" '
+        '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+    )
+    return (header + body).encode('utf-8')
+
+
+EXPORTERS = {
+    'midi': to_midi,
+    'musicxml': to_musicxml,
+    'json': to_json,
+}
@@ -0,0 +1,297 @@
+"""
+Shared spectral features of audio segments.
+
+Tempo detection, source separation and chroma-based analysis all start from
+a spectral transform of the same audio. An AudioFeatures object stands for
+one segment of one file version and computes each feature on first use:
+the decoded samples, the STFT and its magnitude, and the features derived
+from them (onset envelope, tempo, tempo map, chroma, RMS, CQT magnitude). Later
+consumers of the same segment reuse the arrays instead of decoding and
+transforming the audio again.
+
+Arrays are float32 (complex64 for the STFT) and read-only. The FeatureStore
+keeps recently used segments within a memory budget and counts hits and
+misses per feature.
+"""
+import gettext
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import librosa
+import numpy as np
+
+from src.audio_probe import file_identity
+from src.config import Config, add_reload_listener, get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# librosa's default rate, which is also the transcription model's input rate
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Resolution of the tempo map, and the relative tempo change that starts a new entry
+TEMPO_MAP_SECONDS = 8.0
+TEMPO_MAP_TOLERANCE = 0.04
+
+# STFT frames per block when chroma is computed without the full STFT
+CHROMA_BLOCK_FRAMES = 2048
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+class AudioFeatures:
+    """Lazily computed features of one segment of an audio file"""
+
+    def __init__(self, store: 'FeatureStore', key: Hashable, audio_path: str,
+                 start: float = 0.0, duration: Optional[float] = None, sr: int = SAMPLE_RATE):
+        self.key = key
+        self.audio_path = audio_path
+        self.start = start
+        self.duration = duration
+        self.sr = sr
+        self._store = store
+        self._lock = threading.RLock()
+        self._values: Dict[str, Any] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(v, 'nbytes', 0) for v in list(self._values.values()))
+
+    def _get(self, name: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if name in self._values:
+                self._store._count('hits', name)
+                return self._values[name]
+            self._store._count('misses', name)
+            value = compute()
+            self._values[name] = value
+        self._store._account(self)
+        return value
+
+    @property
+    def audio(self) -> np.ndarray:
+        """Mono samples of the segment at sr."""
+        def compute():
+            audio, ___ = librosa.load(self.audio_path, sr=self.sr, mono=True,
+                                      offset=self.start, duration=self.duration)
+            return _read_only(audio.astype(np.float32, copy=False))
+        return self._get('audio', compute)
+
+    @property
+    def stft(self) -> np.ndarray:
+        """Complex STFT (N_FFT, HOP_LENGTH, centered frames)."""
+        return self._get('stft', lambda: _read_only(
+            librosa.stft(self.audio, n_fft=N_FFT, hop_length=HOP_LENGTH).astype(np.complex64, copy=False)
+        ))
+
+    @property
+    def magnitude(self) -> np.ndarray:
+        """Magnitude of the STFT."""
+        return self._get('magnitude', lambda: _read_only(np.abs(self.stft)))
+
+    @property
+    def onset_envelope(self) -> np.ndarray:
+        """Onset strength per STFT frame, as librosa.beat.beat_track computes it."""
+        def compute():
+            mel = librosa.feature.melspectrogram(S=self.magnitude ** 2, sr=self.sr)
+            envelope = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=self.sr,
+                                                    hop_length=HOP_LENGTH, aggregate=np.median)
+            return _read_only(envelope.astype(np.float32, copy=False))
+        return self._get('onset_envelope', compute)
+
+    @property
+    def tempo(self) -> float:
+        """Estimated tempo in BPM."""
+        def compute():
+            tempo, ___ = librosa.beat.beat_track(onset_envelope=self.onset_envelope, sr=self.sr,
+                                                 hop_length=HOP_LENGTH)
+            return float(np.atleast_1d(tempo)[0])
+        return self._get('tempo', compute)
+
+    @property
+    def tempo_map(self) -> List[Tuple[float, float]]:
+        """
+        (file time in seconds, BPM) at the segment start and at each tempo change.
+
+        The local tempo of every frame is summarized per TEMPO_MAP_SECONDS
+        block; a block starts a new entry when its tempo differs from the
+        current one by more than TEMPO_MAP_TOLERANCE. A final block shorter
+        than half the resolution only extends the last entry.
+        """
+        def compute():
+            local = librosa.feature.tempo(onset_envelope=self.onset_envelope, sr=self.sr,
+                                          hop_length=HOP_LENGTH, aggregate=None)
+            block = max(1, int(TEMPO_MAP_SECONDS * self.sr / HOP_LENGTH))
+            tempo_map: List[Tuple[float, float]] = []
+            for first in range(0, len(local), block):
+                if tempo_map and len(local) - first < block // 2:
+                    break
+                bpm = float(np.median(local[first:first + block]))
+                if not tempo_map or abs(bpm - tempo_map[-1][1]) > TEMPO_MAP_TOLERANCE * tempo_map[-1][1]:
+                    time = self.start + first * HOP_LENGTH / self.sr
+                    tempo_map.append((round(time, 3), round(bpm, 3)))
+            return tempo_map
+        return self._get('tempo_map', compute)
+
+    @property
+    def chroma(self) -> np.ndarray:
+        """
+        12 x frames chromagram of the STFT power, at concert (A440) tuning.
+
+        Uses the STFT if it is already computed; otherwise the STFT is
+        computed a block of frames at a time, so a long song's full STFT is
+        never held in memory just for its chroma.
+        """
+        def from_power(power: np.ndarray) -> np.ndarray:
+            return librosa.feature.chroma_stft(S=power, sr=self.sr, n_fft=N_FFT, tuning=0.0)
+
+        def compute():
+            if 'stft' in self._values:
+                chroma = from_power(self.magnitude ** 2)
+            else:
+                padded = np.pad(self.audio, N_FFT // 2)
+                n_frames = 1 + len(self.audio) // HOP_LENGTH
+                blocks = []
+                for first in range(0, n_frames, CHROMA_BLOCK_FRAMES):
+                    count = min(CHROMA_BLOCK_FRAMES, n_frames - first)
+                    samples = padded[first * HOP_LENGTH:(first + count - 1) * HOP_LENGTH + N_FFT]
+                    block = librosa.stft(samples, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)
+                    blocks.append(from_power(np.abs(block) ** 2))
+                chroma = np.concatenate(blocks, axis=1) if blocks else np.zeros((12, 0))
+            return _read_only(chroma.astype(np.float32, copy=False))
+        return self._get('chroma', compute)
+
+    @property
+    def rms(self) -> np.ndarray:
+        """RMS energy per STFT frame."""
+        return self._get('rms', lambda: _read_only(
+            librosa.feature.rms(S=self.magnitude, frame_length=N_FFT)[0].astype(np.float32, copy=False)
+        ))
+
+    @property
+    def cqt(self) -> np.ndarray:
+        """Constant-Q magnitude (84 bins from C1, 12 per octave)."""
+        return self._get('cqt', lambda: _read_only(
+            np.abs(librosa.cqt(self.audio, sr=self.sr, hop_length=HOP_LENGTH)).astype(np.float32, copy=False)
+        ))
+
+
+class FeatureStore:
+    """Thread-safe LRU of AudioFeatures within a memory budget."""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the FeatureStore.
+
+        Args:
+            max_bytes: Memory budget for computed features across all segments
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._segments: "OrderedDict[Hashable, AudioFeatures]" = OrderedDict()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def segment(self, audio_path: str, start: float = 0.0, duration: Optional[float] = None,
+                sr: int = SAMPLE_RATE) -> AudioFeatures:
+        """
+        Return the features of a segment of a file, shared with other consumers.
+
+        Args:
+            audio_path: Audio file
+            start: Segment start in seconds
+            duration: Segment length in seconds (default: to the end of the file)
+            sr: Sample rate the audio is decoded at
+
+        Returns:
+            AudioFeatures computing each feature on first use
+        """
+        key = (file_identity(audio_path), round(float(start), 6),
+               None if duration is None else round(float(duration), 6), sr)
+        with self._lock:
+            features = self._segments.get(key)
+            if features is None:
+                features = AudioFeatures(self, key, os.path.abspath(audio_path), start, duration, sr)
+                self._segments[key] = features
+            self._segments.move_to_end(key)
+            return features
+
+    def _count(self, kind: str, name: str) -> None:
+        with self._lock:
+            counts = self.hits if kind == 'hits' else self.misses
+            counts[name] = counts.get(name, 0) + 1
+
+    def _account(self, current: AudioFeatures) -> None:
+        """Evict least recently used segments until computed features fit the budget."""
+        with self._lock:
+            self._evict(keep=current.key)
+
+    def _evict(self, keep: Hashable = None) -> None:
+        total = sum(f.nbytes for f in self._segments.values())
+        for key in list(self._segments):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._segments.pop(key).nbytes
+        if total > self.max_bytes and keep in self._segments:
+            # Larger than the whole budget: its consumers keep it, the store doesn't
+            self._segments.pop(keep)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(f.nbytes for f in self._segments.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counts per feature and memory in use."""
+        with self._lock:
+            return {
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+                'segments': len(self._segments),
+                'bytes': sum(f.nbytes for f in self._segments.values()),
+            }
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the memory budget, evicting least recently used segments if needed."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._segments.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+
+def _budget_bytes(config: Config) -> int:
+    return int(config.performance.feature_cache_mb * 1024 * 1024)
+
+
+_STORE = FeatureStore(_budget_bytes(get_config()))
+
+
+def _apply_config(config: Config) -> None:
+    _STORE.resize(_budget_bytes(config))
+
+
+add_reload_listener(_apply_config)
+
+
+def get_feature_store() -> FeatureStore:
+    """Return the process-wide FeatureStore."""
+    return _STORE
@@ -0,0 +1,350 @@
+"""
+Acoustic fingerprints: recognize other recordings of the same audio.
+
+The same song arrives as MP3, M4A and WAV rips with different bytes, names
+and a little extra or missing silence at the start, so caches keyed by path
+or content hash miss. A fingerprint summarizes the first FINGERPRINT_SECONDS
+of the decoded audio as a chromagram (robust to codecs, bit rates and sample
+rates) plus a finer onset envelope. Two fingerprints match when their
+chromagrams correlate above MATCH_THRESHOLD at some offset of up to
+MAX_OFFSET_SECONDS; the onset envelopes then pin the offset down to a few
+milliseconds.
+
+A shared intro is not enough: a candidate is confirmed on a second window
+from the middle of both files, which must correlate at the offset found,
+and the difference of the durations must agree with that offset.
+
+The FingerprintIndex persists one small bundle per analyzed file version so
+matches survive restarts and are shared by processes using the same directory.
+"""
+import gettext
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src import serialization
+from src.audio_probe import file_identity, get_audio_duration
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+DEFAULT_INDEX_DIR = Path.home() / '.cache' / 'fingerstyle-tab' / 'fingerprints'
+FINGERPRINT_SUFFIX = '.ftnb'
+
+# Decoded excerpt: the start of the file, mono at a low rate
+FINGERPRINT_SECONDS = 30.0
+SAMPLE_RATE = 11025
+
+# Confirmation window from the middle of the file
+CONFIRM_SECONDS = 10.0
+
+# Bundles of another layout are ignored (and rewritten when the file is analyzed again)
+FINGERPRINT_VERSION = 2
+
+# Chroma frames of about 93 ms; onset frames a quarter of that
+HOP_LENGTH = 1024
+ONSET_HOP_LENGTH = HOP_LENGTH // 4
+
+# Frames quieter than this relative to the excerpt's loudest are ignored
+SILENCE_DB = -50.0
+
+# Largest start offset between two recordings, minimum chroma correlation
+# for a match and minimum share of sounding frames the correlation covers
+MAX_OFFSET_SECONDS = 5.0
+MATCH_THRESHOLD = 0.85
+MIN_OVERLAP = 0.5
+
+# Slack of the confirmation window around the expected lag (frames), and
+# of the durations around the offset (seconds: encoder padding, trimmed tails)
+CONFIRM_SLACK_FRAMES = 2
+DURATION_TOLERANCE = 2.0
+
+# Fingerprints of recently looked-up files kept in memory
+_RECENT_SIZE = 64
+
+
+@dataclass
+class Fingerprint:
+    """Chroma and onset summary of the start of a recording, and chroma of its middle"""
+    chroma: np.ndarray  # frames x 12, centered and unit length; silent frames are zero
+    onset: np.ndarray  # onset strength per ONSET_HOP_LENGTH frame, zero mean, unit length
+    duration: float  # of the whole file, in seconds
+    middle: np.ndarray  # chroma (as above) of CONFIRM_SECONDS from the middle
+    middle_start: float  # where the middle window starts, in seconds
+
+    @property
+    def profile(self) -> np.ndarray:
+        """Unit mean chroma vector, a cheap first test of similarity."""
+        mean = self.chroma.sum(axis=0)
+        norm = np.linalg.norm(mean)
+        return mean / norm if norm > 0 else mean
+
+
+@dataclass
+class FingerprintMatch:
+    """A known recording matching a queried one"""
+    identity: str  # file version the known fingerprint was computed from
+    source_path: str
+    score: float  # chroma correlation at the best offset
+    offset: float  # seconds to add to a time in the known recording to get the queried one
+
+
+def compute_fingerprint(audio_path: str) -> Fingerprint:
+    """
+    Fingerprint the first FINGERPRINT_SECONDS of an audio file.
+
+    Args:
+        audio_path: Audio file
+
+    Returns:
+        Fingerprint of the file
+    """
+    import librosa
+    duration = get_audio_duration(audio_path)
+    audio, ___ = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True, duration=FINGERPRINT_SECONDS)
+
+    onset = librosa.onset.onset_strength(y=audio, sr=SAMPLE_RATE, hop_length=ONSET_HOP_LENGTH)
+    onset = onset - onset.mean() if len(onset) else onset
+    norm = np.linalg.norm(onset)
+    onset = onset / norm if norm > 0 else onset
+
+    middle_start = max(0.0, duration / 2 - CONFIRM_SECONDS / 2)
+    middle, ___ = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True, offset=middle_start,
+                               duration=CONFIRM_SECONDS)
+    return Fingerprint(_chroma(audio), onset.astype(np.float32), duration, _chroma(middle), middle_start)
+
+
+def _chroma(audio: np.ndarray) -> np.ndarray:
+    """Centered, unit-length chroma frames of an excerpt; silent frames are zero."""
+    import librosa
+    chroma = librosa.feature.chroma_stft(y=audio, sr=SAMPLE_RATE, hop_length=HOP_LENGTH, tuning=0.0).T
+    chroma = chroma - chroma.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(chroma, axis=1, keepdims=True)
+    chroma = np.divide(chroma, norms, out=np.zeros_like(chroma), where=norms > 0)
+    rms = librosa.feature.rms(y=audio, hop_length=HOP_LENGTH)[0][:len(chroma)]
+    if len(rms) and rms.max() > 0:
+        chroma[librosa.amplitude_to_db(rms, ref=rms.max()) < SILENCE_DB] = 0.0
+    else:
+        chroma[:] = 0.0
+    return chroma.astype(np.float32)
+
+
+def compare(known: Fingerprint, query: Fingerprint,
+            max_offset: float = MAX_OFFSET_SECONDS) -> Tuple[float, float]:
+    """
+    Find the offset at which two fingerprints agree best.
+
+    Args:
+        known: Fingerprint of a known recording
+        query: Fingerprint of the recording looked up
+        max_offset: Largest start offset to consider, in seconds
+
+    Returns:
+        Tuple of (chroma correlation, offset in seconds to add to a time in
+        the known recording to get the same point in the queried one)
+    """
+    max_lag = int(round(max_offset * SAMPLE_RATE / HOP_LENGTH))
+    best_score, best_lag = _best_lag(known.chroma, query.chroma, range(-max_lag, max_lag + 1))
+    if best_score <= 0:
+        return 0.0, 0.0
+
+    # Refine within one chroma frame on the onset envelopes
+    ratio = HOP_LENGTH // ONSET_HOP_LENGTH
+    candidates = range(best_lag * ratio - ratio, best_lag * ratio + ratio + 1)
+    fine_lag = max(candidates, key=lambda lag: _correlation(known.onset, query.onset, lag))
+    return best_score, fine_lag * ONSET_HOP_LENGTH / SAMPLE_RATE
+
+
+def confirm(known: Fingerprint, query: Fingerprint, offset: float) -> float:
+    """
+    Check a candidate match away from the start of the recordings.
+
+    Args:
+        known: Fingerprint of a known recording
+        query: Fingerprint of the recording looked up
+        offset: Offset found by compare()
+
+    Returns:
+        Chroma correlation of the middle windows at that offset (0.0 if the
+        durations disagree with it)
+    """
+    if abs(query.duration - known.duration - offset) > DURATION_TOLERANCE:
+        return 0.0
+    # Known time t is query time t + offset
+    lag = int(round((known.middle_start + offset - query.middle_start) * SAMPLE_RATE / HOP_LENGTH))
+    score, ___ = _best_lag(known.middle, query.middle,
+                           range(lag - CONFIRM_SLACK_FRAMES, lag + CONFIRM_SLACK_FRAMES + 1))
+    return score
+
+
+def _best_lag(known: np.ndarray, query: np.ndarray, lags: range) -> Tuple[float, int]:
+    """Best mean correlation of known chroma frame i with query frame i + lag over the given lags."""
+    sounding_known = np.any(known != 0, axis=1)
+    sounding_query = np.any(query != 0, axis=1)
+    needed = MIN_OVERLAP * min(sounding_known.sum(), sounding_query.sum())
+    if needed <= 0:
+        return 0.0, 0
+
+    # Diagonal k of the similarity matrix pairs known frame i with query frame i + k
+    similarity = known @ query.T
+    both = sounding_known[:, None] & sounding_query[None, :]
+    best_score, best_lag = 0.0, 0
+    for lag in lags:
+        count = np.diagonal(both, offset=lag).sum()
+        if count < needed:
+            continue
+        score = float(np.diagonal(similarity, offset=lag).sum() / count)
+        if score > best_score:
+            best_score, best_lag = score, lag
+    return best_score, best_lag
+
+
+def _correlation(known: np.ndarray, query: np.ndarray, lag: int) -> float:
+    """Dot product of known[i] and query[i + lag] over their overlap."""
+    if lag >= 0:
+        n = min(len(known), len(query) - lag)
+        return float(known[:n] @ query[lag:lag + n]) if n > 0 else 0.0
+    n = min(len(known) + lag, len(query))
+    return float(known[-lag:-lag + n] @ query[:n]) if n > 0 else 0.0
+
+
+def identity_of(audio_path: str) -> str:
+    """Identify a file version as 'path|size|mtime_ns' (as PieceStore keys do)."""
+    abs_path, mtime_ns, size = file_identity(audio_path)
+    return f"{abs_path}|{size}|{mtime_ns}"
+
+
+class FingerprintIndex:
+    """Disk-backed index of fingerprints of analyzed recordings"""
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize the FingerprintIndex.
+
+        Args:
+            directory: Directory of fingerprint bundles (default: DEFAULT_INDEX_DIR)
+        """
+        self.directory = Path(directory).expanduser() if directory else DEFAULT_INDEX_DIR
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, Fingerprint]] = {}  # file name -> (identity, fingerprint)
+        self._sources: Dict[str, str] = {}
+        self._loaded_mtime: Optional[int] = None
+        self._recent: "OrderedDict[str, Fingerprint]" = OrderedDict()
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._entries)
+
+    def _file_for(self, identity: str) -> Path:
+        key = f"{identity}|v{FINGERPRINT_VERSION}"
+        name = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return self.directory / f"{name}{FINGERPRINT_SUFFIX}"
+
+    def _refresh(self) -> None:
+        """Load bundles written since the last look (by this or another process)."""
+        try:
+            mtime = self.directory.stat().st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            self._loaded_mtime = mtime
+            known = set(self._entries)
+        for path in self.directory.glob(f"*{FINGERPRINT_SUFFIX}"):
+            if path.name in known:
+                continue
+            try:
+                meta, arrays = serialization.read(str(path), use_mmap=False)
+                if meta.get('kind') != 'fingerprint' or meta.get('version') != FINGERPRINT_VERSION:
+                    continue
+                fingerprint = Fingerprint(arrays['chroma'], arrays['onset'], meta['duration'],
+                                          arrays['middle'], meta['middle_start'])
+            except Exception as e:
+                logger.warning(_("Discarding unreadable fingerprint {}: {}").format(path, str(e)))
+                continue
+            with self._lock:
+                self._entries[path.name] = (meta['identity'], fingerprint)
+                self._sources[path.name] = meta['source_path']
+
+    def fingerprint(self, audio_path: str) -> Fingerprint:
+        """Return the fingerprint of a file, computed once per file version."""
+        identity = identity_of(audio_path)
+        with self._lock:
+            fingerprint = self._recent.get(identity)
+            if fingerprint is not None:
+                self._recent.move_to_end(identity)
+                return fingerprint
+        fingerprint = compute_fingerprint(audio_path)
+        with self._lock:
+            self._recent[identity] = fingerprint
+            while len(self._recent) > _RECENT_SIZE:
+                self._recent.popitem(last=False)
+        return fingerprint
+
+    def add(self, audio_path: str) -> None:
+        """Fingerprint a file and persist it, unless this file version is already indexed."""
+        identity = identity_of(audio_path)
+        path = self._file_for(identity)
+        with self._lock:
+            if path.name in self._entries:
+                return
+        if path.exists():
+            # Indexed by another process or an earlier run; loaded on the next refresh
+            return
+        fingerprint = self.fingerprint(audio_path)
+        with self._lock:
+            self._entries[path.name] = (identity, fingerprint)
+            self._sources[path.name] = os.path.abspath(audio_path)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            serialization.write(str(path), {'chroma': fingerprint.chroma, 'onset': fingerprint.onset,
+                                            'middle': fingerprint.middle},
+                                {'kind': 'fingerprint', 'version': FINGERPRINT_VERSION, 'identity': identity,
+                                 'source_path': os.path.abspath(audio_path),
+                                 'duration': fingerprint.duration, 'middle_start': fingerprint.middle_start})
+        except OSError as e:
+            logger.warning(_("Could not persist fingerprint: {}").format(str(e)))
+
+    def matches(self, audio_path: str, max_offset: float = MAX_OFFSET_SECONDS,
+                threshold: float = MATCH_THRESHOLD) -> List[FingerprintMatch]:
+        """
+        Find indexed recordings of the same audio as a file.
+
+        Args:
+            audio_path: Audio file to look up
+            max_offset: Largest start offset between recordings, in seconds
+            threshold: Minimum chroma correlation of a match
+
+        Returns:
+            Matches other than the file version itself, confirmed on the
+            middle of both files, best first
+        """
+        self._refresh()
+        identity = identity_of(audio_path)
+        query = self.fingerprint(audio_path)
+        with self._lock:
+            entries = [(name, ident, fp) for name, (ident, fp) in self._entries.items() if ident != identity]
+
+        found = []
+        for name, known_identity, known in entries:
+            # Leading/trailing silence aside, copies last as long; similar chroma is a cheap pre-test
+            if abs(known.duration - query.duration) > 2 * max_offset:
+                continue
+            if float(known.profile @ query.profile) < threshold / 2:
+                continue
+            score, offset = compare(known, query, max_offset)
+            if score >= threshold and confirm(known, query, offset) >= threshold:
+                found.append(FingerprintMatch(known_identity, self._sources[name], score, offset))
+        return sorted(found, key=lambda m: m.score, reverse=True)
@@ -0,0 +1,384 @@
+"""
+Pluggable inference backends for the Basic Pitch model.
+
+Basic Pitch ships the ICASSP 2022 model as a TensorFlow SavedModel, a TFLite
+flatbuffer and an ONNX graph. This module loads whichever of those formats is
+requested with explicit thread settings, can build a dynamic-range quantized
+variant, and benchmarks backends against each other on the same audio.
+"""
+import gettext
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from basic_pitch import (
+    ONNX_PRESENT,
+    TF_PRESENT,
+    TFLITE_PRESENT,
+    FilenameSuffix,
+    build_icassp_2022_model_path,
+)
+from basic_pitch.inference import Model
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Backend name -> bundled model format
+BACKEND_SUFFIXES = {
+    'tensorflow': FilenameSuffix.tf,
+    'tflite': FilenameSuffix.tflite,
+    'onnx': FilenameSuffix.onnx,
+}
+
+# Order used when backend is 'auto': lightest runtime first
+AUTO_PREFERENCE = ['onnx', 'tflite', 'tensorflow']
+
+# Runtime module of each backend (imported ahead of time by preloaded worker processes)
+RUNTIME_MODULES = {
+    'tensorflow': 'tensorflow',
+    'tflite': 'tflite_runtime.interpreter' if TFLITE_PRESENT else 'tensorflow',
+    'onnx': 'onnxruntime',
+}
+
+# Backends whose loaded, not yet invoked model keeps working in a fork()ed child.
+# TensorFlow and ONNX Runtime start thread pools on load that fork() doesn't copy.
+FORK_SAFE_BACKENDS = {'tflite'}
+
+DEFAULT_QUANTIZED_MODEL_DIR = Path.home() / '.cache' / 'fingerstyle-tab' / 'models'
+
+
+def available_backends() -> List[str]:
+    """
+    List backends whose runtime is installed and whose model file is bundled.
+
+    Returns:
+        Backend names in the order of BACKEND_SUFFIXES
+    """
+    runtime_present = {
+        'tensorflow': TF_PRESENT,
+        'tflite': TFLITE_PRESENT or TF_PRESENT,
+        'onnx': ONNX_PRESENT,
+    }
+    return [
+        name for name, suffix in BACKEND_SUFFIXES.items()
+        if runtime_present[name] and build_icassp_2022_model_path(suffix).exists()
+    ]
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Resolve a configured backend name to one that can be loaded.
+
+    Args:
+        backend: 'auto', 'tensorflow', 'tflite' or 'onnx'
+
+    Returns:
+        Concrete backend name
+
+    Raises:
+        ValueError: If the backend is unknown or not available on this system
+    """
+    available = available_backends()
+    if backend == 'auto':
+        for name in AUTO_PREFERENCE:
+            if name in available:
+                return name
+        raise ValueError(_("No inference backend is available on this system"))
+
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(
+            _("Unknown inference backend: {}. Supported backends: {}").format(
+                backend, ', '.join(BACKEND_SUFFIXES)
+            )
+        )
+    if backend not in available:
+        raise ValueError(
+            _("Inference backend '{}' is not available. Available backends: {}").format(
+                backend, ', '.join(available) or '-'
+            )
+        )
+    return backend
+
+
+def quantized_model_path(backend: str, model_dir: Optional[str] = None) -> Path:
+    """
+    Build (once) and return the dynamic-range quantized model for a backend.
+
+    TFLite variants are converted from the SavedModel with the TFLite converter;
+    ONNX variants are produced with onnxruntime's dynamic quantizer. The result
+    is written to `model_dir` and reused on later calls.
+
+    Args:
+        backend: 'tflite' or 'onnx'
+        model_dir: Directory for generated models (default: ~/.cache/fingerstyle-tab/models)
+
+    Returns:
+        Path to the quantized model file
+
+    Raises:
+        ValueError: If the backend has no quantized variant
+    """
+    target_dir = Path(model_dir).expanduser() if model_dir else DEFAULT_QUANTIZED_MODEL_DIR
+    if backend == 'tflite':
+        target = target_dir / 'nmp.dynamic_range.tflite'
+    elif backend == 'onnx':
+        target = target_dir / 'nmp.dynamic_range.onnx'
+    else:
+        raise ValueError(_("Quantization is only supported for 'tflite' and 'onnx' backends"))
+
+    if target.exists():
+        return target
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    # Only one process builds the model; the others wait and reuse its output
+    with _file_lock(target_dir / '.build.lock'):
+        if target.exists():
+            return target
+
+        tmp_target = target.with_suffix(target.suffix + f'.{os.getpid()}.tmp')
+        logger.info(_("Building quantized {} model at {}...").format(backend, target))
+
+        if backend == 'tflite':
+            import tensorflow as tf
+            converter = tf.lite.TFLiteConverter.from_saved_model(
+                str(build_icassp_2022_model_path(FilenameSuffix.tf))
+            )
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            tmp_target.write_bytes(converter.convert())
+        else:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(
+                str(build_icassp_2022_model_path(FilenameSuffix.onnx)),
+                str(tmp_target),
+                weight_type=QuantType.QInt8,
+            )
+
+        # Atomic rename so readers never observe a partial file
+        os.replace(tmp_target, target)
+    return target
+
+
+@contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """Exclusive inter-process lock (no-op where fcntl is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _configure_tensorflow_threads(intra_op_threads: int, inter_op_threads: int) -> None:
+    import tensorflow as tf
+    try:
+        if intra_op_threads > 0:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads > 0:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        # TensorFlow only accepts thread settings before its runtime is initialized
+        logger.warning(_("Could not apply TensorFlow thread settings: {}").format(str(e)))
+
+
+def load_model(backend: str = 'tensorflow', intra_op_threads: int = 0,
+               inter_op_threads: int = 0, quantize: bool = False,
+               model_dir: Optional[str] = None) -> Model:
+    """
+    Load the Basic Pitch model with a specific backend.
+
+    Args:
+        backend: 'auto', 'tensorflow', 'tflite' or 'onnx'
+        intra_op_threads: Threads used inside a single op (0 = runtime default)
+        inter_op_threads: Threads used to run independent ops (0 = runtime default)
+        quantize: Use the dynamic-range quantized variant (tflite/onnx only)
+        model_dir: Directory for generated quantized models
+
+    Returns:
+        A basic_pitch Model usable with `basic_pitch.inference.predict`
+
+    Raises:
+        ValueError: If the backend is unknown, unavailable or cannot be quantized
+    """
+    backend = resolve_backend(backend)
+    if quantize:
+        model_path = quantized_model_path(backend, model_dir)
+    else:
+        model_path = build_icassp_2022_model_path(BACKEND_SUFFIXES[backend])
+
+    # Bypass Model.__init__, which probes every installed runtime in turn
+    model = Model.__new__(Model)
+
+    if backend == 'tensorflow':
+        import tensorflow as tf
+        _configure_tensorflow_threads(intra_op_threads, inter_op_threads)
+        model.model_type = Model.MODEL_TYPES.TENSORFLOW
+        model.model = tf.saved_model.load(str(model_path))
+    elif backend == 'tflite':
+        if TFLITE_PRESENT:
+            import tflite_runtime.interpreter as tflite
+        else:
+            import tensorflow.lite as tflite
+        model.model_type = Model.MODEL_TYPES.TFLITE
+        model.interpreter = tflite.Interpreter(
+            model_path=str(model_path),
+            num_threads=intra_op_threads if intra_op_threads > 0 else None,
+        )
+        runner = model.interpreter.get_signature_runner()
+        lock = threading.Lock()
+
+        # A TFLite interpreter must not be invoked from several threads at once
+        def locked_runner(**inputs):
+            with lock:
+                return runner(**inputs)
+        model.model = locked_runner
+    else:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads > 0:
+            options.inter_op_num_threads = inter_op_threads
+        model.model_type = Model.MODEL_TYPES.ONNX
+        model.model = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+    logger.info(_("Loaded Basic Pitch model: backend={}, quantized={}, threads={}/{}").format(
+        backend, quantize, intra_op_threads, inter_op_threads
+    ))
+    return model
+
+
+def note_agreement(reference: Sequence[Dict[str, Any]], estimate: Sequence[Dict[str, Any]],
+                   onset_tolerance: float = 0.05) -> Tuple[float, float, float]:
+    """
+    Compare two note lists by pitch and onset time.
+
+    A note in `estimate` matches a reference note when the pitches are equal and
+    the onsets differ by at most `onset_tolerance` seconds; each note matches at
+    most once.
+
+    Args:
+        reference: Reference notes ('start', 'pitch')
+        estimate: Notes to evaluate ('start', 'pitch')
+        onset_tolerance: Maximum onset difference in seconds
+
+    Returns:
+        Tuple of (precision, recall, f1)
+    """
+    if not reference and not estimate:
+        return 1.0, 1.0, 1.0
+    if not reference or not estimate:
+        return 0.0, 0.0, 0.0
+
+    by_pitch: Dict[int, List[float]] = {}
+    for n in reference:
+        by_pitch.setdefault(int(n['pitch']), []).append(float(n['start']))
+    ref_onsets = {p: np.sort(np.asarray(v)) for p, v in by_pitch.items()}
+    used = {p: np.zeros(len(v), dtype=bool) for p, v in ref_onsets.items()}
+
+    matched = 0
+    for n in sorted(estimate, key=lambda x: x['start']):
+        onsets = ref_onsets.get(int(n['pitch']))
+        if onsets is None:
+            continue
+        start = float(n['start'])
+        lo = np.searchsorted(onsets, start - onset_tolerance, side='left')
+        hi = np.searchsorted(onsets, start + onset_tolerance, side='right')
+        free = np.flatnonzero(~used[int(n['pitch'])][lo:hi])
+        if free.size:
+            candidates = lo + free
+            best = candidates[np.argmin(np.abs(onsets[candidates] - start))]
+            used[int(n['pitch'])][best] = True
+            matched += 1
+
+    precision = matched / len(estimate)
+    recall = matched / len(reference)
+    f1 = 0.0 if matched == 0 else 2 * precision * recall / (precision + recall)
+    return precision, recall, f1
+
+
+@dataclass
+class BackendBenchmark:
+    """Timing and accuracy of one backend on one audio file"""
+    backend: str
+    quantized: bool
+    load_seconds: float
+    inference_seconds: float
+    num_notes: int
+    precision: float = 1.0
+    recall: float = 1.0
+    f1: float = 1.0
+
+
+def benchmark_backends(audio_path: str, backends: Optional[Sequence[str]] = None,
+                       include_quantized: bool = True, intra_op_threads: int = 0,
+                       inter_op_threads: int = 0, repeats: int = 1,
+                       model_dir: Optional[str] = None) -> List[BackendBenchmark]:
+    """
+    Run every requested backend on the same audio and compare the results.
+
+    The first configuration run (the unquantized form of the first backend) is
+    the reference that note agreement is measured against.
+
+    Args:
+        audio_path: Audio file to transcribe
+        backends: Backends to compare (default: all available)
+        include_quantized: Also run the quantized variant of tflite/onnx
+        intra_op_threads: Threads used inside a single op (0 = runtime default)
+        inter_op_threads: Threads used to run independent ops (0 = runtime default)
+        repeats: Inference runs per configuration; the fastest is reported
+        model_dir: Directory for generated quantized models
+
+    Returns:
+        One BackendBenchmark per configuration
+    """
+    from basic_pitch.inference import predict
+
+    names = list(backends) if backends else available_backends()
+    configs = [(name, False) for name in names]
+    if include_quantized:
+        configs += [(name, True) for name in names if name in ('tflite', 'onnx')]
+
+    results = []
+    reference_notes = None
+    for name, quantized in configs:
+        start = time.perf_counter()
+        model = load_model(name, intra_op_threads, inter_op_threads, quantized, model_dir)
+        load_seconds = time.perf_counter() - start
+
+        best = float('inf')
+        notes = []
+        for ___ in range(max(1, repeats)):
+            start = time.perf_counter()
+            note_events = predict(str(audio_path), model_or_model_path=model)[2]
+            best = min(best, time.perf_counter() - start)
+            notes = [{'start': float(n[0]), 'pitch': int(n[2])} for n in note_events]
+
+        result = BackendBenchmark(name, quantized, load_seconds, best, len(notes))
+        if reference_notes is None:
+            reference_notes = notes
+        else:
+            result.precision, result.recall, result.f1 = note_agreement(reference_notes, notes)
+        results.append(result)
+        logger.info(_("Benchmark {}{}: load {:.2f}s, inference {:.2f}s, {} notes").format(
+            name, ' (quantized)' if quantized else '', load_seconds, best, len(notes)
+        ))
+
+    return results
@@ -0,0 +1,287 @@
+"""
+Lifecycle management for the Basic Pitch model.
+
+The ModelManager owns the loaded model: it loads it exactly once even when many
+requests arrive together, retries failed loads with exponential backoff, records
+load time and memory, unloads it after a configurable idle period, and can run
+a health check against the loaded model.
+"""
+import gc
+import gettext
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+
+def current_rss_bytes() -> int:
+    """
+    Return the resident set size of this process in bytes.
+
+    Uses /proc on Linux and falls back to the peak RSS reported by
+    getrusage elsewhere (0 if neither is available).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux/BSD
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def basic_pitch_health_check(model: Any) -> None:
+    """
+    Run one silent window through a Basic Pitch model and validate the output.
+
+    Raises:
+        RuntimeError: If the model output is missing heads or contains non-finite values
+    """
+    from basic_pitch.constants import AUDIO_N_SAMPLES
+    output = model.predict(np.zeros((1, AUDIO_N_SAMPLES, 1), dtype=np.float32))
+    for key in ('note', 'onset', 'contour'):
+        if key not in output:
+            raise RuntimeError(_("Model output is missing '{}'").format(key))
+        if not np.all(np.isfinite(output[key])):
+            raise RuntimeError(_("Model output '{}' contains non-finite values").format(key))
+
+
+class ModelManager:
+    """Thread-safe owner of a lazily loaded model."""
+
+    def __init__(self, loader: Callable[[], Any], idle_unload_seconds: float = 0.0,
+                 max_retries: int = 3, retry_backoff_seconds: float = 1.0,
+                 health_check: Optional[Callable[[Any], None]] = None):
+        """
+        Initialize the ModelManager.
+
+        Args:
+            loader: Zero-argument callable that loads and returns the model
+            idle_unload_seconds: Unload after this many idle seconds (0 = never)
+            max_retries: Load attempts per get() before giving up
+            retry_backoff_seconds: Delay before the first retry, doubled per attempt
+            health_check: Callable that raises if the loaded model is unhealthy
+        """
+        self._loader = loader
+        self.idle_unload_seconds = idle_unload_seconds
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._health_check = health_check
+
+        self._model: Any = None
+        self._reset_process_state()
+
+        # Threads and locks do not survive fork(); give children fresh ones
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_process_state)
+
+    def _reset_process_state(self) -> None:
+        self._lock = threading.RLock()
+        self._active = 0
+        self._retired = False
+        self._reaper: Optional[threading.Timer] = None
+        self._last_used = time.monotonic()
+        self._retry_after = 0.0
+        self.stats: Dict[str, Any] = {
+            'loaded': self._model is not None,
+            'load_count': 0,
+            'unload_count': 0,
+            'failed_attempts': 0,
+            'last_error': None,
+            'load_seconds': None,
+            'rss_delta_bytes': None,
+            'pid': os.getpid(),
+        }
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self) -> Any:
+        """
+        Return the loaded model, loading it first if necessary.
+
+        Concurrent callers wait for a single load instead of loading twice.
+
+        Raises:
+            RuntimeError: If every load attempt failed
+        """
+        with self._lock:
+            self._last_used = time.monotonic()
+            if self._model is None:
+                self._load_with_retries()
+            self._schedule_reaper()
+            return self._model
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        """Context manager that keeps the model from being unloaded while in use."""
+        with self._lock:
+            model = self.get()
+            self._active += 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_used = time.monotonic()
+                release = self._retired and self._active == 0
+            if release:
+                self.unload()
+
+    def preload(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the model ahead of the first request.
+
+        Args:
+            background: Load on a daemon thread instead of blocking
+
+        Returns:
+            The loader thread when running in the background
+        """
+        def _preload():
+            try:
+                self.get()
+            except RuntimeError as e:
+                logger.error(_("Model preload failed: {}").format(str(e)))
+
+        if not background:
+            _preload()
+            return None
+        thread = threading.Thread(target=_preload, name='model-preload', daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self) -> bool:
+        """
+        Release the model if it is loaded and not in use.
+
+        Returns:
+            True if the model was released
+        """
+        with self._lock:
+            if self._model is None or self._active > 0:
+                return False
+            self._model = None
+            self.stats['loaded'] = False
+            self.stats['unload_count'] += 1
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+        gc.collect()
+        logger.info(_("Model unloaded to free memory."))
+        return True
+
+    def retire(self) -> None:
+        """
+        Mark the manager as replaced: unload now if idle, otherwise as soon
+        as the last in-flight user finishes.
+        """
+        with self._lock:
+            self._retired = True
+        self.unload()
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Report the lifecycle state and, if loaded, run the health check.
+
+        Returns:
+            Dictionary with stats, idle time and 'healthy' (None if not loaded)
+        """
+        with self._lock:
+            report = dict(self.stats)
+            report['active'] = self._active
+            report['idle_seconds'] = round(time.monotonic() - self._last_used, 1)
+            model = self._model
+            report['healthy'] = None
+            if model is not None and self._health_check is not None:
+                try:
+                    self._health_check(model)
+                    report['healthy'] = True
+                except Exception as e:
+                    report['healthy'] = False
+                    report['health_error'] = str(e)
+        return report
+
+    def _load_with_retries(self) -> None:
+        now = time.monotonic()
+        if now < self._retry_after:
+            raise RuntimeError(
+                _("Model loading failed recently; retrying in {:.1f}s. Last error: {}").format(
+                    self._retry_after - now, self.stats['last_error']
+                )
+            )
+
+        delay = self.retry_backoff_seconds
+        for attempt in range(1, self.max_retries + 1):
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            try:
+                logger.info(_("Loading Basic Pitch model into memory..."))
+                model = self._loader()
+            except Exception as e:
+                self.stats['failed_attempts'] += 1
+                self.stats['last_error'] = str(e)
+                logger.error(_("Failed to load model (attempt {}/{}): {}").format(
+                    attempt, self.max_retries, str(e)
+                ))
+                if attempt < self.max_retries:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+
+            self._model = model
+            self.stats.update({
+                'loaded': True,
+                'load_count': self.stats['load_count'] + 1,
+                'last_error': None,
+                'load_seconds': round(time.perf_counter() - start, 3),
+                'rss_delta_bytes': current_rss_bytes() - rss_before,
+            })
+            self._retry_after = 0.0
+            logger.info(_("Model loaded successfully in {:.2f}s.").format(self.stats['load_seconds']))
+            return
+
+        # Keep failing fast for a while instead of hammering the loader on every call
+        self._retry_after = time.monotonic() + delay
+        raise RuntimeError(_("Failed to load model: {}").format(self.stats['last_error']))
+
+    def _schedule_reaper(self) -> None:
+        if self.idle_unload_seconds <= 0 or self._reaper is not None:
+            return
+        self._reaper = threading.Timer(self.idle_unload_seconds, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _reap(self) -> None:
+        with self._lock:
+            self._reaper = None
+            if self._model is None:
+                return
+            idle = time.monotonic() - self._last_used
+            if self._active > 0 or idle < self.idle_unload_seconds:
+                # Still in use: check again when the idle period could next expire
+                self._reaper = threading.Timer(
+                    max(self.idle_unload_seconds - idle, 0.1), self._reap
+                )
+                self._reaper.daemon = True
+                self._reaper.start()
+                return
+        self.unload()
@@ -0,0 +1,292 @@
+"""
+Note extraction from Basic Pitch activations with array operations.
+
+basic_pitch.note_creation walks every onset and the remaining energy frame
+by frame in Python. Here the same decisions are made for all pitches and
+frames at once:
+
+1. Onsets are the local maxima in time of the onset activations (plus
+   onsets inferred from sharp rises of the frame activations) above the
+   onset threshold. Of two onsets at the same frame a semitone apart only
+   the stronger is kept.
+2. A pitch is active where its frame activation reaches the frame
+   threshold; gaps shorter than ENERGY_TOLERANCE frames are bridged. A note
+   runs from its onset to the end of the active run, or to the next onset
+   at the same or a neighboring pitch, whichever comes first.
+3. Notes not longer than the minimum length are dropped.
+4. Active runs not covered by a note or its neighbors become notes of
+   their own (Basic Pitch's "melodia trick"), unless a stronger run on a
+   neighboring pitch overlaps them.
+
+Chunks are transcribed separately but stitched into one activation matrix
+before extraction, so notes crossing chunk boundaries are found once and no
+note-level deduplication is needed.
+"""
+import gettext
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from basic_pitch.constants import AUDIO_SAMPLE_RATE, FFT_HOP
+from basic_pitch.note_creation import model_frames_to_time
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# MIDI pitch of the model's lowest pitch bin
+MIDI_OFFSET = 21
+
+# Activation frames per second
+FRAME_RATE = AUDIO_SAMPLE_RATE / FFT_HOP
+
+# Frames below the frame threshold a note may bridge (as basic_pitch's energy_tol)
+ENERGY_TOLERANCE = 11
+
+# Frame differences used to infer onsets (as basic_pitch's n_diff)
+N_ONSET_DIFFS = 2
+
+
+@dataclass
+class Activations:
+    """Frame and onset activations (frames x 88 pitches) with the file time of each frame"""
+    frames: np.ndarray
+    onsets: np.ndarray
+    times: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.onsets.nbytes + self.times.nbytes
+
+
+def activations_from_output(model_output: Dict[str, np.ndarray], start_offset: float = 0.0) -> Activations:
+    """
+    Keep the activations needed for notes from unwrapped model output.
+
+    Activations are stored as float16, which halves the memory of cached
+    chunks without affecting thresholds or peak picking.
+    """
+    frames = model_output['note']
+    return Activations(
+        frames=frames.astype(np.float16),
+        onsets=model_output['onset'].astype(np.float16),
+        times=model_frames_to_time(frames.shape[0]) + start_offset,
+    )
+
+
+def stitch(parts: Sequence[Activations]) -> Activations:
+    """
+    Join the activations of consecutive, possibly overlapping chunks.
+
+    Each overlap is cut at its middle, so every kept frame was computed with
+    at least half the overlap of audio context on both sides.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    keep = []
+    for i, part in enumerate(parts):
+        lo = (part.times[0] + parts[i - 1].times[-1]) / 2 if i > 0 else -np.inf
+        hi = (parts[i + 1].times[0] + part.times[-1]) / 2 if i + 1 < len(parts) else np.inf
+        keep.append((part.times >= lo) & (part.times < hi))
+    return Activations(
+        frames=np.concatenate([p.frames[k] for p, k in zip(parts, keep)]),
+        onsets=np.concatenate([p.onsets[k] for p, k in zip(parts, keep)]),
+        times=np.concatenate([p.times[k] for p, k in zip(parts, keep)]),
+    )
+
+
+def min_note_frames(min_note_length_ms: float) -> int:
+    """Convert a minimum note length to activation frames."""
+    return int(np.round(min_note_length_ms / 1000 * FRAME_RATE))
+
+
+# Internally activations are pitch-major (pitches x frames), so scans along
+# time run over contiguous memory.
+
+
+def _infer_onsets(onsets: np.ndarray, frames: np.ndarray) -> np.ndarray:
+    """Add onsets where the frame activation rises sharply (basic_pitch's get_infered_onsets)."""
+    n_frames = frames.shape[1]
+    padded = np.concatenate([np.zeros((frames.shape[0], N_ONSET_DIFFS), frames.dtype), frames], axis=1)
+    diff = np.min([padded[:, N_ONSET_DIFFS:] - padded[:, N_ONSET_DIFFS - n:N_ONSET_DIFFS - n + n_frames]
+                   for n in range(1, N_ONSET_DIFFS + 1)], axis=0)
+    diff[diff < 0] = 0
+    diff[:, :N_ONSET_DIFFS] = 0
+    peak = diff.max(initial=0.0)
+    if peak > 0:
+        diff *= onsets.max() / peak
+    return np.maximum(onsets, diff)
+
+
+def _neighbors(mask: np.ndarray) -> np.ndarray:
+    """Return mask | mask shifted one pitch up | mask shifted one pitch down."""
+    out = mask.copy()
+    out[1:] |= mask[:-1]
+    out[:-1] |= mask[1:]
+    return out
+
+
+def _prev_index(mask: np.ndarray) -> np.ndarray:
+    """For each pitch and frame, the last frame at or before it where mask is set (-1 if none)."""
+    index = np.arange(mask.shape[1], dtype=np.int32)
+    return np.maximum.accumulate(np.where(mask, index, np.int32(-1)), axis=1)
+
+
+def _next_index(mask: np.ndarray) -> np.ndarray:
+    """For each pitch and frame, the first frame at or after it where mask is set (n_frames if none)."""
+    n_frames = mask.shape[1]
+    index = np.arange(n_frames, dtype=np.int32)
+    return np.minimum.accumulate(np.where(mask, index, np.int32(n_frames))[:, ::-1], axis=1)[:, ::-1]
+
+
+def _bridge_gaps(active: np.ndarray, tolerance: int) -> np.ndarray:
+    """Fill inactive gaps shorter than tolerance frames between active frames of the same pitch."""
+    prev_active = _prev_index(active)
+    next_active = _next_index(active)
+    return active | ((prev_active >= 0) & (next_active < active.shape[1])
+                     & (next_active - prev_active - 1 < tolerance))
+
+
+def _note_ends(active: np.ndarray, starts: Tuple[np.ndarray, np.ndarray],
+               breaks: np.ndarray) -> np.ndarray:
+    """End frame (exclusive) of notes starting at starts: end of the bridged run or the next break."""
+    n_frames = active.shape[1]
+    anchored = active.copy()
+    anchored[starts] = True
+    # Bridged runs end on an active frame, so the first frame outside the run is the note end
+    end_of_run = _next_index(~_bridge_gaps(anchored, ENERGY_TOLERANCE))[starts]
+    following = np.zeros_like(breaks)
+    following[:, :-1] = breaks[:, 1:]
+    next_break = _next_index(following)[starts] + 1
+    return np.minimum(np.minimum(end_of_run, next_break), n_frames - 1)
+
+
+def _run_max(values: np.ndarray, p: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> np.ndarray:
+    """Maximum of values[p, t0:t1] for each run (t0 < t1)."""
+    flat = np.append(values.ravel(), 0)
+    bounds = np.empty(2 * len(p), dtype=np.int64)
+    bounds[0::2] = p * values.shape[1] + t0
+    bounds[1::2] = p * values.shape[1] + t1
+    return np.maximum.reduceat(flat, bounds)[0::2]
+
+
+def _mean_over(values: np.ndarray, p: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> np.ndarray:
+    """Mean of values[p, t0:t1] for each note, from cumulative sums."""
+    cumulative = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+    return (cumulative[p, t1] - cumulative[p, t0]) / np.maximum(t1 - t0, 1)
+
+
+def _span_mask(shape: Tuple[int, int], p: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> np.ndarray:
+    """Boolean mask of the spans [t0, t1) at pitches p."""
+    boundaries = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+    np.add.at(boundaries, (p, t0), 1)
+    np.add.at(boundaries, (p, t1), -1)
+    return np.cumsum(boundaries, axis=1)[:, :-1] > 0
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pitch, start frame and end frame (exclusive) of every run of True per pitch."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    run_p, run_t0 = np.nonzero(edges == 1)
+    ___, run_t1 = np.nonzero(edges == -1)
+    return run_p, run_t0, run_t1
+
+
+def _leftover_runs(frames: np.ndarray, frame_threshold: float, min_note_length: int, note_p: np.ndarray,
+                   note_t0: np.ndarray, note_t1: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Runs of activity outside the notes and their neighbors that should be notes themselves."""
+    n_pitches, n_frames = frames.shape
+    covered = _neighbors(_span_mask(frames.shape, note_p, note_t0, note_t1))
+    remaining = (frames > frame_threshold) & ~covered
+    run_p, run_t0, run_t1 = _runs(_bridge_gaps(remaining, ENERGY_TOLERANCE) & ~covered)
+    run_t1 = np.minimum(run_t1, n_frames - 1)
+    long_enough = run_t1 - run_t0 > min_note_length
+    run_p, run_t0, run_t1 = run_p[long_enough], run_t0[long_enough], run_t1[long_enough]
+    if not len(run_p):
+        return run_p, run_t0, run_t1
+
+    # A run overlapped by a stronger run a semitone away belongs to that run
+    run_peak = _run_max(np.where(remaining, frames, 0.0), run_p, run_t0, run_t1)
+    painted = np.zeros((n_pitches, n_frames + 1))
+    np.add.at(painted, (run_p, run_t0), run_peak)
+    np.add.at(painted, (run_p, run_t1), -run_peak)
+    peak_map = np.cumsum(painted, axis=1)[:, :-1]
+    neighbor_peak = np.zeros_like(peak_map)
+    neighbor_peak[1:] = peak_map[:-1]
+    neighbor_peak[:-1] = np.maximum(neighbor_peak[:-1], peak_map[1:])
+    keep = run_peak >= _run_max(neighbor_peak, run_p, run_t0, run_t1)
+    return run_p[keep], run_t0[keep], run_t1[keep]
+
+
+def extract_notes(activations: Activations, onset_threshold: float = 0.5, frame_threshold: float = 0.3,
+                  min_note_length: int = 11, infer_onsets: bool = True,
+                  melodia_trick: bool = True) -> List[Dict[str, Any]]:
+    """
+    Extract note events from frame and onset activations.
+
+    Args:
+        activations: Activations of a whole window (see stitch())
+        onset_threshold: Minimum onset activation of a note start
+        frame_threshold: Minimum frame activation for a note to continue
+        min_note_length: Notes must be longer than this many frames
+        infer_onsets: Also start notes at sharp rises of the frame activation
+        melodia_trick: Also turn strong activity without an onset into notes
+
+    Returns:
+        Note dictionaries ('start', 'end', 'pitch', 'velocity') sorted by onset
+    """
+    frames = np.ascontiguousarray(activations.frames.T, dtype=np.float32)
+    onsets = np.ascontiguousarray(activations.onsets.T, dtype=np.float32)
+    if frames.shape[1] < 3:
+        return []
+    if infer_onsets:
+        onsets = _infer_onsets(onsets, frames)
+
+    # 1. Onset peaks (a plateau counts once, at its first frame); of simultaneous
+    # onsets a semitone apart the stronger wins, the higher one on a tie
+    peaks = np.zeros(onsets.shape, dtype=bool)
+    peaks[:, 1:-1] = (onsets[:, 1:-1] > onsets[:, :-2]) & (onsets[:, 1:-1] >= onsets[:, 2:])
+    peaks &= onsets >= onset_threshold
+    strength = np.where(peaks, onsets, 0.0)
+    lower = np.zeros_like(strength)
+    lower[1:] = strength[:-1]
+    upper = np.zeros_like(strength)
+    upper[:-1] = strength[1:]
+    peaks &= (strength > lower) & (strength >= upper)
+
+    # 2. Notes at every pitch, ended by the next onset at the same or a neighboring
+    # pitch, and 3. long enough. Onsets of too short notes don't end other notes.
+    active = frames >= frame_threshold
+    starts = np.nonzero(peaks)
+    kept = _note_ends(active, starts, _neighbors(peaks)) - starts[1] > min_note_length
+    accepted = np.zeros_like(peaks)
+    accepted[starts[0][kept], starts[1][kept]] = True
+    starts = np.nonzero(accepted)
+    ends = _note_ends(active, starts, _neighbors(accepted))
+    kept = ends - starts[1] > min_note_length
+    note_p, note_t0, note_t1 = starts[0][kept], starts[1][kept], ends[kept]
+
+    # 4. Runs of activity left over after the notes and their neighbors
+    if melodia_trick:
+        run_p, run_t0, run_t1 = _leftover_runs(frames, frame_threshold, min_note_length,
+                                               note_p, note_t0, note_t1)
+        note_p = np.concatenate([note_p, run_p])
+        note_t0 = np.concatenate([note_t0, run_t0])
+        note_t1 = np.concatenate([note_t1, run_t1])
+
+    velocity = _mean_over(frames, note_p, note_t0, note_t1)
+    times = activations.times
+    order = np.lexsort((note_p, note_t0))
+    return [
+        {'start': float(times[t0]), 'end': float(times[t1]), 'pitch': int(p) + MIDI_OFFSET, 'velocity': float(v)}
+        for p, t0, t1, v in zip(note_p[order].tolist(), note_t0[order].tolist(),
+                                note_t1[order].tolist(), velocity[order].tolist())
+    ]
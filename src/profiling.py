@@ -0,0 +1,264 @@
+"""
+Opt-in profiling of individual analysis requests.
+
+The Profiler is armed for the next N requests. A profiled request runs the
+request thread under cProfile, and the scheduler runs each of the job's
+tasks under its own cProfile on whichever pool worker picks it up (see
+Job.profile); the profiles are merged when the request ends. From Python
+3.12, cProfile is built on sys.monitoring: one profiler sees every thread
+and only one may be enabled in the process, so the request's profiler
+covers the pool workers by itself (and anything else running meanwhile),
+and a request profiled while another is (or while another profiling tool is
+active) records its stages without function statistics. Stages of the
+request (transcription, chord analysis, rendering) record wall time and the
+tracemalloc peak allocated above the stage's starting point. tracemalloc is
+process-wide, so pool workers' allocations are included, as are those of
+any unprofiled request running at the same time.
+
+Each profile is written as a pstats file (<name>.prof, for pstats, snakeviz
+and the like) plus a text summary (<name>.txt) of the stages and the hottest
+functions by own time.
+"""
+import contextvars
+import cProfile
+import gettext
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Functions listed in a profile summary
+TOP_FUNCTIONS = 30
+
+PROFILE_SUFFIX = '.prof'
+SUMMARY_SUFFIX = '.txt'
+
+# Before Python 3.12 a cProfile.Profile only sees the thread that enabled it
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+# Profile of the request running in the current thread / context
+_CURRENT: contextvars.ContextVar[Optional['RequestProfile']] = contextvars.ContextVar(
+    'request_profile', default=None
+)
+
+
+class RequestProfile:
+    """cProfile data and stage measurements of one request"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.time()
+        self.wall_seconds = 0.0
+        self.stages: List[Tuple[str, float, Optional[int]]] = []  # (name, seconds, peak bytes)
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a callable under its own profiler and keep the profile (thread-safe)."""
+        if not PROFILE_PER_THREAD:
+            # The request's profiler already sees this thread
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profiles.append(profiler)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record the wall time and peak allocation of a stage of the request."""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - baseline) if tracing else None
+            self.stages.append((name, time.perf_counter() - started, peak))
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Return the merged profile of the request thread and its tasks."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def summary(self, top: int = TOP_FUNCTIONS) -> str:
+        """Return the stage table and the hottest functions by own time."""
+        lines = [
+            _("Profile of: {}").format(self.label),
+            _("Started: {}").format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))),
+            _("Wall time: {:.3f} s, profiled threads/tasks: {}").format(self.wall_seconds, len(self._profiles)),
+            "",
+            _("Stages (seconds, peak allocation):"),
+        ]
+        for name, seconds, peak in self.stages:
+            memory = "n/a" if peak is None else f"{peak / (1024 * 1024):.1f} MB"
+            lines.append(f"  {name:<16} {seconds:9.3f} s  {memory}")
+
+        stats = self.stats()
+        if stats is not None:
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+            lines += ["", _("Hottest functions (own time, all threads):"), out.getvalue().strip()]
+        else:
+            lines += ["", _("No function statistics: another profiler was active in this process")]
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Arms profiling for the next N requests and stores the results."""
+
+    def __init__(self, directory: str):
+        """
+        Initialize the Profiler.
+
+        Args:
+            directory: Where profiles and summaries are written
+        """
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._armed = 0
+        self._tracing = 0  # profiled requests running
+        self._owns_tracing = False  # tracemalloc was started here, not by someone else
+
+    def arm(self, count: int = 1) -> int:
+        """Profile the next count requests (0 disarms); return the number armed."""
+        with self._lock:
+            self._armed = max(0, count)
+            return self._armed
+
+    @property
+    def armed(self) -> int:
+        with self._lock:
+            return self._armed
+
+    def _take(self) -> bool:
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    @contextmanager
+    def request(self, label: str) -> Iterator[Optional[RequestProfile]]:
+        """
+        Profile the enclosed request if profiling is armed.
+
+        Yields:
+            The RequestProfile, or None if this request isn't profiled
+        """
+        if not self._take():
+            yield None
+            return
+
+        profile = RequestProfile(label)
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            self._tracing += 1
+        token = _CURRENT.set(profile)
+        started = time.perf_counter()
+        profiler = _enable_profiler()
+        try:
+            yield profile
+        finally:
+            profile.wall_seconds = time.perf_counter() - started
+            _CURRENT.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                with profile._lock:
+                    profile._profiles.insert(0, profiler)
+            with self._lock:
+                self._tracing -= 1
+                if self._tracing == 0 and self._owns_tracing:
+                    tracemalloc.stop()
+                    self._owns_tracing = False
+            try:
+                name = self.save(profile)
+                logger.info(_("Profile written: {}").format(name))
+            except OSError as e:
+                logger.error(_("Failed to write profile: {}").format(str(e)))
+
+    def save(self, profile: RequestProfile) -> str:
+        """Write a profile and its summary; return the profile name."""
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', os.path.basename(profile.label)).strip('-')[:40] or 'request'
+        base = time.strftime('%Y%m%d-%H%M%S', time.localtime(profile.started)) + f"-{slug}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name, n = base, 1
+        while (self.directory / (name + SUMMARY_SUFFIX)).exists():
+            n += 1
+            name = f"{base}-{n}"
+        stats = profile.stats()
+        if stats is not None:
+            stats.dump_stats(str(self.directory / (name + PROFILE_SUFFIX)))
+        (self.directory / (name + SUMMARY_SUFFIX)).write_text(profile.summary(), encoding='utf-8')
+        return name
+
+    def list_profiles(self) -> List[str]:
+        """Return the names of stored profiles, newest first."""
+        if not self.directory.is_dir():
+            return []
+        summaries = sorted(self.directory.glob('*' + SUMMARY_SUFFIX), key=lambda p: p.stat().st_mtime,
+                           reverse=True)
+        return [p.name[:-len(SUMMARY_SUFFIX)] for p in summaries]
+
+    def read_summary(self, name: str) -> Optional[str]:
+        """Return the summary of a stored profile, or None if there is none by that name."""
+        path = self.directory / (os.path.basename(name) + SUMMARY_SUFFIX)
+        if not path.is_file():
+            return None
+        return path.read_text(encoding='utf-8')
+
+    def profile_path(self, name: str) -> Optional[str]:
+        """Return the path of a stored pstats file, or None."""
+        path = self.directory / (os.path.basename(name) + PROFILE_SUFFIX)
+        return str(path) if path.is_file() else None
+
+
+def _enable_profiler() -> Optional[cProfile.Profile]:
+    """Start a cProfile profiler, or return None if the process's only one is taken (Python 3.12+)."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        logger.warning(_("Profiling without function statistics: {}").format(str(e)))
+        return None
+    return profiler
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Return the profile of the request running in this context, if it is profiled."""
+    return _CURRENT.get()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Measure a stage of the current request if it is profiled; otherwise do nothing."""
+    profile = _CURRENT.get()
+    return profile.stage(name) if profile is not None else nullcontext()
@@ -0,0 +1,285 @@
+"""
+In-memory index of the audio resource directory.
+
+The index keeps one entry per file (normalized name, size, mtime and lazily
+computed duration and content hash) and a trigram index over the normalized
+names, so lookups and listings don't rescan and re-normalize the directory on
+every request. Freshness is maintained by cheap polling of the directory mtime
+(files added, removed or renamed) and of each file's size and mtime (files
+rewritten in place).
+"""
+import gettext
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Minimum trigram similarity for a non-substring fuzzy match
+MIN_SIMILARITY = 0.3
+
+
+def normalize_name(filename: str) -> str:
+    """
+    Normalize a filename for fuzzy matching.
+
+    Drops the extension, punctuation and whitespace and lowercases the rest.
+    Letters of any script are kept so non-Latin titles remain matchable.
+    """
+    name_only = os.path.splitext(os.path.basename(filename))[0]
+    return re.sub(r'[\W_]+', '', name_only).lower()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Return the padded character trigrams of a normalized name."""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class ResourceEntry:
+    """A single file in the resource directory"""
+    name: str
+    path: str
+    normalized: str
+    size: int
+    mtime: float
+    duration: Optional[float] = None
+    content_hash: Optional[str] = None
+
+
+class ResourceIndex:
+    """Polled, thread-safe index of a resource directory."""
+
+    def __init__(self, directory: str, poll_interval: float = 2.0,
+                 duration_probe: Optional[Callable[[str], Optional[float]]] = None):
+        """
+        Initialize the ResourceIndex.
+
+        Args:
+            directory: Directory to index
+            poll_interval: Minimum seconds between freshness checks
+            duration_probe: Callable returning a file's duration in seconds
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.duration_probe = duration_probe
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, ResourceEntry] = {}
+        self._sorted_names: List[str] = []
+        self._trigram_index: Dict[str, Set[str]] = {}
+        self._dir_mtime_ns: Optional[int] = None
+        self._last_check = 0.0
+
+    @property
+    def exists(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rescan the directory if it changed since the last scan.
+
+        The directory is checked at most once per poll interval. When its mtime
+        changed (files added, removed or renamed) it is rescanned; otherwise the
+        indexed files are re-stat'ed, so one rewritten in place drops its cached
+        duration and content hash.
+
+        Args:
+            force: Rescan regardless of the poll interval and directory mtime
+
+        Returns:
+            True if the directory was rescanned or an indexed file changed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_check < self.poll_interval:
+                return False
+            self._last_check = now
+
+            try:
+                dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                dir_mtime_ns = None
+            if not force and dir_mtime_ns == self._dir_mtime_ns:
+                return self._restat()
+
+            self._dir_mtime_ns = dir_mtime_ns
+            self._rescan()
+            return True
+
+    def _restat(self) -> bool:
+        changed = False
+        for entry in self._entries.values():
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                # Removed; the next directory mtime change drops the entry
+                continue
+            if entry.size != st.st_size or entry.mtime != st.st_mtime:
+                entry.size, entry.mtime = st.st_size, st.st_mtime
+                entry.duration = None
+                entry.content_hash = None
+                changed = True
+        return changed
+
+    def _rescan(self) -> None:
+        entries: Dict[str, ResourceEntry] = {}
+        if self.exists:
+            with os.scandir(self.directory) as it:
+                for dirent in it:
+                    if dirent.name.startswith('.') or not dirent.is_file():
+                        continue
+                    st = dirent.stat()
+                    previous = self._entries.get(dirent.name)
+                    if previous and previous.size == st.st_size and previous.mtime == st.st_mtime:
+                        # Unchanged file: keep its already-computed duration/hash
+                        entries[dirent.name] = previous
+                        continue
+                    entries[dirent.name] = ResourceEntry(
+                        name=dirent.name,
+                        path=dirent.path,
+                        normalized=normalize_name(dirent.name),
+                        size=st.st_size,
+                        mtime=st.st_mtime,
+                    )
+
+        trigram_index: Dict[str, Set[str]] = {}
+        for name, entry in entries.items():
+            for gram in trigrams(entry.normalized):
+                trigram_index.setdefault(gram, set()).add(name)
+
+        self._entries = entries
+        self._sorted_names = sorted(entries)
+        self._trigram_index = trigram_index
+        logger.debug(_("Indexed {} files in {}").format(len(entries), self.directory))
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._entries)
+
+    def names(self) -> List[str]:
+        """Return all indexed filenames in sorted order."""
+        self.refresh()
+        return list(self._sorted_names)
+
+    def get(self, name: str) -> Optional[ResourceEntry]:
+        """Return the entry for an exact filename, if indexed."""
+        self.refresh()
+        return self._entries.get(name)
+
+    def lookup(self, query: str, limit: int = 5) -> List[Tuple[ResourceEntry, float]]:
+        """
+        Rank indexed files against a (possibly partial or misspelled) filename.
+
+        Exact normalized matches rank first, then names containing the query,
+        then names contained in the query, then trigram similarity. Ties are
+        broken by filename so results are deterministic. Queries shorter than a
+        trigram share none with the middle of a name, so they are checked
+        against every name instead.
+
+        Args:
+            query: Filename or title to look for
+            limit: Maximum number of results
+
+        Returns:
+            List of (entry, score) pairs, best first
+        """
+        self.refresh()
+        target = normalize_name(query)
+        if not target:
+            return []
+
+        with self._lock:
+            query_grams = trigrams(target)
+            shared: Counter = Counter()
+            for gram in query_grams:
+                for name in self._trigram_index.get(gram, ()):
+                    shared[name] += 1
+
+            # A 1-2 character query only shares padded trigrams with names starting with it
+            candidates = self._entries if len(target) < 3 else shared
+            scored = []
+            for name in candidates:
+                common = shared[name]
+                entry = self._entries[name]
+                candidate = entry.normalized
+                similarity = common / len(query_grams | trigrams(candidate))
+                if candidate == target:
+                    score = 3.0
+                elif target in candidate:
+                    score = 2.0 + len(target) / len(candidate)
+                elif candidate and candidate in target:
+                    score = 1.0 + len(candidate) / len(target)
+                elif similarity >= MIN_SIMILARITY:
+                    score = similarity
+                else:
+                    continue
+                scored.append((entry, score))
+
+        scored.sort(key=lambda pair: (-pair[1], pair[0].name))
+        return scored[:limit]
+
+    def resolve(self, query: str) -> Optional[ResourceEntry]:
+        """Return the best-ranked file for a query, or None if nothing matches."""
+        matches = self.lookup(query, limit=1)
+        return matches[0][0] if matches else None
+
+    def list_page(self, page: int = 1, page_size: int = 50) -> Tuple[List[ResourceEntry], int]:
+        """
+        Return one page of entries in filename order.
+
+        Args:
+            page: 1-based page number
+            page_size: Entries per page
+
+        Returns:
+            Tuple of (entries on the page, total number of entries)
+        """
+        self.refresh()
+        with self._lock:
+            names = self._sorted_names
+            page_size = max(1, page_size)
+            start = (max(1, page) - 1) * page_size
+            entries = [self._entries[n] for n in names[start:start + page_size]]
+            total = len(names)
+
+        if self.duration_probe is not None:
+            for entry in entries:
+                if entry.duration is None:
+                    try:
+                        entry.duration = self.duration_probe(entry.path)
+                    except Exception as e:
+                        logger.warning(_("Could not read duration of {}: {}").format(entry.name, str(e)))
+        return entries, total
+
+    def content_hash(self, entry: ResourceEntry) -> str:
+        """
+        Return (and cache on the entry) the BLAKE2b hash of a file's bytes.
+
+        The file is re-stat'ed first, so an in-place rewrite that left the
+        directory mtime untouched still invalidates the cached hash.
+        """
+        st = os.stat(entry.path)
+        if entry.size != st.st_size or entry.mtime != st.st_mtime:
+            entry.size, entry.mtime = st.st_size, st.st_mtime
+            entry.duration = None
+            entry.content_hash = None
+        if entry.content_hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(entry.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            entry.content_hash = digest.hexdigest()
+        return entry.content_hash
@@ -0,0 +1,378 @@
+"""
+Admission control and weighted-fair scheduling of transcription work.
+
+Every analysis is admitted as a Job whose cost is the number of audio seconds
+it will transcribe. Admission enforces per-client limits (concurrent jobs,
+queued audio, audio per minute) and a global backlog limit, and rejects work
+with a ServerBusy error carrying a retry-after estimate instead of queueing
+it without bound.
+
+Chunk tasks of admitted jobs run on one shared pool of worker threads. The
+next task is chosen by start-time fair queuing across clients (each client's
+virtual time advances by cost / weight as its tasks are dispatched), so one
+client's album cannot starve everyone else. Tasks of short jobs are
+dispatched before tasks of long ones, and within a client shorter jobs go
+first.
+"""
+import gettext
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.config import Config, add_reload_listener, get_config
+from src.thread_budget import get_thread_budget
+
+if TYPE_CHECKING:
+    from src.profiling import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Retry-after estimates are clamped to this range (seconds)
+MIN_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 600.0
+
+# Weight of the newest measurement in the throughput average
+THROUGHPUT_SMOOTHING = 0.2
+
+
+class ServerBusy(RuntimeError):
+    """Raised when a job is not admitted; retry_after is a wait estimate in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(retry_after)))
+        super().__init__(_("Server busy: {}. Retry after {:.0f} s.").format(reason, self.retry_after))
+
+
+@dataclass
+class Job:
+    """An admitted analysis request"""
+    job_id: int
+    client_id: str
+    cost: float  # audio seconds
+    weight: float = 1.0
+    admitted_at: float = field(default_factory=time.monotonic)
+    remaining: float = 0.0  # admitted cost not yet completed
+    profile: Optional['RequestProfile'] = None  # runs the job's tasks when the request is profiled
+
+
+@dataclass
+class _ClientState:
+    vtime: float = 0.0
+    queue: List[Tuple[int, float, int, Any]] = field(default_factory=list)
+    active_jobs: int = 0
+    pending: float = 0.0  # audio seconds admitted but not completed
+    tokens: float = 0.0
+    tokens_at: float = field(default_factory=time.monotonic)
+
+
+class FairScheduler:
+    """Shared worker pool with per-client admission control and fair dispatch."""
+
+    def __init__(self, workers: int = 4, max_jobs_per_client: int = 2,
+                 max_client_pending_seconds: float = 1800.0,
+                 max_pending_seconds: float = 7200.0,
+                 client_audio_seconds_per_minute: float = 0.0,
+                 short_job_seconds: float = 60.0):
+        """
+        Initialize the FairScheduler.
+
+        Args:
+            workers: Worker threads executing chunk tasks
+            max_jobs_per_client: Concurrent jobs per client (0 = unlimited)
+            max_client_pending_seconds: Audio seconds a client may have admitted
+                but not finished (0 = unlimited)
+            max_pending_seconds: Audio seconds admitted across all clients (0 = unlimited)
+            client_audio_seconds_per_minute: Sustained audio seconds per client
+                per minute (0 = unlimited)
+            short_job_seconds: Jobs up to this many audio seconds are dispatched first
+        """
+        self.max_jobs_per_client = max_jobs_per_client
+        self.max_client_pending_seconds = max_client_pending_seconds
+        self.max_pending_seconds = max_pending_seconds
+        self.client_audio_seconds_per_minute = client_audio_seconds_per_minute
+        self.short_job_seconds = short_job_seconds
+
+        self._cond = threading.Condition()
+        self._clients: Dict[str, _ClientState] = {}
+        self._vtime = 0.0
+        self._pending = 0.0
+        self._job_ids = itertools.count(1)
+        self._task_seq = itertools.count()
+        self._queued_tasks = 0
+        self._throughput: Optional[float] = None  # audio seconds per second, per worker
+        self._threads: List[threading.Thread] = []
+        self._target_workers = 0
+        self.stats: Dict[str, Any] = {'admitted': 0, 'rejected': 0, 'completed_tasks': 0}
+        self.resize(workers)
+
+    # -- admission -----------------------------------------------------------
+
+    def _client(self, client_id: str) -> _ClientState:
+        state = self._clients.get(client_id)
+        if state is None:
+            state = _ClientState(vtime=self._vtime)
+            if self.client_audio_seconds_per_minute > 0:
+                state.tokens = self.client_audio_seconds_per_minute
+            self._clients[client_id] = state
+        return state
+
+    def _refill(self, state: _ClientState) -> None:
+        now = time.monotonic()
+        rate = self.client_audio_seconds_per_minute
+        if rate > 0:
+            state.tokens = min(rate, state.tokens + (now - state.tokens_at) * rate / 60.0)
+        state.tokens_at = now
+
+    def _drain_estimate(self, audio_seconds: float) -> float:
+        """Seconds for the pool to process the given amount of queued audio."""
+        per_worker = self._throughput or 1.0
+        return audio_seconds / (per_worker * max(1, self._target_workers))
+
+    def admit(self, client_id: str, cost: float, weight: float = 1.0, enforce: bool = True) -> Job:
+        """
+        Admit a job or reject it with ServerBusy.
+
+        Args:
+            client_id: Identity of the caller
+            cost: Audio seconds the job will transcribe
+            weight: Relative share of the pool for this client's tasks
+            enforce: Apply admission limits (False for trusted local callers)
+
+        Returns:
+            The admitted Job; pass it to release() (or use job()) when done
+
+        Raises:
+            ServerBusy: If a limit would be exceeded
+        """
+        cost = max(0.0, float(cost))
+        with self._cond:
+            state = self._client(client_id)
+            self._refill(state)
+            if enforce:
+                try:
+                    self._check_limits(state, cost)
+                except ServerBusy as e:
+                    self.stats['rejected'] += 1
+                    logger.info(_("Rejected job for {}: {}").format(client_id, e.reason))
+                    raise
+            state.active_jobs += 1
+            state.pending += cost
+            self._pending += cost
+            if self.client_audio_seconds_per_minute > 0:
+                state.tokens -= cost
+            self.stats['admitted'] += 1
+            return Job(next(self._job_ids), client_id, cost, weight=weight, remaining=cost)
+
+    def _check_limits(self, state: _ClientState, cost: float) -> None:
+        if self.max_jobs_per_client and state.active_jobs >= self.max_jobs_per_client:
+            raise ServerBusy(
+                _("{} analyses already running for this client").format(state.active_jobs),
+                self._drain_estimate(state.pending / max(1, state.active_jobs)),
+            )
+        # A single job over a limit is still admitted when nothing else is pending
+        if (self.max_client_pending_seconds and state.pending > 0
+                and state.pending + cost > self.max_client_pending_seconds):
+            raise ServerBusy(
+                _("too much audio queued for this client"),
+                self._drain_estimate(state.pending + cost - self.max_client_pending_seconds),
+            )
+        if (self.max_pending_seconds and self._pending > 0
+                and self._pending + cost > self.max_pending_seconds):
+            raise ServerBusy(
+                _("server queue is full"),
+                self._drain_estimate(self._pending + cost - self.max_pending_seconds),
+            )
+        if self.client_audio_seconds_per_minute > 0 and state.tokens < 0:
+            raise ServerBusy(
+                _("audio-per-minute quota exceeded"),
+                -state.tokens * 60.0 / self.client_audio_seconds_per_minute,
+            )
+
+    def release(self, job: Job) -> None:
+        """Finish a job, returning any uncompleted cost to the budget."""
+        with self._cond:
+            state = self._client(job.client_id)
+            state.active_jobs = max(0, state.active_jobs - 1)
+            state.pending = max(0.0, state.pending - job.remaining)
+            self._pending = max(0.0, self._pending - job.remaining)
+            job.remaining = 0.0
+            self._refill(state)
+            if state.active_jobs == 0 and not state.queue and state.pending == 0:
+                # Forget idle clients, except for their rate-limit debt
+                if self.client_audio_seconds_per_minute <= 0 or state.tokens >= self.client_audio_seconds_per_minute:
+                    del self._clients[job.client_id]
+
+    @contextmanager
+    def job(self, client_id: str, cost: float, weight: float = 1.0,
+            enforce: bool = True) -> Iterator[Job]:
+        """Context manager around admit() and release()."""
+        admitted = self.admit(client_id, cost, weight=weight, enforce=enforce)
+        try:
+            yield admitted
+        finally:
+            self.release(admitted)
+
+    # -- dispatch ------------------------------------------------------------
+
+    def submit(self, job: Job, fn: Callable[..., Any], *args: Any,
+               cost: Optional[float] = None, **kwargs: Any) -> Future:
+        """
+        Queue a task of an admitted job.
+
+        Args:
+            job: Job the task belongs to
+            fn: Callable run on a worker thread
+            cost: Audio seconds the task covers (default: the job's cost)
+
+        Returns:
+            Future with the task's result
+        """
+        future: Future = Future()
+        cost = job.cost if cost is None else max(0.0, float(cost))
+        priority = 0 if job.cost <= self.short_job_seconds else 1
+        with self._cond:
+            state = self._client(job.client_id)
+            if not state.queue:
+                # A client returning from idle doesn't get credit for the idle time
+                state.vtime = max(state.vtime, self._vtime)
+            # Within a client: short-job class first, then shorter jobs, then FIFO
+            state.queue.append((priority, job.cost, next(self._task_seq), (job, fn, args, kwargs, cost, future)))
+            state.queue.sort(key=lambda entry: entry[:3])
+            self._queued_tasks += 1
+            self._cond.notify()
+        return future
+
+    def run(self, job: Job, fn: Callable[..., Any], *args: Any,
+            cost: Optional[float] = None, **kwargs: Any) -> Any:
+        """Run a task through the scheduler and wait for its result."""
+        return self.submit(job, fn, *args, cost=cost, **kwargs).result()
+
+    def _next_task(self) -> Optional[Tuple[Any, ...]]:
+        """Pick the next task: short-job class first, then the client furthest behind."""
+        best_key, best_client = None, None
+        for client_id, state in self._clients.items():
+            if not state.queue:
+                continue
+            key = (state.queue[0][0], state.vtime, client_id)
+            if best_key is None or key < best_key:
+                best_key, best_client = key, client_id
+        if best_client is None:
+            return None
+        state = self._clients[best_client]
+        ___, ___, ___, task = state.queue.pop(0)
+        job, cost = task[0], task[4]
+        self._vtime = max(self._vtime, state.vtime)
+        state.vtime += cost / max(job.weight, 1e-6)
+        self._queued_tasks -= 1
+        return task
+
+    def _worker(self) -> None:
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                while True:
+                    if me not in self._threads[:self._target_workers]:
+                        self._threads.remove(me)
+                        return
+                    task = self._next_task()
+                    if task is not None:
+                        break
+                    self._cond.wait()
+
+            job, fn, args, kwargs, cost, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            try:
+                if job.profile is not None:
+                    future.set_result(job.profile.run(fn, *args, **kwargs))
+                else:
+                    future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            elapsed = time.monotonic() - started
+
+            with self._cond:
+                done = min(cost, job.remaining)
+                job.remaining -= done
+                state = self._clients.get(job.client_id)
+                if state is not None:
+                    state.pending = max(0.0, state.pending - done)
+                self._pending = max(0.0, self._pending - done)
+                self.stats['completed_tasks'] += 1
+                if cost > 0 and elapsed > 0:
+                    rate = cost / elapsed
+                    self._throughput = rate if self._throughput is None else (
+                        THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * self._throughput
+                    )
+
+    def resize(self, workers: int) -> None:
+        """Change the number of worker threads; surplus workers exit after their current task."""
+        workers = max(1, workers)
+        with self._cond:
+            self._target_workers = workers
+            while len(self._threads) < workers:
+                thread = threading.Thread(target=self._worker, name=f"scheduler-worker-{len(self._threads)}",
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Return queue depth, backlog and per-client load."""
+        with self._cond:
+            return {
+                **self.stats,
+                'workers': self._target_workers,
+                'queued_tasks': self._queued_tasks,
+                'pending_audio_seconds': round(self._pending, 1),
+                'throughput_per_worker': None if self._throughput is None else round(self._throughput, 2),
+                'clients': {
+                    client_id: {'active_jobs': s.active_jobs, 'queued_tasks': len(s.queue),
+                                'pending_audio_seconds': round(s.pending, 1)}
+                    for client_id, s in self._clients.items()
+                },
+            }
+
+    def configure(self, config: Config) -> None:
+        """Apply limits and the thread budget's worker count from a (reloaded) configuration."""
+        admission = config.admission
+        with self._cond:
+            self.max_jobs_per_client = admission.max_jobs_per_client
+            self.max_client_pending_seconds = admission.max_client_pending_seconds
+            self.max_pending_seconds = admission.max_pending_seconds
+            self.client_audio_seconds_per_minute = admission.client_audio_seconds_per_minute
+            self.short_job_seconds = admission.short_job_seconds
+        self.resize(get_thread_budget(config).workers)
+
+
+# Process-wide scheduler, created on first use
+_SCHEDULER: Optional[FairScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """Return the process-wide FairScheduler, creating it from the configuration."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                config = get_config()
+                scheduler = FairScheduler(workers=get_thread_budget(config).workers)
+                scheduler.configure(config)
+                add_reload_listener(scheduler.configure)
+                _SCHEDULER = scheduler
+    return _SCHEDULER
@@ -0,0 +1,145 @@
+"""
+Optional source separation ahead of transcription.
+
+One STFT of the audio is split by median-filtering HPSS into harmonic and
+percussive parts. The percussive part (strum attacks, slaps, body knocks) is
+dropped, since the model tends to read it as short spurious notes. The
+harmonic part is optionally split at a crossover frequency into a bass stem
+and a melody stem, which are transcribed separately so every note carries
+the stem it came from. All stems are masks of the same STFT, so the
+separation costs one STFT, one HPSS and one inverse STFT per stem.
+
+The model relies on harmonics, so the bass stem keeps the first few
+partials of notes below the crossover rather than only their fundamentals.
+The melody stem keeps everything above the crossover; without the bass
+fundamentals it finds melody notes more reliably, and the bass overtones it
+still contains are removed after transcription (see merge_stems()).
+"""
+import gettext
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import librosa
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Stem names, stored as the 'source' of transcribed notes
+BASS = 'bass'
+MELODY = 'melody'
+HARMONIC = 'harmonic'
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Median filter length in frames and bins (librosa's default of 31 costs twice as much)
+HPSS_KERNEL_SIZE = 17
+
+# HPSS is applied below this frequency; higher bins pass through unchanged
+HPSS_MAX_HZ = 4000.0
+
+# Semitones a note may lie outside its stem's band and still be kept
+BAND_TOLERANCE = 1
+
+# The bass stem extends to this multiple of the crossover frequency
+BASS_PARTIALS = 3
+
+# Intervals (semitones) of the 2nd to 6th harmonics above a fundamental
+OVERTONE_INTERVALS = (12, 19, 24, 28, 31)
+
+# A melody note this close (seconds) to a bass note's onset at an overtone
+# interval is that bass note's overtone
+OVERTONE_ONSET_SECONDS = 0.06
+
+
+def stem_names(split_bands: bool) -> List[str]:
+    """Return the stems separate() produces."""
+    return [BASS, MELODY] if split_bands else [HARMONIC]
+
+
+def separate(audio: np.ndarray, sr: int, split_bands: bool = True, crossover_hz: float = 150.0,
+             margin: float = 1.0, stft: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Split mono audio into harmonic stems, dropping the percussive part.
+
+    Args:
+        audio: Mono samples
+        sr: Sample rate of audio
+        split_bands: Split the harmonic part into bass and melody stems
+        crossover_hz: Boundary between the bass and melody bands
+        margin: HPSS margin; above 1 leaves ambiguous energy out of both parts
+        stft: STFT of audio (N_FFT, HOP_LENGTH) if already computed
+
+    Returns:
+        Stem name -> samples, each as long as audio
+    """
+    if stft is None:
+        stft = librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    top = int(np.searchsorted(freqs, HPSS_MAX_HZ))
+    harmonic_mask, ___ = librosa.decompose.hpss(np.abs(stft[:top]), kernel_size=HPSS_KERNEL_SIZE,
+                                                margin=margin, mask=True)
+    harmonic = stft.copy()
+    harmonic[:top] *= harmonic_mask
+    if not split_bands:
+        return {HARMONIC: librosa.istft(harmonic, hop_length=HOP_LENGTH, length=len(audio))}
+
+    bass_band = (freqs < crossover_hz * BASS_PARTIALS)[:, np.newaxis]
+    melody_band = (freqs >= crossover_hz)[:, np.newaxis]
+    return {
+        BASS: librosa.istft(harmonic * bass_band, hop_length=HOP_LENGTH, length=len(audio)),
+        MELODY: librosa.istft(harmonic * melody_band, hop_length=HOP_LENGTH, length=len(audio)),
+    }
+
+
+def in_band(stem: str, midi_pitch: int, crossover_hz: float) -> bool:
+    """Return whether a note transcribed from a stem lies in that stem's band."""
+    crossover = librosa.hz_to_midi(crossover_hz)
+    if stem == BASS:
+        return midi_pitch <= crossover + BAND_TOLERANCE
+    if stem == MELODY:
+        return midi_pitch >= crossover - BAND_TOLERANCE
+    return True
+
+
+def merge_stems(stem_notes: Dict[str, List[Dict[str, Any]]],
+                crossover_hz: float = 150.0) -> List[Dict[str, Any]]:
+    """
+    Combine the notes transcribed from each stem.
+
+    Notes outside their stem's band are dropped, as are melody notes at an
+    overtone interval above a bass note starting at the same time. The rest
+    are returned as new dictionaries with the stem name as 'source'.
+
+    Args:
+        stem_notes: Stem name -> notes transcribed from that stem
+        crossover_hz: Crossover used by separate()
+
+    Returns:
+        Notes of all stems, sorted by onset
+    """
+    kept = {
+        stem: [n for n in notes if in_band(stem, n['pitch'], crossover_hz)]
+        for stem, notes in stem_notes.items()
+    }
+    bass_notes = kept.get(BASS, [])
+    if bass_notes and MELODY in kept:
+        bass_onsets = np.array([n['start'] for n in bass_notes])
+        bass_pitches = np.array([n['pitch'] for n in bass_notes])
+        intervals = np.array(OVERTONE_INTERVALS)
+
+        def is_overtone(note: Dict[str, Any]) -> bool:
+            near = np.abs(bass_onsets - note['start']) <= OVERTONE_ONSET_SECONDS
+            return bool(np.isin(note['pitch'] - bass_pitches[near], intervals).any())
+
+        kept[MELODY] = [n for n in kept[MELODY] if not is_overtone(n)]
+
+    merged = [dict(n, source=stem) for stem, notes in kept.items() for n in notes]
+    merged.sort(key=lambda n: (n['start'], n['pitch']))
+    return merged
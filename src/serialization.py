@@ -0,0 +1,163 @@
+"""
+Compact binary serialization of analysis arrays.
+
+A bundle is a small header followed by raw little-endian column arrays:
+
+    magic (4 bytes) | format version (uint16) | reserved (uint16) |
+    header length (uint32) | header JSON | padding | column data
+
+The JSON header carries the metadata (BPM, tempo map, model version, ...) and
+each column's name, dtype, shape and offset. Columns start on 64-byte
+boundaries, so a bundle read from disk is memory-mapped and every column is
+a read-only NumPy view into the mapping, with nothing copied or parsed
+beyond the header.
+"""
+import functools
+import gettext
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+MAGIC = b'FTNB'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, format version, reserved, header length
+_PREAMBLE = struct.Struct('<4sHHI')
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+@functools.lru_cache(maxsize=1)
+def model_version() -> str:
+    """Return the version of the transcription model that produced the notes."""
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return f"basic-pitch {version('basic-pitch')}"
+    except PackageNotFoundError:
+        return "basic-pitch unknown"
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def pack(arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> bytes:
+    """
+    Serialize named arrays and JSON-compatible metadata into one bundle.
+
+    Args:
+        arrays: Column name -> array (numeric dtypes only)
+        meta: Metadata stored in the header
+
+    Returns:
+        Bundle bytes
+    """
+    columns = []
+    offset = 0
+    prepared = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise ValueError(_("Cannot serialize object array: {}").format(name))
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        columns.append({
+            'name': name,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+        })
+        prepared.append((offset, array))
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({'meta': meta, 'columns': columns}, separators=(',', ':')).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    out = bytearray(data_start + offset)
+    _PREAMBLE.pack_into(out, 0, MAGIC, FORMAT_VERSION, 0, len(header))
+    out[_PREAMBLE.size:_PREAMBLE.size + len(header)] = header
+    for column_offset, array in prepared:
+        start = data_start + column_offset
+        out[start:start + array.nbytes] = array.tobytes()
+    return bytes(out)
+
+
+def unpack(buffer: Buffer) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Read a bundle without copying its column data.
+
+    Args:
+        buffer: Bundle bytes or a memory map of a bundle file
+
+    Returns:
+        Tuple of (metadata, column name -> read-only array view)
+
+    Raises:
+        ValueError: If the buffer is not a bundle or has an unsupported version
+    """
+    if len(buffer) < _PREAMBLE.size:
+        raise ValueError(_("Truncated note bundle"))
+    magic, fmt_version, ___, header_len = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(_("Not a note bundle"))
+    if fmt_version > FORMAT_VERSION:
+        raise ValueError(_("Unsupported note bundle version: {}").format(fmt_version))
+
+    header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_len]).decode('utf-8'))
+    data_start = _align(_PREAMBLE.size + header_len)
+
+    arrays = {}
+    for column in header['columns']:
+        dtype = np.dtype(column['dtype'])
+        shape = tuple(column['shape'])
+        count = int(np.prod(shape, dtype=np.int64))
+        start = data_start + column['offset']
+        if start + count * dtype.itemsize > len(buffer):
+            raise ValueError(_("Truncated note bundle"))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=start).reshape(shape)
+        array.flags.writeable = False
+        arrays[column['name']] = array
+    return header['meta'], arrays
+
+
+def write(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+    """Write a bundle file atomically."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pack(arrays, meta))
+    os.replace(tmp_path, path)
+
+
+def read(path: str, use_mmap: bool = True) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Open a bundle file.
+
+    With use_mmap the file is mapped and the returned arrays are views into
+    the mapping; pages are read from disk (or the page cache) on first access.
+
+    Args:
+        path: Bundle file
+        use_mmap: Map the file instead of reading it into memory
+
+    Returns:
+        Tuple of (metadata, column name -> read-only array)
+    """
+    with open(path, 'rb') as f:
+        if not use_mmap:
+            return unpack(f.read())
+        # The arrays keep the mapping alive after the file is closed
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return unpack(mapped)
+
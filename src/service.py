@@ -0,0 +1,586 @@
+"""
+Analysis service: the state and blocking bodies behind the MCP tools.
+
+The service owns the model (through the transcriber), the result caches,
+the analyzed-piece store, the resource index and the request profiler. It
+runs either inside an MCP server process or in the shared analysis daemon
+(see src.daemon), which serves it to every MCP server of its user; each
+function takes and returns plain values so it can be called over the
+daemon's socket as well as in-process.
+"""
+import gettext
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+from src.analysis import AnalyzedPiece, OverrideStore, PieceStore, result_settings
+from src.analysis_profiles import PREVIEW, get_analysis_profile
+from src.audio_probe import get_audio_duration
+from src.chord_engine import chroma_for_chords
+from src.config import ConfigWatcher, add_reload_listener, get_config
+from src.exporters import EXPORT_FORMATS
+from src.features import get_feature_store
+from src.fingerprint import FingerprintIndex
+from src.profiling import Profiler, current_profile, stage
+from src.resource_index import ResourceIndex
+from src.scheduler import ServerBusy, get_scheduler
+from src.tab_generator import create_tab
+from src.thread_budget import get_thread_budget
+from src.transcriber import LOCAL_CLIENT, estimate_cost, get_model_manager, get_worker_pool, transcribe_audio
+from src.warmup import Warmup
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Result cache to avoid re-processing identical files (LRU, performance.tab_cache_size)
+_TAB_CACHE = OrderedDict()
+_TAB_CACHE_LOCK = threading.Lock()
+
+# Resolved file and, for whole-song results, profile name of each cached result,
+# so fingering overrides can patch or drop the results of the file they change
+_TAB_SOURCES = {}
+
+# Background refinements of progressive requests, by tab cache key; each
+# future resolves to the refined result that replaces the cached preview
+_REFINING = {}
+
+# Index of the local 'resource/' folder, refreshed by polling its mtime
+RESOURCE_DIR = os.path.join(REPO_DIR, 'resource')
+_RESOURCE_INDEX = ResourceIndex(RESOURCE_DIR, duration_probe=get_audio_duration)
+
+# Whole-song analyses (notes, chords, fingering) reused for range rendering,
+# and for re-encoded copies of the same song found by fingerprint
+_PIECE_STORE = PieceStore(max_in_memory=get_config().performance.piece_cache_size,
+                          fingerprints=FingerprintIndex())
+
+# Fingering overrides set with tweak_tab_fingering, per audio file. Pieces are shared by
+# every client of this process, and so are their overrides: all clients are the same user
+# (the daemon refuses other users), and a tweak made in one session applies to all of them
+_OVERRIDES = OverrideStore()
+
+# Background warm-up of this process (see warm_up)
+_WARMUP = Warmup()
+
+# Profiles of requests flagged with profile_next_requests
+PROFILE_DIR = os.path.join(REPO_DIR, 'profiles')
+_PROFILER = Profiler(PROFILE_DIR)
+
+_STARTED = False
+_START_LOCK = threading.Lock()
+
+
+def _apply_config(config):
+    """Apply reloaded cache limits; running requests keep the settings they started with."""
+    _PIECE_STORE.max_in_memory = config.performance.piece_cache_size
+    with _TAB_CACHE_LOCK:
+        while len(_TAB_CACHE) > config.performance.tab_cache_size:
+            _TAB_SOURCES.pop(_TAB_CACHE.popitem(last=False)[0], None)
+
+
+def start() -> None:
+    """
+    Prepare the service in this process (once): warm the model if configured,
+    apply configuration reloads and watch config.yaml for changes.
+    """
+    global _STARTED
+    with _START_LOCK:
+        if _STARTED:
+            return
+        _STARTED = True
+
+    # Size worker pools and runtime/BLAS thread counts to the CPUs before any of them start
+    get_thread_budget()
+
+    # Warm the model in the background so the first request doesn't pay for loading
+    # (with worker processes: start their template, which preloads on its own)
+    if get_config().inference.preload:
+        if get_config().performance.worker_processes > 0:
+            get_worker_pool().start()
+        else:
+            get_model_manager().preload()
+
+    add_reload_listener(_apply_config)
+
+    # Reload config.yaml when it changes, without restarting the server
+    if get_config().performance.config_poll_seconds > 0:
+        ConfigWatcher(get_config().performance.config_poll_seconds).start()
+
+
+def _resolve_audio_path(file_path: str):
+    """
+    Resolve a user-supplied path or (fuzzy) filename to an existing file.
+
+    Returns:
+        Tuple of (full_path, None) on success or (None, error message)
+    """
+    full_path = os.path.abspath(os.path.expanduser(file_path))
+
+    # 1. Ranked fuzzy matching against the resource index
+    if not os.path.exists(full_path):
+        logger.debug(f"Path {full_path} not found. Fuzzy matching in {RESOURCE_DIR}")
+        match = _RESOURCE_INDEX.resolve(os.path.basename(full_path))
+        if match is not None:
+            logger.debug(f"Fuzzy match: {match.name}")
+            full_path = match.path
+
+    # 2. Final check with explicit failure message
+    if not os.path.exists(full_path):
+        files = _RESOURCE_INDEX.names()
+        err_msg = (
+            "CRITICAL ERROR: TAB GENERATION FAILED. NO FILE FOUND.\n"
+            f"Expected: {full_path}\n"
+            f"Available in resource/: {', '.join(files)}\n"
+            "INSTRUCTION TO AI: Do NOT hallucinate a tab. Tell the user the file is missing in the 로컬 'resource' folder."
+        )
+        return None, err_msg
+    return full_path, None
+
+
+def _get_piece(full_path: str, client_id: str = LOCAL_CLIENT, profile=None) -> AnalyzedPiece:
+    """
+    Return the analyzed piece for a file with its fingering overrides applied,
+    transcribing the whole song on first use (unless another recording of it
+    was analyzed).
+
+    Args:
+        full_path: Resolved audio file
+        client_id: Client the transcription is admitted for
+        profile: Analysis profile (default: analysis.default_profile)
+
+    Raises:
+        ServerBusy: If the transcription is not admitted for this client
+    """
+    profile = profile or get_analysis_profile()
+    key = PieceStore.key_for(full_path, profile=profile)
+    piece = _PIECE_STORE.get(key)
+    if piece is None:
+        # Another recording of the same song may have been analyzed already
+        with stage('fingerprint'):
+            piece = _PIECE_STORE.find_recording(full_path, profile=profile)
+        if piece is None:
+            with get_scheduler().job(client_id, estimate_cost(full_path, profile=profile)) as job:
+                job.profile = current_profile()
+                piece = AnalyzedPiece.from_audio(full_path, profile, job)
+        piece.apply_overrides(_OVERRIDES.get(full_path))
+        _PIECE_STORE.put(key, piece)
+    else:
+        _sync_overrides(key, piece, full_path)
+    return piece
+
+
+def _sync_overrides(key: str, piece: AnalyzedPiece, full_path: str):
+    """Apply a file's current overrides to a stored piece; return the measures refingered."""
+    overrides = _OVERRIDES.get(full_path)
+    if piece.overrides == overrides:
+        return []
+    measures = piece.apply_overrides(overrides)
+    _PIECE_STORE.put(key, piece)
+    return measures
+
+
+def _analyze_to_tab(client_id: str, full_path: str, duration_seconds: float, start_seconds: float,
+                    profile) -> str:
+    """Transcribe and render a resolved file, with stages measured if the request is profiled."""
+    if not start_seconds and duration_seconds is None:
+        # Whole song: keep the analysis so later range requests are cheap
+        piece = _get_piece(full_path, client_id, profile)
+        with stage('render'):
+            return piece.render_measures()
+
+    cost = estimate_cost(full_path, duration_seconds, start_seconds, profile)
+    with get_scheduler().job(client_id, cost) as job:
+        job.profile = current_profile()
+        # Step 1: Transcribe audio to note data
+        with stage('transcribe'):
+            notes, detected_bpm = transcribe_audio(full_path, duration=duration_seconds,
+                                                   start_offset=start_seconds, job=job, profile=profile)
+
+        # Step 2: Convert notes to tablature
+        with stage('chroma'):
+            chroma = chroma_for_chords(full_path, start_seconds or 0.0, duration_seconds,
+                                       engine=profile.chord_engine)
+            tempo_map = None
+            if profile.tempo == 'map':
+                tempo_map = get_feature_store().segment(full_path, start_seconds or 0.0,
+                                                        duration_seconds).tempo_map
+        with stage('render'):
+            # Measure-scoped overrides are numbered in the whole song, not in this window
+            overrides = [o for o in _OVERRIDES.get(full_path) if o.start_measure is None and o.end_measure is None]
+            return create_tab(notes, bpm=detected_bpm, chroma=chroma, chroma_offset=start_seconds or 0.0,
+                              fingering=profile.fingering, overrides=overrides, tempo_map=tempo_map)
+
+
+def _tab_cache_key(file_path: str, start_seconds: float, duration_seconds: float, profile) -> str:
+    # Results computed with settings since reloaded are never served again
+    settings = hashlib.blake2b(result_settings(profile).encode('utf-8'), digest_size=8).hexdigest()
+    return f"{file_path}_{start_seconds}_{duration_seconds}_{profile.name}_{settings}"
+
+
+def _cached_tab(cache_key: str):
+    """Return a cached result (marking it recently used), or None."""
+    with _TAB_CACHE_LOCK:
+        if cache_key in _TAB_CACHE:
+            _TAB_CACHE.move_to_end(cache_key)
+            return _TAB_CACHE[cache_key]
+    return None
+
+
+def _cache_tab(cache_key: str, result: str, source=None) -> None:
+    """Cache a result; source is (resolved file, profile name of a whole-song result or None)."""
+    with _TAB_CACHE_LOCK:
+        _TAB_CACHE[cache_key] = result
+        _TAB_CACHE.move_to_end(cache_key)
+        if source is not None:
+            _TAB_SOURCES[cache_key] = source
+        while len(_TAB_CACHE) > get_config().performance.tab_cache_size:
+            _TAB_SOURCES.pop(_TAB_CACHE.popitem(last=False)[0], None)
+
+
+def _tab_source(full_path: str, duration_seconds: float, start_seconds: float, profile):
+    whole_song = not start_seconds and duration_seconds is None
+    return full_path, profile.name if whole_song else None
+
+
+def _run_analysis(client_id: str, full_path: str, duration_seconds: float, start_seconds: float,
+                  profile) -> str:
+    """Analyze a resolved file with a profile (profiled if armed) and format the result."""
+    logger.debug(f"Processing {full_path} (profile {profile.name})...")
+    label = f"{full_path} (start {start_seconds}s, duration {duration_seconds}s, profile {profile.name})"
+    with _PROFILER.request(label):
+        tab = _analyze_to_tab(client_id, full_path, duration_seconds, start_seconds, profile)
+    logger.debug("Processing complete")
+    return _("Analysis Successful (Start: {}s, Duration: {}s) - Path: {}:\n\n{}").format(start_seconds, duration_seconds, full_path, tab)
+
+
+def _refine(cache_key: str, future: Future, client_id: str, full_path: str,
+            duration_seconds: float, start_seconds: float, profile) -> None:
+    """Background body of a progressive request: replace the cached preview with the refined result."""
+    try:
+        result = _run_analysis(client_id, full_path, duration_seconds, start_seconds, profile)
+    except BaseException as e:
+        logger.error(_("Refinement failed, dropping the preview: {}").format(str(e)))
+        with _TAB_CACHE_LOCK:
+            _TAB_CACHE.pop(cache_key, None)
+            _TAB_SOURCES.pop(cache_key, None)
+            _REFINING.pop(cache_key, None)
+        future.set_exception(e)
+        return
+    with _TAB_CACHE_LOCK:
+        _REFINING.pop(cache_key, None)
+    _cache_tab(cache_key, result, _tab_source(full_path, duration_seconds, start_seconds, profile))
+    future.set_result(result)
+
+
+def _progressive(client_id: str, file_path: str, full_path: str, duration_seconds: float,
+                 start_seconds: float, profile) -> str:
+    """Return a preview now and refine it to the requested profile in the background."""
+    preview_key = _tab_cache_key(file_path, start_seconds, duration_seconds, PREVIEW)
+    preview = _cached_tab(preview_key)
+    if preview is None:
+        preview = _run_analysis(client_id, full_path, duration_seconds, start_seconds, PREVIEW)
+        _cache_tab(preview_key, preview, _tab_source(full_path, duration_seconds, start_seconds, PREVIEW))
+    provisional = preview + "\n\n" + _(
+        "(Preview. A '{}' analysis is running in the background; call again with the same "
+        "arguments to get it once it is done.)").format(profile.name)
+
+    cache_key = _tab_cache_key(file_path, start_seconds, duration_seconds, profile)
+    future = Future()
+    with _TAB_CACHE_LOCK:
+        if cache_key in _REFINING or cache_key in _TAB_CACHE:
+            return _TAB_CACHE.get(cache_key, provisional)
+        # Registered together, so other requests never see a preview without its refinement
+        _REFINING[cache_key] = future
+        _TAB_CACHE[cache_key] = provisional
+    threading.Thread(target=_refine, name="refine", daemon=True,
+                     args=(cache_key, future, client_id, full_path, duration_seconds,
+                           start_seconds, profile)).start()
+    return provisional
+
+
+def analyze_audio_to_tab(client_id: Optional[str], file_path: str, duration_seconds: float = None,
+                         start_seconds: float = 0.0, profile: str = None, progressive: bool = False) -> str:
+    """Body of the analyze_audio_to_tab tool (see mcp_server)."""
+    client_id = client_id or LOCAL_CLIENT
+    try:
+        analysis_profile = get_analysis_profile(profile)
+    except ValueError as e:
+        return _("Error: {}").format(str(e))
+    cache_key = _tab_cache_key(file_path, start_seconds, duration_seconds, analysis_profile)
+    with _TAB_CACHE_LOCK:
+        refinement = _REFINING.get(cache_key)
+    try:
+        if refinement is not None and not progressive:
+            # The cached result is a preview being refined; wait for the refined one
+            return refinement.result()
+        cached = _cached_tab(cache_key)
+        if cached is not None:
+            logger.info(f"Returning cached result for: {file_path}")
+            return cached
+
+        logger.debug(f"Tool called for: {file_path} (start {start_seconds}s, duration {duration_seconds}s, "
+                     f"profile {analysis_profile.name})")
+
+        full_path, err_msg = _resolve_audio_path(file_path)
+        if err_msg:
+            return err_msg
+
+        if progressive and analysis_profile != PREVIEW:
+            return _progressive(client_id, file_path, full_path, duration_seconds, start_seconds,
+                                analysis_profile)
+        result = _run_analysis(client_id, full_path, duration_seconds, start_seconds, analysis_profile)
+        _cache_tab(cache_key, result, _tab_source(full_path, duration_seconds, start_seconds, analysis_profile))
+        return result
+    except ServerBusy as e:
+        return str(e)
+    except Exception as e:
+        logger.error(_("Error during analysis: {}").format(str(e)))
+        return _("Error occurred during processing (Check server logs for details): {}").format(str(e))
+
+
+def list_available_audio_files(page: int = 1, page_size: int = 50) -> str:
+    """Body of the list_available_audio_files tool."""
+    if not _RESOURCE_INDEX.exists:
+        return _("The 'resource/' folder does not exist.")
+
+    entries, total = _RESOURCE_INDEX.list_page(page, page_size)
+    if total == 0:
+        return _("The 'resource/' folder is empty.")
+    if not entries:
+        return _("Page {} is empty ({} files in total).").format(page, total)
+
+    def describe(entry):
+        details = [f"{entry.size / (1024 * 1024):.1f} MB"]
+        if entry.duration is not None:
+            details.insert(0, f"{int(entry.duration // 60)}:{int(entry.duration % 60):02d}")
+        return f"{entry.name} ({', '.join(details)})"
+
+    pages = (total + max(1, page_size) - 1) // max(1, page_size)
+    return _("Available files in 'resource/' (page {}/{}, {} files):\n- {}").format(
+        page, pages, total, "\n- ".join(describe(e) for e in entries)
+    )
+
+
+def render_tab_measures(client_id: Optional[str], file_path: str, start_measure: int = 1,
+                        end_measure: int = None) -> str:
+    """Body of the render_tab_measures tool."""
+    full_path, err_msg = _resolve_audio_path(file_path)
+    if err_msg:
+        return err_msg
+    try:
+        piece = _get_piece(full_path, client_id or LOCAL_CLIENT)
+        last = piece.num_measures if end_measure is None else min(end_measure, piece.num_measures)
+        tab = piece.render_measures(start_measure - 1, last)
+        return _("Measures {}-{} of {} - Path: {}:\n\n{}").format(
+            start_measure, last, piece.num_measures, full_path, tab
+        )
+    except ServerBusy as e:
+        return str(e)
+    except Exception as e:
+        logger.error(_("Error during analysis: {}").format(str(e)))
+        return _("Error occurred during processing (Check server logs for details): {}").format(str(e))
+
+
+def render_tab_time_range(client_id: Optional[str], file_path: str, start_seconds: float,
+                          end_seconds: float) -> str:
+    """Body of the render_tab_time_range tool."""
+    full_path, err_msg = _resolve_audio_path(file_path)
+    if err_msg:
+        return err_msg
+    try:
+        piece = _get_piece(full_path, client_id or LOCAL_CLIENT)
+        first = piece.measure_at(start_seconds) + 1
+        last = min(piece.measure_at(max(start_seconds, end_seconds - 1e-9)) + 1, piece.num_measures)
+        tab = piece.render_time_range(start_seconds, end_seconds)
+        return _("Measures {}-{} of {} ({}s-{}s) - Path: {}:\n\n{}").format(
+            first, last, piece.num_measures, start_seconds, end_seconds, full_path, tab
+        )
+    except ServerBusy as e:
+        return str(e)
+    except Exception as e:
+        logger.error(_("Error during analysis: {}").format(str(e)))
+        return _("Error occurred during processing (Check server logs for details): {}").format(str(e))
+
+
+def _patch_cached_tabs(full_path: str, piece: AnalyzedPiece, profile) -> None:
+    """
+    Bring cached results of a file up to date with its overrides.
+
+    Whole-song results of the piece's profile get the piece's tab, in which
+    only lines with refingered measures are rendered again; other results of
+    the file are dropped and recomputed on request.
+    """
+    with _TAB_CACHE_LOCK:
+        keys = [key for key, (path, ___) in _TAB_SOURCES.items() if path == full_path]
+    for key in keys:
+        with _TAB_CACHE_LOCK:
+            if _TAB_SOURCES.get(key, (None, None))[1] != profile.name or key in _REFINING:
+                _TAB_CACHE.pop(key, None)
+                _TAB_SOURCES.pop(key, None)
+                continue
+            cached = _TAB_CACHE.get(key)
+        if cached is not None:
+            title = cached.split("\n\n", 1)[0]
+            with _TAB_CACHE_LOCK:
+                if key in _TAB_CACHE:
+                    _TAB_CACHE[key] = title + "\n\n" + piece.render_measures()
+
+
+def tweak_tab_fingering(client_id: Optional[str], file_path: str, note_pitch: int, preferred_string: int,
+                        start_measure: int = None, end_measure: int = None) -> str:
+    """Body of the tweak_tab_fingering tool."""
+    if not 0 <= note_pitch <= 127:
+        return _("Invalid pitch. Please enter a MIDI pitch between 0 and 127.")
+    if not 0 <= preferred_string <= 6:
+        return _("Invalid string number. Please enter a value between 1 and 6 (0 removes the override).")
+    if start_measure is not None and end_measure is not None and end_measure < start_measure:
+        return _("Invalid measure range: {}-{}.").format(start_measure, end_measure)
+    full_path, err_msg = _resolve_audio_path(file_path)
+    if err_msg:
+        return err_msg
+    try:
+        profile = get_analysis_profile()
+        piece = _get_piece(full_path, client_id or LOCAL_CLIENT, profile)
+        num_strings = len(piece.tuning)
+        if preferred_string > num_strings:
+            return _("Invalid string number. Please enter a value between 1 and {} (0 removes the override).").format(num_strings)
+        _OVERRIDES.set(full_path, note_pitch,
+                       num_strings - preferred_string if preferred_string else None,
+                       None if start_measure is None else max(0, start_measure - 1), end_measure)
+        measures = _sync_overrides(PieceStore.key_for(full_path, profile=profile), piece, full_path)
+        _patch_cached_tabs(full_path, piece, profile)
+
+        scope = _("measures {}-{}").format(start_measure or 1, end_measure or piece.num_measures) \
+            if start_measure is not None or end_measure is not None else _("the whole piece")
+        if preferred_string:
+            summary = _("Pitch {} is now played on string {} in {}.").format(note_pitch, preferred_string, scope)
+        else:
+            summary = _("Removed the string override of pitch {} in {}.").format(note_pitch, scope)
+        if not measures:
+            return summary + " " + _("No notes changed.")
+        runs = []
+        for m in measures:
+            if runs and runs[-1][1] == m:
+                runs[-1][1] = m + 1
+            else:
+                runs.append([m, m + 1])
+        tabs = [_("Measures {}-{}:").format(first + 1, end) + "\n" + piece.render_measures(first, end)
+                for first, end in runs]
+        return summary + " " + _("Refingered measures: {}").format(
+            ", ".join(str(m + 1) for m in measures)) + "\n\n" + "\n".join(tabs)
+    except ServerBusy as e:
+        return str(e)
+    except Exception as e:
+        logger.error(_("Error during analysis: {}").format(str(e)))
+        return _("Error occurred during processing (Check server logs for details): {}").format(str(e))
+
+
+def export_tab(client_id: Optional[str], file_path: str, format: str = "musicxml") -> Dict[str, Any]:
+    """
+    Body of the export_tab tool, up to writing the file.
+
+    The caller writes the file, so exports land with the requesting user's
+    permissions even when the service runs in the shared daemon.
+
+    Returns:
+        {'name': file name, 'data': bytes} or {'error': message}
+    """
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        return {'error': _("Error: Unsupported export format: {}. Supported formats: {}").format(
+            format, ', '.join(EXPORT_FORMATS)
+        )}
+    full_path, err_msg = _resolve_audio_path(file_path)
+    if err_msg:
+        return {'error': err_msg}
+    try:
+        data = _get_piece(full_path, client_id or LOCAL_CLIENT).export(fmt)
+        stem = os.path.splitext(os.path.basename(full_path))[0]
+        return {'name': stem + EXPORT_FORMATS[fmt], 'data': data}
+    except ServerBusy as e:
+        return {'error': str(e)}
+    except Exception as e:
+        logger.error(_("Error during export: {}").format(str(e)))
+        return {'error': _("Error occurred during processing (Check server logs for details): {}").format(str(e))}
+
+
+def model_status() -> str:
+    """Body of the get_model_status tool."""
+    report = get_model_manager().health()
+    lines = [_("Model status:")]
+    for key in ('loaded', 'healthy', 'load_seconds', 'rss_delta_bytes', 'load_count',
+                'unload_count', 'failed_attempts', 'last_error', 'active', 'idle_seconds'):
+        lines.append(f"- {key}: {report.get(key)}")
+    if report.get('health_error'):
+        lines.append(f"- health_error: {report['health_error']}")
+    warmup = _WARMUP.status()
+    lines.append(_("- warm-up: {} ({} s)").format(warmup['state'], warmup['seconds']) if warmup['error'] is None
+                 else _("- warm-up: {} ({})").format(warmup['state'], warmup['error']))
+    return "\n".join(lines)
+
+
+def warm_up() -> str:
+    """
+    Body of the warm-up started after an MCP handshake: analyze a synthetic
+    clip in the background (once per process) so the first request is warm.
+    """
+    if _WARMUP.start():
+        return _("Warm-up started")
+    return _("Warm-up {}").format(_WARMUP.state)
+
+
+def queue_status() -> str:
+    """Body of the get_queue_status tool."""
+    status = get_scheduler().status()
+    lines = [_("Queue status:")]
+    for key in ('workers', 'queued_tasks', 'pending_audio_seconds', 'throughput_per_worker',
+                'admitted', 'rejected', 'completed_tasks'):
+        lines.append(f"- {key}: {status.get(key)}")
+    lines.append(_("- thread budget: {}").format(get_thread_budget().describe()))
+    for client_id, load in status['clients'].items():
+        lines.append(f"- client {client_id}: {load['active_jobs']} running, "
+                     f"{load['pending_audio_seconds']} s of audio pending")
+    if get_config().performance.worker_processes > 0:
+        pool = get_worker_pool().status()
+        lines.append(_("- worker processes: {} running ({} idle), {} spawned, last startup {} ms, "
+                       "template preload {} s").format(
+            pool['workers'], pool['idle'], pool['spawned'], pool['last_startup_ms'], pool['preload_seconds']
+        ))
+    return "\n".join(lines)
+
+
+def profile_next_requests(count: int = 1) -> str:
+    """Body of the profile_next_requests tool."""
+    armed = _PROFILER.arm(count)
+    return _("Profiling the next {} analyze_audio_to_tab request(s). Profiles are written to: {}").format(
+        armed, PROFILE_DIR
+    )
+
+
+def get_profile(name: str = "") -> str:
+    """Body of the get_profile tool."""
+    names = _PROFILER.list_profiles()
+    if not name:
+        if not names:
+            return _("No profiles yet. Use profile_next_requests, then run analyze_audio_to_tab.")
+        return _("Stored profiles (newest first):") + "\n" + "\n".join(f"- {n}" for n in names)
+    if name == 'latest':
+        if not names:
+            return _("No profiles yet. Use profile_next_requests, then run analyze_audio_to_tab.")
+        name = names[0]
+    summary = _PROFILER.read_summary(name)
+    if summary is None:
+        return _("Profile not found: {}").format(name)
+    pstats_path = _PROFILER.profile_path(name)
+    if pstats_path:
+        summary += "\n\n" + _("Full profile (pstats): {}").format(pstats_path)
+    return summary
@@ -1,9 +1,17 @@
+import functools
 import gettext
 import os
 import logging
-from typing import List, Dict, Tuple, Optional, Any
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Optional, Any, Mapping, Sequence
+import numpy as np
 from music21 import pitch
 
+from src.chord_engine import BEATS_PER_MEASURE, ChordEngine, beats_at
+from src.config import get_config
+from src.separation import BASS, MELODY
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,79 +24,225 @@ localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales
 translate = gettext.translation('messages', localedir, fallback=True)
 _ = translate.gettext
 
+# Precision Chord Templates based on reference charts
+# Chord name -> {string index (0 = low E): fret}
+CHORD_TEMPLATES = {
+    "C": {1: 3, 2: 2, 3: 0, 4: 1, 5: 0},
+    "Cm": {1: 3, 2: 5, 3: 5, 4: 4, 5: 3},
+    "C7": {1: 3, 2: 2, 3: 3, 4: 1, 5: 0},
+    "CM7": {1: 3, 2: 2, 3: 0, 4: 0, 5: 0},
+    "Cm7": {1: 3, 2: 5, 3: 3, 4: 4, 5: 3},
+    "Csus4": {1: 3, 2: 3, 3: 0, 4: 1, 5: 1},
+    "D": {2: 0, 3: 2, 4: 3, 5: 2},
+    "Dm": {2: 0, 3: 2, 4: 3, 5: 1},
+    "D7": {2: 0, 3: 2, 4: 1, 5: 2},
+    "DM7": {2: 0, 3: 2, 4: 2, 5: 2},
+    "Dm7": {2: 0, 3: 2, 4: 1, 5: 1},
+    "Dsus4": {2: 0, 3: 2, 4: 3, 5: 3},
+    "E": {0: 0, 1: 2, 2: 2, 3: 1, 4: 0, 5: 0},
+    "Em": {0: 0, 1: 2, 2: 2, 3: 0, 4: 0, 5: 0},
+    "E7": {0: 0, 1: 2, 2: 0, 3: 1, 4: 0, 5: 0},
+    "EM7": {0: 0, 1: 2, 2: 1, 3: 1, 4: 0, 5: 0},
+    "Em7": {0: 0, 1: 2, 2: 0, 3: 0, 4: 0, 5: 0},
+    "Esus4": {0: 0, 1: 2, 2: 2, 3: 2, 4: 0, 5: 0},
+    "F": {0: 1, 1: 3, 2: 3, 3: 2, 4: 1, 5: 1},
+    "Fm": {0: 1, 1: 3, 2: 3, 3: 1, 4: 1, 5: 1},
+    "F7": {0: 1, 1: 3, 2: 1, 3: 2, 4: 1, 5: 1},
+    "FM7": {2: 3, 3: 2, 4: 1, 5: 0},
+    "Fm7": {0: 1, 1: 3, 2: 1, 3: 1, 4: 1, 5: 1},
+    "Fsus4": {0: 1, 1: 3, 2: 3, 3: 3, 4: 1, 5: 1},
+    "G": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 3},
+    "Gm": {0: 3, 1: 5, 2: 5, 3: 3, 4: 3, 5: 3},
+    "G7": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 1},
+    "GM7": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 2},
+    "Gm7": {0: 3, 1: 5, 2: 3, 3: 3, 4: 3, 5: 3},
+    "Gsus4": {0: 3, 1: 3, 2: 0, 3: 0, 4: 1, 5: 3},
+    "A": {1: 0, 2: 2, 3: 2, 4: 2, 5: 0},
+    "Am": {1: 0, 2: 2, 3: 2, 4: 1, 5: 0},
+    "A7": {1: 0, 2: 2, 3: 0, 4: 2, 5: 0},
+    "AM7": {1: 0, 2: 2, 3: 1, 4: 2, 5: 0},
+    "Am7": {1: 0, 2: 2, 3: 0, 4: 1, 5: 0},
+    "Asus4": {1: 0, 2: 2, 3: 2, 4: 3, 5: 0},
+    "B": {1: 2, 2: 4, 3: 4, 4: 4, 5: 2},
+    "Bm": {1: 2, 2: 4, 3: 4, 4: 3, 5: 2},
+    "B7": {1: 2, 2: 1, 3: 2, 4: 0, 5: 2},
+    "BM7": {1: 2, 2: 4, 3: 3, 4: 4, 5: 2},
+    "Bm7": {1: 2, 2: 4, 3: 2, 4: 3, 5: 2},
+    "Bsus4": {1: 2, 2: 4, 3: 4, 4: 5, 5: 2},
+    "Fadd9": {1: 3, 2: 3, 3: 2, 4: 1, 5: 3},
+}
+
+# Chord-name suffix -> chord_detection.enabled_chord_types key
+CHORD_TYPE_SUFFIXES = {
+    '': 'major',
+    'm': 'minor',
+    '7': 'seventh',
+    'M7': 'major_seventh',
+    'm7': 'minor_seventh',
+    'sus4': 'suspended',
+    'add9': 'add9',
+}
+
+
+def chord_type(name: str) -> str:
+    """Return the chord type ('major', 'minor7', ...) of a template name like 'F#m7'."""
+    suffix = name[2:] if name[1:2] in ('#', 'b') else name[1:]
+    return CHORD_TYPE_SUFFIXES.get(suffix, suffix)
+
+
+# Octave shifts tried when placing a note, in priority order for ties
+OCTAVE_SHIFTS = (-24, -12, 0, 12)
+
+# Fingering methods: each note on its own, or the whole passage at once
+FINGERING_METHODS = ('greedy', 'dp')
+
+# Whole-passage fingering: score lost per fret the hand moves between
+# consecutive fretted notes, and when consecutive notes starting in the same
+# slot would share a string
+HAND_SHIFT_PENALTY = 40
+STRING_CLASH_PENALTY = 5000
+
+
+@dataclass(frozen=True)
+class FingeringOverride:
+    """Play a pitch on a given string, everywhere or in a range of measures"""
+    pitch: int  # MIDI pitch
+    string: int  # string index (0 = lowest string)
+    start_measure: Optional[int] = None  # first measure (0-based); None = from the start
+    end_measure: Optional[int] = None  # measure after the last one; None = to the end
+
+    def applies(self, pitches: np.ndarray, measure_idx: np.ndarray) -> np.ndarray:
+        """Return which notes the override applies to."""
+        mask = pitches == self.pitch
+        if self.start_measure is not None:
+            mask &= measure_idx >= self.start_measure
+        if self.end_measure is not None:
+            mask &= measure_idx < self.end_measure
+        return mask
+
+
+@dataclass(frozen=True)
+class TuningTables:
+    """Immutable lookup tables derived from a tuning/capo configuration"""
+    tuning_names: Tuple[str, ...]
+    tuning: Tuple[int, ...]  # sounding MIDI pitch of each open string (capo included)
+    capo: int
+    max_fret: int
+    chord_templates: Mapping[str, Mapping[int, int]]
+    chord_names: Tuple[str, ...]
+    chord_masks: np.ndarray  # (n_chords, 12) pitch classes sounded by each shape
+    chord_roots: np.ndarray  # (n_chords,) pitch class of each shape's lowest string
+    fret_candidates: Tuple[Tuple[Tuple[int, int], ...], ...]  # MIDI pitch -> ((string, fret), ...)
+
+
+@functools.lru_cache(maxsize=32)
+def get_tuning_tables(tuning: Tuple[str, ...], capo: int = 0, max_fret: int = 15,
+                      chord_types: Optional[Tuple[str, ...]] = None) -> TuningTables:
+    """
+    Build (once per configuration) the lookup tables for a tuning and capo.
+
+    Args:
+        tuning: String tunings from low to high (e.g. ('E2', 'A2', ...))
+        capo: Capo fret; frets in the tab are relative to the capo
+        max_fret: Highest fret considered when placing notes
+        chord_types: Chord types to detect (default: all)
+
+    Returns:
+        Shared, read-only TuningTables
+
+    Raises:
+        ValueError: If a tuning name cannot be parsed
+    """
+    try:
+        open_strings = tuple(pitch.Pitch(t).midi + capo for t in tuning)
+    except Exception as e:
+        logger.error(_("Invalid tuning specification: {}").format(str(e)))
+        raise ValueError(_("Invalid tuning: {}").format(list(tuning))) from e
+
+    # Shapes that reference strings this tuning doesn't have are dropped
+    templates = {
+        name: MappingProxyType(dict(shape))
+        for name, shape in CHORD_TEMPLATES.items()
+        if all(s < len(open_strings) for s in shape)
+        and (chord_types is None or chord_type(name) in chord_types)
+    }
+    chord_names = tuple(templates)
+    chord_masks = np.zeros((len(chord_names), 12), dtype=np.float32)
+    chord_roots = np.zeros(len(chord_names), dtype=np.int64)
+    for i, name in enumerate(chord_names):
+        shape = templates[name]
+        for s, f in shape.items():
+            chord_masks[i, (open_strings[s] + f) % 12] = 1.0
+        first_s = next(iter(shape))
+        chord_roots[i] = (open_strings[first_s] + shape[first_s]) % 12
+    chord_masks.setflags(write=False)
+    chord_roots.setflags(write=False)
+
+    fret_candidates = tuple(
+        tuple(
+            (s_idx, midi_pitch + shift - open_strings[s_idx])
+            for shift in OCTAVE_SHIFTS
+            for s_idx in range(len(open_strings))
+            if 0 <= midi_pitch + shift - open_strings[s_idx] <= max_fret
+        )
+        for midi_pitch in range(128)
+    )
+
+    logger.info(_("Tuning tables built - Tuning: {}, Capo: {}").format(list(tuning), capo))
+    return TuningTables(
+        tuning_names=tuple(tuning),
+        tuning=open_strings,
+        capo=capo,
+        max_fret=max_fret,
+        chord_templates=MappingProxyType(templates),
+        chord_names=chord_names,
+        chord_masks=chord_masks,
+        chord_roots=chord_roots,
+        fret_candidates=fret_candidates,
+    )
+
+
 class TabGenerator:
-    def __init__(self, tuning: List[str] = None, bpm: float = 75):
+    def __init__(self, tuning: List[str] = None, bpm: float = 75, capo: int = 0):
         """
         Initialize the TabGenerator.
 
+        Tuning-derived tables are shared between generators with the same
+        tuning and capo; only the BPM is per-instance state. Layout, fret
+        and chord settings are read from the configuration at construction.
+
         Args:
-            tuning: List of string tunings (default: standard tuning E2-E4)
-            bpm: Beats per minute (default: 75, range: 40-200)
+            tuning: List of string tunings (default: configured standard tuning)
+            bpm: Beats per minute (default: 75, clamped to the configured range)
+            capo: Capo fret (default: 0)
         """
+        config = get_config()
+        tab_config = config.tablature
         if tuning is None:
-            tuning = ['E2', 'A2', 'D3', 'G3', 'B3', 'E4']
-
-        try:
-            self.tuning = [pitch.Pitch(t).midi for t in tuning]
-        except Exception as e:
-            logger.error(_("Invalid tuning specification: {}").format(str(e)))
-            raise ValueError(_("Invalid tuning: {}").format(tuning)) from e
-
+            tuning = tab_config.standard_tuning
+
+        enabled = config.chord_detection.enabled_chord_types
+        chord_types = tuple(sorted(
+            t for t in CHORD_TYPE_SUFFIXES.values() if enabled.get(t, True)
+        ))
+        self.tables = get_tuning_tables(tuple(tuning), capo, tab_config.max_fret, chord_types)
+        self.tuning = self.tables.tuning
+        self.chord_templates = self.tables.chord_templates
         self.num_strings = len(self.tuning)
-        self.bpm = max(40, min(bpm, 200))  # Realistic BPM limits
-        self.bass_threshold = 50
-        self.capo = 0
-
-        logger.info(_("TabGenerator initialized - Tuning: {}, BPM: {:.1f}").format(
+        self.bpm = max(config.audio.min_bpm, min(bpm, config.audio.max_bpm))  # Realistic BPM limits
+        self.bass_threshold = tab_config.bass_threshold
+        self.slots_per_measure = tab_config.slots_per_measure
+        self.measures_per_line = tab_config.measures_per_line
+        self.min_fret = tab_config.min_fret
+        self.preferred_fret_max = tab_config.preferred_fret_max
+        self.min_chord_score = config.chord_detection.min_score
+        self.chord_smoothing = config.chord_detection.smoothing
+        self.capo = capo
+        self._chord_engine: Optional[ChordEngine] = None
+
+        logger.debug(_("TabGenerator initialized - Tuning: {}, BPM: {:.1f}").format(
             tuning, self.bpm
-        )) 
-
-        # Precision Chord Templates based on reference charts
-        self.chord_templates = {
-            "C": {1: 3, 2: 2, 3: 0, 4: 1, 5: 0},
-            "Cm": {1: 3, 2: 5, 3: 5, 4: 4, 5: 3},
-            "C7": {1: 3, 2: 2, 3: 3, 4: 1, 5: 0},
-            "CM7": {1: 3, 2: 2, 3: 0, 4: 0, 5: 0},
-            "Cm7": {1: 3, 2: 5, 3: 3, 4: 4, 5: 3},
-            "Csus4": {1: 3, 2: 3, 3: 0, 4: 1, 5: 1},
-            "D": {2: 0, 3: 2, 4: 3, 5: 2},
-            "Dm": {2: 0, 3: 2, 4: 3, 5: 1},
-            "D7": {2: 0, 3: 2, 4: 1, 5: 2},
-            "DM7": {2: 0, 3: 2, 4: 2, 5: 2},
-            "Dm7": {2: 0, 3: 2, 4: 1, 5: 1},
-            "Dsus4": {2: 0, 3: 2, 4: 3, 5: 3},
-            "E": {0: 0, 1: 2, 2: 2, 3: 1, 4: 0, 5: 0},
-            "Em": {0: 0, 1: 2, 2: 2, 3: 0, 4: 0, 5: 0},
-            "E7": {0: 0, 1: 2, 2: 0, 3: 1, 4: 0, 5: 0},
-            "EM7": {0: 0, 1: 2, 2: 1, 3: 1, 4: 0, 5: 0},
-            "Em7": {0: 0, 1: 2, 2: 0, 3: 0, 4: 0, 5: 0},
-            "Esus4": {0: 0, 1: 2, 2: 2, 3: 2, 4: 0, 5: 0},
-            "F": {0: 1, 1: 3, 2: 3, 3: 2, 4: 1, 5: 1},
-            "Fm": {0: 1, 1: 3, 2: 3, 3: 1, 4: 1, 5: 1},
-            "F7": {0: 1, 1: 3, 2: 1, 3: 2, 4: 1, 5: 1},
-            "FM7": {2: 3, 3: 2, 4: 1, 5: 0},
-            "Fm7": {0: 1, 1: 3, 2: 1, 3: 1, 4: 1, 5: 1},
-            "Fsus4": {0: 1, 1: 3, 2: 3, 3: 3, 4: 1, 5: 1},
-            "G": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 3},
-            "Gm": {0: 3, 1: 5, 2: 5, 3: 3, 4: 3, 5: 3},
-            "G7": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 1},
-            "GM7": {0: 3, 1: 2, 2: 0, 3: 0, 4: 0, 5: 2},
-            "Gm7": {0: 3, 1: 5, 2: 3, 3: 3, 4: 3, 5: 3},
-            "Gsus4": {0: 3, 1: 3, 2: 0, 3: 0, 4: 1, 5: 3},
-            "A": {1: 0, 2: 2, 3: 2, 4: 2, 5: 0},
-            "Am": {1: 0, 2: 2, 3: 2, 4: 1, 5: 0},
-            "A7": {1: 0, 2: 2, 3: 0, 4: 2, 5: 0},
-            "AM7": {1: 0, 2: 2, 3: 1, 4: 2, 5: 0},
-            "Am7": {1: 0, 2: 2, 3: 0, 4: 1, 5: 0},
-            "Asus4": {1: 0, 2: 2, 3: 2, 4: 3, 5: 0},
-            "B": {1: 2, 2: 4, 3: 4, 4: 4, 5: 2},
-            "Bm": {1: 2, 2: 4, 3: 4, 4: 3, 5: 2},
-            "B7": {1: 2, 2: 1, 3: 2, 4: 0, 5: 2},
-            "BM7": {1: 2, 2: 4, 3: 3, 4: 4, 5: 2},
-            "Bm7": {1: 2, 2: 4, 3: 2, 4: 3, 5: 2},
-            "Bsus4": {1: 2, 2: 4, 3: 4, 4: 5, 5: 2},
-            "Fadd9": {1: 3, 2: 3, 3: 2, 4: 1, 5: 3},
-        }
+        ))
 
     def find_best_pos(self, midi_pitch: int, is_bass: bool = False,
                       chord_shape: Optional[Dict[int, int]] = None) -> Optional[Tuple[int, int]]:
@@ -106,42 +260,62 @@ class TabGenerator:
         best_cand = None
         max_score = -999999
 
-        for octave_shift in [-24, -12, 0, 12]:
-            shifted_pitch = midi_pitch + octave_shift
-            for s_idx in range(self.num_strings):
-                fret = shifted_pitch - self.tuning[s_idx]
-                if 0 <= fret <= 15:
-                    score = 0
-                    # Prefer lower frets (0-5) for easier playability
-                    if 0 <= fret <= 5:
-                        score += 800
-                        score += (5 - fret) * 15
-                    else:
-                        score -= (fret * 150)
-
-                    # Bonus if note matches chord shape
-                    if chord_shape and s_idx in chord_shape and chord_shape[s_idx] == fret:
-                        score += 2000
-
-                    # Bass notes prefer lower strings
-                    if is_bass and s_idx <= 2:
-                        score += 100
-                    # Melody notes prefer higher strings
-                    if not is_bass and s_idx >= 3:
-                        score += 50
-
-                    if score > max_score:
-                        max_score = score
-                        best_cand = (s_idx, fret)
+        if not 0 <= midi_pitch < len(self.tables.fret_candidates):
+            return None
+
+        for s_idx, fret in self.tables.fret_candidates[midi_pitch]:
+            score = 0
+            # Prefer lower frets (0-5 by default) for easier playability
+            if self.min_fret <= fret <= self.preferred_fret_max:
+                score += 800
+                score += (self.preferred_fret_max - fret) * 15
+            else:
+                score -= (fret * 150)
+
+            # Bonus if note matches chord shape
+            if chord_shape and s_idx in chord_shape and chord_shape[s_idx] == fret:
+                score += 2000
+
+            # Bass notes prefer lower strings
+            if is_bass and s_idx <= 2:
+                score += 100
+            # Melody notes prefer higher strings
+            if not is_bass and s_idx >= 3:
+                score += 50
+
+            if score > max_score:
+                max_score = score
+                best_cand = (s_idx, fret)
 
         return best_cand
 
-    def generate_ascii_tab(self, notes: List[Dict[str, Any]]) -> str:
+    @property
+    def chord_engine(self) -> ChordEngine:
+        """Chroma chord engine for this generator's chord shapes (built on first use)."""
+        if self._chord_engine is None:
+            self._chord_engine = ChordEngine(self.tables, self.chord_smoothing)
+        return self._chord_engine
+
+    def generate_ascii_tab(self, notes: List[Dict[str, Any]], start_measure: int = 0,
+                           end_measure: Optional[int] = None, chroma: Optional[np.ndarray] = None,
+                           chroma_offset: float = 0.0, fingering: str = 'greedy',
+                           overrides: Sequence[FingeringOverride] = (),
+                           tempo_map: Optional[Sequence[Tuple[float, float]]] = None) -> str:
         """
         Generate ASCII tablature from a list of notes.
 
+        Only the requested measure range is analyzed and rendered, so showing a
+        few bars of a long piece doesn't materialize the rest of it.
+
         Args:
             notes: List of note dictionaries with 'start', 'end', 'pitch', 'velocity'
+            start_measure: First measure to render (0-based, default: 0)
+            end_measure: Measure after the last one to render (default: end of piece)
+            chroma: Chromagram of the audio to detect chords from (default: use the notes)
+            chroma_offset: File time of the first chroma frame in seconds
+            fingering: Fingering method, 'greedy' or 'dp' (see assign_fingering)
+            overrides: Fingering overrides, with measures numbered as in this tab
+            tempo_map: (time, bpm) entries the measure grid follows (default: self.bpm throughout)
 
         Returns:
             ASCII tablature string
@@ -154,51 +328,40 @@ class TabGenerator:
             return _("No notes detected.")
 
         try:
-            slots_per_measure = 16
+            slots_per_measure = self.slots_per_measure
             sec_per_measure = (60 / self.bpm) * 4
-            max_time = max(n['end'] for n in notes)
-            num_measures = int(max_time / sec_per_measure) + 1
+            starts = np.fromiter((n['start'] for n in notes), dtype=np.float64, count=len(notes))
+            ends = np.fromiter((n['end'] for n in notes), dtype=np.float64, count=len(notes))
+            pitches = np.fromiter((n['pitch'] for n in notes), dtype=np.int64, count=len(notes))
+            is_bass = bass_mask(notes)
+            num_measures = int(self.grid_positions(ends.max(), tempo_map)[0]) + 1
+
+            start_m = max(0, start_measure)
+            end_m = num_measures if end_measure is None else min(end_measure, num_measures)
+            if start_m >= end_m:
+                return _("No measures in the requested range.")
 
             logger.info(_("Generating tab: {} measures, {:.2f} sec/measure").format(
-                num_measures, sec_per_measure
+                end_m - start_m, sec_per_measure
             ))
 
-            # Initialize tab grid
-            full_tab = [[["-" for ___ in range(slots_per_measure)]
-                         for ___ in range(num_measures)]
-                        for ___ in range(self.num_strings)]
-            measure_chords = ["N.C." for ___ in range(num_measures)]
-
-            # Detect chords for each measure
-            for m_idx in range(num_measures):
-                m_notes = [n for n in notes if int(n['start'] / sec_per_measure) == m_idx]
-                measure_chords[m_idx] = self.detect_chord(m_notes)
-
-            # Place notes on the tab
-            for n in notes:
-                m_idx = int(n['start'] / sec_per_measure)
-                if m_idx >= num_measures:
-                    continue
-
-                chord_name = measure_chords[m_idx]
-                current_shape = self.chord_templates.get(chord_name, {})
-
-                is_bass = n['pitch'] <= self.bass_threshold
-                pos = self.find_best_pos(n['pitch'], is_bass, current_shape)
+            measure_idx, slot_idx = self.grid_positions(starts, tempo_map)
+            in_range = (measure_idx >= start_m) & (measure_idx < end_m)
+            rel_measure = measure_idx[in_range] - start_m
+            slot_idx = slot_idx[in_range]
+            pitches = pitches[in_range]
+            if is_bass is not None:
+                is_bass = is_bass[in_range]
+            forced = self.override_strings(pitches, measure_idx[in_range], overrides)
 
-                if pos:
-                    s_idx, fret = pos
-                    rel_time = n['start'] % sec_per_measure
-                    slot_idx = int((rel_time / sec_per_measure) * slots_per_measure)
-                    line_idx = self.num_strings - 1 - s_idx
-
-                    fret_str = str(fret)
-                    for i, c in enumerate(fret_str):
-                        if slot_idx + i < slots_per_measure:
-                            full_tab[line_idx][m_idx][slot_idx + i] = c
+            measure_chords = self.measure_chords(rel_measure, pitches, start_m, end_m - start_m,
+                                                 chroma, chroma_offset, tempo_map)
+            strings, frets = self.assign_fingering(pitches, rel_measure, measure_chords, is_bass,
+                                                   fingering, slot_idx, forced)
 
             logger.info(_("Tab generation completed successfully"))
-            return self._render_layout(full_tab, measure_chords, num_measures, slots_per_measure)
+            return self.render_tab(rel_measure, slot_idx, strings, frets,
+                                   measure_chords, slots_per_measure)
 
         except KeyError as e:
             logger.error(_("Missing required note field: {}").format(str(e)))
@@ -207,6 +370,320 @@ class TabGenerator:
             logger.error(_("Tab generation failed: {}").format(str(e)))
             raise RuntimeError(_("Failed to generate tablature: {}").format(str(e))) from e
 
+    def grid_positions(self, times, tempo_map: Optional[Sequence[Tuple[float, float]]] = None
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the measure and slot of each time on the tab grid.
+
+        Args:
+            times: Times in seconds
+            tempo_map: (time, bpm) entries the grid follows (default: self.bpm throughout)
+
+        Returns:
+            Tuple of (measure index, slot index) arrays
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if tempo_map is None:
+            sec_per_measure = (60 / self.bpm) * 4
+            measure_idx = (times / sec_per_measure).astype(np.int64)
+            slot_idx = (np.mod(times, sec_per_measure) / sec_per_measure) * self.slots_per_measure
+            return measure_idx, slot_idx.astype(np.int64)
+        measures = beats_at(times, tempo_map) / BEATS_PER_MEASURE
+        measure_idx = np.floor(measures).astype(np.int64)
+        slot_idx = ((measures - measure_idx) * self.slots_per_measure).astype(np.int64)
+        return measure_idx, np.minimum(slot_idx, self.slots_per_measure - 1)
+
+    def measure_chords(self, measure_idx: np.ndarray, pitches: np.ndarray, start_measure: int,
+                       num_measures: int, chroma: Optional[np.ndarray] = None,
+                       chroma_offset: float = 0.0,
+                       tempo_map: Optional[Sequence[Tuple[float, float]]] = None) -> List[str]:
+        """
+        Return the chord of each measure of a range, from the audio if chroma is given.
+
+        Args:
+            measure_idx: Measure index of each note relative to start_measure
+            pitches: MIDI pitch of each note
+            start_measure: First measure of the range
+            num_measures: Number of measures
+            chroma: Chromagram of the audio (default: detect from the notes)
+            chroma_offset: File time of the first chroma frame in seconds
+            tempo_map: (time, bpm) entries the measure grid follows (default: self.bpm throughout)
+
+        Returns:
+            Chord name (or 'N.C.') per measure
+        """
+        if chroma is not None:
+            return self.chord_engine.measure_chords(chroma, self.bpm, start_measure, num_measures,
+                                                    chroma_offset, tempo_map=tempo_map)
+        return self.detect_measure_chords(measure_idx, pitches, num_measures)
+
+    def detect_measure_chords(self, measure_idx: np.ndarray, pitches: np.ndarray,
+                              num_measures: int) -> List[str]:
+        """
+        Detect the chord of every measure at once.
+
+        Equivalent to calling detect_chord on each measure's notes, but scores
+        all measures against all templates with a single matrix product.
+
+        Args:
+            measure_idx: Measure index of each note (0 <= idx < num_measures)
+            pitches: MIDI pitch of each note
+            num_measures: Number of measures
+
+        Returns:
+            Chord name (or 'N.C.') per measure
+        """
+        if not self.tables.chord_names:
+            return ["N.C."] * num_measures
+
+        counts = np.zeros((num_measures, 12), dtype=np.float32)
+        np.add.at(counts, (measure_idx, pitches % 12), 1.0)
+        scores = 3 * (counts @ self.tables.chord_masks.T)
+        # Root note bonus
+        scores += 5 * (counts[:, self.tables.chord_roots] > 0)
+
+        best_idx = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(num_measures), best_idx]
+        return [
+            self.tables.chord_names[i] if score > self.min_chord_score else "N.C."
+            for i, score in zip(best_idx.tolist(), best_scores.tolist())
+        ]
+
+    def assign_fingering(self, pitches: np.ndarray, measure_idx: np.ndarray,
+                         measure_chords: List[str],
+                         is_bass: Optional[np.ndarray] = None, method: str = 'greedy',
+                         slot_idx: Optional[np.ndarray] = None,
+                         forced_strings: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Choose a string and fret for every note.
+
+        Args:
+            pitches: MIDI pitch of each note
+            measure_idx: Measure index of each note into measure_chords
+            measure_chords: Chord name per measure
+            is_bass: Whether each note is a bass note (default: pitch <= bass_threshold)
+            method: 'greedy' (best position per note, see find_best_pos) or
+                'dp' (best positions for the passage, see assign_fingering_dp)
+            slot_idx: Slot of each note within its measure (used by 'dp')
+            forced_strings: String each note must be played on, -1 where free
+                (see override_strings); ignored where the pitch can't be played on it
+
+        Returns:
+            Tuple of (string index, fret) arrays; -1 where no position exists
+
+        Raises:
+            ValueError: If the method is unknown
+        """
+        if method not in FINGERING_METHODS:
+            raise ValueError(_("Unknown fingering method: {}. Supported methods: {}").format(
+                method, ", ".join(FINGERING_METHODS)
+            ))
+        if is_bass is None:
+            is_bass = pitches <= self.bass_threshold
+        if method == 'dp':
+            if slot_idx is None:
+                slot_idx = np.zeros(len(pitches), dtype=np.int64)
+            return self.assign_fingering_dp(pitches, measure_idx, slot_idx, measure_chords, is_bass,
+                                            forced_strings)
+
+        strings = np.full(len(pitches), -1, dtype=np.int8)
+        frets = np.full(len(pitches), -1, dtype=np.int8)
+        # Positions only depend on (pitch, bass/melody, chord), so each is solved once
+        memo: Dict[Tuple[int, bool, str], Optional[Tuple[int, int]]] = {}
+
+        for i, (midi_pitch, m_idx, bass) in enumerate(zip(pitches.tolist(), measure_idx.tolist(),
+                                                          is_bass.tolist())):
+            chord_name = measure_chords[m_idx]
+            key = (midi_pitch, bass, chord_name)
+            if key not in memo:
+                memo[key] = self.find_best_pos(
+                    midi_pitch, bass, self.chord_templates.get(chord_name, {})
+                )
+            pos = memo[key]
+            if pos:
+                strings[i], frets[i] = pos
+
+        if forced_strings is not None:
+            for i in np.flatnonzero(forced_strings >= 0).tolist():
+                fret = self.fret_on_string(int(pitches[i]), int(forced_strings[i]))
+                if fret is not None:
+                    strings[i], frets[i] = forced_strings[i], fret
+        return strings, frets
+
+    def fret_on_string(self, midi_pitch: int, string: int) -> Optional[int]:
+        """
+        Return the fret that plays a pitch on a string, or None if it can't.
+
+        Pitches outside the fretboard are moved by octaves as in find_best_pos,
+        the smallest shift first; playable pitches are not.
+        """
+        if not 0 <= midi_pitch < len(self.tables.fret_candidates):
+            return None
+        candidates = self.tables.fret_candidates[midi_pitch]
+        shifts = [(abs(self.tuning[s_idx] + fret - midi_pitch), s_idx, fret) for s_idx, fret in candidates]
+        playable = any(shift == 0 for shift, ___, ___ in shifts)
+        on_string = [(shift, fret) for shift, s_idx, fret in shifts
+                     if s_idx == string and (shift == 0 or not playable)]
+        return min(on_string)[1] if on_string else None
+
+    def override_strings(self, pitches: np.ndarray, measure_idx: np.ndarray,
+                         overrides: Sequence[FingeringOverride]) -> Optional[np.ndarray]:
+        """
+        Return the string each note is forced onto by fingering overrides.
+
+        Args:
+            pitches: MIDI pitch of each note
+            measure_idx: Measure of each note in the numbering the overrides use
+            overrides: Overrides in order; later ones win where they overlap
+
+        Returns:
+            String index per note (-1 where free), or None without overrides
+        """
+        if not overrides:
+            return None
+        forced = np.full(len(pitches), -1, dtype=np.int8)
+        for override in overrides:
+            forced[override.applies(pitches, measure_idx)] = override.string
+        return forced
+
+    def assign_fingering_dp(self, pitches: np.ndarray, measure_idx: np.ndarray, slot_idx: np.ndarray,
+                            measure_chords: List[str], is_bass: np.ndarray,
+                            forced_strings: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Choose a string and fret for every note, jointly for the whole passage.
+
+        Every candidate position is scored as in find_best_pos. A Viterbi pass
+        over the notes in order then maximizes the total score minus
+        HAND_SHIFT_PENALTY per fret the hand moves between consecutive fretted
+        notes and STRING_CLASH_PENALTY where consecutive notes starting in the
+        same slot would share a string. Forced notes keep only their candidates
+        on the forced string, so their neighbours are fingered around them.
+
+        Args:
+            pitches: MIDI pitch of each note
+            measure_idx: Measure index of each note into measure_chords
+            slot_idx: Slot of each note within its measure
+            measure_chords: Chord name per measure
+            is_bass: Whether each note is a bass note
+            forced_strings: String each note must be played on, -1 where free
+
+        Returns:
+            Tuple of (string index, fret) arrays; -1 where no position exists
+        """
+        strings = np.full(len(pitches), -1, dtype=np.int8)
+        frets = np.full(len(pitches), -1, dtype=np.int8)
+        candidates = self.tables.fret_candidates
+        width = max(1, max(len(c) for c in candidates))
+        table_strings = np.full((len(candidates), width), -1, dtype=np.int64)
+        table_frets = np.zeros((len(candidates), width), dtype=np.int64)
+        for midi_pitch, positions in enumerate(candidates):
+            for k, (s_idx, fret) in enumerate(positions):
+                table_strings[midi_pitch, k], table_frets[midi_pitch, k] = s_idx, fret
+
+        in_table = (pitches >= 0) & (pitches < len(candidates))
+        placeable = np.flatnonzero(in_table)
+        placeable = placeable[table_strings[pitches[placeable], 0] >= 0]
+        if len(placeable) == 0:
+            return strings, frets
+        cand_strings = table_strings[pitches[placeable]]
+        cand_frets = table_frets[pitches[placeable]]
+
+        # Per-note scores of find_best_pos, for all candidates at once
+        in_preferred = (cand_frets >= self.min_fret) & (cand_frets <= self.preferred_fret_max)
+        scores = np.where(in_preferred, 800 + (self.preferred_fret_max - cand_frets) * 15,
+                          -150 * cand_frets).astype(np.float64)
+        shapes = np.full((max(1, len(measure_chords)), self.num_strings), -1, dtype=np.int64)
+        for m_idx, chord_name in enumerate(measure_chords):
+            for s_idx, fret in self.chord_templates.get(chord_name, {}).items():
+                shapes[m_idx, s_idx] = fret
+        shape_frets = shapes[measure_idx[placeable][:, None], np.maximum(cand_strings, 0)]
+        scores += 2000 * (shape_frets == cand_frets)
+        scores += np.where(is_bass[placeable][:, None], 100 * (cand_strings <= 2), 50 * (cand_strings >= 3))
+        scores[cand_strings < 0] = -np.inf
+        if forced_strings is not None:
+            for i in np.flatnonzero(forced_strings[placeable] >= 0).tolist():
+                string = int(forced_strings[placeable[i]])
+                fret = self.fret_on_string(int(pitches[placeable[i]]), string)
+                # Where the forced string has no position, the override is ignored
+                if fret is not None:
+                    scores[i, (cand_strings[i] != string) | (cand_frets[i] != fret)] = -np.inf
+
+        measures, slots = measure_idx[placeable], slot_idx[placeable]
+        together = (measures[1:] == measures[:-1]) & (slots[1:] == slots[:-1])
+        fretted = cand_frets > 0
+        columns = np.arange(width)
+        total = scores[0]
+        back = np.zeros(cand_strings.shape, dtype=np.int64)
+        for i in range(1, len(placeable)):
+            cost = HAND_SHIFT_PENALTY * np.abs(cand_frets[i - 1][:, None] - cand_frets[i][None, :])
+            cost *= fretted[i - 1][:, None] & fretted[i][None, :]
+            if together[i - 1]:
+                cost += STRING_CLASH_PENALTY * (cand_strings[i - 1][:, None] == cand_strings[i][None, :])
+            paths = total[:, None] - cost
+            back[i] = np.argmax(paths, axis=0)
+            total = paths[back[i], columns] + scores[i]
+
+        choice = np.empty(len(placeable), dtype=np.int64)
+        choice[-1] = np.argmax(total)
+        for i in range(len(placeable) - 1, 0, -1):
+            choice[i - 1] = back[i, choice[i]]
+        rows = np.arange(len(placeable))
+        strings[placeable] = cand_strings[rows, choice]
+        frets[placeable] = cand_frets[rows, choice]
+        return strings, frets
+
+    def render_tab(self, measure_idx: np.ndarray, slot_idx: np.ndarray, strings: np.ndarray,
+                   frets: np.ndarray, measure_chords: List[str],
+                   slots_per_measure: Optional[int] = None, header: bool = True) -> str:
+        """
+        Render placed notes into ASCII tablature.
+
+        Notes are scattered into a (strings x total slots) byte grid in bulk;
+        each output line is then a slice of that grid joined once.
+
+        Args:
+            measure_idx: Measure index of each note into measure_chords
+            slot_idx: Slot of each note within its measure
+            strings: String index of each note (-1 = not placed)
+            frets: Fret of each note
+            measure_chords: Chord name per rendered measure
+            slots_per_measure: Slots per measure (default: configured value)
+            header: Start with the title line (see render_header); without it,
+                renderings of consecutive lines of measures join with newlines
+
+        Returns:
+            ASCII tablature string
+        """
+        slots_per_measure = slots_per_measure or self.slots_per_measure
+        num_measures = len(measure_chords)
+        grid = np.full((self.num_strings, num_measures * slots_per_measure), ord('-'), dtype=np.uint8)
+
+        placed = strings >= 0
+        if placed.any():
+            lines = (self.num_strings - 1 - strings[placed]).astype(np.int64)
+            columns = measure_idx[placed] * slots_per_measure + slot_idx[placed]
+            limits = (measure_idx[placed] + 1) * slots_per_measure
+            fret_values = frets[placed].astype(np.int64)
+
+            # Two-digit frets spill into the next slot unless that crosses the barline
+            two_digit = (fret_values >= 10) & (columns + 1 < limits)
+            first_digit = np.where(fret_values >= 10, fret_values // 10, fret_values)
+            note_order = np.arange(len(fret_values))
+
+            targets = np.concatenate([lines * grid.shape[1] + columns,
+                                      (lines * grid.shape[1] + columns + 1)[two_digit]])
+            values = ord('0') + np.concatenate([first_digit, (fret_values % 10)[two_digit]])
+            write_seq = np.concatenate([note_order * 2, note_order[two_digit] * 2 + 1])
+
+            # Later notes overwrite earlier ones, as in sequential placement
+            sequence = np.argsort(write_seq, kind='stable')
+            targets, values = targets[sequence], values[sequence]
+            ___, last = np.unique(targets[::-1], return_index=True)
+            keep_idx = len(targets) - 1 - last
+            grid.ravel()[targets[keep_idx]] = values[keep_idx].astype(np.uint8)
+
+        return self._render_layout(grid, measure_chords, slots_per_measure, header)
+
     def detect_chord(self, m_notes: List[Dict[str, Any]]) -> str:
         """
         Detect the most likely chord from notes in a measure.
@@ -217,63 +694,88 @@ class TabGenerator:
         Returns:
             Chord name (e.g., 'C', 'Am', 'G7') or 'N.C.' (No Chord)
         """
-        if not m_notes:
+        if not m_notes or not self.tables.chord_names:
             return "N.C."
 
-        pitches = [n['pitch'] % 12 for n in m_notes]
-        scores = {}
-
-        for name, shape in self.chord_templates.items():
-            template_pitches = set([(self.tuning[s] + f) % 12 for s, f in shape.items()])
-            scores[name] = sum(3 for p in pitches if p in template_pitches)
-
-            # Root note bonus
-            if shape:
-                first_s = next(iter(shape))
-                root_pitch = (self.tuning[first_s] + shape[first_s]) % 12
-                if root_pitch in pitches:
-                    scores[name] += 5
+        # Pitch-class histogram scored against every template at once
+        counts = np.bincount([n['pitch'] % 12 for n in m_notes], minlength=12).astype(np.float32)
+        scores = 3 * (self.tables.chord_masks @ counts)
+        # Root note bonus
+        scores += 5 * (counts[self.tables.chord_roots] > 0)
 
-        best = max(scores, key=scores.get)
-        detected = best if scores[best] > 5 else "N.C."
+        best_idx = int(np.argmax(scores))
+        best = self.tables.chord_names[best_idx]
+        detected = best if scores[best_idx] > self.min_chord_score else "N.C."
 
         if detected != "N.C.":
             logger.debug(_("Detected chord: {}").format(detected))
 
         return detected
 
-    def _render_layout(self, full_tab, measure_chords, num_measures, slots_per_measure):
-        measures_per_line = 4
-        headers = ['e|', 'B|', 'G|', 'D|', 'A|', 'E|']
+    def render_header(self) -> str:
+        """Title line that starts a rendered tab."""
         header_text = _("🎸 Fingerstyle Precision Analysis")
-        output = [f"{header_text} (BPM: {self.bpm:.1f})\n"]
+        return f"{header_text} (BPM: {self.bpm:.1f})\n"
+
+    def _render_layout(self, grid: np.ndarray, measure_chords: List[str],
+                       slots_per_measure: int, header: bool = True) -> str:
+        measures_per_line = self.measures_per_line
+        num_measures = len(measure_chords)
+        headers = ['e|', 'B|', 'G|', 'D|', 'A|', 'E|']
+        output = [self.render_header()] if header else []
+
+        # Measures as rows of slots, with a barline column appended to each
+        measures = grid.reshape(self.num_strings, num_measures, slots_per_measure)
+        bars = np.full((self.num_strings, num_measures, 1), ord('|'), dtype=np.uint8)
+        with_bars = np.concatenate([measures, bars], axis=2)
 
         for start_m in range(0, num_measures, measures_per_line):
             end_m = min(start_m + measures_per_line, num_measures)
-            chord_line = "  "
-            for m_idx in range(start_m, end_m):
-                chord_line += measure_chords[m_idx].ljust(slots_per_measure) + " "
-            output.append(chord_line)
+            output.append("  " + "".join(
+                measure_chords[m_idx].ljust(slots_per_measure) + " " for m_idx in range(start_m, end_m)
+            ))
 
             for s_idx in range(self.num_strings):
-                line = headers[s_idx]
-                for m_idx in range(start_m, end_m):
-                    line += "".join(full_tab[s_idx][m_idx]) + "|"
-                output.append(line)
+                output.append(headers[s_idx] + with_bars[s_idx, start_m:end_m].tobytes().decode('ascii'))
             output.append("")
 
         return "\n".join(output)
 
-def create_tab(notes: List[Dict[str, Any]], bpm: float = 75) -> str:
+
+def bass_mask(notes: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """
+    Return which notes came from the bass stem of source separation.
+
+    Returns None when the notes carry no 'source' (separation disabled or
+    bands not split), in which case bass is guessed from pitch.
+    """
+    if not any(n.get('source') in (BASS, MELODY) for n in notes):
+        return None
+    return np.fromiter((n.get('source') == BASS for n in notes), dtype=bool, count=len(notes))
+
+
+def create_tab(notes: List[Dict[str, Any]], bpm: float = 75,
+               tuning: List[str] = None, capo: int = 0, chroma: Optional[np.ndarray] = None,
+               chroma_offset: float = 0.0, fingering: str = 'greedy',
+               overrides: Sequence[FingeringOverride] = (),
+               tempo_map: Optional[Sequence[Tuple[float, float]]] = None) -> str:
     """
     Convenience function to create a tablature from notes.
 
     Args:
         notes: List of note dictionaries
         bpm: Beats per minute (default: 75)
+        tuning: List of string tunings (default: standard tuning E2-E4)
+        capo: Capo fret (default: 0)
+        chroma: Chromagram of the audio to detect chords from (default: use the notes)
+        chroma_offset: File time of the first chroma frame in seconds
+        fingering: Fingering method, 'greedy' or 'dp'
+        overrides: Fingering overrides (see TabGenerator.generate_ascii_tab)
+        tempo_map: (time, bpm) entries the measure grid follows (default: bpm throughout)
 
     Returns:
         ASCII tablature string
     """
-    generator = TabGenerator(bpm=bpm)
-    return generator.generate_ascii_tab(notes)
+    generator = TabGenerator(tuning=tuning, bpm=bpm, capo=capo)
+    return generator.generate_ascii_tab(notes, chroma=chroma, chroma_offset=chroma_offset,
+                                        fingering=fingering, overrides=overrides, tempo_map=tempo_map)
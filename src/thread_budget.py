@@ -0,0 +1,230 @@
+"""
+CPU thread budget shared by the worker pool, the inference runtime and BLAS.
+
+Every layer of a transcription is parallel on its own: the scheduler runs
+several chunk tasks at once, TensorFlow (or TFLite/ONNX Runtime) gives each
+inference call intra- and inter-op thread pools, and librosa/NumPy calls into
+OpenBLAS/MKL/OpenMP, which start a thread per core. Left at their defaults
+these multiply (workers x runtime threads x BLAS threads) far beyond the
+cores, and the threads thrash instead of working.
+
+The budget starts from the CPUs this process may actually use (its affinity
+mask and any cgroup CPU quota, as in a container). Worker processes each
+have their own runtime and BLAS thread pools, so the CPUs are split between
+them: cpus // processes runtime and BLAS threads and one inter-op thread
+each. Worker threads share this process's pools (TensorFlow's are process
+global, and so is threadpoolctl's BLAS limit), so those are sized for the
+whole process instead: cpus intra-op and BLAS threads, and an inter-op
+thread per worker so their calls can run side by side. Any of the numbers
+can be fixed in config.yaml.
+"""
+import gettext
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from src.config import Config, get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Thread-count variables read by OpenMP and the BLAS libraries NumPy may use
+BLAS_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    """Thread counts for each parallel layer of transcription"""
+    cpus: int  # CPUs budgeted for
+    cpu_source: str  # where the CPU count came from
+    workers: int  # scheduler worker threads
+    worker_processes: int  # worker processes running inference (0 = in-process)
+    intra_op_threads: int  # per process's inference runtime; 0 = runtime default
+    inter_op_threads: int
+    blas_threads: int  # OpenMP/BLAS threads per process; 0 = library default
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that apply the BLAS/OpenMP limit to a new process."""
+        if self.blas_threads <= 0:
+            return {}
+        return {name: str(self.blas_threads) for name in BLAS_ENV_VARS}
+
+    def describe(self) -> str:
+        """One-line summary for status reports."""
+        slots = _("{} worker processes").format(self.worker_processes) if self.worker_processes \
+            else _("{} worker threads").format(self.workers)
+        return _("{} CPUs ({}): {}, inference {} intra-op / {} inter-op threads per process, "
+                 "BLAS/OpenMP {} threads").format(
+            self.cpus, self.cpu_source, slots, self.intra_op_threads or _("default"),
+            self.inter_op_threads or _("default"), self.blas_threads or _("default"))
+
+
+def cgroup_cpu_quota(root: str = CGROUP_ROOT) -> Optional[float]:
+    """
+    Return the CPU quota of this process's cgroup in CPUs, or None if unlimited.
+
+    Reads cgroup v2 cpu.max or cgroup v1 cpu.cfs_quota_us/cpu.cfs_period_us,
+    at the cgroup root (as mounted in a container) and along the process's
+    own cgroup path; the smallest limit wins.
+    """
+    candidates = []
+    try:
+        with open('/proc/self/cgroup', encoding='utf-8') as f:
+            for line in f:
+                ___, controllers, path = line.strip().split(':', 2)
+                if controllers == '' or 'cpu' in controllers.split(','):
+                    candidates.append(path.lstrip('/'))
+    except (OSError, ValueError):
+        pass
+
+    quotas = []
+    for relative in [''] + candidates:
+        parts = relative.split('/') if relative else []
+        for depth in range(len(parts), -1, -1):
+            directory = os.path.join(root, *parts[:depth])
+            quota = _read_quota(directory) or _read_quota(os.path.join(root, 'cpu', *parts[:depth])) \
+                or _read_quota(os.path.join(root, 'cpu,cpuacct', *parts[:depth]))
+            if quota:
+                quotas.append(quota)
+    return min(quotas) if quotas else None
+
+
+def _read_quota(directory: str) -> Optional[float]:
+    """Quota in CPUs from one cgroup directory (v2 or v1), or None."""
+    try:
+        with open(os.path.join(directory, 'cpu.max'), encoding='utf-8') as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(directory, 'cpu.cfs_quota_us'), encoding='utf-8') as f:
+            quota = int(f.read())
+        with open(os.path.join(directory, 'cpu.cfs_period_us'), encoding='utf-8') as f:
+            period = int(f.read())
+        return None if quota <= 0 or period <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> Tuple[int, str]:
+    """
+    Return the number of CPUs this process can use and where it came from.
+
+    The affinity mask (taskset, cpusets) bounds the count, and a cgroup CPU
+    quota lowers it further, rounded down to whole CPUs (at least one).
+    """
+    try:
+        cpus, source = len(os.sched_getaffinity(0)), 'affinity'
+    except AttributeError:
+        cpus, source = os.cpu_count() or 1, 'cpu_count'
+    quota = cgroup_cpu_quota(root)
+    if quota is not None and quota < cpus:
+        return max(1, math.floor(quota)), 'cgroup quota'
+    return cpus, source
+
+
+def compute_budget(config: Config, cpus: Optional[int] = None, cpu_source: Optional[str] = None) -> ThreadBudget:
+    """
+    Split the CPUs between worker slots, the inference runtime and BLAS.
+
+    Args:
+        config: Configuration; threads.* and inference.*_op_threads fix counts,
+            performance.workers and performance.worker_processes cap the slots
+        cpus: CPUs to budget for (default: threads.cpus, else available_cpus())
+        cpu_source: Where cpus came from, for reports
+
+    Returns:
+        ThreadBudget; with threads.enabled off, the configured values unchanged
+    """
+    threads, performance, inference = config.threads, config.performance, config.inference
+    if cpus is None:
+        if threads.cpus > 0:
+            cpus, cpu_source = threads.cpus, 'config'
+        else:
+            cpus, cpu_source = available_cpus()
+    cpus = max(1, cpus)
+    if not threads.enabled:
+        return ThreadBudget(cpus, cpu_source or 'config', max(1, performance.workers),
+                            performance.worker_processes, inference.intra_op_threads,
+                            inference.inter_op_threads, 0)
+
+    workers = max(1, min(performance.workers, cpus))
+    worker_processes = min(performance.worker_processes, cpus)
+    if worker_processes:
+        # Each process has its own pools: split the CPUs between them
+        intra_op, inter_op = max(1, cpus // worker_processes), 1
+        blas = intra_op
+    else:
+        # The worker threads share this process's pools: size them for the process
+        intra_op, inter_op, blas = cpus, workers, cpus
+    return ThreadBudget(
+        cpus=cpus,
+        cpu_source=cpu_source or 'config',
+        workers=workers,
+        worker_processes=worker_processes,
+        intra_op_threads=inference.intra_op_threads or intra_op,
+        inter_op_threads=inference.inter_op_threads or inter_op,
+        blas_threads=threads.blas_threads or blas,
+    )
+
+
+def apply_blas_limit(blas_threads: int) -> None:
+    """
+    Limit OpenMP/BLAS threads in this process and the processes it starts.
+
+    The environment variables only take effect in libraries loaded afterwards
+    (and in child processes); threadpoolctl, if installed, also resizes the
+    thread pools of libraries already loaded.
+    """
+    if blas_threads <= 0:
+        return
+    for name in BLAS_ENV_VARS:
+        os.environ[name] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=blas_threads)
+
+
+# Budget of this process and the settings it was computed from
+_BUDGET: Optional[ThreadBudget] = None
+_BUDGET_KEY: Optional[Tuple] = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def get_thread_budget(config: Optional[Config] = None) -> ThreadBudget:
+    """
+    Return the process-wide thread budget, applying its BLAS limit.
+
+    The budget is recomputed when the settings it depends on change
+    (configuration reload); the CPU count is detected once.
+
+    Args:
+        config: Configuration to budget for (default: the global configuration)
+    """
+    global _BUDGET, _BUDGET_KEY
+    config = config or get_config()
+    key = (config.threads, config.performance.workers, config.performance.worker_processes,
+           config.inference.intra_op_threads, config.inference.inter_op_threads)
+    with _BUDGET_LOCK:
+        if _BUDGET is None or _BUDGET_KEY != key:
+            cpus = source = None
+            if _BUDGET is not None and config.threads.cpus <= 0 and _BUDGET.cpu_source != 'config':
+                cpus, source = _BUDGET.cpus, _BUDGET.cpu_source
+            _BUDGET = compute_budget(config, cpus, source)
+            _BUDGET_KEY = key
+            apply_blas_limit(_BUDGET.blas_threads)
+            logger.info(_("Thread budget: {}").format(_BUDGET.describe()))
+        return _BUDGET
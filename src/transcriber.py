@@ -1,12 +1,29 @@
 import numpy as np
-import librosa
+import functools
 import gettext
 import os
 import logging
-from typing import List, Dict, Tuple, Any
+import threading
+from concurrent.futures import Future, InvalidStateError
+from contextlib import nullcontext
+from dataclasses import replace
+from typing import List, Dict, Tuple, Any, Optional
 from pathlib import Path
-from basic_pitch.inference import predict
-from basic_pitch import ICASSP_2022_MODEL_PATH
+from basic_pitch.constants import (ANNOT_N_FRAMES, ANNOTATIONS_N_SEMITONES, AUDIO_N_SAMPLES,
+                                   AUDIO_SAMPLE_RATE, FFT_HOP, N_FREQ_BINS_CONTOURS)
+from basic_pitch.inference import unwrap_output, window_audio_file
+from src.analysis_profiles import AnalysisProfile, get_analysis_profile
+from src.audio_probe import get_audio_duration
+from src.config import NoteExtractionConfig, PerformanceConfig, SeparationConfig, get_config
+from src.features import get_feature_store
+from src.inference_backend import FORK_SAFE_BACKENDS, RUNTIME_MODULES, load_model, resolve_backend
+from src.model_manager import ModelManager, basic_pitch_health_check
+from src.note_extraction import Activations, activations_from_output, extract_notes, min_note_frames, stitch
+from src.scheduler import FairScheduler, Job, get_scheduler
+from src.separation import merge_stems, separate, stem_names
+from src.thread_budget import get_thread_budget
+from src.window_planner import clip_to_window, get_window_planner, plan_chunks
+from src.worker_pool import PRELOAD_MODULES, WorkerProcessPool, worker_model
 
 # Setup logging
 logging.basicConfig(
@@ -23,23 +40,114 @@ _ = translate.gettext
 # Supported audio formats
 SUPPORTED_FORMATS = {'.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aac'}
 
-# Global model cache to avoid re-loading for every request
-_MODEL_CACHE = None
+# Basic Pitch windowing (as in basic_pitch.inference.run_inference)
+N_OVERLAPPING_FRAMES = 30
+OVERLAP_LEN = N_OVERLAPPING_FRAMES * FFT_HOP
+HOP_SIZE = AUDIO_N_SAMPLES - OVERLAP_LEN
+
+# Model output of one window (frames x bins), also used for skipped silent windows
+WINDOW_OUTPUT_SHAPES = {
+    "note": (ANNOT_N_FRAMES, ANNOTATIONS_N_SEMITONES),
+    "onset": (ANNOT_N_FRAMES, ANNOTATIONS_N_SEMITONES),
+    "contour": (ANNOT_N_FRAMES, N_FREQ_BINS_CONTOURS),
+}
+
+# Client identity of jobs submitted without admission (library and CLI use)
+LOCAL_CLIENT = "local"
+
+# Process-wide model owner, created on first use
+_MODEL_MANAGER: Optional[ModelManager] = None
+_MODEL_MANAGER_KEY: Optional[Tuple[Any, ...]] = None
+_MODEL_MANAGER_LOCK = threading.Lock()
+
+# Process-wide pool of preloaded worker processes, created on first use
+_WORKER_POOL: Optional[WorkerProcessPool] = None
+_WORKER_POOL_KEY: Optional[Tuple[Any, ...]] = None
+
+def get_model_manager() -> ModelManager:
+    """
+    Return the process-wide ModelManager, creating it from the configuration.
+
+    Runtime thread counts come from the thread budget (src.thread_budget).
+    If the backend, threads or quantization changed since the manager was
+    created (configuration reload), a new manager is created for subsequent
+    requests; the old one is retired and unloads once its in-flight requests
+    finish. Lifecycle settings are applied to the current manager in place.
+    """
+    global _MODEL_MANAGER, _MODEL_MANAGER_KEY
+    inference = get_config().inference
+    budget = get_thread_budget()
+    key = (inference.backend, budget.intra_op_threads, budget.inter_op_threads,
+           inference.quantize, inference.quantized_model_dir)
+    with _MODEL_MANAGER_LOCK:
+        if _MODEL_MANAGER is None or _MODEL_MANAGER_KEY != key:
+            if _MODEL_MANAGER is not None:
+                logger.info(_("Inference settings changed; switching to a new model"))
+                _MODEL_MANAGER.retire()
+            _MODEL_MANAGER = ModelManager(
+                functools.partial(load_model, inference.backend,
+                                  intra_op_threads=budget.intra_op_threads,
+                                  inter_op_threads=budget.inter_op_threads,
+                                  quantize=inference.quantize,
+                                  model_dir=inference.quantized_model_dir),
+                health_check=basic_pitch_health_check,
+            )
+            _MODEL_MANAGER_KEY = key
+        _MODEL_MANAGER.idle_unload_seconds = inference.idle_unload_seconds
+        _MODEL_MANAGER.max_retries = max(1, inference.load_retries)
+        _MODEL_MANAGER.retry_backoff_seconds = inference.retry_backoff_seconds
+        return _MODEL_MANAGER
 
 def get_model():
-    """Lazy load and cache the Basic Pitch model."""
-    global _MODEL_CACHE
-    if _MODEL_CACHE is None:
-        try:
-            from basic_pitch.inference import Model
-            logger.info(_("Loading Basic Pitch model into memory..."))
-            _MODEL_CACHE = Model(str(ICASSP_2022_MODEL_PATH))
-            logger.info(_("Model loaded successfully."))
-        except Exception as e:
-            logger.error(_("Failed to load model: {}").format(str(e)))
-            # Fallback to path string if direct load fails
-            _MODEL_CACHE = ICASSP_2022_MODEL_PATH
-    return _MODEL_CACHE
+    """Return the cached Basic Pitch model, loading it on first use."""
+    return get_model_manager().get()
+
+def get_worker_pool() -> WorkerProcessPool:
+    """
+    Return the process-wide pool of preloaded worker processes.
+
+    The template process imports the backend's runtime and loads the model
+    once for all workers (see src.worker_pool), which only fork-safe backends
+    (tflite) allow. If the inference settings changed, the old pool is
+    closed and a new one is created; pool size (capped by the thread budget)
+    and idle timeout are applied in place. Workers inherit the budget's
+    BLAS/OpenMP limit.
+
+    Raises:
+        ValueError: If the inference backend is not fork-safe
+    """
+    global _WORKER_POOL, _WORKER_POOL_KEY
+    config = get_config()
+    inference, settings = config.inference, config.performance
+    budget = get_thread_budget()
+    key = (inference.backend, budget.intra_op_threads, budget.inter_op_threads, budget.blas_threads,
+           inference.quantize, inference.quantized_model_dir)
+    with _MODEL_MANAGER_LOCK:
+        if _WORKER_POOL is None or _WORKER_POOL_KEY != key:
+            if _WORKER_POOL is not None:
+                logger.info(_("Inference settings changed; starting new worker processes"))
+                _WORKER_POOL.close()
+            backend = resolve_backend(inference.backend)
+            if backend not in FORK_SAFE_BACKENDS:
+                raise ValueError(_("Worker processes need the tflite backend, whose preloaded model "
+                                   "all workers share; the {} backend would load a copy in each. "
+                                   "Set inference.backend to tflite.").format(backend))
+            _WORKER_POOL = WorkerProcessPool(
+                functools.partial(load_model, backend,
+                                  intra_op_threads=budget.intra_op_threads,
+                                  inter_op_threads=budget.inter_op_threads,
+                                  quantize=inference.quantize,
+                                  model_dir=inference.quantized_model_dir),
+                preload_model=True,
+                max_workers=budget.worker_processes,
+                idle_seconds=settings.worker_process_idle_seconds,
+                preload_modules=(RUNTIME_MODULES[backend],) + PRELOAD_MODULES,
+                env=budget.environment(),
+            )
+            _WORKER_POOL_KEY = key
+        else:
+            _WORKER_POOL.resize(budget.worker_processes, settings.worker_process_idle_seconds)
+        return _WORKER_POOL
 
 def validate_audio_file(audio_path: str) -> Path:
     """
@@ -72,97 +180,257 @@ def validate_audio_file(audio_path: str) -> Path:
 
     return path
 
-def _transcribe_chunk(audio_path: str, duration: float = None, start_offset: float = 0.0) -> List[Dict[str, Any]]:
+def _run_inference(audio: np.ndarray, model, batch_size: int = 1,
+                   silence_db: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """
+    Run the model over mono 22.05 kHz audio, several windows per call.
+
+    Equivalent to basic_pitch.inference.run_inference, but on samples already
+    in memory and with batch_size windows stacked into each model call.
+    With silence_db, windows whose peak is below that level (dBFS) are not
+    run through the model; their activations are zero.
+    """
+    padded = np.concatenate([np.zeros(OVERLAP_LEN // 2, dtype=np.float32), audio.astype(np.float32)])
+    windows = [window for window, ___ in window_audio_file(padded, HOP_SIZE)]
+    audible = list(range(len(windows)))
+    if silence_db is not None:
+        threshold = 10.0 ** (silence_db / 20.0)
+        audible = [i for i, window in enumerate(windows) if np.abs(window).max() >= threshold]
+
+    output = {k: np.zeros((len(windows),) + shape, dtype=np.float32) for k, shape in WINDOW_OUTPUT_SHAPES.items()}
+    for i in range(0, len(audible), max(1, batch_size)):
+        batch_idx = audible[i:i + max(1, batch_size)]
+        for k, v in model.predict(np.stack([windows[j] for j in batch_idx])).items():
+            output[k][batch_idx] = v
+    return {k: unwrap_output(v, len(audio), N_OVERLAPPING_FRAMES) for k, v in output.items()}
+
+def _load_chunk(audio_path: str, duration: float = None, start_offset: float = 0.0) -> np.ndarray:
+    """Decode part of a file as mono audio at the model's sample rate."""
+    validated_path = validate_audio_file(audio_path)
+    return get_feature_store().segment(str(validated_path), start_offset, duration, AUDIO_SAMPLE_RATE).audio
+
+def _activations_from_audio(audio: np.ndarray, model, batch_size: int = 1,
+                            start_offset: float = 0.0, silence_db: Optional[float] = None) -> Activations:
+    """Run the model over in-memory audio; frame times are offset by start_offset."""
+    return activations_from_output(_run_inference(audio, model, batch_size, silence_db), start_offset)
+
+def _transcribe_chunk(audio_path: str, duration: float = None, start_offset: float = 0.0,
+                      model=None, batch_size: int = 1, silence_db: Optional[float] = None) -> Activations:
     """Internal function for processing a single audio chunk."""
-    temp_path = None
+    audio = _load_chunk(audio_path, duration, start_offset)
+    if model is None:
+        model = get_model()
+    return _activations_from_audio(audio, model, batch_size, start_offset, silence_db)
+
+def _call_with_worker_model(fn, *args: Any, **kwargs: Any) -> Any:
+    """Run fn in a pool worker process with that process's preloaded model."""
+    return fn(*args, model=worker_model(), **kwargs)
+
+def _submit_model_task(scheduler: FairScheduler, job: Job, pool: Optional[WorkerProcessPool], model,
+                       fn, *args: Any, cost: float, **kwargs: Any) -> Future:
+    """Queue fn(*args, model=..., **kwargs), in a worker process if a pool is given."""
+    if pool is not None:
+        return scheduler.submit(job, pool.run, _call_with_worker_model, fn, *args, cost=cost, **kwargs)
+    return scheduler.submit(job, fn, *args, model=model, cost=cost, **kwargs)
+
+def _extract(activations: Activations, settings: NoteExtractionConfig) -> List[Dict[str, Any]]:
+    """Extract notes with the configured thresholds."""
+    return extract_notes(activations, onset_threshold=settings.onset_threshold,
+                         frame_threshold=settings.frame_threshold,
+                         min_note_length=min_note_frames(settings.min_note_length_ms),
+                         infer_onsets=settings.infer_onsets, melodia_trick=settings.melodia_trick)
+
+def _separate_chunk(audio_path: str, duration: float, start_offset: float,
+                    separation: SeparationConfig) -> Dict[str, np.ndarray]:
+    """Split a chunk into stems (see src.separation), reusing its shared STFT."""
+    validated_path = validate_audio_file(audio_path)
+    features = get_feature_store().segment(str(validated_path), start_offset, duration, AUDIO_SAMPLE_RATE)
+    return separate(features.audio, AUDIO_SAMPLE_RATE, split_bands=separation.split_bands,
+                    crossover_hz=separation.crossover_hz, margin=separation.hpss_margin,
+                    stft=features.stft)
+
+def _settle(future: Future, result: Any = None, exception: BaseException = None) -> None:
+    """Complete a future unless the requester already cancelled it."""
     try:
-        validated_path = validate_audio_file(audio_path)
-        target_path = str(validated_path)
-        if duration or start_offset > 0:
-            import tempfile
-            import soundfile as sf
-            y, sr = librosa.load(str(validated_path), offset=start_offset, duration=duration)
-            fd, temp_path = tempfile.mkstemp(suffix=".wav")
-            os.close(fd)
-            sf.write(temp_path, y, sr)
-            target_path = temp_path
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
 
-        model = get_model()
-        model_output, midi_data, note_events = predict(target_path, model_or_model_path=model)
-
-        notes = []
-        for note in note_events:
-            notes.append({
-                'start': float(note[0]) + start_offset,
-                'end': float(note[1]) + start_offset,
-                'pitch': int(note[2]),
-                'velocity': float(note[3])
-            })
-        return notes
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            try: os.remove(temp_path)
-            except: pass
-
-def transcribe_audio(audio_path: str, duration: float = None, start_offset: float = 0.0) -> Tuple[List[Dict[str, Any]], float]:
+def _submit_separated(scheduler: FairScheduler, job: Job, audio_path: str, start: float,
+                      duration: float, model, batch_size: int,
+                      separation: SeparationConfig, pool: Optional[WorkerProcessPool] = None,
+                      silence_db: Optional[float] = None) -> Future:
     """
-    Analyzes an audio file, using parallel processing for files longer than 45 seconds.
+    Queue separation of a chunk, then transcription of each stem as its own task.
+
+    Stems are transcribed concurrently on the scheduler's workers (in
+    worker processes if a pool is given). The
+    returned future resolves to a dict of stem name -> activations.
     """
-    validated_path = validate_audio_file(audio_path)
-    audio_path_str = str(validated_path)
-    
-    # 1. Detect BPM
-    logger.info(_("Detecting tempo..."))
-    y, sr = librosa.load(audio_path_str, offset=start_offset, duration=min(60, duration if duration else 60))
-    tempo, __ = librosa.beat.beat_track(y=y, sr=sr)
-    detected_bpm = float(tempo)
-    logger.info(_("Detected BPM: {:.2f}").format(detected_bpm))
-
-    # 2. Determine chunks
-    total_duration = float(librosa.get_duration(path=audio_path_str))
+    result: Future = Future()
+    pending: List[Future] = []
+
+    def on_stems(separated: Future) -> None:
+        if separated.cancelled() or result.cancelled():
+            return
+        if separated.exception() is not None:
+            _settle(result, exception=separated.exception())
+            return
+        stems = separated.result()
+        stem_activations: Dict[str, Activations] = {}
+        lock = threading.Lock()
+
+        def on_activations(stem: str, future: Future) -> None:
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                _settle(result, exception=future.exception())
+                return
+            with lock:
+                stem_activations[stem] = future.result()
+                done = len(stem_activations) == len(stems)
+            if done:
+                _settle(result, stem_activations)
+
+        for stem, audio in stems.items():
+            future = _submit_model_task(scheduler, job, pool, model, _activations_from_audio, audio,
+                                        batch_size=batch_size, start_offset=start,
+                                        silence_db=silence_db, cost=duration)
+            pending.append(future)
+            future.add_done_callback(functools.partial(on_activations, stem))
+
+    separated = scheduler.submit(job, _separate_chunk, audio_path, duration, start, separation, cost=0.0)
+    pending.append(separated)
+    separated.add_done_callback(on_stems)
+
+    def on_done(future: Future) -> None:
+        if future.cancelled():
+            for task in list(pending):
+                task.cancel()
+
+    result.add_done_callback(on_done)
+    return result
+
+def _separation_for(profile: AnalysisProfile) -> SeparationConfig:
+    """The separation settings of a profile: as configured unless it turns separation on or off."""
+    separation = get_config().separation
+    if profile.separation is not None:
+        separation = replace(separation, enabled=profile.separation)
+    return separation
+
+def estimate_cost(audio_path: str, duration: float = None, start_offset: float = 0.0,
+                  profile: Optional[AnalysisProfile] = None) -> float:
+    """
+    Return the number of audio seconds a transcription request would process.
+
+    With source separation every stem is transcribed, so the cost is the
+    window length times the number of stems.
+    """
+    total_duration = max(0.0, get_audio_duration(audio_path) - start_offset)
     if duration:
         total_duration = min(total_duration, duration)
-    
-    # Parallelize only if significant length
-    if total_duration < 45:
-        notes = _transcribe_chunk(audio_path_str, duration=total_duration, start_offset=start_offset)
-        return notes, detected_bpm
-
-    chunk_size = 30.0
-    overlap = 2.0
-    chunks = []
-    curr = start_offset
-    end_time = start_offset + total_duration
-    
-    while curr < end_time:
-        d = min(chunk_size + overlap, end_time - curr)
-        chunks.append((curr, d))
-        if curr + chunk_size >= end_time: break
-        curr += chunk_size
-
-    logger.info(_("Parallel Analysis: Splitting into {} chunks to finish in < 1 min").format(len(chunks)))
-    
-    from concurrent.futures import ThreadPoolExecutor
-    all_notes = []
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = [executor.submit(_transcribe_chunk, audio_path_str, d, s) for s, d in chunks]
-        for i, future in enumerate(futures):
-            try:
-                all_notes.extend(future.result())
-            except Exception as e:
-                logger.error(_("Error in chunk {}: {}").format(i+1, str(e)))
-                raise RuntimeError(_("Parallel processing failed in chunk {}: {}").format(i+1, str(e))) from e
-
-    # 3. Deduplicate
-    all_notes.sort(key=lambda x: (x['start'], x['pitch']))
-    unique_notes = []
-    if all_notes:
-        unique_notes.append(all_notes[0])
-        for i in range(1, len(all_notes)):
-            curr_n = all_notes[i]
-            prev_n = unique_notes[-1]
-            if curr_n['pitch'] == prev_n['pitch'] and (curr_n['start'] - prev_n['start']) < 0.1:
-                continue
-            unique_notes.append(curr_n)
-
-    return unique_notes, detected_bpm
+    separation = _separation_for(profile or get_analysis_profile())
+    if separation.enabled:
+        total_duration *= len(stem_names(separation.split_bands))
+    return total_duration
+
+def transcribe_audio(audio_path: str, duration: float = None, start_offset: float = 0.0,
+                     job: Optional[Job] = None,
+                     profile: Optional[AnalysisProfile] = None) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Analyzes an audio file, using parallel processing for long files.
+
+    Chunks run on the shared scheduler's workers (inference in preloaded
+    worker processes if performance.worker_processes is set); chunks already transcribed
+    or in flight for an overlapping request on the same file are reused (see
+    src.window_planner). Chunking, worker count and
+    batch size are read from the configuration once per request, so a
+    configuration reload never changes a running job.
+
+    Args:
+        audio_path: Path to the audio file
+        duration: Seconds to analyze (default: to the end)
+        start_offset: Start of the analysis in seconds
+        job: Admitted scheduler job to run under (default: an unlimited local job)
+        profile: Speed/quality profile (default: analysis.default_profile); it
+            decides separation, silence skipping, chunk overlap and tempo search
+
+    Returns:
+        Tuple of (notes, detected BPM)
+    """
+    validated_path = validate_audio_file(audio_path)
+    settings = get_config().performance
+    profile = profile or get_analysis_profile()
+    scheduler = get_scheduler()
+
+    pool = get_worker_pool() if settings.worker_processes > 0 else None
+
+    # Keep the model resident (not idle-unloaded) for the whole request; worker
+    # processes have their own
+    with nullcontext() if pool is not None else get_model_manager().use() as model:
+        if job is not None:
+            return _transcribe_validated(str(validated_path), duration, start_offset,
+                                         model, settings, scheduler, job, pool, profile)
+        cost = estimate_cost(str(validated_path), duration, start_offset, profile)
+        with scheduler.job(LOCAL_CLIENT, cost, enforce=False) as local_job:
+            return _transcribe_validated(str(validated_path), duration, start_offset,
+                                         model, settings, scheduler, local_job, pool, profile)
+
+def _transcribe_validated(audio_path_str: str, duration: float, start_offset: float,
+                          model, settings: PerformanceConfig, scheduler: FairScheduler,
+                          job: Job, pool: Optional[WorkerProcessPool],
+                          profile: AnalysisProfile) -> Tuple[List[Dict[str, Any]], float]:
+    # 1. Map the window onto grid chunks shared with overlapping requests
+    file_duration = get_audio_duration(audio_path_str)
+    end_time = min(file_duration, start_offset + duration) if duration else file_duration
+    overlap = settings.chunk_overlap_seconds if profile.chunk_overlap else 0.0
+    chunks = plan_chunks(file_duration, start_offset, end_time, settings.chunk_seconds,
+                         overlap, settings.parallel_threshold_seconds)
+    if len(chunks) > 1:
+        logger.info(_("Parallel Analysis: Splitting into {} chunks to finish in < 1 min").format(len(chunks)))
+
+    # 2. Detect BPM (a preview takes the configured default instead) on the first chunk:
+    # the same feature segment its transcription decodes, so the audio is decoded once
+    if profile.tempo == 'fixed' or not chunks:
+        detected_bpm = get_config().audio.default_bpm
+    else:
+        logger.info(_("Detecting tempo..."))
+        first = chunks[0]
+        detected_bpm = get_feature_store().segment(audio_path_str, first.start, first.duration,
+                                                   AUDIO_SAMPLE_RATE).tempo
+        logger.info(_("Detected BPM: {:.2f}").format(detected_bpm))
+
+    separation = _separation_for(profile)
+
+    def submit(chunk):
+        if separation.enabled:
+            return _submit_separated(scheduler, job, audio_path_str, chunk.start, chunk.duration,
+                                     model, settings.batch_size, separation, pool, profile.silence_db)
+        return _submit_model_task(scheduler, job, pool, model, _transcribe_chunk, audio_path_str,
+                                  chunk.duration, chunk.start, batch_size=settings.batch_size,
+                                  silence_db=profile.silence_db, cost=chunk.duration)
+
+    inference = get_config().inference
+    variant = (inference.backend, inference.quantize, inference.quantized_model_dir,
+               repr(separation) if separation.enabled else None, profile.silence_db)
+    try:
+        chunk_activations = get_window_planner().transcribe(audio_path_str, chunks, submit, variant)
+    except Exception as e:
+        if len(chunks) <= 1:
+            raise
+        logger.error(_("Error in chunk transcription: {}").format(str(e)))
+        raise RuntimeError(_("Parallel processing failed: {}").format(str(e))) from e
+
+    # 3. Stitch the chunks' activations, extract notes and cut to the window
+    extraction = get_config().note_extraction
+    if separation.enabled:
+        notes = merge_stems({
+            stem: _extract(stitch([chunk[stem] for chunk in chunk_activations]), extraction)
+            for stem in chunk_activations[0]
+        } if chunk_activations else {}, separation.crossover_hz)
+    else:
+        notes = _extract(stitch(chunk_activations), extraction) if chunk_activations else []
+    return clip_to_window(notes, start_offset, end_time), detected_bpm
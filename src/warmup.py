@@ -0,0 +1,218 @@
+"""
+Warm-up: pay first-request costs before the first request.
+
+The first analysis in a fresh process imports librosa's and basic_pitch's
+lazily loaded modules, loads the model, traces its TensorFlow graph and
+compiles librosa's numba kernels (resampling, onset and beat tracking, peak
+picking). warm_up() runs the whole pipeline of the default profile on a few
+seconds of synthetic guitar so a server can do all of that in the background
+right after the MCP handshake.
+
+numba keeps what it compiles in an on-disk cache. configure_numba_cache()
+points that cache at a writable directory (warmup.numba_cache_dir) so the
+kernels compiled once are loaded by every later process, including worker
+processes forked after the warm-up, which would otherwise compile again.
+It has to run before librosa is imported.
+"""
+import gettext
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+DEFAULT_NUMBA_CACHE_DIR = Path.home() / '.cache' / 'fingerstyle-tab' / 'numba'
+SAMPLE_RATE = 22050
+
+# Plucked C major arpeggio (MIDI pitches), one note per eighth at 100 BPM
+_CLIP_PITCHES = (48, 52, 55, 60, 64, 60, 55, 52)
+_CLIP_STEP_SECONDS = 0.3
+
+
+def configure_numba_cache(directory: Optional[str] = None) -> Optional[str]:
+    """
+    Keep numba's compiled kernels in a persistent cache directory.
+
+    Args:
+        directory: Cache directory (default: warmup.numba_cache_dir, else an
+            existing NUMBA_CACHE_DIR, else DEFAULT_NUMBA_CACHE_DIR)
+
+    Returns:
+        The cache directory, or None if it can't be created
+    """
+    directory = directory or get_config().warmup.numba_cache_dir \
+        or os.environ.get('NUMBA_CACHE_DIR') or str(DEFAULT_NUMBA_CACHE_DIR)
+    directory = os.path.expanduser(directory)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        logger.warning(_("Could not create the numba cache directory {}: {}").format(directory, str(e)))
+        return None
+    os.environ['NUMBA_CACHE_DIR'] = directory
+    if 'numba' in sys.modules:
+        # Kernels decorated from now on (librosa loads its submodules lazily) use the new directory
+        from numba.core import config as numba_config
+        numba_config.reload_config()
+    return directory
+
+
+def synthetic_clip(seconds: float = 3.0, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """A few seconds of plucked guitar-like notes (harmonics with an exponential decay)."""
+    audio = np.zeros(int(seconds * sr), dtype=np.float32)
+    t = np.arange(int(0.8 * sr)) / sr
+    for i, start in enumerate(np.arange(0.0, seconds, _CLIP_STEP_SECONDS)):
+        f0 = 440.0 * 2 ** ((_CLIP_PITCHES[i % len(_CLIP_PITCHES)] - 69) / 12)
+        note = sum(0.3 / k * np.sin(2 * np.pi * f0 * k * t) for k in range(1, 6)) * np.exp(-4 * t)
+        first = int(start * sr)
+        audio[first:first + len(t)] += note[:len(audio) - first]
+    return audio / max(1e-9, float(np.abs(audio).max()))
+
+
+def warm_up(profile=None) -> float:
+    """
+    Run the full pipeline (transcription, chords, fingering, rendering) on a synthetic clip.
+
+    The clip is analyzed under a temporary path, so no cache entry outlives it
+    in a way a real file could hit. Like every analysis it may print through
+    the libraries it runs; mcp_server.py sends that output to stderr for the
+    whole process at startup, so a warm-up beside requests can't reach the
+    protocol stream.
+
+    Args:
+        profile: Analysis profile to warm (default: analysis.default_profile)
+
+    Returns:
+        Seconds the warm-up took
+    """
+    import soundfile as sf
+    from src.analysis import AnalyzedPiece
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='tab-warmup-') as directory:
+        path = os.path.join(directory, 'warmup.wav')
+        sf.write(path, synthetic_clip(get_config().warmup.clip_seconds), SAMPLE_RATE)
+        AnalyzedPiece.from_audio(path, profile).render_measures()
+    return time.perf_counter() - started
+
+
+class Warmup:
+    """Background warm-up of a process, run at most once"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = 'idle'  # idle, running, done, failed
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def start(self) -> bool:
+        """Start warming up in a background thread; False if already started or disabled."""
+        with self._lock:
+            if self.state != 'idle' or not get_config().warmup.enabled:
+                return False
+            self.state = 'running'
+        threading.Thread(target=self._run, name='warmup', daemon=True).start()
+        return True
+
+    def _run(self) -> None:
+        try:
+            seconds = warm_up()
+        except Exception as e:
+            logger.warning(_("Warm-up failed; the first request will be slower: {}").format(str(e)))
+            self.error, self.state = str(e), 'failed'
+            return
+        logger.info(_("Warm-up finished in {:.2f}s").format(seconds))
+        self.seconds, self.state = round(seconds, 3), 'done'
+
+    def status(self) -> Dict[str, Any]:
+        return {'state': self.state, 'seconds': self.seconds, 'error': self.error}
+
+
+@dataclass
+class FirstRequestBenchmark:
+    """Latency of the first request in a fresh process"""
+    mode: str  # 'cold (no JIT cache)', 'cold' or 'warm'
+    import_seconds: float  # importing the pipeline
+    warmup_seconds: Optional[float]  # warm-up before the request, if any
+    first_request_seconds: float
+
+
+# Run in a fresh interpreter by benchmark_first_request; prints timings as JSON
+_FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from src.warmup import configure_numba_cache
+configure_numba_cache(sys.argv[3] or None)
+from src.analysis import AnalyzedPiece
+from src.warmup import warm_up
+imported = time.perf_counter() - started
+warmup_seconds = warm_up() if sys.argv[2] == 'warm' else None
+started = time.perf_counter()
+AnalyzedPiece.from_audio(sys.argv[1], duration=float(sys.argv[4]) if sys.argv[4] else None).render_measures()
+print(json.dumps([imported, warmup_seconds, time.perf_counter() - started]))
+"""
+
+
+def benchmark_first_request(audio_path: str, duration: Optional[float] = None,
+                            repeats: int = 1) -> List[FirstRequestBenchmark]:
+    """
+    Measure the first analysis of a fresh process, cold and after a warm-up.
+
+    Each run is a new interpreter analyzing the file with the default profile:
+    cold with an empty numba cache (the first run after installing), cold with
+    the persistent numba cache, and warm (warm_up() first, as the server does
+    after the handshake).
+
+    Args:
+        audio_path: Audio file to analyze
+        duration: Seconds to analyze from the start (default: whole file)
+        repeats: Processes per mode; the fastest first request is reported
+
+    Returns:
+        One FirstRequestBenchmark per mode
+    """
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in [repo_dir] + sys.path if p),
+               TF_CPP_MIN_LOG_LEVEL='3')
+    audio_path = os.path.abspath(audio_path)
+
+    def run(mode: str, cache_dir: str) -> List[float]:
+        output = subprocess.run(
+            [sys.executable, '-c', _FIRST_REQUEST_SCRIPT, audio_path, mode, cache_dir,
+             '' if duration is None else str(duration)],
+            env=env, cwd=repo_dir, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    # Compile once into the persistent cache, as a previous server run would have
+    configure_numba_cache()
+    run('cold', '')
+
+    results = []
+    for mode in ('cold (no JIT cache)', 'cold', 'warm'):
+        timings = []
+        for ___ in range(max(1, repeats)):
+            if mode == 'cold (no JIT cache)':
+                with tempfile.TemporaryDirectory(prefix='tab-numba-') as cache_dir:
+                    timings.append(run('cold', cache_dir))
+            else:
+                timings.append(run(mode, ''))
+        imported, warmup_seconds, first = min(timings, key=lambda t: t[2])
+        results.append(FirstRequestBenchmark(mode, imported, warmup_seconds, first))
+        logger.info(_("Benchmark first request ({}): {:.2f}s").format(mode, first))
+    return results
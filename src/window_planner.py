@@ -0,0 +1,223 @@
+"""
+Coalescing of overlapping transcription windows of the same audio file.
+
+Windows are transcribed as chunks on a fixed grid in file time: chunk k
+starts at k * chunk_seconds and runs chunk_overlap_seconds past the next
+grid line. A request for any window maps to the grid chunks covering it, so
+requests for 0-30 s, then 0-60 s, then the whole song share their common
+chunks instead of each transcribing from scratch. Finished chunks are kept
+in an LRU cache keyed by file identity (path, size, mtime) and inference
+settings, and a chunk being transcribed for one request is joined by any
+other request that needs it. A chunk's result is the model's activations
+(see src.note_extraction); the transcriber stitches the chunks covering a
+window and extracts its notes once, so notes in chunk overlaps need no
+deduplication.
+"""
+import gettext
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from src.audio_probe import file_identity
+from src.config import Config, add_reload_listener, get_config
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A grid chunk of an audio file, in seconds of file time"""
+    index: int
+    start: float
+    duration: float
+
+
+def plan_chunks(file_duration: float, start: float, end: float, chunk_seconds: float,
+                overlap_seconds: float, single_chunk_seconds: float) -> List[Chunk]:
+    """
+    Return the grid chunks needed to transcribe [start, end) of a file.
+
+    Args:
+        file_duration: Length of the audio file in seconds
+        start: Window start in seconds
+        end: Window end in seconds (clamped to the file)
+        chunk_seconds: Grid spacing
+        overlap_seconds: Extra audio transcribed past each grid line
+        single_chunk_seconds: Files shorter than this are one chunk
+
+    Returns:
+        Chunks in time order; empty if the window is empty
+    """
+    start = max(0.0, start)
+    end = min(end, file_duration)
+    if end <= start:
+        return []
+    if file_duration < single_chunk_seconds:
+        return [Chunk(0, 0.0, file_duration)]
+
+    chunk_seconds = max(1.0, chunk_seconds)
+    overlap_seconds = max(0.0, overlap_seconds)
+    first = int(start // chunk_seconds)
+    last = max(first, math.ceil(end / chunk_seconds) - 1)
+    chunks = []
+    for k in range(first, last + 1):
+        chunk_start = k * chunk_seconds
+        if chunk_start >= file_duration:
+            break
+        chunks.append(Chunk(k, chunk_start, min(chunk_seconds + overlap_seconds, file_duration - chunk_start)))
+    return chunks
+
+
+def clip_to_window(notes: Sequence[Dict[str, Any]], start: float, end: float) -> List[Dict[str, Any]]:
+    """
+    Cut notes to a window.
+
+    Notes starting in [start, end) are returned as new dictionaries with
+    their end clipped to the window.
+    """
+    return [dict(n, end=min(n['end'], end)) for n in notes if start <= n['start'] < end]
+
+
+class _InFlight:
+    """A chunk being transcribed and the number of requests waiting for it"""
+
+    def __init__(self, future: Future):
+        self.future = future
+        self.waiters = 1
+
+
+class WindowPlanner:
+    """Thread-safe cache of transcribed chunks plus the chunks being transcribed."""
+
+    def __init__(self, max_chunks: int = 128):
+        """
+        Initialize the WindowPlanner.
+
+        Args:
+            max_chunks: Most recently used chunk results kept in memory
+        """
+        self.max_chunks = max_chunks
+        self._lock = threading.Lock()
+        self._chunks: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self.stats = {'cached': 0, 'joined': 0, 'submitted': 0}
+
+    def _remember(self, key: Hashable, result: Any) -> None:
+        self._chunks[key] = result
+        self._chunks.move_to_end(key)
+        while len(self._chunks) > max(0, self.max_chunks):
+            self._chunks.popitem(last=False)
+
+    def _finish(self, key: Hashable, entry: _InFlight, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is entry:
+                del self._in_flight[key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._remember(key, future.result())
+
+    def transcribe(self, audio_path: str, chunks: Sequence[Chunk],
+                   submit: Callable[[Chunk], Future],
+                   variant: Hashable = ()) -> List[Any]:
+        """
+        Return the result of each chunk, transcribing only chunks not cached or in flight.
+
+        Args:
+            audio_path: Audio file the chunks belong to
+            chunks: Chunks from plan_chunks()
+            submit: Starts transcription of a chunk and returns its Future
+            variant: Settings that change the transcription (model, backend)
+
+        Returns:
+            One result per chunk, in the order of chunks; treat as read-only
+
+        Raises:
+            Exception: The first error raised by a chunk transcription
+        """
+        content = file_identity(audio_path)
+        results: List[Any] = [None] * len(chunks)
+        waiting: List[Tuple[int, Hashable, _InFlight]] = []
+        started: List[Tuple[Hashable, _InFlight]] = []
+
+        with self._lock:
+            for i, chunk in enumerate(chunks):
+                key = (content, variant, chunk)
+                cached = self._chunks.get(key)
+                if cached is not None:
+                    self._chunks.move_to_end(key)
+                    results[i] = cached
+                    self.stats['cached'] += 1
+                    continue
+                entry = self._in_flight.get(key)
+                if entry is not None:
+                    entry.waiters += 1
+                    self.stats['joined'] += 1
+                else:
+                    entry = _InFlight(submit(chunk))
+                    self._in_flight[key] = entry
+                    started.append((key, entry))
+                    self.stats['submitted'] += 1
+                waiting.append((i, key, entry))
+
+        # Callbacks of already finished futures run immediately, so add them unlocked
+        for key, entry in started:
+            entry.future.add_done_callback(lambda f, key=key, entry=entry: self._finish(key, entry, f))
+
+        try:
+            for i, ___, entry in waiting:
+                results[i] = entry.future.result()
+        except BaseException:
+            self._abandon(waiting)
+            raise
+        return results
+
+    def _abandon(self, waiting: List[Tuple[int, Hashable, _InFlight]]) -> None:
+        """Stop waiting for chunks; cancel those no other request is waiting for."""
+        to_cancel = []
+        with self._lock:
+            for ___, key, entry in waiting:
+                if entry.future.done():
+                    continue
+                entry.waiters -= 1
+                if entry.waiters <= 0:
+                    if self._in_flight.get(key) is entry:
+                        del self._in_flight[key]
+                    to_cancel.append(entry.future)
+        for future in to_cancel:
+            future.cancel()
+
+    def resize(self, max_chunks: int) -> None:
+        """Change the capacity, evicting least recently used chunks if needed."""
+        with self._lock:
+            self.max_chunks = max_chunks
+            while len(self._chunks) > max(0, self.max_chunks):
+                self._chunks.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chunks.clear()
+
+
+_PLANNER = WindowPlanner(get_config().performance.chunk_cache_size)
+
+
+def _apply_config(config: Config) -> None:
+    _PLANNER.resize(config.performance.chunk_cache_size)
+
+
+add_reload_listener(_apply_config)
+
+
+def get_window_planner() -> WindowPlanner:
+    """Return the process-wide WindowPlanner."""
+    return _PLANNER
@@ -0,0 +1,422 @@
+"""
+Worker processes forked from a preloaded template.
+
+Starting a transcription process from scratch means importing TensorFlow,
+librosa and basic_pitch and loading the model: seconds of CPU and hundreds
+of MB per process. The pool instead spawns one template process that does
+the imports (and, for backends whose loaded model survives fork(), builds
+the model), freezes its heap out of the garbage collector and then only
+forks. A new worker is a fork of the template: it starts in milliseconds
+and shares the template's modules and read-only model weights copy-on-write.
+
+Workers are forked when a task finds no idle worker (up to max_workers) and
+exit after idle_seconds without work; the template stays, so the pool can
+grow again without paying the cold start. Workers connect back to the pool
+over a Unix socket and run one pickled task at a time. Task callables must
+be importable module-level functions; they get the process's model from
+worker_model().
+"""
+import gc
+import gettext
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Internationalization Setup
+localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '../locales')
+translate = gettext.translation('messages', localedir, fallback=True)
+_ = translate.gettext
+
+# Imported by the template before it forks any worker
+PRELOAD_MODULES = ('numpy', 'librosa', 'librosa.core.audio', 'basic_pitch.inference', 'src.transcriber')
+
+# Seconds before a requested worker that never connected is given up on
+SPAWN_TIMEOUT = 60.0
+
+# Model of this worker process and how to load it (set in the template)
+_MODEL: Any = None
+_LOADER: Optional[Callable[[], Any]] = None
+
+
+def worker_model() -> Any:
+    """
+    Return the model of this worker process, loading it on first use.
+
+    Raises:
+        RuntimeError: If not called inside a pool worker
+    """
+    global _MODEL
+    if _MODEL is None:
+        if _LOADER is None:
+            raise RuntimeError(_("Not running in a preloaded worker process"))
+        _MODEL = _LOADER()
+    return _MODEL
+
+
+def _serve(conn: Connection) -> None:
+    """Run pickled tasks until the pool sends an empty message or goes away."""
+    while True:
+        try:
+            payload = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+        if not payload:
+            return
+        try:
+            fn, args, kwargs = pickle.loads(payload)
+            result = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            result = (False, e)
+        try:
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            data = pickle.dumps((False, RuntimeError(_("Task result could not be returned: {}").format(str(e)))))
+        conn.send_bytes(data)
+
+
+def _template_main(fd: int) -> None:
+    """
+    Entry point of the template process.
+
+    Reads its settings from the pipe fd, preloads, then forks a worker for
+    every request received on the pipe until the pool closes it.
+    """
+    global _MODEL, _LOADER
+    # Ctrl-C is the server's business; the template and workers exit when the pool closes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    started = time.perf_counter()
+    control = Connection(fd, writable=False)
+    # Unpickling the loader already imports its module
+    address, authkey, loader, preload_model, modules = control.recv()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(_("Worker preload could not import {}: {}").format(name, str(e)))
+    preload_seconds = time.perf_counter() - started
+
+    _LOADER = loader
+    started = time.perf_counter()
+    if preload_model and loader is not None:
+        try:
+            _MODEL = loader()
+        except Exception as e:
+            # Workers retry the load themselves on first use
+            logger.error(_("Worker template failed to load the model: {}").format(str(e)))
+    model_seconds = time.perf_counter() - started
+
+    # Keep the preloaded heap out of garbage collection so workers don't copy its pages
+    gc.collect()
+    gc.freeze()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # workers are reaped automatically
+
+    while True:
+        try:
+            count = control.recv()
+        except (EOFError, OSError):
+            return
+        for ___ in range(count):
+            forked_at = time.perf_counter()
+            if os.fork() != 0:
+                continue
+            code = 0
+            try:
+                control.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                conn = Client(address, family='AF_UNIX', authkey=authkey)
+                conn.send({
+                    'pid': os.getpid(),
+                    'startup_seconds': time.perf_counter() - forked_at,
+                    'preload_seconds': preload_seconds,
+                    'model_seconds': model_seconds if _MODEL is not None else None,
+                })
+                _serve(conn)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+
+
+class _Worker:
+    """Pool-side handle of a worker process"""
+
+    def __init__(self, pid: int, conn: Connection):
+        self.pid = pid
+        self.conn = conn
+        self.last_used = time.monotonic()
+
+
+class WorkerProcessPool:
+    """Pool of worker processes forked on demand from a preloaded template."""
+
+    def __init__(self, loader: Optional[Callable[[], Any]] = None, preload_model: bool = False,
+                 max_workers: int = 2, idle_seconds: float = 300.0,
+                 preload_modules: Sequence[str] = PRELOAD_MODULES,
+                 env: Optional[Mapping[str, str]] = None):
+        """
+        Initialize the WorkerProcessPool.
+
+        Args:
+            loader: Picklable zero-argument callable that loads the model
+            preload_model: Load the model in the template, shared by all workers;
+                only safe for models that keep working in a forked child
+            max_workers: Most worker processes at a time
+            idle_seconds: Workers idle this long exit (0 = keep them)
+            preload_modules: Modules the template imports before forking
+            env: Extra environment variables of the template, set before its
+                imports (e.g. BLAS thread limits) and inherited by workers
+        """
+        self.max_workers = max(1, max_workers)
+        self.idle_seconds = idle_seconds
+        self._loader = loader
+        self._preload_model = preload_model
+        self._preload_modules = tuple(preload_modules)
+        self._env = dict(env or {})
+
+        self._cond = threading.Condition()
+        self._workers: Dict[int, _Worker] = {}
+        self._idle: List[_Worker] = []  # most recently used last
+        self._starting: List[float] = []  # request times of workers not yet connected
+        self._closed = False
+        self._template: Optional[subprocess.Popen] = None
+        self._control: Optional[Connection] = None
+        self._listener: Optional[Listener] = None
+        self._authkey = secrets.token_bytes(32)
+        self._reaper: Optional[threading.Timer] = None
+        self.stats: Dict[str, Any] = {
+            'spawned': 0, 'retired': 0, 'crashed': 0, 'tasks': 0,
+            'last_startup_ms': None, 'preload_seconds': None, 'model_seconds': None,
+        }
+
+    # -- template and workers ------------------------------------------------
+
+    def _template_alive(self) -> bool:
+        return self._template is not None and self._template.poll() is None
+
+    def _ensure_template(self) -> None:
+        """Start the listener and template process if they aren't running (lock held)."""
+        if self._listener is None:
+            address = os.path.join(tempfile.mkdtemp(prefix='tab-workers-'), 'pool.sock')
+            self._listener = Listener(address, family='AF_UNIX', authkey=self._authkey)
+            threading.Thread(target=self._accept_loop, args=(self._listener,),
+                             name='worker-pool-accept', daemon=True).start()
+        if self._template_alive():
+            return
+        if self._template is not None:
+            logger.warning(_("Worker template process exited (code {}); starting a new one").format(
+                self._template.returncode))
+            self._control.close()
+
+        # A fresh interpreter rather than multiprocessing's spawn, which would
+        # re-run the server's main module; stdout may be the MCP transport
+        read_end, write_end = os.pipe()
+        env = dict(os.environ, **self._env, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        try:
+            self._template = subprocess.Popen(
+                [sys.executable, '-c', f"from src.worker_pool import _template_main; _template_main({read_end})"],
+                pass_fds=(read_end,), env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            )
+        finally:
+            os.close(read_end)
+        self._control = Connection(write_end, readable=False)
+        self._control.send((self._listener.address, self._authkey, self._loader, self._preload_model,
+                            self._preload_modules))
+        self._starting.clear()
+        logger.info(_("Started worker template process {}").format(self._template.pid))
+
+    def _spawn(self, count: int) -> None:
+        """Ask the template for count more workers (lock held)."""
+        self._ensure_template()
+        self._control.send(count)
+        self._starting.extend([time.monotonic()] * count)
+
+    def _accept_loop(self, listener: Listener) -> None:
+        while True:
+            try:
+                conn = listener.accept()
+                hello = conn.recv()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                with self._cond:
+                    if self._closed:
+                        return
+                continue
+            worker = _Worker(hello['pid'], conn)
+            with self._cond:
+                if self._starting:
+                    self._starting.pop(0)
+                if self._closed or len(self._workers) >= self.max_workers:
+                    conn.send_bytes(b'')
+                    conn.close()
+                    continue
+                self._workers[worker.pid] = worker
+                self._idle.append(worker)
+                self.stats['spawned'] += 1
+                self.stats['last_startup_ms'] = round(hello['startup_seconds'] * 1000, 2)
+                self.stats['preload_seconds'] = round(hello['preload_seconds'], 3)
+                self.stats['model_seconds'] = (None if hello['model_seconds'] is None
+                                               else round(hello['model_seconds'], 3))
+                self._cond.notify_all()
+            self._schedule_reaper()
+
+    def _retire(self, worker: _Worker) -> None:
+        """Tell a worker to exit; it must not be in _idle (lock held)."""
+        self._workers.pop(worker.pid, None)
+        self.stats['retired'] += 1
+        try:
+            worker.conn.send_bytes(b'')
+        except OSError:
+            pass
+        worker.conn.close()
+
+    # -- tasks ---------------------------------------------------------------
+
+    def _acquire(self) -> _Worker:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(_("Worker pool is closed"))
+                if self._idle:
+                    return self._idle.pop()
+                now = time.monotonic()
+                self._starting = [t for t in self._starting if now - t < SPAWN_TIMEOUT]
+                if len(self._workers) + len(self._starting) < self.max_workers:
+                    self._spawn(1)
+                elif self._template is not None and not self._template_alive() and not self._workers:
+                    raise RuntimeError(_("Worker template process exited (code {})").format(
+                        self._template.returncode))
+                self._cond.wait(timeout=1.0)
+
+    def _release(self, worker: _Worker) -> None:
+        with self._cond:
+            worker.last_used = time.monotonic()
+            if self._closed or len(self._workers) > self.max_workers:
+                self._retire(worker)
+            else:
+                self._idle.append(worker)
+                self._cond.notify()
+        self._schedule_reaper()
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run fn(*args, **kwargs) in a worker process and return its result.
+
+        Raises:
+            RuntimeError: If the worker process died while running the task
+            Exception: Whatever the task raised
+        """
+        payload = pickle.dumps((fn, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        worker = self._acquire()
+        try:
+            worker.conn.send_bytes(payload)
+            ok, value = pickle.loads(worker.conn.recv_bytes())
+        except (EOFError, OSError) as e:
+            with self._cond:
+                self._workers.pop(worker.pid, None)
+                self.stats['crashed'] += 1
+                self._cond.notify_all()
+            worker.conn.close()
+            raise RuntimeError(_("Worker process {} died while running a task").format(worker.pid)) from e
+        with self._cond:
+            self.stats['tasks'] += 1
+        self._release(worker)
+        if not ok:
+            raise value
+        return value
+
+    # -- sizing --------------------------------------------------------------
+
+    def _schedule_reaper(self) -> None:
+        with self._cond:
+            if self.idle_seconds <= 0 or self._reaper is not None or not self._idle:
+                return
+            self._reaper = threading.Timer(self.idle_seconds, self._reap)
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        with self._cond:
+            self._reaper = None
+            now = time.monotonic()
+            for worker in [w for w in self._idle if now - w.last_used >= self.idle_seconds]:
+                self._idle.remove(worker)
+                self._retire(worker)
+            if self._idle and self.idle_seconds > 0:
+                # Check again when the next idle worker could expire
+                wait = min(self.idle_seconds - (now - w.last_used) for w in self._idle)
+                self._reaper = threading.Timer(max(wait, 0.05), self._reap)
+                self._reaper.daemon = True
+                self._reaper.start()
+
+    def start(self, workers: int = 0) -> None:
+        """Start the template now (it preloads in the background) and optionally some workers."""
+        with self._cond:
+            self._ensure_template()
+            missing = min(workers, self.max_workers) - len(self._workers) - len(self._starting)
+            if missing > 0:
+                self._spawn(missing)
+
+    def resize(self, max_workers: int, idle_seconds: Optional[float] = None) -> None:
+        """Change the worker limit; surplus idle workers exit now, busy ones after their task."""
+        with self._cond:
+            self.max_workers = max(1, max_workers)
+            if idle_seconds is not None and idle_seconds != self.idle_seconds:
+                self.idle_seconds = idle_seconds
+                if self._reaper is not None:
+                    self._reaper.cancel()
+                    self._reaper = None
+            while self._idle and len(self._workers) > self.max_workers:
+                self._retire(self._idle.pop(0))
+        self._schedule_reaper()
+
+    def status(self) -> Dict[str, Any]:
+        """Return worker counts, spawn statistics and the template's preload timings."""
+        with self._cond:
+            return {
+                **self.stats,
+                'workers': len(self._workers),
+                'idle': len(self._idle),
+                'starting': len(self._starting),
+                'max_workers': self.max_workers,
+                'template_pid': self._template.pid if self._template is not None else None,
+            }
+
+    def close(self) -> None:
+        """Stop idle workers and the template; busy workers exit after their task."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            while self._idle:
+                self._retire(self._idle.pop())
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+            if self._control is not None:
+                self._control.close()
+            listener, self._listener = self._listener, None
+            self._cond.notify_all()
+        if listener is not None:
+            address = listener.address
+            listener.close()
+            try:
+                os.rmdir(os.path.dirname(address))
+            except OSError:
+                pass
+        if self._template is not None:
+            try:
+                self._template.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._template.kill()
@@ -0,0 +1,275 @@
+"""
+Tests for the analyzed piece module
+"""
+import numpy as np
+import pytest
+import soundfile as sf
+from src.analysis import AnalyzedPiece, OverrideStore, PieceStore
+from src.analysis_profiles import ACCURATE, BALANCED, PREVIEW
+from src.config import get_config
+from src.fingerprint import FingerprintMatch, identity_of
+from src.tab_generator import FingeringOverride, TabGenerator
+
+
+@pytest.fixture
+def notes():
+    """Two notes per second over 40 seconds, sorted by onset"""
+    return [{'start': i * 0.5, 'end': i * 0.5 + 0.4, 'pitch': 45 + (i * 7) % 30, 'velocity': 0.7}
+            for i in range(80)]
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """40 seconds of (silent) audio standing in for a recording"""
+    path = tmp_path / "recording.wav"
+    sf.write(str(path), np.zeros(40 * 8000, dtype=np.float32), 8000)
+    return str(path)
+
+
+class StubFingerprints:
+    """Reports every file as a copy of one known recording"""
+
+    def __init__(self, match):
+        self.match = match
+        self.added = []
+
+    def matches(self, audio_path):
+        return [self.match]
+
+    def add(self, audio_path):
+        self.added.append(audio_path)
+
+
+class TestAnalyzedPiece:
+    """Tests for AnalyzedPiece"""
+
+    def test_full_render_matches_generator(self, notes):
+        """Test rendering the whole piece matches generate_ascii_tab"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        assert piece.render_measures() == TabGenerator(bpm=120).generate_ascii_tab(notes)
+
+    def test_range_render_matches_generator(self, notes):
+        """Test a measure range matches generate_ascii_tab for the same range"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        expected = TabGenerator(bpm=120).generate_ascii_tab(notes, start_measure=3, end_measure=7)
+        assert piece.render_measures(3, 7) == expected
+
+    def test_measure_index(self, notes):
+        """Test the measure index points at each measure's notes"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)  # 2 s per measure, 4 notes each
+        assert piece.num_measures == 20
+        assert piece.note_range(5, 6) == (20, 24)
+        assert all(n['start'] // 2 == 5 for n in piece.notes(5, 6))
+
+    def test_time_range(self, notes):
+        """Test time ranges map to the overlapping measures"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        assert piece.render_time_range(4.0, 8.0) == piece.render_measures(2, 4)
+        assert piece.render_time_range(4.5, 5.0) == piece.render_measures(2, 3)
+
+    def test_unsorted_input(self, notes):
+        """Test notes are indexed by onset even if given out of order"""
+        piece = AnalyzedPiece.from_notes(list(reversed(notes)), bpm=120)
+        assert list(piece.starts) == sorted(piece.starts)
+
+    def test_empty(self):
+        """Test a piece without notes"""
+        piece = AnalyzedPiece.from_notes([], bpm=100)
+        assert piece.num_measures == 0
+        assert "No notes" in piece.render_measures()
+
+    def test_save_load_roundtrip(self, notes, tmp_path):
+        """Test a saved piece renders identically after loading"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=96, capo=2, source_path="/music/song.mp3")
+        path = str(tmp_path / "piece.ftnb")
+        piece.save(path)
+        loaded = AnalyzedPiece.load(path)
+        assert loaded.capo == 2
+        assert loaded.source_path == "/music/song.mp3"
+        assert loaded.render_measures(1, 5) == piece.render_measures(1, 5)
+        assert loaded.is_bass is None
+
+    def test_accurate_settings_persisted(self, notes, tmp_path):
+        """Test a tempo map and whole-passage fingering survive saving"""
+        tempo_map = [(0.0, 96.0), (20.0, 120.0)]
+        piece = AnalyzedPiece.from_notes(notes, bpm=96, fingering='dp', tempo_map=tempo_map)
+        assert (piece.strings >= 0).all()
+        path = str(tmp_path / "piece.ftnb")
+        piece.save(path)
+        loaded = AnalyzedPiece.load(path)
+        assert loaded.tempo_map == tempo_map
+        assert (loaded.frets == piece.frets).all()
+
+    def test_tempo_map_places_measures(self, notes):
+        """Test a tempo change moves the measure grid and matches generate_ascii_tab"""
+        tempo_map = [(0.0, 120.0), (20.0, 60.0)]  # 2 s per measure, then 4 s
+        piece = AnalyzedPiece.from_notes(notes, bpm=120, tempo_map=tempo_map)
+        assert piece.num_measures == 15
+        assert piece.measure_at(19.9) == 9 and piece.measure_at(24.0) == 11
+        assert all(24.0 <= n['start'] < 28.0 for n in piece.notes(11, 12))
+        assert piece.slot_idx[piece.note_range(11, 12)[0] + 1] == 2  # 24.5 s: an eighth into the measure
+        expected = TabGenerator(bpm=120).generate_ascii_tab(notes, tempo_map=tempo_map)
+        assert piece.render_measures() == expected
+        assert piece.render_time_range(24.0, 28.0) == piece.render_measures(11, 12)
+
+    def test_source_tags(self, notes, tmp_path):
+        """Test bass tags from source separation decide fingering and are persisted"""
+        tagged = [dict(n, source='bass' if n['pitch'] < 60 else 'melody') for n in notes]
+        piece = AnalyzedPiece.from_notes(tagged, bpm=120)
+        assert piece.is_bass.tolist() == [n['pitch'] < 60 for n in notes]
+        assert piece.render_measures() == TabGenerator(bpm=120).generate_ascii_tab(tagged)
+        path = str(tmp_path / "piece.ftnb")
+        piece.save(path)
+        assert AnalyzedPiece.load(path).is_bass.tolist() == piece.is_bass.tolist()
+
+    def test_realigned(self, notes, recording):
+        """Test a piece moved to another recording keeps the notes inside it, shifted"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120, tempo_map=[(0.0, 120.0), (10.0, 100.0)])
+        later = piece.realigned(recording, 1.0)
+        assert later.source_path == recording
+        assert later.starts[0] == 1.0 and later.starts[-1] == 39.5
+        assert len(later.starts) == 78
+        assert later.tempo_map == [(0.0, 120.0), (11.0, 100.0)]
+
+        earlier = piece.realigned(recording, -1.0)
+        assert earlier.starts[0] == 0.0 and len(earlier.starts) == 78
+        assert earlier.tempo_map == [(0.0, 120.0), (9.0, 100.0)]
+
+
+class TestFingeringOverrides:
+    """Tests for AnalyzedPiece.apply_overrides and OverrideStore"""
+
+    def test_matches_full_refingering(self, notes):
+        """Test refingering affected measures gives the tab of fingering everything with the overrides"""
+        overrides = [FingeringOverride(64, 4), FingeringOverride(59, 2, 5, 9)]
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        piece.render_measures()
+        affected = piece.apply_overrides(overrides)
+        scoped = (piece.pitches == 59) & (piece.measure_idx >= 5) & (piece.measure_idx < 9)
+        assert affected == sorted(set(piece.measure_idx[(piece.pitches == 64) | scoped]))
+        expected = TabGenerator(bpm=120).generate_ascii_tab(notes, overrides=overrides)
+        assert piece.render_measures() == expected
+        assert (piece.strings[piece.pitches == 64] == 4).all()
+
+    def test_only_affected_lines_rerendered(self, notes):
+        """Test cached lines of measures without the pitch are kept, and unchanged overrides are a no-op"""
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        piece.render_measures()
+        kept = dict(piece._rows)
+        [measure] = piece.apply_overrides([FingeringOverride(int(piece.pitches[0]), 3, 0, 1)])
+        assert measure == 0
+        assert [row for row in kept if row not in piece._rows] == [(0, 4)]
+        assert piece.apply_overrides([FingeringOverride(int(piece.pitches[0]), 3, 0, 1)]) == []
+
+    def test_render_during_apply_not_cached(self, notes):
+        """Test a line rendered while overrides are applied is not cached over the refingered one"""
+        overrides = [FingeringOverride(64, 4)]
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        render_rows = piece._render_rows
+
+        def interleaved(*args, **kwargs):
+            row = render_rows(*args, **kwargs)
+            if not piece.overrides:
+                piece.apply_overrides(overrides)
+            return row
+
+        piece._render_rows = interleaved
+        piece.render_measures()
+        del piece._render_rows
+        assert piece.render_measures() == TabGenerator(bpm=120).generate_ascii_tab(notes, overrides=overrides)
+
+    def test_loaded_piece(self, notes, tmp_path):
+        """Test overrides apply to a memory-mapped piece and are saved with it"""
+        path = str(tmp_path / "piece.ftnb")
+        AnalyzedPiece.from_notes(notes, bpm=120, fingering='dp').save(path)
+        loaded = AnalyzedPiece.load(path)
+        loaded.apply_overrides([FingeringOverride(64, 4, 2, None)])
+        loaded.save(path)
+        reloaded = AnalyzedPiece.load(path)
+        assert reloaded.fingering == 'dp'
+        assert reloaded.overrides == (FingeringOverride(64, 4, 2, None),)
+        assert reloaded.render_measures() == loaded.render_measures()
+
+    def test_store(self, tmp_path):
+        """Test overrides persist per file, replace their scope and are removed"""
+        store = OverrideStore(str(tmp_path))
+        store.set("/music/song.mp3", 64, 4)
+        store.set("/music/song.mp3", 64, 3, 2, 5)
+        store.set("/music/song.mp3", 64, 2, 2, 5)
+        assert OverrideStore(str(tmp_path)).get("/music/song.mp3") == (
+            FingeringOverride(64, 4), FingeringOverride(64, 2, 2, 5))
+        assert store.get("/music/other.mp3") == ()
+        assert store.set("/music/song.mp3", 64, None, 2, 5) == (FingeringOverride(64, 4),)
+        store.set("/music/song.mp3", 64, 3, 2, 5)
+        assert store.set("/music/song.mp3", 64, None) == ()
+
+
+class TestPieceStore:
+    """Tests for PieceStore"""
+
+    def test_persists_to_disk(self, notes, tmp_path):
+        """Test a stored piece is found by a new store on the same directory"""
+        audio = tmp_path / "song.wav"
+        audio.write_bytes(b"audio")
+        key = PieceStore.key_for(str(audio))
+        PieceStore(str(tmp_path / "pieces")).put(key, AnalyzedPiece.from_notes(notes, bpm=120))
+        restored = PieceStore(str(tmp_path / "pieces")).get(key)
+        assert restored is not None
+        assert restored.num_measures == 20
+
+    def test_key_changes_with_file(self, tmp_path):
+        """Test the key changes when the audio file changes"""
+        audio = tmp_path / "song.wav"
+        audio.write_bytes(b"audio")
+        before = PieceStore.key_for(str(audio))
+        audio.write_bytes(b"different audio")
+        assert PieceStore.key_for(str(audio)) != before
+        assert PieceStore.key_for(str(audio), capo=1) != PieceStore.key_for(str(audio))
+
+    def test_key_per_profile(self, tmp_path):
+        """Test each profile has its own analysis and the default is 'balanced'"""
+        audio = tmp_path / "song.wav"
+        audio.write_bytes(b"audio")
+        keys = {PieceStore.key_for(str(audio), profile=p) for p in (PREVIEW, BALANCED, ACCURATE)}
+        assert len(keys) == 3
+        assert PieceStore.key_for(str(audio)) == PieceStore.key_for(str(audio), profile=BALANCED)
+
+    def test_key_per_inference_backend(self, tmp_path, monkeypatch):
+        """Test pieces transcribed by another backend or quantization are not reused"""
+        audio = tmp_path / "song.wav"
+        audio.write_bytes(b"audio")
+        before = PieceStore.key_for(str(audio))
+        monkeypatch.setattr(get_config().inference, 'backend', 'tflite')
+        tflite = PieceStore.key_for(str(audio))
+        monkeypatch.setattr(get_config().inference, 'quantize', True)
+        assert len({before, tflite, PieceStore.key_for(str(audio))}) == 3
+
+    def test_memory_bound(self, notes, tmp_path):
+        """Test only the most recently used pieces stay in memory"""
+        store = PieceStore(str(tmp_path), max_in_memory=1)
+        piece = AnalyzedPiece.from_notes(notes, bpm=120)
+        store.put("a", piece)
+        store.put("b", piece)
+        assert list(store._pieces) == ["b"]
+        assert store.get("a") is not None  # reloaded from disk
+
+    def test_find_recording(self, notes, recording, tmp_path):
+        """Test the stored piece of a matching recording is reused, realigned, for its settings"""
+        original = tmp_path / "original.mp3"
+        original.write_bytes(b"audio")
+        match = FingerprintMatch(identity_of(str(original)), str(original), score=0.95, offset=0.5)
+        store = PieceStore(str(tmp_path / "pieces"), fingerprints=StubFingerprints(match))
+        store.put(PieceStore.key_for(str(original), profile=BALANCED),
+                  AnalyzedPiece.from_notes(notes, bpm=120, source_path=str(original)))
+        assert store.fingerprints.added == [str(original)]
+
+        original.unlink()  # the analysis outlives the file it came from
+        piece = store.find_recording(recording, profile=BALANCED)
+        assert piece.source_path == recording
+        assert piece.starts[0] == 0.5
+        assert store.find_recording(recording, profile=ACCURATE) is None
+        assert PieceStore(str(tmp_path / "pieces")).find_recording(recording) is None
+
+    def test_missing(self, tmp_path):
+        """Test unknown keys return None"""
+        assert PieceStore(str(tmp_path)).get("unknown") is None
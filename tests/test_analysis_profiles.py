@@ -0,0 +1,35 @@
+"""
+Tests for speed/quality analysis profiles
+"""
+import pytest
+import src.config
+from src.analysis_profiles import ACCURATE, BALANCED, PREVIEW, AnalysisProfile, get_analysis_profile
+from src.config import Config
+
+
+class TestGetAnalysisProfile:
+    """Tests for get_analysis_profile"""
+
+    def test_by_name(self):
+        """Test profiles are found by name, ignoring case"""
+        assert get_analysis_profile('preview') is PREVIEW
+        assert get_analysis_profile('Accurate') is ACCURATE
+
+    def test_default_from_config(self, monkeypatch):
+        """Test requests without a profile get the configured default"""
+        config = Config()
+        monkeypatch.setattr(src.config, "_config", config)
+        assert get_analysis_profile() is BALANCED
+        config.analysis.default_profile = 'preview'
+        assert get_analysis_profile() is PREVIEW
+
+    def test_unknown(self):
+        """Test an unknown name raises ValueError listing the profiles"""
+        with pytest.raises(ValueError, match="balanced"):
+            get_analysis_profile('fastest')
+
+    def test_balanced_keeps_configuration(self):
+        """Test 'balanced' overrides nothing, so it matches requests made before profiles"""
+        assert BALANCED == AnalysisProfile('balanced')
+        assert PREVIEW.separation is False and not PREVIEW.chunk_overlap and PREVIEW.tempo == 'fixed'
+        assert ACCURATE.fingering == 'dp' and ACCURATE.tempo == 'map'
@@ -0,0 +1,88 @@
+"""
+Tests for the audio metadata probe
+"""
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+from src import audio_probe
+from src.audio_probe import AudioProbeCache
+
+
+def write_tone(path, seconds=1.5, sr=22050, channels=1):
+    """Write a short sine tone"""
+    t = np.arange(int(sr * seconds)) / sr
+    y = 0.1 * np.sin(2 * np.pi * 440 * t)
+    if channels > 1:
+        y = np.stack([y] * channels, axis=1)
+    sf.write(str(path), y, sr)
+
+
+class TestAudioProbeCache:
+    """Tests for AudioProbeCache"""
+
+    def test_reads_wav_header(self, tmp_path):
+        """Test WAV metadata comes from the header"""
+        path = tmp_path / "tone.wav"
+        write_tone(path, seconds=1.5, channels=2)
+        meta = AudioProbeCache().probe(str(path))
+        assert meta.duration == pytest.approx(1.5, abs=1e-3)
+        assert meta.sample_rate == 22050
+        assert meta.channels == 2
+        assert meta.source == 'header'
+        assert meta.codec.startswith('wav')
+
+    def test_cache_hit(self, tmp_path, monkeypatch):
+        """Test a second probe of an unchanged file doesn't read it again"""
+        path = tmp_path / "tone.wav"
+        write_tone(path)
+        cache = AudioProbeCache()
+        cache.probe(str(path))
+        monkeypatch.setattr(audio_probe, "_probe_soundfile", lambda p: pytest.fail("re-read"))
+        cache.probe(str(path))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_invalidated_on_change(self, tmp_path):
+        """Test rewriting a file invalidates its cached metadata"""
+        path = tmp_path / "tone.wav"
+        write_tone(path, seconds=1.0)
+        cache = AudioProbeCache()
+        assert cache.probe(str(path)).duration == pytest.approx(1.0, abs=1e-3)
+        write_tone(path, seconds=2.0)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert cache.probe(str(path)).duration == pytest.approx(2.0, abs=1e-3)
+
+    def test_lru_bound(self, tmp_path):
+        """Test the cache holds at most max_entries files"""
+        cache = AudioProbeCache(max_entries=2)
+        for i in range(3):
+            path = tmp_path / f"tone{i}.wav"
+            write_tone(path, seconds=0.1)
+            cache.probe(str(path))
+        assert len(cache._entries) == 2
+        cache.resize(1)
+        assert len(cache._entries) == 1
+
+    def test_decode_fallback(self, tmp_path, monkeypatch):
+        """Test files without a readable header are decoded once"""
+        path = tmp_path / "tone.wav"
+        write_tone(path, seconds=1.0)
+        monkeypatch.setattr(audio_probe, "_probe_soundfile", lambda p: None)
+        monkeypatch.setattr(audio_probe, "_probe_audioread", lambda p: None)
+        meta = AudioProbeCache().probe(str(path))
+        assert meta.source == 'decode'
+        assert meta.duration == pytest.approx(1.0, abs=1e-3)
+
+    def test_unreadable_file(self, tmp_path):
+        """Test non-audio content raises RuntimeError"""
+        path = tmp_path / "broken.mp3"
+        path.write_bytes(b"not audio at all")
+        with pytest.raises(RuntimeError):
+            AudioProbeCache().probe(str(path))
+
+    def test_missing_file(self):
+        """Test missing files raise FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            AudioProbeCache().probe("/nonexistent/file.wav")
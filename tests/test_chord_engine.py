@@ -0,0 +1,146 @@
+"""
+Tests for chroma-based chord recognition
+"""
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+from src.chord_engine import (FRAME_RATE, NO_CHORD, ChordEngine, beats_at, chroma_for_chords,
+                              viterbi_self_loop)
+from src.features import SAMPLE_RATE
+from src.tab_generator import TabGenerator, create_tab
+
+# Pitch classes of the test progression
+TRIADS = {'C': (0, 4, 7), 'G': (7, 11, 2), 'Am': (9, 0, 4), 'F': (5, 9, 0)}
+
+
+def chord_column(name, level=1.0):
+    """Chroma of a triad over a small noise floor"""
+    column = np.full(12, 0.05)
+    if name != NO_CHORD:
+        column[list(TRIADS[name])] = level
+    return column
+
+
+def chord_chroma(chords, seconds_each, noise=0.0, seed=0):
+    """Chroma frames holding each chord (name or chroma column) for seconds_each seconds (or a list)"""
+    rng = np.random.default_rng(seed)
+    if np.isscalar(seconds_each):
+        seconds_each = [seconds_each] * len(chords)
+    columns = []
+    for chord, seconds in zip(chords, seconds_each):
+        column = chord_column(chord) if isinstance(chord, str) else chord
+        columns.append(np.repeat(column[:, np.newaxis], int(round(seconds * FRAME_RATE)), axis=1))
+    chroma = np.concatenate(columns, axis=1)
+    return chroma + noise * rng.random(chroma.shape)
+
+
+@pytest.fixture
+def engine():
+    return TabGenerator(bpm=120).chord_engine
+
+
+class TestChordEngine:
+    """Tests for ChordEngine"""
+
+    def test_measure_chords(self, engine):
+        """Test one chord per 2-second measure at 120 BPM is recognized"""
+        chroma = chord_chroma(['C', 'G', 'Am', 'F'], 2.0, noise=0.1)
+        assert engine.measure_chords(chroma, 120, 0, 4) == ['C', 'G', 'Am', 'F']
+
+    def test_measure_range_and_offset(self, engine):
+        """Test a measure range of chroma that starts later in the file"""
+        chroma = chord_chroma(['G', 'Am', 'F'], 2.0)
+        # The chroma starts at 2 s, i.e. at measure 1
+        assert engine.measure_chords(chroma, 120, 2, 2, offset_seconds=2.0) == ['Am', 'F']
+
+    def test_tempo_map(self, engine):
+        """Test measures follow a tempo map: 2 s measures, then 4 s measures from 4 s on"""
+        chroma = chord_chroma(['C', 'G', 'Am', 'F'], [2.0, 2.0, 4.0, 4.0])
+        tempo_map = [(0.0, 120.0), (4.0, 60.0)]
+        assert engine.measure_chords(chroma, 120, 0, 4, tempo_map=tempo_map) == ['C', 'G', 'Am', 'F']
+        assert beats_at([1.0, 4.0, 6.0], tempo_map).tolist() == [2.0, 8.0, 10.0]
+
+    def test_smoothing_ignores_single_beat(self, engine):
+        """Test a noisy beat leaning to another chord only flips the chord without smoothing"""
+        blip = chord_column('C', 0.6) + chord_column('G')
+        chroma = chord_chroma(['C'] * 3 + [blip] + ['C'] * 4, 0.5)
+        assert engine.beat_chords(chroma, 120, num_beats=8) == ['C'] * 8
+        # Keeping the chord is as likely as any change: each beat takes its best match
+        unsmoothed = ChordEngine(TabGenerator(bpm=120).tables, smoothing=1 / len(engine.chord_names))
+        assert unsmoothed.beat_chords(chroma, 120, num_beats=8)[3] == 'G'
+
+    def test_silence_is_no_chord(self, engine):
+        """Test beats without pitched content are N.C."""
+        chroma = np.concatenate([np.zeros((12, 100)), chord_chroma(['C'], 2.0)], axis=1)
+        beats = engine.beat_chords(chroma, 120)
+        assert beats[0] == NO_CHORD
+        assert beats[-1] == 'C'
+
+    def test_ten_minute_song(self, engine):
+        """Test a 10-minute song's chroma is decoded in well under a second"""
+        progression = ['C', 'G', 'Am', 'F'] * 75
+        chroma = chord_chroma(progression, 2.0, noise=0.2)
+        t0 = time.perf_counter()
+        chords = engine.measure_chords(chroma, 120, 0, len(progression))
+        assert time.perf_counter() - t0 < 0.5
+        assert chords == progression
+
+
+class TestViterbi:
+    """Tests for viterbi_self_loop"""
+
+    def test_matches_full_viterbi(self):
+        """Test the O(states) recursion finds the same path as the full transition matrix"""
+        rng = np.random.default_rng(1)
+        log_emission = rng.normal(size=(50, 6))
+        log_stay, log_switch = np.log(0.7), np.log(0.06)
+        transition = np.full((6, 6), log_switch)
+        np.fill_diagonal(transition, log_stay)
+        delta, backpointers = log_emission[0], []
+        for t in range(1, 50):
+            candidates = delta[:, np.newaxis] + transition
+            backpointers.append(np.argmax(candidates, axis=0))
+            delta = candidates.max(axis=0) + log_emission[t]
+        path = [int(np.argmax(delta))]
+        for pointers in reversed(backpointers):
+            path.append(int(pointers[path[-1]]))
+        assert viterbi_self_loop(log_emission, log_stay, log_switch).tolist() == path[::-1]
+
+
+class TestChordsFromAudio:
+    """Tests for chroma chords of decoded audio"""
+
+    @pytest.fixture
+    def chord_file(self, tmp_path):
+        """C, G, Am, F strummed for one 2-second measure each"""
+        t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+
+        def string(pitch):
+            f0 = 440 * 2 ** ((pitch - 69) / 12)
+            return sum(0.1 / k * np.sin(2 * np.pi * f0 * k * t) for k in range(1, 7)) * np.exp(-2 * t)
+
+        voicings = [(60, 64, 67, 72), (55, 59, 62, 67), (57, 60, 64, 69), (53, 57, 60, 65)]
+        audio = np.concatenate([sum(string(p) for p in voicing) for voicing in voicings])
+        path = tmp_path / "chords.wav"
+        sf.write(str(path), audio.astype(np.float32), SAMPLE_RATE)
+        return str(path)
+
+    def test_engine_from_config(self, chord_file, monkeypatch):
+        """Test chroma is only fetched when the chroma engine is configured"""
+        from src.config import get_config
+        assert chroma_for_chords(chord_file) is None
+        monkeypatch.setattr(get_config().chord_detection, 'engine', 'chroma')
+        assert chroma_for_chords(chord_file).shape[0] == 12
+        monkeypatch.setattr(get_config().chord_detection, 'engine', 'bogus')
+        with pytest.raises(ValueError):
+            chroma_for_chords(chord_file)
+
+    def test_tab_chords_from_audio(self, chord_file, monkeypatch):
+        """Test tab chord names come from the audio, even for measures without notes"""
+        from src.config import get_config
+        monkeypatch.setattr(get_config().chord_detection, 'engine', 'chroma')
+        notes = [{'start': 0.1, 'end': 7.9, 'pitch': 48, 'velocity': 0.8}]
+        tab = create_tab(notes, bpm=120, chroma=chroma_for_chords(chord_file))
+        assert tab.split("\n")[2].split() == ['C', 'G', 'Am', 'F']
@@ -1,12 +1,16 @@
 """
 Tests for the configuration module
 """
+import os
+
 import pytest
 import yaml
 from pathlib import Path
+import src.config
 from src.config import (
-    Config, AudioConfig, TablatureConfig, ChordDetectionConfig,
-    LoggingConfig, I18nConfig, MCPConfig, get_config, reload_config
+    Config, AudioConfig, TablatureConfig, ChordDetectionConfig, InferenceConfig,
+    AnalysisConfig, PerformanceConfig, AdmissionConfig, DaemonConfig, ThreadsConfig, WarmupConfig, NoteExtractionConfig, SeparationConfig, LoggingConfig, I18nConfig, MCPConfig, ConfigWatcher,
+    add_reload_listener, get_config, reload_config
 )
 
 
@@ -33,6 +37,133 @@ class TestTablatureConfig:
         assert config.slots_per_measure == 16
 
 
+class TestInferenceConfig:
+    """Tests for InferenceConfig"""
+
+    def test_default_values(self):
+        """Test default inference configuration"""
+        config = InferenceConfig()
+        assert config.backend == "tensorflow"
+        assert config.intra_op_threads == 0
+        assert config.quantize is False
+
+    def test_from_yaml(self, tmp_path):
+        """Test inference section is loaded from YAML"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'inference': {'backend': 'tflite', 'intra_op_threads': 2}}))
+        config = Config.from_yaml(str(config_file))
+        assert config.inference.backend == 'tflite'
+        assert config.inference.intra_op_threads == 2
+
+
+class TestChordDetectionConfig:
+    """Tests for ChordDetectionConfig"""
+
+    def test_notes_engine_by_default(self):
+        """Test chords come from the notes unless the chroma engine is chosen"""
+        config = ChordDetectionConfig()
+        assert config.engine == 'notes'
+        assert 0 < config.smoothing < 1
+
+
+class TestNoteExtractionConfig:
+    """Tests for NoteExtractionConfig"""
+
+    def test_basic_pitch_defaults(self, tmp_path):
+        """Test the defaults are Basic Pitch's and a section overrides them"""
+        config = NoteExtractionConfig()
+        assert (config.onset_threshold, config.frame_threshold) == (0.5, 0.3)
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'note_extraction': {'onset_threshold': 0.6}}))
+        loaded = Config.from_yaml(str(config_file))
+        assert loaded.note_extraction.onset_threshold == 0.6
+        assert loaded.to_dict()['note_extraction']['min_note_length_ms'] == 127.7
+
+
+class TestSeparationConfig:
+    """Tests for SeparationConfig"""
+
+    def test_disabled_by_default(self):
+        """Test separation is opt-in"""
+        config = SeparationConfig()
+        assert config.enabled is False
+        assert config.split_bands is True
+
+
+class TestAnalysisConfig:
+    """Tests for AnalysisConfig"""
+
+    def test_balanced_by_default(self):
+        """Test requests without a profile use the configured pipeline"""
+        assert AnalysisConfig().default_profile == "balanced"
+
+
+class TestPerformanceConfig:
+    """Tests for PerformanceConfig"""
+
+    def test_default_values(self):
+        """Test defaults match the previously hard-coded pipeline settings"""
+        config = PerformanceConfig()
+        assert config.workers == 4
+        assert config.chunk_seconds == 30.0
+        assert config.chunk_overlap_seconds == 2.0
+        assert config.parallel_threshold_seconds == 45.0
+        assert config.worker_processes == 0
+
+    def test_worker_processes_need_tflite(self, tmp_path):
+        """Test worker processes are refused with a backend whose model can't be shared"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("performance:\n  worker_processes: 2\n")
+        with pytest.raises(ValueError, match="tflite"):
+            Config.from_yaml(str(config_file))
+        config_file.write_text("performance:\n  worker_processes: 2\ninference:\n  backend: tflite\n")
+        assert Config.from_yaml(str(config_file)).performance.worker_processes == 2
+
+    def test_example_config_loads(self):
+        """Test the shipped example configuration is valid"""
+        example = Path(__file__).parent.parent / "config.yaml.example"
+        config = Config.from_yaml(str(example))
+        assert config.performance == PerformanceConfig()
+        assert config.admission == AdmissionConfig()
+        assert config.separation == SeparationConfig()
+        assert config.tablature == TablatureConfig()
+        assert config.analysis == AnalysisConfig()
+        assert config.daemon == DaemonConfig()
+        assert config.threads == ThreadsConfig()
+        assert config.warmup == WarmupConfig()
+
+
+class TestDaemonConfig:
+    """Tests for DaemonConfig"""
+
+    def test_socket_path_from_yaml(self, tmp_path):
+        """Test the daemon section is read from YAML"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("daemon:\n  socket_path: /tmp/tab.sock\n")
+        config = Config.from_yaml(str(config_file))
+        assert config.daemon.socket_path == "/tmp/tab.sock"
+        assert config.daemon.enabled
+
+
+class TestAdmissionConfig:
+    """Tests for AdmissionConfig"""
+
+    def test_default_values(self):
+        """Test default admission limits"""
+        config = AdmissionConfig()
+        assert config.max_jobs_per_client == 2
+        assert config.max_pending_seconds == 7200.0
+        assert config.client_audio_seconds_per_minute == 0.0
+
+    def test_from_yaml(self, tmp_path):
+        """Test admission section is loaded from YAML"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'admission': {'max_jobs_per_client': 1}}))
+        config = Config.from_yaml(str(config_file))
+        assert config.admission.max_jobs_per_client == 1
+        assert config.to_dict()['admission']['max_jobs_per_client'] == 1
+
+
 class TestConfig:
     """Tests for main Config class"""
 
@@ -128,5 +259,58 @@ class TestGlobalConfig:
         assert config.audio.default_bpm == 90.0
 
 
+class TestConfigWatcher:
+    """Tests for configuration hot reload"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_globals(self, monkeypatch):
+        """Keep reloads from leaking into other tests"""
+        monkeypatch.setattr(src.config, "_config", None)
+        monkeypatch.setattr(src.config, "_config_path", None)
+        monkeypatch.setattr(src.config, "_reload_listeners", [])
+
+    def _touch(self, path, data):
+        path.write_text(yaml.dump(data))
+        st = os.stat(path)
+        # Make sure the mtime differs even on coarse-grained filesystems
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_reloads_on_change(self, tmp_path):
+        """Test a changed file is reloaded and listeners are notified"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'performance': {'workers': 2}}))
+        assert get_config(str(config_file)).performance.workers == 2
+
+        seen = []
+        add_reload_listener(lambda config: seen.append(config.performance.workers))
+        watcher = ConfigWatcher(config_path=str(config_file))
+        assert watcher.check() is False
+
+        self._touch(config_file, {'performance': {'workers': 8}})
+        assert watcher.check() is True
+        assert get_config().performance.workers == 8
+        assert seen == [8]
+
+    def test_keeps_config_on_invalid_file(self, tmp_path):
+        """Test a broken edit doesn't replace the running configuration"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'performance': {'workers': 2}}))
+        before = get_config(str(config_file))
+        watcher = ConfigWatcher(config_path=str(config_file))
+
+        self._touch(config_file, {'performance': {'no_such_option': 1}})
+        assert watcher.check() is False
+        assert get_config() is before
+
+    def test_running_requests_keep_their_config(self, tmp_path):
+        """Test reload replaces the global Config instead of mutating it"""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump({'performance': {'workers': 2}}))
+        in_flight = get_config(str(config_file))
+        self._touch(config_file, {'performance': {'workers': 8}})
+        reload_config(str(config_file))
+        assert in_flight.performance.workers == 2
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,115 @@
+"""
+Tests for the shared analysis daemon and its client
+"""
+import os
+import threading
+
+import pytest
+from src import daemon as daemon_module
+from src.daemon import AnalysisDaemon, DaemonClient, DaemonError, DaemonUnavailable
+
+
+class FakeService:
+    """Records calls instead of analyzing"""
+
+    def __init__(self):
+        self.calls = []
+
+    def analyze_audio_to_tab(self, client_id, file_path, duration_seconds=None, start_seconds=0.0,
+                             profile=None, progressive=False):
+        self.calls.append((client_id, file_path))
+        return f"tab of {file_path} ({profile})"
+
+    def export_tab(self, client_id, file_path, format="musicxml"):
+        return {'name': 'song.mid', 'data': b'MThd\x00\xff'}
+
+    def model_status(self):
+        raise RuntimeError("model exploded")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    service = FakeService()
+    server = AnalysisDaemon(str(tmp_path / "daemon.sock"), service=service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, service
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+class TestAnalysisDaemon:
+    """Tests for AnalysisDaemon and DaemonClient"""
+
+    def test_round_trip(self, daemon):
+        """Test calls reach the service with client ids scoped to the calling process"""
+        server, service = daemon
+        client = DaemonClient(server.path)
+        assert client.call('analyze_audio_to_tab', client_id='session-1', file_path='/a.wav',
+                           profile='preview') == "tab of /a.wav (preview)"
+        client.call('analyze_audio_to_tab', client_id=None, file_path='/b.wav')
+        assert service.calls == [(f'pid-{os.getpid()}/session-1', '/a.wav'),
+                                 (f'pid-{os.getpid()}', '/b.wav')]
+        assert client.ping()['pid'] == os.getpid()
+        assert oct(os.stat(server.path).st_mode & 0o777) == oct(0o600)
+
+    def test_bytes_results(self, daemon):
+        """Test binary exports survive the JSON protocol"""
+        server, ___ = daemon
+        exported = DaemonClient(server.path).call('export_tab', client_id='c', file_path='/a.wav', format='midi')
+        assert exported == {'name': 'song.mid', 'data': b'MThd\x00\xff'}
+
+    def test_rejected_requests(self, daemon):
+        """Test unknown methods and service failures are reported, not treated as a missing daemon"""
+        server, ___ = daemon
+        client = DaemonClient(server.path)
+        with pytest.raises(DaemonError, match="Unknown method"):
+            client.call('shutdown')
+        with pytest.raises(DaemonError, match="model exploded"):
+            client.call('model_status')
+
+    @pytest.mark.skipif(not hasattr(os, 'getuid'), reason="no user ids on this platform")
+    def test_other_users_refused(self, daemon, monkeypatch):
+        """Test a client won't use a daemon socket owned by another user"""
+        server, service = daemon
+        monkeypatch.setattr(daemon_module, '_own_uid', lambda: os.getuid() + 1)
+        with pytest.raises(DaemonUnavailable, match="another user"):
+            DaemonClient(server.path).call('analyze_audio_to_tab', client_id='c', file_path='/a.wav')
+        assert service.calls == []
+
+    @pytest.mark.skipif(not hasattr(os, 'getuid'), reason="no user ids on this platform")
+    def test_default_socket_is_private(self, tmp_path, monkeypatch):
+        """Test the default socket lives in a per-user 0700 directory"""
+        monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+        path = daemon_module.default_socket_path()
+        assert path.startswith(str(tmp_path))
+        server = AnalysisDaemon(path, service=FakeService())
+        try:
+            assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+        finally:
+            server.server_close()
+
+    def test_absent_daemon(self, tmp_path):
+        """Test a missing socket raises DaemonUnavailable so callers can fall back"""
+        client = DaemonClient(str(tmp_path / "missing.sock"), connect_timeout=0.1)
+        with pytest.raises(DaemonUnavailable):
+            client.call('model_status')
+
+    def test_stale_socket(self, tmp_path, daemon):
+        """Test a leftover socket file is replaced but a live daemon is not"""
+        server, ___ = daemon
+        with pytest.raises(RuntimeError):
+            AnalysisDaemon(server.path, service=FakeService())
+
+        stale = tmp_path / "stale.sock"
+        stale.write_text("")
+        replacement = AnalysisDaemon(str(stale), service=FakeService())
+        try:
+            thread = threading.Thread(target=replacement.serve_forever, daemon=True)
+            thread.start()
+            assert DaemonClient(str(stale)).ping()['pid'] == os.getpid()
+        finally:
+            replacement.shutdown()
+            replacement.server_close()
+        assert not stale.exists()
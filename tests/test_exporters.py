@@ -0,0 +1,62 @@
+"""
+Tests for the export formats
+"""
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import pretty_midi
+import pytest
+from src.analysis import AnalyzedPiece
+
+
+@pytest.fixture
+def piece():
+    """Eight measures at 120 BPM with a few simultaneous notes"""
+    notes = [{'start': i * 0.5, 'end': i * 0.5 + 0.4, 'pitch': 45 + (i * 7) % 30, 'velocity': 0.7}
+             for i in range(32)]
+    notes += [{'start': 2.0, 'end': 3.0, 'pitch': 64, 'velocity': 0.5},
+              {'start': 2.0, 'end': 3.0, 'pitch': 67, 'velocity': 0.5}]
+    return AnalyzedPiece.from_notes(notes, bpm=120)
+
+
+class TestExports:
+    """Tests for AnalyzedPiece.export"""
+
+    def test_midi(self, piece):
+        """Test the MIDI export contains every note"""
+        midi = pretty_midi.PrettyMIDI(io.BytesIO(piece.export('midi')))
+        exported = midi.instruments[0].notes
+        assert len(exported) == len(piece.pitches)
+        assert sorted(n.pitch for n in exported) == sorted(piece.pitches.tolist())
+
+    def test_musicxml(self, piece):
+        """Test the MusicXML export has a TAB staff, fingering and full measures"""
+        root = ET.fromstring(piece.export('musicxml').split(b'\n', 2)[2])
+        assert root.find('.//clef/sign').text == 'TAB'
+        assert len(root.findall('.//staff-tuning')) == 6
+        measures = root.findall('.//measure')
+        assert len(measures) == piece.num_measures
+        for measure in measures:
+            durations = [int(n.find('duration').text) for n in measure.findall('note')
+                         if n.find('chord') is None]
+            assert sum(durations) == 64
+        technical = root.findall('.//technical')
+        assert technical and all(t.find('string') is not None and t.find('fret') is not None
+                                 for t in technical)
+
+    def test_json(self, piece):
+        """Test the JSON export is columnar and matches the analysis"""
+        document = json.loads(piece.export('json'))
+        assert document['measures'] == piece.measure_chords
+        assert document['notes']['pitch'] == piece.pitches.tolist()
+        assert all(1 <= s <= 6 for s in document['notes']['string'])
+
+    def test_export_is_cached(self, piece):
+        """Test each format is generated only once per piece"""
+        assert piece.export('json') is piece.export('json')
+
+    def test_unknown_format(self, piece):
+        """Test unsupported formats raise ValueError"""
+        with pytest.raises(ValueError):
+            piece.export('pdf')
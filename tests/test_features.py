@@ -0,0 +1,107 @@
+"""
+Tests for the shared audio feature store
+"""
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+from src.features import SAMPLE_RATE, FeatureStore
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    """Four seconds of clicks at 120 BPM over a tone"""
+    t = np.arange(4 * SAMPLE_RATE) / SAMPLE_RATE
+    audio = 0.2 * np.sin(2 * np.pi * 220 * t)
+    for beat in range(8):
+        pos = int(beat * 0.5 * SAMPLE_RATE)
+        audio[pos:pos + 300] += 0.8
+    path = tmp_path / "clicks.wav"
+    sf.write(str(path), audio.astype(np.float32), SAMPLE_RATE)
+    return str(path)
+
+
+@pytest.fixture
+def tempo_change_file(tmp_path):
+    """Clicks at 100 BPM for 24 seconds, then at 140 BPM for 24 seconds"""
+    audio = []
+    for bpm in (100, 140):
+        part = np.zeros(24 * SAMPLE_RATE, dtype=np.float32)
+        for beat in range(int(24 * bpm / 60)):
+            pos = int(beat * 60 / bpm * SAMPLE_RATE)
+            part[pos:pos + 300] += 0.8
+        audio.append(part)
+    path = tmp_path / "tempo_change.wav"
+    sf.write(str(path), np.concatenate(audio), SAMPLE_RATE)
+    return str(path)
+
+
+class TestAudioFeatures:
+    """Tests for AudioFeatures"""
+
+    def test_tempo_matches_beat_track(self, audio_file):
+        """Test tempo from the shared STFT equals librosa.beat.beat_track on the samples"""
+        y, sr = librosa.load(audio_file)
+        expected, ___ = librosa.beat.beat_track(y=y, sr=sr)
+        assert FeatureStore().segment(audio_file).tempo == pytest.approx(float(np.atleast_1d(expected)[0]))
+
+    def test_tempo_map(self, tempo_change_file):
+        """Test the tempo map starts at the first tempo and ends at the second"""
+        tempo_map = FeatureStore().segment(tempo_change_file).tempo_map
+        assert tempo_map[0][0] == 0.0
+        assert tempo_map[0][1] == pytest.approx(100, rel=0.05)
+        assert tempo_map[-1][1] == pytest.approx(140, rel=0.05)
+        assert 16.0 <= tempo_map[-1][0] <= 32.0
+
+    def test_computed_once(self, audio_file):
+        """Test consumers of a segment share each feature and hits are counted"""
+        store = FeatureStore()
+        features = store.segment(audio_file, 0.0, 2.0)
+        stft = features.stft
+        assert store.segment(audio_file, 0.0, 2.0) is features
+        assert features.stft is stft
+        features.chroma
+        assert store.stats()['misses'] == {'audio': 1, 'stft': 1, 'magnitude': 1, 'chroma': 1}
+        # The second request and the magnitude (for chroma) reuse the STFT
+        assert store.stats()['hits']['stft'] == 2
+
+    def test_chroma_blockwise(self, audio_file, monkeypatch):
+        """Test chroma computed in STFT blocks equals chroma of the full STFT"""
+        monkeypatch.setattr('src.features.CHROMA_BLOCK_FRAMES', 50)
+        blockwise = FeatureStore().segment(audio_file)
+        full = FeatureStore().segment(audio_file)
+        full.stft
+        np.testing.assert_allclose(blockwise.chroma, full.chroma, atol=1e-5)
+        assert 'stft' not in blockwise._values
+
+    def test_read_only_float32(self, audio_file):
+        """Test features are read-only float32 arrays"""
+        features = FeatureStore().segment(audio_file)
+        assert features.audio.dtype == np.float32
+        assert features.stft.dtype == np.complex64
+        assert features.chroma.shape[0] == 12
+        assert features.rms.shape == features.onset_envelope.shape
+        with pytest.raises(ValueError):
+            features.magnitude[0, 0] = 1.0
+
+
+class TestFeatureStore:
+    """Tests for FeatureStore"""
+
+    def test_segments_are_distinct(self, audio_file):
+        """Test different segments and file versions get their own features"""
+        store = FeatureStore()
+        first = store.segment(audio_file, 0.0, 2.0)
+        assert store.segment(audio_file, 1.0, 2.0) is not first
+        sf.write(audio_file, np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE)
+        assert store.segment(audio_file, 0.0, 2.0) is not first
+
+    def test_memory_budget(self, audio_file):
+        """Test least recently used segments are evicted to stay within the budget"""
+        store = FeatureStore()
+        store.segment(audio_file, 0.0, 2.0).stft
+        one_segment = store.nbytes
+        store.resize(int(one_segment * 1.5))
+        store.segment(audio_file, 2.0, 2.0).stft
+        assert store.stats()['segments'] == 1
+        assert store.nbytes <= store.max_bytes
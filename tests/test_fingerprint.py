@@ -0,0 +1,94 @@
+"""
+Tests for acoustic fingerprints of recordings
+"""
+import numpy as np
+import pytest
+import soundfile as sf
+from src.fingerprint import MATCH_THRESHOLD, FingerprintIndex, compare, compute_fingerprint
+
+SAMPLE_RATE = 22050
+
+
+def arpeggio(seed, seconds=20.0, sr=SAMPLE_RATE):
+    """Plucked eighth notes over C, G, Am and F, the pattern picked by seed"""
+    rng = np.random.default_rng(seed)
+    chords = [(48, 52, 55, 60, 64), (43, 47, 50, 55, 59), (45, 48, 52, 57, 60), (41, 45, 48, 53, 57)]
+    step = 0.3
+    audio = np.zeros(int((seconds + 1.5) * sr), dtype=np.float32)
+    t = np.arange(int(1.5 * sr)) / sr
+    for i in range(int(seconds / step)):
+        chord = chords[(i // 8) % len(chords)]
+        f0 = 440.0 * 2 ** ((chord[rng.integers(len(chord))] - 69) / 12)
+        start = int(i * step * sr)
+        audio[start:start + len(t)] += sum(0.2 / k * np.sin(2 * np.pi * f0 * k * t) for k in range(1, 6)) * np.exp(-3 * t)
+    return audio[:int(seconds * sr)] / np.abs(audio).max()
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    """A song, a FLAC copy at 44.1 kHz with 1.2 s more lead-in, and another song"""
+    song = arpeggio(seed=1)
+    paths = {'song': str(tmp_path / "song.wav"), 'copy': str(tmp_path / "copy.flac"),
+             'other': str(tmp_path / "other.wav")}
+    sf.write(paths['song'], song, SAMPLE_RATE)
+    lead_in = np.zeros(int(1.2 * 44100), dtype=np.float32)
+    sf.write(paths['copy'], 0.7 * np.concatenate([lead_in, np.repeat(song, 2)]), 44100)
+    sf.write(paths['other'], arpeggio(seed=2), SAMPLE_RATE)
+    return paths
+
+
+class TestFingerprint:
+    """Tests for compute_fingerprint and compare"""
+
+    def test_copy_matches_with_offset(self, recordings):
+        """Test a re-encoded copy with a longer lead-in matches and the offset is found"""
+        score, offset = compare(compute_fingerprint(recordings['song']), compute_fingerprint(recordings['copy']))
+        assert score >= MATCH_THRESHOLD
+        assert offset == pytest.approx(1.2, abs=0.03)
+
+    def test_other_song_does_not_match(self, recordings):
+        """Test another arrangement of the same chords is not taken for the song"""
+        score, ___ = compare(compute_fingerprint(recordings['song']), compute_fingerprint(recordings['other']))
+        assert score < MATCH_THRESHOLD
+
+    def test_silence(self, tmp_path):
+        """Test silent audio matches nothing"""
+        path = str(tmp_path / "silence.wav")
+        sf.write(path, np.zeros(SAMPLE_RATE * 5, dtype=np.float32), SAMPLE_RATE)
+        silence = compute_fingerprint(path)
+        assert compare(silence, silence) == (0.0, 0.0)
+
+
+class TestFingerprintIndex:
+    """Tests for FingerprintIndex"""
+
+    def test_matches_persist(self, recordings, tmp_path):
+        """Test an indexed recording is found by a new index on the same directory"""
+        FingerprintIndex(str(tmp_path / "index")).add(recordings['song'])
+        index = FingerprintIndex(str(tmp_path / "index"))
+        assert len(index) == 1
+        [match] = index.matches(recordings['copy'])
+        assert match.source_path == recordings['song']
+        assert match.offset == pytest.approx(1.2, abs=0.03)
+        assert index.matches(recordings['other']) == []
+
+    def test_same_intro_other_song(self, tmp_path):
+        """Test a recording sharing only the intro is rejected by the middle window"""
+        song = arpeggio(seed=1, seconds=60.0)
+        variant = np.concatenate([song[:25 * SAMPLE_RATE], arpeggio(seed=3, seconds=60.0)[25 * SAMPLE_RATE:]])
+        sf.write(str(tmp_path / "song.wav"), song, SAMPLE_RATE)
+        sf.write(str(tmp_path / "variant.wav"), variant, SAMPLE_RATE)
+        index = FingerprintIndex(str(tmp_path / "index"))
+        index.add(str(tmp_path / "song.wav"))
+        score, ___ = compare(index.fingerprint(str(tmp_path / "song.wav")),
+                             index.fingerprint(str(tmp_path / "variant.wav")))
+        assert score >= MATCH_THRESHOLD
+        assert index.matches(str(tmp_path / "variant.wav")) == []
+
+    def test_not_matched_to_itself(self, recordings, tmp_path):
+        """Test a file version is not reported as a copy of itself"""
+        index = FingerprintIndex(str(tmp_path / "index"))
+        index.add(recordings['song'])
+        index.add(recordings['song'])
+        assert len(index) == 1
+        assert index.matches(recordings['song']) == []
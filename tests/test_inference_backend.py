@@ -0,0 +1,76 @@
+"""
+Tests for the inference backend module
+"""
+import pytest
+from basic_pitch.inference import Model
+from src.inference_backend import (
+    BACKEND_SUFFIXES, available_backends, resolve_backend, load_model, note_agreement
+)
+
+
+class TestResolveBackend:
+    """Tests for backend selection"""
+
+    def test_available_backends_known(self):
+        """Test available backends are a subset of the known ones"""
+        for name in available_backends():
+            assert name in BACKEND_SUFFIXES
+
+    def test_resolve_unknown_backend(self):
+        """Test unknown backend names are rejected"""
+        with pytest.raises(ValueError, match="Unknown inference backend"):
+            resolve_backend("cuda")
+
+    def test_resolve_auto(self):
+        """Test 'auto' resolves to an available backend"""
+        if not available_backends():
+            pytest.skip("No inference runtime installed")
+        assert resolve_backend("auto") in available_backends()
+
+    def test_resolve_quantize_unsupported(self):
+        """Test quantization is rejected for the SavedModel backend"""
+        if "tensorflow" not in available_backends():
+            pytest.skip("TensorFlow not installed")
+        with pytest.raises(ValueError, match="Quantization"):
+            load_model("tensorflow", quantize=True)
+
+
+class TestLoadModel:
+    """Tests for loading models with explicit settings"""
+
+    def test_load_tflite_with_threads(self):
+        """Test TFLite model loads with an explicit thread count"""
+        if "tflite" not in available_backends():
+            pytest.skip("TFLite runtime not installed")
+        model = load_model("tflite", intra_op_threads=1)
+        assert isinstance(model, Model)
+        assert model.model_type == Model.MODEL_TYPES.TFLITE
+
+
+class TestNoteAgreement:
+    """Tests for note-level agreement"""
+
+    def test_identical(self):
+        """Test identical note lists agree perfectly"""
+        notes = [{'start': 0.0, 'pitch': 60}, {'start': 0.5, 'pitch': 64}]
+        assert note_agreement(notes, notes) == (1.0, 1.0, 1.0)
+
+    def test_onset_tolerance(self):
+        """Test small onset shifts still match"""
+        ref = [{'start': 1.0, 'pitch': 60}]
+        est = [{'start': 1.03, 'pitch': 60}]
+        assert note_agreement(ref, est)[2] == 1.0
+        assert note_agreement(ref, est, onset_tolerance=0.01)[2] == 0.0
+
+    def test_each_note_matches_once(self):
+        """Test duplicate estimates only match a single reference note"""
+        ref = [{'start': 1.0, 'pitch': 60}]
+        est = [{'start': 1.0, 'pitch': 60}, {'start': 1.01, 'pitch': 60}]
+        precision, recall, ___ = note_agreement(ref, est)
+        assert precision == 0.5
+        assert recall == 1.0
+
+    def test_empty(self):
+        """Test empty inputs"""
+        assert note_agreement([], []) == (1.0, 1.0, 1.0)
+        assert note_agreement([{'start': 0.0, 'pitch': 60}], []) == (0.0, 0.0, 0.0)
@@ -0,0 +1,120 @@
+"""
+Tests for the model lifecycle manager
+"""
+import threading
+import time
+
+import pytest
+from src.model_manager import ModelManager, current_rss_bytes
+
+
+class CountingLoader:
+    """Loader stub that counts calls and can fail a number of times"""
+
+    def __init__(self, failures=0, delay=0.0):
+        self.calls = 0
+        self.failures = failures
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delay)
+        if call <= self.failures:
+            raise OSError("disk unavailable")
+        return object()
+
+
+class TestModelManager:
+    """Tests for ModelManager"""
+
+    def test_lazy_load_once(self):
+        """Test model is loaded on first use and then reused"""
+        loader = CountingLoader()
+        manager = ModelManager(loader)
+        assert not manager.is_loaded
+        first = manager.get()
+        assert manager.get() is first
+        assert loader.calls == 1
+        assert manager.stats['load_seconds'] is not None
+
+    def test_concurrent_first_requests_load_once(self):
+        """Test concurrent callers share a single load"""
+        loader = CountingLoader(delay=0.05)
+        manager = ModelManager(loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.get())) for ___ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert loader.calls == 1
+        assert all(r is results[0] for r in results)
+
+    def test_retry_with_backoff(self):
+        """Test failed loads are retried"""
+        loader = CountingLoader(failures=2)
+        manager = ModelManager(loader, max_retries=3, retry_backoff_seconds=0.01)
+        assert manager.get() is not None
+        assert loader.calls == 3
+        assert manager.stats['failed_attempts'] == 2
+
+    def test_gives_up_and_fails_fast(self):
+        """Test exhausted retries raise and later calls fail fast during backoff"""
+        loader = CountingLoader(failures=100)
+        manager = ModelManager(loader, max_retries=1, retry_backoff_seconds=5)
+        with pytest.raises(RuntimeError, match="Failed to load model"):
+            manager.get()
+        with pytest.raises(RuntimeError, match="retrying in"):
+            manager.get()
+        assert loader.calls == 1
+
+    def test_idle_unload(self):
+        """Test the model is released after the idle period"""
+        manager = ModelManager(CountingLoader(), idle_unload_seconds=0.05)
+        manager.get()
+        deadline = time.monotonic() + 2
+        while manager.is_loaded and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not manager.is_loaded
+        assert manager.stats['unload_count'] == 1
+
+    def test_no_unload_while_in_use(self):
+        """Test the model is kept while a request is using it"""
+        manager = ModelManager(CountingLoader())
+        with manager.use():
+            assert manager.unload() is False
+        assert manager.unload() is True
+
+    def test_retire_waits_for_in_flight_requests(self):
+        """Test a replaced manager unloads only after its last user finishes"""
+        manager = ModelManager(CountingLoader())
+        with manager.use():
+            manager.retire()
+            assert manager.is_loaded
+        assert not manager.is_loaded
+
+    def test_health_report(self):
+        """Test health report with a failing health check"""
+        def broken(model):
+            raise RuntimeError("bad output")
+        manager = ModelManager(CountingLoader(), health_check=broken)
+        assert manager.health()['healthy'] is None
+        manager.get()
+        report = manager.health()
+        assert report['healthy'] is False
+        assert "bad output" in report['health_error']
+
+    def test_preload_background(self):
+        """Test preloading on a background thread"""
+        manager = ModelManager(CountingLoader())
+        thread = manager.preload()
+        thread.join(timeout=2)
+        assert manager.is_loaded
+
+
+def test_current_rss_bytes():
+    """Test RSS is reported as a non-negative integer"""
+    assert current_rss_bytes() >= 0
@@ -0,0 +1,94 @@
+"""
+Tests for vectorized note extraction from model activations
+"""
+import numpy as np
+import basic_pitch.note_creation as infer
+from src.inference_backend import note_agreement
+from src.note_extraction import MIDI_OFFSET, Activations, activations_from_output, extract_notes, stitch
+
+N_PITCHES = 88
+
+
+def make_activations(n_frames, notes=(), runs=(), start_offset=0.0):
+    """Activations with (pitch, first, last, onset level) notes and (pitch, first, last) runs without onsets"""
+    frames = np.zeros((n_frames, N_PITCHES), dtype=np.float32)
+    onsets = np.zeros((n_frames, N_PITCHES), dtype=np.float32)
+    for pitch, first, last, level in notes:
+        frames[first:last, pitch - MIDI_OFFSET] = 0.8
+        onsets[first, pitch - MIDI_OFFSET] = level
+    for pitch, first, last in runs:
+        frames[first:last, pitch - MIDI_OFFSET] = 0.8
+    return activations_from_output({'note': frames, 'onset': onsets}, start_offset)
+
+
+def part(activations, first, last):
+    """Frames [first, last) of activations, as one chunk of a longer file"""
+    return Activations(activations.frames[first:last], activations.onsets[first:last],
+                       activations.times[first:last])
+
+
+class TestExtractNotes:
+    """Tests for extract_notes"""
+
+    def test_single_note(self):
+        """Test a note runs from its onset to the end of its activity"""
+        activations = make_activations(100, notes=[(60, 10, 60, 0.9)], start_offset=30.0)
+        (note,) = extract_notes(activations)
+        assert note['pitch'] == 60
+        assert note['start'] == activations.times[10] and note['start'] > 30.0
+        assert note['end'] == activations.times[60]
+        assert abs(note['velocity'] - 0.8) < 0.01
+
+    def test_note_across_seam_found_once(self):
+        """Test a note held across overlapping chunks is one note after stitching"""
+        whole = make_activations(300, notes=[(64, 100, 200, 0.9), (67, 20, 60, 0.9)])
+        stitched = stitch([part(whole, 0, 160), part(whole, 130, 300)])
+        np.testing.assert_array_equal(stitched.times, whole.times)
+        notes = extract_notes(stitched)
+        assert [(n['pitch'], n['start'], n['end']) for n in notes] == [
+            (67, whole.times[20], whole.times[60]), (64, whole.times[100], whole.times[200])]
+
+    def test_thresholds_and_min_length(self):
+        """Test the onset threshold and minimum length are honored"""
+        activations = make_activations(200, notes=[(60, 10, 60, 0.4), (72, 100, 115, 0.9)])
+        options = {'infer_onsets': False, 'melodia_trick': False}
+        assert [n['pitch'] for n in extract_notes(activations, **options)] == [72]
+        assert [n['pitch'] for n in extract_notes(activations, onset_threshold=0.35, **options)] == [60, 72]
+        assert extract_notes(activations, onset_threshold=0.35, min_note_length=20, **options)[0]['pitch'] == 60
+        assert len(extract_notes(activations, onset_threshold=0.35, min_note_length=20, **options)) == 1
+
+    def test_melodia_trick(self):
+        """Test strong activity without an onset becomes a note only with the melodia trick"""
+        activations = make_activations(100, runs=[(55, 5, 80)])
+        assert extract_notes(activations, infer_onsets=False, melodia_trick=False) == []
+        (note,) = extract_notes(activations, infer_onsets=False)
+        assert note['pitch'] == 55 and note['start'] == activations.times[5]
+
+    def test_neighbor_onsets(self):
+        """Test of two onsets a semitone apart at the same frame only the stronger starts a note"""
+        activations = make_activations(100, notes=[(60, 10, 60, 0.7), (61, 10, 60, 0.9)])
+        notes = extract_notes(activations, infer_onsets=False, melodia_trick=False)
+        assert [n['pitch'] for n in notes] == [61]
+
+    def test_matches_basic_pitch(self):
+        """Test notes agree with basic_pitch's frame-by-frame extraction on noisy activations"""
+        rng = np.random.default_rng(3)
+        n_frames = 2000
+        frames = np.zeros((n_frames, N_PITCHES), dtype=np.float32)
+        onsets = np.zeros((n_frames, N_PITCHES), dtype=np.float32)
+        for ___ in range(150):
+            pitch, first = rng.integers(20, 70), rng.integers(0, n_frames - 100)
+            last = first + rng.integers(5, 100)
+            frames[first:last, pitch] = np.maximum(frames[first:last, pitch], rng.uniform(0.3, 1.0))
+            if rng.random() < 0.8:
+                onsets[first, pitch] = rng.uniform(0.3, 1.0)
+        frames = np.clip(frames + rng.uniform(0, 0.25, frames.shape).astype(np.float32), 0, 1)
+        model_output = {'note': frames, 'onset': onsets}
+
+        ___, events = infer.model_output_to_notes(
+            {**model_output, 'contour': np.zeros((n_frames, 264), dtype=np.float32)},
+            onset_thresh=0.5, frame_thresh=0.3, min_note_len=11, melodia_trick=True,
+        )
+        reference = [{'start': e[0], 'pitch': e[2]} for e in events]
+        precision, recall, ___ = note_agreement(reference, extract_notes(activations_from_output(model_output)))
+        assert precision > 0.9 and recall > 0.9
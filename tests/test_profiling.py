@@ -0,0 +1,83 @@
+"""
+Tests for opt-in request profiling
+"""
+import pstats
+import tracemalloc
+
+import numpy as np
+from src.profiling import Profiler, current_profile, stage
+from src.scheduler import FairScheduler
+
+
+def worker_hotspot(n):
+    """A function that only runs on a scheduler worker"""
+    return float(np.sort(np.random.default_rng(0).random(n)).sum())
+
+
+class TestProfiler:
+    """Tests for Profiler"""
+
+    def test_only_armed_requests_are_profiled(self, tmp_path):
+        """Test arming profiles exactly the next N requests"""
+        profiler = Profiler(str(tmp_path))
+        with profiler.request("before") as profile:
+            assert profile is None
+        profiler.arm(2)
+        for ___ in range(3):
+            with profiler.request("song.wav"):
+                pass
+        assert profiler.armed == 0
+        assert len(profiler.list_profiles()) == 2
+
+    def test_request_covers_pool_workers(self, tmp_path):
+        """Test the profile includes tasks run on scheduler workers and per-stage memory"""
+        profiler = Profiler(str(tmp_path))
+        profiler.arm(1)
+        scheduler = FairScheduler(workers=2)
+        with profiler.request("/music/slow song.mp3") as profile:
+            assert current_profile() is profile
+            job = scheduler.admit("a", 10)
+            job.profile = current_profile()
+            with stage('transcribe'):
+                futures = [scheduler.submit(job, worker_hotspot, 50000) for ___ in range(2)]
+                buffer = np.ones(4 * 1024 * 1024, dtype=np.uint8)
+                [f.result() for f in futures]
+            del buffer
+            scheduler.release(job)
+        assert current_profile() is None
+        assert not tracemalloc.is_tracing()
+
+        (name,) = profiler.list_profiles()
+        assert name.endswith("slow-song-mp3")
+        summary = profiler.read_summary(name)
+        assert "transcribe" in summary
+        assert "worker_hotspot" in summary
+        stage_name, seconds, peak = profile.stages[0]
+        assert stage_name == 'transcribe' and peak >= 4 * 1024 * 1024
+        stats = pstats.Stats(profiler.profile_path(name))
+        assert any(func[2] == 'worker_hotspot' for func in stats.stats)
+
+    def test_overlapping_requests(self, tmp_path):
+        """Test a request profiled while another is still runs its tasks and stores a profile"""
+        profiler = Profiler(str(tmp_path))
+        profiler.arm(2)
+        scheduler = FairScheduler(workers=2)
+        with profiler.request("outer.wav"):
+            with profiler.request("inner.wav") as inner:
+                job = scheduler.admit("a", 10)
+                job.profile = inner
+                assert scheduler.submit(job, worker_hotspot, 1000).result() > 0
+                scheduler.release(job)
+        assert len(profiler.list_profiles()) == 2
+
+    def test_stage_without_profile(self):
+        """Test stages of unprofiled requests cost nothing and record nothing"""
+        with stage('transcribe'):
+            pass
+        assert current_profile() is None
+
+    def test_unknown_profile(self, tmp_path):
+        """Test reading a missing profile returns None"""
+        profiler = Profiler(str(tmp_path / "none"))
+        assert profiler.list_profiles() == []
+        assert profiler.read_summary("../../etc/passwd") is None
@@ -0,0 +1,126 @@
+"""
+Tests for the resource directory index
+"""
+import os
+
+import pytest
+from src.resource_index import ResourceIndex, normalize_name
+
+
+@pytest.fixture
+def resource_dir(tmp_path):
+    """Resource directory with a few audio files"""
+    for name in ["Adelle-- someone like you-null.mp3",
+                 "Falling Slowly - Once [legendado](MP3_70K)_1.mp3",
+                 "someone like you (live).wav",
+                 ".hidden.mp3"]:
+        (tmp_path / name).write_bytes(b"x" * 10)
+    (tmp_path / "subdir").mkdir()
+    return tmp_path
+
+
+class TestNormalizeName:
+    """Tests for filename normalization"""
+
+    def test_strips_extension_and_punctuation(self):
+        """Test extension, punctuation and case are removed"""
+        assert normalize_name("Falling Slowly - Once.mp3") == "fallingslowlyonce"
+
+    def test_keeps_non_latin_letters(self):
+        """Test non-Latin titles are not normalized away"""
+        assert normalize_name("봄날 (Spring Day).mp3") == "봄날springday"
+
+
+class TestResourceIndex:
+    """Tests for ResourceIndex"""
+
+    def test_indexes_visible_files_only(self, resource_dir):
+        """Test hidden files and directories are skipped"""
+        index = ResourceIndex(str(resource_dir))
+        assert len(index) == 3
+        assert ".hidden.mp3" not in index.names()
+
+    def test_exact_match_ranks_first(self, resource_dir):
+        """Test an exact normalized match beats substring matches"""
+        index = ResourceIndex(str(resource_dir))
+        assert index.resolve("someone like you live").name == "someone like you (live).wav"
+
+    def test_ranking_is_deterministic(self, resource_dir):
+        """Test the closer-length substring match wins"""
+        index = ResourceIndex(str(resource_dir))
+        results = index.lookup("someone like you")
+        assert [e.name for e, ___ in results] == [
+            "someone like you (live).wav",
+            "Adelle-- someone like you-null.mp3",
+        ]
+
+    def test_misspelled_query(self, resource_dir):
+        """Test trigram similarity finds near misses"""
+        index = ResourceIndex(str(resource_dir))
+        assert index.resolve("faling slowly once").name.startswith("Falling Slowly")
+
+    def test_short_query_inside_name(self, resource_dir):
+        """Test queries shorter than a trigram still find names containing them"""
+        index = ResourceIndex(str(resource_dir))
+        assert index.resolve("ow").name.startswith("Falling Slowly")
+        assert index.resolve("v").name == "someone like you (live).wav"
+
+    def test_no_match(self, resource_dir):
+        """Test unrelated queries don't match"""
+        index = ResourceIndex(str(resource_dir))
+        assert index.resolve("bohemian rhapsody") is None
+        assert index.resolve("!!!") is None
+
+    def test_picks_up_new_files(self, resource_dir):
+        """Test new files appear after a refresh"""
+        index = ResourceIndex(str(resource_dir), poll_interval=0)
+        assert index.resolve("wonderwall") is None
+        (resource_dir / "Wonderwall.flac").write_bytes(b"y")
+        # Make sure the directory mtime differs even on coarse-grained filesystems
+        st = os.stat(resource_dir)
+        os.utime(resource_dir, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert index.resolve("wonderwall").name == "Wonderwall.flac"
+
+    def test_pagination(self, resource_dir):
+        """Test paginated listing"""
+        index = ResourceIndex(str(resource_dir))
+        first, total = index.list_page(1, 2)
+        second, ___ = index.list_page(2, 2)
+        assert total == 3
+        assert len(first) == 2 and len(second) == 1
+        assert [e.name for e in first + second] == index.names()
+
+    def test_duration_probe(self, resource_dir):
+        """Test durations are filled in for listed entries only"""
+        index = ResourceIndex(str(resource_dir), duration_probe=lambda path: 61.0)
+        entries, ___ = index.list_page(1, 1)
+        assert entries[0].duration == 61.0
+
+    def test_rewritten_file_restated(self, resource_dir):
+        """Test a file rewritten in place is noticed although the directory mtime is unchanged"""
+        index = ResourceIndex(str(resource_dir), poll_interval=0, duration_probe=lambda path: 61.0)
+        entry = index.get("someone like you (live).wav")
+        index.list_page(1, 10)
+        dir_stat = os.stat(resource_dir)
+        with open(entry.path, "wb") as f:
+            f.write(b"different content")
+        os.utime(resource_dir, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+        assert index.refresh()
+        assert (entry.size, entry.duration) == (len(b"different content"), None)
+        assert not index.refresh()
+
+    def test_content_hash_invalidation(self, resource_dir):
+        """Test content hash changes when a file is rewritten in place"""
+        index = ResourceIndex(str(resource_dir))
+        entry = index.get("someone like you (live).wav")
+        first = index.content_hash(entry)
+        assert index.content_hash(entry) == first
+        with open(entry.path, "wb") as f:
+            f.write(b"different content")
+        assert index.content_hash(entry) != first
+
+    def test_missing_directory(self, tmp_path):
+        """Test a missing directory is treated as empty"""
+        index = ResourceIndex(str(tmp_path / "nope"))
+        assert not index.exists
+        assert index.names() == []
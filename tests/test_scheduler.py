@@ -0,0 +1,131 @@
+"""
+Tests for admission control and fair scheduling
+"""
+import threading
+
+import pytest
+from src.config import Config
+from src.scheduler import FairScheduler, ServerBusy
+
+
+@pytest.fixture
+def gate():
+    """Event that blocks the first task so later ones queue up"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+class TestAdmission:
+    """Tests for FairScheduler.admit"""
+
+    def test_job_limit_per_client(self):
+        """Test a client over its concurrent job limit is rejected with a retry estimate"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=1)
+        job = scheduler.admit("a", 10)
+        with pytest.raises(ServerBusy) as exc_info:
+            scheduler.admit("a", 10)
+        assert exc_info.value.retry_after >= 1
+        assert "Retry after" in str(exc_info.value)
+        # Other clients are unaffected
+        scheduler.release(scheduler.admit("b", 10))
+        scheduler.release(job)
+        scheduler.release(scheduler.admit("a", 10))
+        assert scheduler.status()['rejected'] == 1
+
+    def test_global_pending_limit(self):
+        """Test the server-wide backlog limit applies across clients"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=0, max_pending_seconds=100)
+        scheduler.admit("a", 80)
+        with pytest.raises(ServerBusy):
+            scheduler.admit("b", 30)
+        scheduler.admit("b", 20)
+
+    def test_single_large_job_admitted_when_idle(self):
+        """Test a job larger than the limits still runs when nothing else is queued"""
+        scheduler = FairScheduler(workers=1, max_client_pending_seconds=100, max_pending_seconds=100)
+        job = scheduler.admit("a", 500)
+        with pytest.raises(ServerBusy):
+            scheduler.admit("a", 1)
+        scheduler.release(job)
+        assert scheduler.status()['pending_audio_seconds'] == 0
+
+    def test_audio_per_minute_quota(self):
+        """Test the per-client token bucket rejects a burst over the quota"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=0, client_audio_seconds_per_minute=60)
+        scheduler.release(scheduler.admit("a", 90))
+        with pytest.raises(ServerBusy) as exc_info:
+            scheduler.admit("a", 1)
+        assert exc_info.value.retry_after >= 30
+        scheduler.release(scheduler.admit("b", 1))
+
+    def test_unenforced_admission(self):
+        """Test trusted local jobs bypass the limits but are still counted"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=1)
+        with scheduler.job("local", 10, enforce=False):
+            with scheduler.job("local", 10, enforce=False):
+                assert scheduler.status()['clients']['local']['active_jobs'] == 2
+        assert "local" not in scheduler.status()['clients']
+
+
+class TestDispatch:
+    """Tests for task dispatch"""
+
+    def test_run_and_release(self):
+        """Test tasks return results and completed audio leaves the backlog"""
+        scheduler = FairScheduler(workers=2)
+        with scheduler.job("a", 20) as job:
+            futures = [scheduler.submit(job, pow, i, 2, cost=10) for i in range(2)]
+            assert [f.result() for f in futures] == [0, 1]
+            assert scheduler.status()['pending_audio_seconds'] == 0
+        assert scheduler.status()['completed_tasks'] == 2
+
+    def test_exceptions_propagate(self):
+        """Test task exceptions are raised from the future"""
+        scheduler = FairScheduler(workers=1)
+        with scheduler.job("a", 1) as job:
+            with pytest.raises(ZeroDivisionError):
+                scheduler.run(job, lambda: 1 / 0)
+
+    def test_fair_across_clients(self, gate):
+        """Test a light client is not queued behind a heavy client's backlog"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=0, max_client_pending_seconds=0,
+                                  max_pending_seconds=0, short_job_seconds=0)
+        order = []
+        heavy = scheduler.admit("heavy", 300)
+        light = scheduler.admit("light", 300)
+        blocker = scheduler.submit(heavy, gate.wait, cost=30)
+        futures = [scheduler.submit(heavy, order.append, "heavy", cost=30) for ___ in range(4)]
+        futures += [scheduler.submit(light, order.append, "light", cost=30) for ___ in range(2)]
+        gate.set()
+        for future in [blocker] + futures:
+            future.result()
+        # The light client's tasks are served before most of the heavy backlog
+        assert order.index("light") <= 1
+        assert order[-1] == "heavy"
+
+    def test_short_jobs_first(self, gate):
+        """Test tasks of short jobs are dispatched before tasks of long jobs"""
+        scheduler = FairScheduler(workers=1, max_jobs_per_client=0, short_job_seconds=60)
+        order = []
+        long_job = scheduler.admit("a", 600)
+        short_job = scheduler.admit("b", 20)
+        blocker = scheduler.submit(long_job, gate.wait, cost=30)
+        futures = [scheduler.submit(long_job, order.append, "long", cost=30) for ___ in range(3)]
+        futures.append(scheduler.submit(short_job, order.append, "short"))
+        gate.set()
+        for future in [blocker] + futures:
+            future.result()
+        assert order[0] == "short"
+
+    def test_configure(self):
+        """Test a reloaded configuration updates limits and the worker count"""
+        scheduler = FairScheduler(workers=1)
+        config = Config()
+        config.admission.max_jobs_per_client = 5
+        config.performance.workers = 3
+        config.threads.cpus = 4  # the thread budget caps workers at the CPU count
+        scheduler.configure(config)
+        status = scheduler.status()
+        assert scheduler.max_jobs_per_client == 5
+        assert status['workers'] == 3
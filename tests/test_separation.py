@@ -0,0 +1,66 @@
+"""
+Tests for source separation before transcription
+"""
+import numpy as np
+import pytest
+from src.separation import BASS, HARMONIC, MELODY, merge_stems, separate
+
+SR = 22050
+
+
+def band_energy(audio, low_hz, high_hz):
+    """Energy of audio between two frequencies"""
+    spectrum = np.abs(np.fft.rfft(audio)) ** 2
+    freqs = np.fft.rfftfreq(len(audio), 1 / SR)
+    return spectrum[(freqs >= low_hz) & (freqs < high_hz)].sum()
+
+
+@pytest.fixture
+def mix():
+    """A sustained bass and melody tone with broadband clicks"""
+    t = np.arange(4 * SR) / SR
+    audio = 0.3 * np.sin(2 * np.pi * 82.41 * t) + 0.3 * np.sin(2 * np.pi * 659.26 * t)
+    rng = np.random.default_rng(0)
+    for pos in range(SR // 2, len(audio) - 200, SR // 2):
+        audio[pos:pos + 200] += rng.normal(0, 0.5, 200)
+    return audio.astype(np.float32)
+
+
+class TestSeparate:
+    """Tests for separate"""
+
+    def test_drops_percussive_part(self, mix):
+        """Test clicks are attenuated in the harmonic stem"""
+        harmonic = separate(mix, SR, split_bands=False)[HARMONIC]
+        assert len(harmonic) == len(mix)
+        # Broadband click energy between the two tones
+        assert band_energy(harmonic, 1500, 4000) < 0.2 * band_energy(mix, 1500, 4000)
+
+    def test_split_bands(self, mix):
+        """Test the bass stem holds the low tone and the melody stem the high one"""
+        stems = separate(mix, SR, crossover_hz=150)
+        assert set(stems) == {BASS, MELODY}
+        assert band_energy(stems[BASS], 70, 100) > 10 * band_energy(stems[MELODY], 70, 100)
+        assert band_energy(stems[MELODY], 600, 700) > 10 * band_energy(stems[BASS], 600, 700)
+
+
+class TestMergeStems:
+    """Tests for merge_stems"""
+
+    def test_band_filter_and_tags(self):
+        """Test notes outside their stem's band are dropped and the rest tagged"""
+        merged = merge_stems({
+            BASS: [{'start': 0.0, 'end': 1.0, 'pitch': 40}, {'start': 0.5, 'end': 1.0, 'pitch': 64}],
+            MELODY: [{'start': 0.2, 'end': 1.0, 'pitch': 64}, {'start': 0.7, 'end': 1.0, 'pitch': 36}],
+        }, crossover_hz=150)
+        assert [(n['pitch'], n['source']) for n in merged] == [(40, BASS), (64, MELODY)]
+
+    def test_overtones_removed(self):
+        """Test melody notes at a bass note's overtone with the same onset are dropped"""
+        merged = merge_stems({
+            BASS: [{'start': 1.0, 'end': 2.0, 'pitch': 40}],
+            MELODY: [{'start': 1.02, 'end': 2.0, 'pitch': 52},   # octave, same onset
+                     {'start': 1.5, 'end': 2.0, 'pitch': 52},    # octave, later onset
+                     {'start': 1.0, 'end': 2.0, 'pitch': 55}],   # not an overtone
+        }, crossover_hz=150)
+        assert [(n['start'], n['pitch']) for n in merged] == [(1.0, 40), (1.0, 55), (1.5, 52)]
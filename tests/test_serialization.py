@@ -0,0 +1,55 @@
+"""
+Tests for the binary analysis serialization
+"""
+import mmap
+
+import numpy as np
+import pytest
+from src import serialization
+
+
+class TestBundle:
+    """Tests for pack/unpack and bundle files"""
+
+    def test_roundtrip(self):
+        """Test arrays and metadata survive a roundtrip"""
+        arrays = {'a': np.arange(5, dtype=np.int8), 'b': np.ones((3, 4), dtype=np.float32)}
+        meta, restored = serialization.unpack(serialization.pack(arrays, {'bpm': 90.0}))
+        assert meta == {'bpm': 90.0}
+        np.testing.assert_array_equal(restored['a'], arrays['a'])
+        np.testing.assert_array_equal(restored['b'], arrays['b'])
+
+    def test_columns_are_aligned_views(self):
+        """Test columns are read-only views starting on aligned offsets"""
+        data = serialization.pack({'a': np.arange(3, dtype=np.int8),
+                                   'b': np.arange(3, dtype=np.float64)}, {})
+        ___, arrays = serialization.unpack(data)
+        assert not arrays['b'].flags.writeable
+        assert not arrays['b'].flags.owndata
+
+    def test_mmap_read(self, tmp_path):
+        """Test files are memory-mapped, not copied"""
+        path = str(tmp_path / "bundle.ftnb")
+        serialization.write(path, {'x': np.arange(1000, dtype=np.int64)}, {'kind': 'test'})
+        meta, arrays = serialization.read(path)
+        assert meta['kind'] == 'test'
+        base = arrays['x']
+        while isinstance(base, np.ndarray):
+            base = base.base
+        assert isinstance(base.obj, mmap.mmap)
+        assert int(arrays['x'].sum()) == 499500
+
+    def test_empty_arrays(self):
+        """Test empty columns roundtrip"""
+        ___, arrays = serialization.unpack(serialization.pack({'x': np.zeros(0)}, {}))
+        assert arrays['x'].shape == (0,)
+
+    def test_rejects_foreign_data(self):
+        """Test non-bundle and future-version data is rejected"""
+        with pytest.raises(ValueError):
+            serialization.unpack(b"PK\x03\x04" + b"\x00" * 32)
+        data = bytearray(serialization.pack({}, {}))
+        data[4] = serialization.FORMAT_VERSION + 1
+        with pytest.raises(ValueError):
+            serialization.unpack(bytes(data))
+
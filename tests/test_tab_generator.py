@@ -1,8 +1,13 @@
 """
 Tests for the tab generator module
 """
+import numpy as np
 import pytest
-from src.tab_generator import TabGenerator, create_tab
+import src.config
+import src.tab_generator
+from src.config import Config
+from src.tab_generator import (FingeringOverride, TabGenerator, bass_mask, chord_type, create_tab,
+                               get_tuning_tables)
 
 
 class TestTabGenerator:
@@ -64,6 +69,17 @@ class TestTabGenerator:
         # Should prefer frets 0-5
         assert fret <= 5
 
+    def test_source_tags_override_bass_threshold(self):
+        """Test notes tagged by source separation are fingered by their stem"""
+        generator = TabGenerator()
+        pitches = np.array([55, 55])
+        strings, ___ = generator.assign_fingering(pitches, np.zeros(2, dtype=np.int64), ["N.C."],
+                                                  is_bass=np.array([True, False]))
+        assert strings[0] <= 2 < strings[1]
+        notes = [{'start': 0.0, 'end': 0.5, 'pitch': 55, 'velocity': 0.8, 'source': 'bass'}]
+        assert bass_mask(notes).tolist() == [True]
+        assert bass_mask([{'start': 0.0, 'end': 0.5, 'pitch': 55}]) is None
+
     def test_generate_ascii_tab_empty(self):
         """Test generating tab with no notes"""
         generator = TabGenerator()
@@ -83,6 +99,44 @@ class TestTabGenerator:
         assert "|" in result  # Tab should have pipe characters
         assert "-" in result  # Tab should have dashes
 
+    def test_generate_measure_range(self):
+        """Test rendering a measure range matches the same bars of the full tab"""
+        generator = TabGenerator(bpm=120)  # 2 seconds per measure
+        notes = [{'start': i * 0.5, 'end': i * 0.5 + 0.4, 'pitch': 48 + (i * 5) % 24, 'velocity': 0.8}
+                 for i in range(64)]
+        full = generator.generate_ascii_tab(notes).split("\n")
+        partial = generator.generate_ascii_tab(notes, start_measure=4, end_measure=8).split("\n")
+        # Header + blank, then one line group of chord line, 6 strings and a blank
+        assert partial[2:10] == full[10:18]
+        assert len(partial) == 10
+
+    def test_generate_empty_measure_range(self):
+        """Test a range past the end of the piece"""
+        generator = TabGenerator()
+        notes = [{'start': 0.0, 'end': 0.5, 'pitch': 60, 'velocity': 0.8}]
+        assert "No measures" in generator.generate_ascii_tab(notes, start_measure=10)
+
+    def test_two_digit_fret_clipped_at_barline(self):
+        """Test a two-digit fret in the last slot doesn't spill into the next measure"""
+        generator = TabGenerator(bpm=120)
+        strings = np.array([0], dtype=np.int8)
+        frets = np.array([12], dtype=np.int8)
+        tab = generator.render_tab(np.array([0]), np.array([15]), strings, frets, ["N.C.", "N.C."])
+        low_e = [line for line in tab.split("\n") if line.startswith("E|")][0]
+        assert low_e == "E|" + "-" * 15 + "1|" + "-" * 16 + "|"
+
+    def test_measure_chords_match_detect_chord(self):
+        """Test batched chord detection agrees with per-measure detection"""
+        generator = TabGenerator()
+        measures = [
+            [48, 52, 55], [50, 54, 57, 62], [], [45, 52, 57, 60], [64],
+        ]
+        measure_idx = np.array([m for m, ps in enumerate(measures) for ___ in ps])
+        pitches = np.array([p for ps in measures for p in ps])
+        batched = generator.detect_measure_chords(measure_idx, pitches, len(measures))
+        single = [generator.detect_chord([{'pitch': p} for p in ps]) for ps in measures]
+        assert batched == single
+
     def test_detect_chord_empty(self):
         """Test chord detection with no notes"""
         generator = TabGenerator()
@@ -112,6 +166,200 @@ class TestTabGenerator:
             generator.generate_ascii_tab(invalid_notes)
 
 
+class TestDpFingering:
+    """Tests for whole-passage (dynamic-programming) fingering"""
+
+    @pytest.fixture
+    def passage(self):
+        """Random notes over 40 measures with a chord per measure"""
+        generator = TabGenerator(bpm=120)
+        rng = np.random.default_rng(0)
+        pitches = rng.integers(35, 85, 400)
+        measure_idx = np.sort(rng.integers(0, 40, 400))
+        slot_idx = rng.integers(0, 16, 400)
+        chords = [generator.tables.chord_names[i] for i in rng.integers(0, len(generator.tables.chord_names), 40)]
+        return generator, pitches, measure_idx, slot_idx, chords
+
+    def test_matches_greedy_without_penalties(self, passage, monkeypatch):
+        """Test the per-note scores are find_best_pos's: without transition costs both agree"""
+        generator, pitches, measure_idx, slot_idx, chords = passage
+        monkeypatch.setattr(src.tab_generator, "HAND_SHIFT_PENALTY", 0)
+        monkeypatch.setattr(src.tab_generator, "STRING_CLASH_PENALTY", 0)
+        greedy = generator.assign_fingering(pitches, measure_idx, chords)
+        dp = generator.assign_fingering(pitches, measure_idx, chords, method='dp', slot_idx=slot_idx)
+        np.testing.assert_array_equal(dp[0], greedy[0])
+        np.testing.assert_array_equal(dp[1], greedy[1])
+
+    def test_positions_sound_the_note(self, passage):
+        """Test every position plays the note's pitch class"""
+        generator, pitches, measure_idx, slot_idx, chords = passage
+        strings, frets = generator.assign_fingering(pitches, measure_idx, chords, method='dp', slot_idx=slot_idx)
+        placed = strings >= 0
+        assert placed.all()
+        sounding = np.asarray(generator.tuning)[strings[placed]] + frets[placed]
+        assert np.all((sounding - pitches[placed]) % 12 == 0)
+
+    def test_simultaneous_notes_on_different_strings(self):
+        """Test two notes struck together aren't put on one string, as greedy does"""
+        generator = TabGenerator(bpm=120)
+        pitches, measure_idx, slot_idx = np.array([64, 65]), np.array([0, 0]), np.array([0, 0])
+        greedy_strings, ___ = generator.assign_fingering(pitches, measure_idx, ["N.C."])
+        dp_strings, ___ = generator.assign_fingering(pitches, measure_idx, ["N.C."], method='dp', slot_idx=slot_idx)
+        assert greedy_strings[0] == greedy_strings[1]
+        assert dp_strings[0] != dp_strings[1]
+
+    def test_unknown_method(self):
+        """Test an unknown fingering method raises ValueError"""
+        with pytest.raises(ValueError):
+            TabGenerator().assign_fingering(np.array([60]), np.array([0]), ["N.C."], method='fastest')
+
+
+class TestFingeringOverrides:
+    """Tests for fingering overrides"""
+
+    @pytest.fixture
+    def passage(self):
+        """A4 (MIDI 69) and other notes over 8 measures"""
+        generator = TabGenerator(bpm=120)
+        pitches = np.tile([69, 52, 60, 64], 8)
+        measure_idx = np.repeat(np.arange(8), 4)
+        slot_idx = np.tile([0, 4, 8, 12], 8)
+        return generator, pitches, measure_idx, slot_idx, ["N.C."] * 8
+
+    def test_scoped_override(self, passage):
+        """Test an override moves only its pitch, and only in its measures"""
+        generator, pitches, measure_idx, slot_idx, chords = passage
+        free = generator.assign_fingering(pitches, measure_idx, chords)
+        forced = generator.override_strings(pitches, measure_idx, [FingeringOverride(69, 3, 2, 4)])
+        strings, frets = generator.assign_fingering(pitches, measure_idx, chords, forced_strings=forced)
+        moved = (pitches == 69) & (measure_idx >= 2) & (measure_idx < 4)
+        assert (strings[moved] == 3).all() and (frets[moved] == 14).all()
+        np.testing.assert_array_equal(strings[~moved], free[0][~moved])
+
+    def test_later_override_wins(self, passage):
+        """Test overlapping overrides resolve to the later one"""
+        generator, pitches, measure_idx, ___, ___ = passage
+        forced = generator.override_strings(pitches, measure_idx,
+                                            [FingeringOverride(69, 3), FingeringOverride(69, 4, 0, 1)])
+        assert forced[pitches == 69].tolist() == [4] + [3] * 7
+        assert (forced[pitches != 69] == -1).all()
+        assert generator.override_strings(pitches, measure_idx, []) is None
+
+    def test_dp_honors_override(self, passage):
+        """Test whole-passage fingering keeps forced notes on their string"""
+        generator, pitches, measure_idx, slot_idx, chords = passage
+        forced = generator.override_strings(pitches, measure_idx, [FingeringOverride(69, 4)])
+        strings, frets = generator.assign_fingering(pitches, measure_idx, chords, method='dp',
+                                                    slot_idx=slot_idx, forced_strings=forced)
+        assert (strings[pitches == 69] == 4).all() and (frets[pitches == 69] == 10).all()
+        sounding = np.asarray(generator.tuning)[strings] + frets
+        assert np.all((sounding - pitches) % 12 == 0)
+
+    def test_unplayable_override_ignored(self, passage):
+        """Test a string the pitch can't be played on leaves its fingering alone"""
+        generator, pitches, measure_idx, ___, chords = passage
+        forced = generator.override_strings(pitches, measure_idx, [FingeringOverride(52, 5)])
+        assert generator.fret_on_string(52, 5) is None
+        for method in ('greedy', 'dp'):
+            free = generator.assign_fingering(pitches, measure_idx, chords, method=method)
+            tweaked = generator.assign_fingering(pitches, measure_idx, chords, method=method,
+                                                 forced_strings=forced)
+            np.testing.assert_array_equal(tweaked[0], free[0])
+
+    def test_create_tab_with_overrides(self):
+        """Test create_tab honors overrides"""
+        notes = [{'start': 0.0, 'end': 0.5, 'pitch': 64, 'velocity': 0.8}]
+        assert "e|0" in create_tab(notes, bpm=120)
+        assert "B|5" in create_tab(notes, bpm=120, overrides=[FingeringOverride(64, 4)])
+
+
+class TestTuningTables:
+    """Tests for shared tuning tables"""
+
+    def test_tables_shared_between_generators(self):
+        """Test generators with the same tuning reuse one set of tables"""
+        assert TabGenerator(bpm=80).tables is TabGenerator(bpm=120).tables
+
+    def test_tables_are_read_only(self):
+        """Test shared tables cannot be mutated by a generator"""
+        generator = TabGenerator()
+        with pytest.raises(TypeError):
+            generator.chord_templates["X"] = {}
+        with pytest.raises(ValueError):
+            generator.tables.chord_masks[0, 0] = 0
+
+    def test_capo_shifts_open_strings(self):
+        """Test capo raises the sounding pitch of every string"""
+        tables = get_tuning_tables(('E2', 'A2', 'D3', 'G3', 'B3', 'E4'), capo=2)
+        assert tables.tuning[0] == 42
+
+    def test_capo_frets_relative_to_capo(self):
+        """Test notes are placed relative to the capo"""
+        generator = TabGenerator(capo=2)
+        # F#2 (MIDI 42) is the open low string with capo 2
+        assert generator.find_best_pos(42, is_bass=True) == (0, 0)
+
+    def test_fret_candidates_within_range(self):
+        """Test precomputed candidates respect the fret range"""
+        tables = get_tuning_tables(('E2', 'A2', 'D3', 'G3', 'B3', 'E4'))
+        for candidates in tables.fret_candidates:
+            assert all(0 <= fret <= 15 for ___, fret in candidates)
+
+    def test_short_tuning_skips_six_string_shapes(self):
+        """Test shapes using missing strings are dropped for 4-string tunings"""
+        generator = TabGenerator(tuning=['E1', 'A1', 'D2', 'G2'])
+        assert "E" not in generator.chord_templates
+        assert generator.detect_chord([{'pitch': 40, 'start': 0.0, 'end': 1.0}]) in ("N.C.",) + generator.tables.chord_names
+
+
+class TestConfiguredGenerator:
+    """Tests for settings read from the configuration"""
+
+    @pytest.fixture
+    def config(self, monkeypatch):
+        """Fresh configuration installed as the global one"""
+        config = Config()
+        monkeypatch.setattr(src.config, "_config", config)
+        return config
+
+    def test_layout_from_config(self, config):
+        """Test slots per measure and measures per line follow the configuration"""
+        config.tablature.slots_per_measure = 8
+        config.tablature.measures_per_line = 2
+        notes = [{'start': i * 2.0, 'end': i * 2.0 + 1.0, 'pitch': 64, 'velocity': 0.8} for i in range(4)]
+        tab = TabGenerator(bpm=120).generate_ascii_tab(notes)
+        e_lines = [line for line in tab.split('\n') if line.startswith('e|')]
+        assert len(e_lines) == 2
+        assert e_lines[0] == "e|0-------|0-------|"
+
+    def test_fret_preferences_from_config(self, config):
+        """Test max fret and preferred fret range follow the configuration"""
+        config.tablature.max_fret = 5
+        generator = TabGenerator()
+        assert all(fret <= 5 for ___, fret in generator.tables.fret_candidates[50])
+        assert TabGenerator().find_best_pos(64) == (5, 0)
+        config.tablature.min_fret = 1
+        # Open strings are no longer preferred: E4 moves to the B string
+        assert TabGenerator().find_best_pos(64) == (4, 5)
+
+    def test_chord_settings_from_config(self, config):
+        """Test disabled chord types and the score threshold are respected"""
+        config.chord_detection.enabled_chord_types['seventh'] = False
+        generator = TabGenerator()
+        assert "G7" not in generator.chord_templates
+        assert "G" in generator.chord_templates
+        c_major = [{'pitch': p, 'start': 0.0, 'end': 1.0} for p in (48, 52, 55)]
+        assert generator.detect_chord(c_major) == "C"
+        config.chord_detection.min_score = 100
+        assert TabGenerator().detect_chord(c_major) == "N.C."
+
+    def test_chord_type(self):
+        """Test chord names map to configuration chord types"""
+        assert chord_type("F#m7") == "minor_seventh"
+        assert chord_type("Csus4") == "suspended"
+        assert chord_type("Fadd9") == "add9"
+
+
 class TestCreateTab:
     """Tests for create_tab convenience function"""
 
@@ -0,0 +1,83 @@
+"""
+Tests for the CPU thread budget
+"""
+import os
+
+import pytest
+from src.config import Config, InferenceConfig, PerformanceConfig, ThreadsConfig
+from src.thread_budget import BLAS_ENV_VARS, available_cpus, cgroup_cpu_quota, compute_budget
+
+
+def config(workers=4, worker_processes=0, intra=0, inter=0, **threads):
+    """Configuration with the settings the budget depends on"""
+    return Config(performance=PerformanceConfig(workers=workers, worker_processes=worker_processes),
+                  inference=InferenceConfig(intra_op_threads=intra, inter_op_threads=inter),
+                  threads=ThreadsConfig(**threads))
+
+
+class TestComputeBudget:
+    """Tests for compute_budget"""
+
+    def test_worker_threads_share_process_pools(self):
+        """Test worker threads get the process-wide pools sized for all CPUs, an inter-op thread each"""
+        budget = compute_budget(config(), cpus=8, cpu_source='affinity')
+        assert (budget.workers, budget.intra_op_threads, budget.inter_op_threads, budget.blas_threads) == (4, 8, 4, 8)
+
+    def test_workers_capped_by_cpus(self):
+        """Test no more worker threads than CPUs"""
+        budget = compute_budget(config(workers=8), cpus=2)
+        assert (budget.workers, budget.intra_op_threads, budget.inter_op_threads, budget.blas_threads) == (2, 2, 2, 2)
+
+    def test_worker_processes(self):
+        """Test worker processes, not the threads feeding them, divide the CPUs"""
+        budget = compute_budget(config(workers=4, worker_processes=2), cpus=8)
+        assert (budget.worker_processes, budget.intra_op_threads, budget.inter_op_threads,
+                budget.blas_threads) == (2, 4, 1, 4)
+        assert budget.worker_processes * budget.intra_op_threads <= 8
+        assert compute_budget(config(worker_processes=16), cpus=8).worker_processes == 8
+
+    def test_overrides(self):
+        """Test configured counts replace the derived ones"""
+        budget = compute_budget(config(intra=3, inter=2, blas_threads=1, cpus=6))
+        assert (budget.cpus, budget.cpu_source) == (6, 'config')
+        assert (budget.intra_op_threads, budget.inter_op_threads, budget.blas_threads) == (3, 2, 1)
+
+    def test_disabled(self):
+        """Test a disabled budget leaves the configured values and library defaults"""
+        budget = compute_budget(config(workers=16, enabled=False), cpus=2)
+        assert (budget.workers, budget.intra_op_threads, budget.blas_threads) == (16, 0, 0)
+        assert budget.environment() == {}
+
+    def test_environment(self):
+        """Test the BLAS limit is expressed for every OpenMP/BLAS library"""
+        environment = compute_budget(config(worker_processes=4), cpus=8).environment()
+        assert environment == {name: '2' for name in BLAS_ENV_VARS}
+
+
+class TestCpuDetection:
+    """Tests for cgroup quotas and available_cpus"""
+
+    def test_cgroup_v2_quota(self, tmp_path):
+        """Test a cgroup v2 cpu.max limit is read in CPUs"""
+        (tmp_path / "cpu.max").write_text("150000 100000\n")
+        assert cgroup_cpu_quota(str(tmp_path)) == 1.5
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert cgroup_cpu_quota(str(tmp_path)) is None
+
+    def test_cgroup_v1_quota(self, tmp_path):
+        """Test a cgroup v1 CFS quota is read in CPUs, and -1 means unlimited"""
+        cpu = tmp_path / "cpu"
+        cpu.mkdir()
+        (cpu / "cpu.cfs_period_us").write_text("100000")
+        (cpu / "cpu.cfs_quota_us").write_text("200000")
+        assert cgroup_cpu_quota(str(tmp_path)) == 2.0
+        (cpu / "cpu.cfs_quota_us").write_text("-1")
+        assert cgroup_cpu_quota(str(tmp_path)) is None
+
+    @pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason="needs sched_getaffinity")
+    def test_quota_lowers_cpu_count(self, tmp_path):
+        """Test a quota below the affinity mask wins, rounded down to at least one CPU"""
+        (tmp_path / "cpu.max").write_text("50000 100000\n")
+        assert available_cpus(str(tmp_path)) == (1, 'cgroup quota')
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert available_cpus(str(tmp_path)) == (len(os.sched_getaffinity(0)), 'affinity')
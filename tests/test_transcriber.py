@@ -1,9 +1,20 @@
 """
 Tests for the transcriber module
 """
+import time
+
+import numpy as np
 import pytest
+import soundfile as sf
 from pathlib import Path
-from src.transcriber import transcribe_audio, validate_audio_file, SUPPORTED_FORMATS
+import src.transcriber
+from src.analysis_profiles import BALANCED
+from src.config import Config, InferenceConfig, PerformanceConfig, SeparationConfig, get_config
+from src.features import get_feature_store
+from src.scheduler import FairScheduler
+from src.thread_budget import compute_budget
+from src.transcriber import (WINDOW_OUTPUT_SHAPES, _run_inference, _submit_separated, transcribe_audio,
+                             validate_audio_file, SUPPORTED_FORMATS)
 
 
 class TestValidateAudioFile:
@@ -62,3 +73,105 @@ class TestTranscribeAudio:
         audio_file.write_text("not an audio file")
         with pytest.raises(ValueError):
             transcribe_audio(str(audio_file))
+
+
+class TestTempoDetection:
+    """Tests for the tempo detected before transcription"""
+
+    def test_audio_decoded_once(self, tmp_path):
+        """Test the tempo is detected on the chunk's own feature segment, not a second decode"""
+        path = tmp_path / "song.wav"
+        sr = 22050
+        t = np.arange(8 * sr) / sr
+        sf.write(str(path), (0.5 * np.sin(2 * np.pi * 220 * t) * np.exp(-3 * (t % 0.5))).astype(np.float32), sr)
+        decoded = get_feature_store().stats()['misses'].get('audio', 0)
+        scheduler = FairScheduler(workers=1)
+        with scheduler.job("a", 8) as job:
+            ___, bpm = src.transcriber._transcribe_validated(
+                str(path), None, 0.0, CountingModel(), get_config().performance, scheduler, job, None, BALANCED)
+        assert bpm > 0
+        assert get_feature_store().stats()['misses']['audio'] == decoded + 1
+
+
+class TestSeparatedTranscription:
+    """Tests for transcription of separated stems"""
+
+    @pytest.fixture
+    def stems(self, monkeypatch):
+        """Stub separation into two stems and stem inference by stem level"""
+        def fake_separate(audio_path, duration, start_offset, separation):
+            return {'bass': np.zeros(4), 'melody': np.ones(4)}
+
+        def fake_activations(audio, model, batch_size, start_offset, silence_db=None):
+            return {'level': float(audio[0]), 'start': start_offset}
+
+        monkeypatch.setattr(src.transcriber, "_separate_chunk", fake_separate)
+        monkeypatch.setattr(src.transcriber, "_activations_from_audio", fake_activations)
+
+    def test_stems_transcribed_as_tasks(self, stems):
+        """Test each stem runs as its own scheduler task and yields its activations"""
+        scheduler = FairScheduler(workers=2)
+        with scheduler.job("a", 60) as job:
+            future = _submit_separated(scheduler, job, "song.wav", 30.0, 30.0, None, 1, SeparationConfig())
+            stems = future.result(timeout=10)
+        assert stems == {'bass': {'level': 0.0, 'start': 30.0}, 'melody': {'level': 1.0, 'start': 30.0}}
+        # Workers count a task after resolving its future
+        deadline = time.monotonic() + 5
+        while scheduler.status()['completed_tasks'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scheduler.status()['completed_tasks'] == 3
+
+
+class CountingModel:
+    """Stand-in model answering every window with ones and counting the windows it saw"""
+
+    def __init__(self):
+        self.windows = 0
+
+    def predict(self, batch):
+        self.windows += len(batch)
+        return {k: np.ones((len(batch),) + shape, dtype=np.float32) for k, shape in WINDOW_OUTPUT_SHAPES.items()}
+
+
+class TestSilenceSkipping:
+    """Tests for skipping silent model windows"""
+
+    def test_silent_windows_not_run(self):
+        """Test quiet windows skip the model and yield zero activations of the same shape"""
+        sr = 22050
+        audio = np.zeros(12 * sr, dtype=np.float32)
+        audio[9 * sr:] = 0.5 * np.sin(2 * np.pi * 220 * np.arange(3 * sr) / sr)
+
+        full_model, skipping_model = CountingModel(), CountingModel()
+        full = _run_inference(audio, full_model, batch_size=4)
+        skipped = _run_inference(audio, skipping_model, batch_size=4, silence_db=-40.0)
+        assert skipping_model.windows < full_model.windows
+        for key in full:
+            assert skipped[key].shape == full[key].shape
+        assert skipped['note'][:100].max() == 0.0
+        assert skipped['note'][-100:].min() == 1.0
+
+
+class TestWorkerPool:
+    """Tests for get_worker_pool"""
+
+    def use_config(self, monkeypatch, backend):
+        """Make get_worker_pool see two worker processes with the given backend"""
+        config = Config(performance=PerformanceConfig(worker_processes=2),
+                        inference=InferenceConfig(backend=backend))
+        monkeypatch.setattr(src.transcriber, "get_config", lambda: config)
+        monkeypatch.setattr(src.transcriber, "get_thread_budget", lambda: compute_budget(config, cpus=4))
+        monkeypatch.setattr(src.transcriber, "_WORKER_POOL", None)
+
+    def test_tflite_model_shared(self, monkeypatch):
+        """Test the tflite model is preloaded once for all workers"""
+        self.use_config(monkeypatch, "tflite")
+        pool = src.transcriber.get_worker_pool()
+        pool.close()
+        assert pool._preload_model
+
+    def test_other_backends_rejected(self, monkeypatch):
+        """Test a backend whose model can't be shared across fork() is refused"""
+        self.use_config(monkeypatch, "tensorflow")
+        with pytest.raises(ValueError, match="tflite"):
+            src.transcriber.get_worker_pool()
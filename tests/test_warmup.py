@@ -0,0 +1,88 @@
+"""
+Tests for the startup warm-up and the persistent numba cache
+"""
+import os
+import sys
+import time
+
+import pytest
+import src.warmup
+from src.config import Config, WarmupConfig
+from src.warmup import SAMPLE_RATE, Warmup, configure_numba_cache, synthetic_clip
+
+
+@pytest.fixture
+def numba_env(monkeypatch):
+    """Restore NUMBA_CACHE_DIR (and numba's config) after the test"""
+    monkeypatch.delenv('NUMBA_CACHE_DIR', raising=False)
+    yield
+    monkeypatch.undo()
+    if 'numba' in sys.modules:
+        from numba.core import config as numba_config
+        numba_config.reload_config()
+
+
+def wait_for(warmup, state):
+    """Wait up to 5 s for a warm-up to reach a state"""
+    deadline = time.monotonic() + 5
+    while warmup.state != state and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return warmup.status()
+
+
+class TestNumbaCache:
+    """Tests for configure_numba_cache"""
+
+    def test_configured_directory(self, tmp_path, numba_env):
+        """Test the cache directory is created and handed to numba"""
+        directory = configure_numba_cache(str(tmp_path / "numba"))
+        assert directory == str(tmp_path / "numba")
+        assert os.path.isdir(directory)
+        assert os.environ['NUMBA_CACHE_DIR'] == directory
+
+    def test_existing_environment_kept(self, tmp_path, numba_env, monkeypatch):
+        """Test a NUMBA_CACHE_DIR set by the user wins over the default"""
+        monkeypatch.setenv('NUMBA_CACHE_DIR', str(tmp_path / "mine"))
+        assert configure_numba_cache() == str(tmp_path / "mine")
+
+
+class TestWarmup:
+    """Tests for synthetic_clip and Warmup"""
+
+    def test_synthetic_clip(self):
+        """Test the clip is normalized audio of the requested length"""
+        clip = synthetic_clip(2.0)
+        assert len(clip) == 2 * SAMPLE_RATE
+        assert abs(clip).max() == pytest.approx(1.0)
+
+    def test_runs_once(self, monkeypatch):
+        """Test the warm-up runs once per process, in the background"""
+        calls = []
+
+        def fake_warm_up():
+            calls.append(1)
+            return 1.5
+
+        monkeypatch.setattr(src.warmup, "warm_up", fake_warm_up)
+        warmup = Warmup()
+        assert warmup.start()
+        assert not warmup.start()
+        assert wait_for(warmup, 'done') == {'state': 'done', 'seconds': 1.5, 'error': None}
+        assert calls == [1]
+
+    def test_failure_reported(self, monkeypatch):
+        """Test a failing warm-up is reported, not raised"""
+        def fail():
+            raise RuntimeError("no model")
+
+        monkeypatch.setattr(src.warmup, "warm_up", fail)
+        warmup = Warmup()
+        warmup.start()
+        assert wait_for(warmup, 'failed')['error'] == "no model"
+
+    def test_disabled(self, monkeypatch):
+        """Test warmup.enabled off skips the warm-up"""
+        monkeypatch.setattr(src.warmup, "get_config", lambda: Config(warmup=WarmupConfig(enabled=False)))
+        warmup = Warmup()
+        assert not warmup.start()
+        assert warmup.state == 'idle'
@@ -0,0 +1,153 @@
+"""
+Tests for coalescing of overlapping transcription windows
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+from src.window_planner import Chunk, WindowPlanner, clip_to_window, plan_chunks
+
+
+def fake_notes(chunk):
+    """One note per second of the chunk, at whole seconds of file time"""
+    return [{'start': float(t), 'end': t + 0.5, 'pitch': 60, 'velocity': 0.8}
+            for t in range(int(chunk.start), int(chunk.start + chunk.duration))]
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "song.wav"
+    path.write_bytes(b"\0" * 16)
+    return str(path)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+class CountingSubmit:
+    """submit() stub running fake_notes on an executor and recording chunks"""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.chunks = []
+
+    def __call__(self, chunk):
+        self.chunks.append(chunk)
+        return self.executor.submit(fake_notes, chunk)
+
+
+class TestPlanChunks:
+    """Tests for plan_chunks"""
+
+    def test_grid_aligned(self):
+        """Test windows map to the chunks of a fixed grid"""
+        chunks = plan_chunks(300, 35, 70, chunk_seconds=30, overlap_seconds=2, single_chunk_seconds=45)
+        assert chunks == [Chunk(1, 30, 32), Chunk(2, 60, 32)]
+
+    def test_contained_window_reuses_chunks(self):
+        """Test a window inside another needs a subset of its chunks"""
+        outer = plan_chunks(300, 0, 90, 30, 2, 45)
+        inner = plan_chunks(300, 10, 50, 30, 2, 45)
+        assert set(inner) <= set(outer)
+
+    def test_clamped_to_file(self):
+        """Test the last chunk ends with the file"""
+        chunks = plan_chunks(100, 0, 1000, 30, 2, 45)
+        assert [c.index for c in chunks] == [0, 1, 2, 3]
+        assert chunks[-1].start + chunks[-1].duration == 100
+
+    def test_short_file_single_chunk(self):
+        """Test files under the threshold are transcribed in one piece"""
+        assert plan_chunks(40, 10, 20, 30, 2, 45) == [Chunk(0, 0.0, 40)]
+
+    def test_empty_window(self):
+        """Test windows outside the file need no chunks"""
+        assert plan_chunks(100, 120, 150, 30, 2, 45) == []
+
+
+class TestClipToWindow:
+    """Tests for clip_to_window"""
+
+    def test_clip(self):
+        """Test notes starting outside the window are dropped and ends are cut to it"""
+        notes = [{'start': 4.0, 'end': 6.0, 'pitch': 55, 'velocity': 0.8},
+                 {'start': 29.0, 'end': 31.5, 'pitch': 60, 'velocity': 0.8},
+                 {'start': 31.0, 'end': 33.0, 'pitch': 64, 'velocity': 0.7}]
+        clipped = clip_to_window(notes, 5.0, 32.0)
+        assert [(n['start'], n['end'], n['pitch']) for n in clipped] == [(29.0, 31.5, 60), (31.0, 32.0, 64)]
+        # The input notes are left untouched
+        assert notes[2]['end'] == 33.0
+
+
+class TestWindowPlanner:
+    """Tests for WindowPlanner"""
+
+    def test_overlapping_windows_share_chunks(self, audio_file, executor):
+        """Test 0-30 s, 0-60 s and the whole file transcribe each chunk once"""
+        planner = WindowPlanner()
+        submit = CountingSubmit(executor)
+        for end in (30, 60, 120):
+            chunks = plan_chunks(120, 0, end, 30, 2, 45)
+            planner.transcribe(audio_file, chunks, submit)
+        assert [c.index for c in submit.chunks] == [0, 1, 2, 3]
+        assert planner.stats['cached'] == 3
+
+    def test_in_flight_chunks_are_joined(self, audio_file):
+        """Test concurrent requests wait for the same transcription"""
+        planner = WindowPlanner()
+        future = Future()
+        calls = []
+
+        def submit(chunk):
+            calls.append(chunk)
+            return future
+
+        chunks = plan_chunks(120, 0, 30, 30, 2, 45)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(planner.transcribe(audio_file, chunks, submit)))
+                   for ___ in range(3)]
+        for thread in threads:
+            thread.start()
+        while planner.stats['joined'] < 2:
+            threading.Event().wait(0.01)
+        future.set_result(fake_notes(chunks[0]))
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert len(results) == 3 and all(r == results[0] for r in results)
+
+    def test_changed_file_is_transcribed_again(self, audio_file, executor):
+        """Test chunks are keyed by file version"""
+        planner = WindowPlanner()
+        submit = CountingSubmit(executor)
+        chunks = plan_chunks(120, 0, 30, 30, 2, 45)
+        planner.transcribe(audio_file, chunks, submit)
+        with open(audio_file, 'ab') as f:
+            f.write(b"\0")
+        planner.transcribe(audio_file, chunks, submit)
+        assert len(submit.chunks) == 2
+
+    def test_failed_chunk_is_not_cached(self, audio_file, executor):
+        """Test errors propagate and the chunk is retried by the next request"""
+        planner = WindowPlanner()
+        chunks = plan_chunks(120, 0, 30, 30, 2, 45)
+
+        def failing(chunk):
+            return executor.submit(lambda: 1 / 0)
+
+        with pytest.raises(ZeroDivisionError):
+            planner.transcribe(audio_file, chunks, failing)
+        submit = CountingSubmit(executor)
+        planner.transcribe(audio_file, chunks, submit)
+        assert len(submit.chunks) == 1
+
+    def test_memory_bound(self, audio_file, executor):
+        """Test only max_chunks results are kept"""
+        planner = WindowPlanner(max_chunks=2)
+        submit = CountingSubmit(executor)
+        planner.transcribe(audio_file, plan_chunks(120, 0, 120, 30, 2, 45), submit)
+        planner.transcribe(audio_file, plan_chunks(120, 0, 30, 30, 2, 45), submit)
+        assert len(submit.chunks) == 5
@@ -0,0 +1,88 @@
+"""
+Tests for worker processes forked from a preloaded template
+"""
+import os
+import threading
+import time
+
+import pytest
+from src.worker_pool import WorkerProcessPool, worker_model
+
+
+def load_fake_model():
+    """A 'model' recording the process it was loaded in"""
+    return {'loaded_in': os.getpid()}
+
+
+def model_owner(delay=0.0):
+    """Return the pid the worker's model was loaded in and the worker's own pid"""
+    time.sleep(delay)
+    return worker_model()['loaded_in'], os.getpid()
+
+
+def fail(kind):
+    if kind == 'raise':
+        raise ValueError("bad input")
+    os._exit(3)
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerProcessPool(load_fake_model, preload_model=True, max_workers=2, idle_seconds=0.0,
+                             preload_modules=('numpy',))
+    yield pool
+    pool.close()
+
+
+class TestWorkerProcessPool:
+    """Tests for WorkerProcessPool"""
+
+    def test_workers_share_template_model(self, pool):
+        """Test concurrent tasks run in separate forks of the template that built the model"""
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.run(model_owner, 0.5)))
+                   for ___ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        template = pool.status()['template_pid']
+        assert [loaded_in for loaded_in, ___ in results] == [template, template]
+        worker_pids = {pid for ___, pid in results}
+        assert len(worker_pids) == 2 and template not in worker_pids
+        assert pool.status()['spawned'] == 2
+
+    def test_pool_shrinks_and_regrows(self, pool):
+        """Test idle workers exit and new ones are forked without restarting the template"""
+        pool.resize(2, idle_seconds=0.2)
+        ___, first_worker = pool.run(model_owner)
+        template = pool.status()['template_pid']
+        wait_for(lambda: pool.status()['workers'] == 0)
+
+        ___, second_worker = pool.run(model_owner)
+        status = pool.status()
+        assert second_worker != first_worker
+        assert status['template_pid'] == template
+        assert status['spawned'] == 2 and status['retired'] == 1
+        assert status['last_startup_ms'] < 1000
+
+    def test_task_failures(self, pool):
+        """Test task exceptions are re-raised and a dead worker doesn't break the pool"""
+        with pytest.raises(ValueError, match="bad input"):
+            pool.run(fail, 'raise')
+        with pytest.raises(RuntimeError):
+            pool.run(fail, 'exit')
+        assert pool.status()['crashed'] == 1
+        assert pool.run(model_owner)[0] == pool.status()['template_pid']
+
+    def test_model_outside_worker(self):
+        """Test worker_model is only available in pool workers"""
+        with pytest.raises(RuntimeError):
+            worker_model()